@@ -14,7 +14,10 @@ from sqlalchemy import create_engine
 from sqlalchemy import text as sql
 from sqlalchemy.engine import URL
 
-from zetta_utils.db_annotations.precomp_annotations import build_annotation_layer
+from zetta_utils.db_annotations.precomp_annotations import (
+    array_to_lines,
+    build_annotation_layer,
+)
 from zetta_utils.geometry import BBox3D, Vec3D
 from zetta_utils.layer.volumetric import VolumetricIndex
 
@@ -182,7 +185,7 @@ def load_annotations():
             lines = layer.read_all()
         items = [
             {"id": hex(l.id)[2:], "type": "line", "pointA": l.start, "pointB": l.end}
-            for l in lines
+            for l in array_to_lines(lines)
         ]
     return items
 
@@ -0,0 +1,40 @@
+import timeit
+from typing import Any, Callable, Dict
+
+import pytest
+
+BENCHMARK_RESULTS: Dict[str, float] = {}
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--run-benchmarks"):
+        return
+    skip = pytest.mark.skip(reason="Only run when `--run-benchmarks` is given")
+    for item in items:
+        if "benchmarks" in item.nodeid.split("/"):
+            item.add_marker(skip)
+
+
+@pytest.fixture
+def bench(request) -> Callable[..., float]:
+    """
+    Time ``fn`` and fail if the best time per call exceeds ``max_usec`` microseconds.
+    The budgets are meant to be generous and catch order-of-magnitude regressions.
+    """
+
+    def run(fn: Callable[[], Any], max_usec: float, number: int = 1000, repeat: int = 5) -> float:
+        usec = min(timeit.repeat(fn, number=number, repeat=repeat)) / number * 1e6
+        BENCHMARK_RESULTS[request.node.name] = usec
+        assert usec <= max_usec, f"{usec:.2f}us per call exceeds the {max_usec}us budget"
+        return usec
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not BENCHMARK_RESULTS:
+        return
+    terminalreporter.section("benchmarks")
+    width = max(len(k) for k in BENCHMARK_RESULTS)
+    for name, usec in BENCHMARK_RESULTS.items():
+        terminalreporter.write_line(f"{name:<{width}} {usec:10.2f}us")
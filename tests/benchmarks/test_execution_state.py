@@ -0,0 +1,79 @@
+# pylint: disable=missing-docstring
+import time
+import tracemalloc
+from typing import Any
+
+import pytest
+
+from zetta_utils.mazepa import Dependency, InMemoryExecutionState, TaskOutcome
+from zetta_utils.mazepa.flows import _FlowSchema
+from zetta_utils.mazepa.id_generation import get_literal_id_fn
+from zetta_utils.mazepa.tasks import _TaskableOperation
+
+from .conftest import BENCHMARK_RESULTS
+
+BATCH_LEN = 1000
+
+
+def noop():
+    pass
+
+
+def make_task(i: int):
+    return _TaskableOperation(fn=noop, id_fn=get_literal_id_fn(f"task-{i}")).make_task()
+
+
+def two_stage_flow(i):
+    # Mimics subchunkable flows: most flows are blocked on their first task at any time.
+    # Tasks are made when the flow runs, so that only those of ongoing flows are in memory.
+    yield make_task(2 * i)
+    yield Dependency()
+    yield make_task(2 * i + 1)
+
+
+def top_flow(flows):
+    yield flows
+
+
+def make_flow(num_tasks: int):
+    flows = [
+        _FlowSchema(fn=two_stage_flow, id_fn=get_literal_id_fn(f"flow-{i}"))(i=i)
+        for i in range(num_tasks // 2)
+    ]
+    return _FlowSchema(fn=top_flow, id_fn=get_literal_id_fn("flow-top"))(flows=flows)
+
+
+def run_to_completion(state: InMemoryExecutionState) -> int:
+    num_ticks = 0
+    outcome: TaskOutcome[Any] = TaskOutcome()
+    while state.has_ongoing_flows():
+        batch = state.get_task_batch(max_batch_len=BATCH_LEN)
+        state.update_with_task_outcomes({e.id_: outcome for e in batch})
+        num_ticks += 1
+    return num_ticks
+
+
+@pytest.mark.parametrize("num_tasks", [10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7])
+def test_scheduler_ticks(request, num_tasks):
+    state = InMemoryExecutionState(ongoing_flows=[make_flow(num_tasks)])
+    start = time.perf_counter()
+    num_ticks = run_to_completion(state)
+    usec = (time.perf_counter() - start) / num_ticks * 1e6
+    BENCHMARK_RESULTS[request.node.name] = usec
+    # The cost of a tick must not grow with the number of ongoing flows
+    assert usec <= 50000, f"{usec:.2f}us per tick exceeds the 50000us budget"
+
+
+@pytest.mark.parametrize("num_tasks", [10 ** 5])
+def test_scheduler_memory(num_tasks):
+    flow = make_flow(num_tasks)
+    tracemalloc.start()
+    try:
+        run_to_completion(InMemoryExecutionState(ongoing_flows=[flow]))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    bytes_per_task = peak / num_tasks
+    assert (
+        bytes_per_task <= 2000
+    ), f"{bytes_per_task:.0f} bytes/task peak scheduler memory exceeds the 2000 byte budget"
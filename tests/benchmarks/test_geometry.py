@@ -0,0 +1,80 @@
+# pylint: disable=missing-docstring,redefined-outer-name
+import os
+
+import pytest
+
+from zetta_utils.geometry import BBox3D, BBoxStrider, IntVec3D, Vec3D
+from zetta_utils.geometry.vec import VEC3D_TYPECHECK_ENV_VAR
+from zetta_utils.layer.volumetric import VolumetricIndex
+
+pytestmark = pytest.mark.skipif(
+    os.environ.get(VEC3D_TYPECHECK_ENV_VAR, "0") == "1",
+    reason="Budgets assume Vec3D runtime type checking is disabled",
+)
+
+VEC_A = Vec3D(1, 2, 3)
+VEC_B = Vec3D(4.0, 5.0, 6.0)
+BBOX = BBox3D.from_coords([0, 0, 0], [256, 256, 40], [4, 4, 40])
+IDX = VolumetricIndex.from_coords([0, 0, 0], [256, 256, 8], Vec3D(4, 4, 40))
+
+
+@pytest.mark.parametrize(
+    "fn",
+    [
+        pytest.param(lambda: Vec3D(1, 2, 3), id="vec3d_init"),
+        pytest.param(lambda: VEC_A + VEC_B, id="vec3d_add"),
+        pytest.param(lambda: VEC_A - 1, id="vec3d_sub_scalar"),
+        pytest.param(lambda: VEC_A * VEC_A, id="vec3d_mul"),
+        pytest.param(lambda: VEC_A / VEC_B, id="vec3d_truediv"),
+        pytest.param(lambda: VEC_B // VEC_A, id="vec3d_floordiv"),
+        pytest.param(lambda: VEC_B % VEC_A, id="vec3d_mod"),
+        pytest.param(lambda: round(VEC_B), id="vec3d_round"),
+        pytest.param(lambda: VEC_A == VEC_B, id="vec3d_eq"),
+        pytest.param(lambda: hash(VEC_A), id="vec3d_hash"),
+        pytest.param(lambda: tuple(VEC_A), id="vec3d_iter"),
+    ],
+)
+def test_vec3d(bench, fn):
+    bench(fn, max_usec=50)
+
+
+@pytest.mark.parametrize(
+    "fn",
+    [
+        pytest.param(
+            lambda: BBox3D.from_coords([0, 0, 0], [8, 8, 8], [4, 4, 40]), id="bbox3d_from_coords"
+        ),
+        pytest.param(lambda: BBOX.padded([4, 4, 0], [4, 4, 40]), id="bbox3d_padded"),
+        pytest.param(lambda: BBOX.intersection(BBOX), id="bbox3d_intersection"),
+        pytest.param(lambda: BBOX.snapped([0, 0, 0], [64, 64, 40], "shrink"), id="bbox3d_snapped"),
+    ],
+)
+def test_bbox3d(bench, fn):
+    bench(fn, max_usec=2000, number=200)
+
+
+@pytest.mark.parametrize(
+    "fn",
+    [
+        pytest.param(
+            lambda: VolumetricIndex.from_coords([0, 0, 0], [8, 8, 8], VEC_A),
+            id="vol_idx_from_coords",
+        ),
+        pytest.param(lambda: IDX.padded([4, 4, 0]), id="vol_idx_padded"),
+        pytest.param(lambda: IDX.intersection(IDX), id="vol_idx_intersection"),
+        pytest.param(lambda: IDX.snapped([0, 0, 0], [64, 64, 1], "shrink"), id="vol_idx_snapped"),
+        pytest.param(IDX.to_slices, id="vol_idx_to_slices"),
+    ],
+)
+def test_volumetric_index(bench, fn):
+    bench(fn, max_usec=2000, number=200)
+
+
+def test_bbox_strider_chunks(bench):
+    strider = BBoxStrider(
+        bbox=BBOX,
+        resolution=Vec3D(4, 4, 40),
+        chunk_size=IntVec3D(16, 16, 1),
+        stride=IntVec3D(16, 16, 1),
+    )
+    bench(strider.get_all_chunk_bboxes, max_usec=200000, number=5)
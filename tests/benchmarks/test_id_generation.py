@@ -0,0 +1,62 @@
+# pylint: disable=missing-docstring,redefined-outer-name
+import itertools
+
+import pytest
+
+from zetta_utils.builder.building import BuilderPartial
+from zetta_utils.geometry import BBox3D
+from zetta_utils.layer.volumetric.cloudvol import build_cv_layer
+from zetta_utils.mazepa import Dependency, Flow
+from zetta_utils.mazepa.id_generation import generate_invocation_id, get_dill_hash
+from zetta_utils.mazepa_layer_processing.common import build_subchunkable_apply_flow
+
+BBOX = BBox3D.from_coords([0, 0, 0], [2048, 2048, 40], [1, 1, 1])
+
+
+def _collect_tasks(flow: Flow) -> list:
+    result = []
+    flow_yield = flow.get_next_batch()
+    while flow_yield is not None:
+        if not isinstance(flow_yield, Dependency):
+            for e in flow_yield:
+                result.extend(_collect_tasks(e) if isinstance(e, Flow) else [e])
+        flow_yield = flow.get_next_batch()
+    return result
+
+
+@pytest.fixture(scope="module")
+def invocations(tmp_path_factory):
+    path = tmp_path_factory.mktemp("id_generation")
+    layers = [
+        build_cv_layer(
+            path=str(path / name),
+            info_type="image",
+            info_data_type="float32",
+            info_num_channels=1,
+            info_scales=[[4, 4, 40]],
+            info_chunk_size=[64, 64, 1],
+            info_encoding="raw",
+            info_bbox=BBOX,
+        )
+        for name in ["src", "dst"]
+    ]
+    flow = build_subchunkable_apply_flow(
+        fn=BuilderPartial(spec={"@type": "invoke_lambda_str", "lambda_str": "lambda src: src"}),
+        op_kwargs={"src": layers[0]},
+        dst=layers[1],
+        dst_resolution=[4, 4, 40],
+        processing_chunk_sizes=[[64, 64, 1]],
+        skip_intermediaries=True,
+        bbox=BBOX,
+    )
+    return [(e.fn, list(e.args), e.kwargs) for e in _collect_tasks(flow)]
+
+
+def test_ids_per_sec_dill(bench, invocations):
+    calls = itertools.cycle(invocations)
+    bench(lambda: get_dill_hash(next(calls)), max_usec=50000, number=100)
+
+
+def test_ids_per_sec_structural(bench, invocations):
+    calls = itertools.cycle(invocations)
+    bench(lambda: generate_invocation_id(*next(calls)), max_usec=1000, number=100)
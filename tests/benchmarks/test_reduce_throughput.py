@@ -0,0 +1,82 @@
+# pylint: disable=missing-docstring
+import itertools
+
+import numpy as np
+import pytest
+
+from zetta_utils.geometry import BBox3D, Vec3D
+from zetta_utils.layer.volumetric import (
+    VolumetricBasedLayerProtocol,
+    VolumetricIndex,
+    VolumetricLayer,
+)
+from zetta_utils.layer.volumetric.cloudvol import build_cv_layer
+from zetta_utils.mazepa_layer_processing.common.volumetric_apply_flow import (
+    ReduceByWeightedSum,
+)
+
+RESOLUTION = Vec3D(1, 1, 1)
+
+
+def make_idx(start, end) -> VolumetricIndex:
+    return VolumetricIndex(resolution=RESOLUTION, bbox=BBox3D.from_coords(start, end, RESOLUTION))
+
+
+def make_layer(path: str, roi_idx: VolumetricIndex, chunk_size: Vec3D) -> VolumetricLayer:
+    layer = build_cv_layer(
+        path=path,
+        info_type="image",
+        info_data_type="float32",
+        info_num_channels=1,
+        info_scales=[RESOLUTION],
+        info_chunk_size=chunk_size,
+        info_encoding="raw",
+        info_bbox=roi_idx.bbox,
+    )
+    return layer.with_changes(
+        backend=layer.backend.with_changes(
+            enforce_chunk_aligned_writes=False, use_compression=False
+        )
+    )
+
+
+@pytest.mark.parametrize(
+    "grid_shape, chunk_size, blend_pad",
+    [
+        # Typical 2D inference: four chunks blended around a corner
+        [(2, 2, 1), (512, 512, 1), (64, 64, 0)],
+        # Typical 3D inference: every neighbour of the middle chunk
+        [(3, 3, 3), (128, 128, 16), (16, 16, 4)],
+    ],
+)
+def test_reduce_by_weighted_sum(tmp_path, bench, grid_shape, chunk_size, blend_pad):
+    chunk_size = Vec3D(*chunk_size)
+    blend_pad = Vec3D(*blend_pad)
+    grid_size = Vec3D(*grid_shape) * chunk_size
+    roi_idx = make_idx(-chunk_size, grid_size + chunk_size)
+    red_idx = make_idx((0, 0, 0), grid_size)
+    src_idxs = [
+        make_idx(Vec3D(*e) * chunk_size, (Vec3D(*e) + 1) * chunk_size).padded(blend_pad)
+        for e in itertools.product(*(range(e) for e in grid_shape))
+    ]
+    # One intermediary for each checkerboarding phase, as in the flows
+    phases: dict[tuple[int, ...], VolumetricBasedLayerProtocol] = {}
+    src_layers: list[VolumetricBasedLayerProtocol] = []
+    for src_idx in src_idxs:
+        phase = tuple(int(e // chunk_size[i]) % 2 for i, e in enumerate(src_idx.start + blend_pad))
+        if phase not in phases:
+            phases[phase] = make_layer(
+                f"file://{tmp_path}/phase_{len(phases)}", roi_idx, chunk_size
+            )
+        phases[phase][src_idx] = np.random.rand(1, *src_idx.shape).astype(np.float32)
+        src_layers.append(phases[phase])
+    # Uncompressed like the intermediaries, so that the time is not dominated by the write
+    dst = make_layer(f"file://{tmp_path}/dst", roi_idx, chunk_size)
+
+    op = ReduceByWeightedSum("quadratic")
+    bench(
+        lambda: op(src_idxs, src_layers, red_idx, roi_idx, dst, blend_pad),
+        max_usec=5e6,
+        number=1,
+        repeat=5,
+    )
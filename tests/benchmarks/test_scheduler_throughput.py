@@ -0,0 +1,85 @@
+# pylint: disable=missing-docstring
+import itertools
+import os
+import time
+
+import pytest
+
+from zetta_utils import mazepa
+from zetta_utils.mazepa_addons.configurations.worker_pool import (
+    setup_local_worker_pool,
+    setup_process_queue_worker_pool,
+)
+from zetta_utils.message_queues import FileQueue, ProcessQueue
+
+from .conftest import BENCHMARK_RESULTS
+
+NUM_STAGES = 5
+STAGE_LEN = 100
+REPEAT = 3
+
+# Builtin, so that the spawned workers can unpickle the tasks without importing the tests
+noop = mazepa.taskable_operation(abs)
+_ids = itertools.count()
+
+
+def make_flow(num_stages: int, stage_len: int) -> mazepa.Flow:
+    # Stages separated by dependencies, like the levels of subchunkable flows
+    return mazepa.sequential_flow(
+        [
+            mazepa.concurrent_flow([noop.make_task(next(_ids)) for _ in range(stage_len)])
+            for _ in range(num_stages)
+        ]
+    )
+
+
+def execute_flow(flow, task_queue, outcome_queue):
+    mazepa.execute(
+        flow,
+        task_queue=task_queue,
+        outcome_queue=outcome_queue,
+        batch_gap_sleep_sec=0.5,
+        do_dryrun_estimation=False,
+        show_progress=False,
+        checkpoint_interval_sec=None,
+    )
+
+
+def run_flows(request, num_workers, task_queue, outcome_queue, min_tasks_per_sec):
+    # Wait for the workers to start up
+    execute_flow(make_flow(1, num_workers), task_queue, outcome_queue)
+    elapsed = float("inf")
+    for _ in range(REPEAT):
+        flow = make_flow(NUM_STAGES, STAGE_LEN)
+        start = time.perf_counter()
+        execute_flow(flow, task_queue, outcome_queue)
+        elapsed = min(elapsed, time.perf_counter() - start)
+    usec = elapsed / (NUM_STAGES * STAGE_LEN) * 1e6
+    BENCHMARK_RESULTS[request.node.name] = usec
+    # Generous floor, meant to catch order-of-magnitude regressions of the scheduler loop
+    tasks_per_sec = 1e6 / usec
+    assert (
+        tasks_per_sec >= min_tasks_per_sec
+    ), f"{tasks_per_sec:.1f} tasks/sec is below the {min_tasks_per_sec} tasks/sec floor"
+
+
+@pytest.mark.parametrize("num_workers", [1, 2, 4, 8])
+def test_file_queue_tasks_per_sec(request, tmp_path, num_workers):
+    task_queue_name = os.path.join(tmp_path, "task_queue")
+    outcome_queue_name = os.path.join(tmp_path, "outcome_queue")
+    with FileQueue(task_queue_name) as task_queue, FileQueue(
+        outcome_queue_name, pull_wait_sec=0
+    ) as outcome_queue:
+        with setup_local_worker_pool(
+            num_workers, task_queue_name, outcome_queue_name, sleep_sec=0.01
+        ):
+            run_flows(request, num_workers, task_queue, outcome_queue, min_tasks_per_sec=5)
+
+
+@pytest.mark.parametrize("num_workers", [1, 2, 4, 8])
+def test_process_queue_tasks_per_sec(request, num_workers):
+    with ProcessQueue("task_queue") as task_queue, ProcessQueue(
+        "outcome_queue", pull_wait_sec=0.1
+    ) as outcome_queue:
+        with setup_process_queue_worker_pool(num_workers, task_queue, outcome_queue):
+            run_flows(request, num_workers, task_queue, outcome_queue, min_tasks_per_sec=100)
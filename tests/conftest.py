@@ -12,6 +12,9 @@ constants.RUN_DATABASE = None
 
 def pytest_addoption(parser):
     parser.addoption("--run-integration", default=False, help="Run integration tests")
+    parser.addoption(
+        "--run-benchmarks", action="store_true", default=False, help="Run microbenchmarks"
+    )
 
 
 @pytest.fixture(scope="session")
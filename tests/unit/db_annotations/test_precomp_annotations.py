@@ -1,12 +1,19 @@
+import itertools
 import os
 import shutil
 
+import numpy as np
 import pytest
+from cloudvolume.datasource.precomputed.sharding import ShardingSpecification
 
+from zetta_utils import mazepa
 from zetta_utils.db_annotations import precomp_annotations
 from zetta_utils.db_annotations.precomp_annotations import (
     AnnotationLayer,
     LineAnnotation,
+    array_to_lines,
+    line_dtype,
+    lines_to_array,
 )
 from zetta_utils.geometry import BBox3D, Vec3D
 from zetta_utils.layer.volumetric.index import VolumetricIndex
@@ -45,7 +52,7 @@ def test_round_trip():
     assert sf.index == index
     assert sf.chunk_sizes == chunk_sizes
 
-    lines_read = sf.read_all()
+    lines_read = array_to_lines(sf.read_all())
     assert len(lines_read) == len(lines)
     for line in lines:
         assert line in lines_read
@@ -54,7 +61,7 @@ def test_round_trip():
     roi = BBox3D.from_coords((510, 0, 300), (3000, 200, 1000), Vec3D(5, 50, 40))
     # With that index, and strict=False, we would get at least 3 lines (ids 3, 4, and 5).
     # And on this test, we'll get our coordinates in their original resolution.
-    lines_read = sf.read_in_bounds(roi, strict=False)
+    lines_read = array_to_lines(sf.read_in_bounds(roi, strict=False))
     assert len(lines_read) == 3
     for line in lines_read:
         assert line in lines  # should match what was written exactly in this case
@@ -64,7 +71,9 @@ def test_round_trip():
             assert line.end == (258.0, 62.0, 575.0)
     # But with strict=True, we should get only 2 lines (ids 4 and 5).
     # And also, in this test, we'll ask for the coordinates in nm.
-    lines_read = sf.read_in_bounds(roi, strict=True, annotation_resolution=Vec3D(1, 1, 1))
+    lines_read = array_to_lines(
+        sf.read_in_bounds(roi, strict=True, annotation_resolution=Vec3D(1, 1, 1))
+    )
     assert len(lines_read) == 2
     for line in lines_read:
         assert line.id in [4, 5]
@@ -78,7 +87,7 @@ def test_round_trip():
         LineAnnotation(line_id=105, start=(1298.5, 889.0, 315.0), end=(1294.5, 887.0, 314.0)),
     ]
     sf.write_annotations(new_lines, clearing_bbox=roi)
-    lines_read = sf.read_in_bounds(roi, strict=False)
+    lines_read = array_to_lines(sf.read_in_bounds(roi, strict=False))
     assert len(lines_read) == 3
     for line in lines_read:
         assert line.id in [3, 104, 105]
@@ -88,7 +97,7 @@ def test_round_trip():
 
     # Above is typical usage.  Below, we do some odd things
     # to trigger other code paths we want to test.
-    lines_read = sf.read_all(-1, False)  # allow duplicates
+    lines_read = array_to_lines(sf.read_all(-1, False))  # allow duplicates
     assert len(lines_read) == len(lines) + 1
 
     shutil.rmtree(os.path.join(file_dir, "spatial0"))
@@ -114,13 +123,13 @@ def test_resolution_changes():
     sf.write_annotations(lines, Vec3D(10, 10, 80))
 
     # pull those back out at file native resolution, i.e. (20, 20, 40)
-    lines_read = sf.read_all()
+    lines_read = array_to_lines(sf.read_all())
     assert len(lines_read) == 1
     assert lines_read[0].start == (100 * 10 / 20, 500 * 10 / 20, 50 * 80 / 40)
     assert lines_read[0].end == (200 * 10 / 20, 600 * 10 / 20, 60 * 80 / 40)
 
     # pull those back out at resolution (5, 5, 20)
-    lines_read = sf.read_all(annotation_resolution=Vec3D(5, 5, 20))
+    lines_read = array_to_lines(sf.read_all(annotation_resolution=Vec3D(5, 5, 20)))
     assert len(lines_read) == 1
     assert lines_read[0].start == (100 * 10 / 5, 500 * 10 / 5, 50 * 80 / 20)
     assert lines_read[0].end == (200 * 10 / 5, 600 * 10 / 5, 60 * 80 / 20)
@@ -174,6 +183,357 @@ def test_edge_cases():
     assert not AnnotationLayer("/dev/null/subdir", index).exists()
 
 
+def test_encode_decode():
+    lines = [
+        LineAnnotation(line_id=7, start=(1.5, 2.0, 3.0), end=(4.0, 5.0, 6.25)),
+        LineAnnotation(line_id=2 ** 40, start=(0.0, 0.0, 0.0), end=(-1.0, 2.0, 3.0)),
+    ]
+    data = precomp_annotations.encode_lines(lines, randomize=False)
+    assert len(data) == 8 + len(lines) * (LineAnnotation.BYTES_PER_ENTRY + 8)
+    decoded = precomp_annotations.decode_lines(data)
+    assert decoded.dtype == precomp_annotations.LINE_DTYPE
+    assert array_to_lines(decoded) == lines
+
+    # the encoding matches that of the individual LineAnnotations
+    buffer = bytearray(np.array([len(lines)], dtype="<u8").tobytes())
+    for line in lines:
+        buffer += np.array([*line.start, *line.end], dtype="<f4").tobytes()
+    buffer += np.array([line.id for line in lines], dtype="<u8").tobytes()
+    assert bytes(buffer) == data
+
+    shuffled = precomp_annotations.decode_lines(precomp_annotations.encode_lines(lines))
+    assert sorted(shuffled["id"].tolist()) == [7, 2 ** 40]
+    assert len(precomp_annotations.decode_lines(b"")) == 0
+
+
+def test_lines_in_bounds():
+    rng = np.random.default_rng(0)
+    lines = np.empty(2000, dtype=precomp_annotations.LINE_DTYPE)
+    lines["id"] = np.arange(len(lines))
+    lines["start"] = rng.integers(-5, 25, (len(lines), 3))
+    lines["end"] = lines["start"] + rng.integers(-8, 8, (len(lines), 3))
+    bounds = VolumetricIndex.from_coords((0, 2, 4), (10, 12, 14), Vec3D(4, 4, 40))
+    expected = [bounds.line_intersects(line.start, line.end) for line in array_to_lines(lines)]
+    assert precomp_annotations.lines_in_bounds(lines, bounds).tolist() == expected
+
+
+def test_bin_lines():
+    rng = np.random.default_rng(0)
+    lines = np.empty(2000, dtype=precomp_annotations.LINE_DTYPE)
+    lines["id"] = np.arange(len(lines))
+    # integer coordinates, so that many lines touch the chunk faces
+    lines["start"] = rng.integers(-5, 40, (len(lines), 3))
+    lines["end"] = lines["start"] + rng.integers(-12, 12, (len(lines), 3))
+    bounds = VolumetricIndex.from_coords((0, 2, 4), (30, 32, 24), Vec3D(1, 1, 1))
+    chunk_size = (8, 10, 4)
+
+    bins = precomp_annotations.bin_lines(lines, bounds, chunk_size)
+    assert [cell for cell, _ in bins] == sorted(cell for cell, _ in bins)
+    binned = {cell: line_indices.tolist() for cell, line_indices in bins}
+    for cell in itertools.product(range(4), range(3), range(5)):
+        chunk_start = bounds.start + Vec3D(*cell) * Vec3D(*chunk_size)
+        chunk_bounds = VolumetricIndex.from_coords(
+            chunk_start, chunk_start + Vec3D(*chunk_size), bounds.resolution
+        )
+        expected = np.flatnonzero(precomp_annotations.lines_in_bounds(lines, chunk_bounds))
+        assert binned.get(cell, []) == expected.tolist()
+    assert precomp_annotations.bin_lines(lines[:0], bounds, chunk_size) == []
+
+
+def test_chunk_file_io():
+    temp_dir = os.path.expanduser("~/temp/test_precomp_anno")
+    level_dir = os.path.join(temp_dir, "chunk_file_io", "spatial0")
+    assert not precomp_annotations.list_chunk_files(level_dir)
+
+    lines = lines_to_array(
+        [LineAnnotation(line_id=i, start=(i, i, i), end=(i + 1, i, i)) for i in range(3)]
+    )
+    precomp_annotations.write_chunk_files(
+        level_dir, [("10_0_0", lines[:1]), ("2_0_0", lines[1:])], progress=True
+    )
+    with open(os.path.join(level_dir, "notachunk"), "wb"):
+        pass
+    assert precomp_annotations.list_chunk_files(level_dir) == ["2_0_0", "10_0_0"]
+
+    chunks = precomp_annotations.read_chunk_files(level_dir, ["10_0_0", "1_0_0", "2_0_0"])
+    assert [len(e) for e in chunks] == [1, 0, 2]
+    np.testing.assert_array_equal(chunks[0], lines[:1])
+    np.testing.assert_array_equal(np.sort(chunks[2], order="id"), lines[1:])
+    assert not precomp_annotations.read_chunk_files(level_dir, [])
+
+    shutil.rmtree(os.path.join(temp_dir, "chunk_file_io"))
+
+
+def test_write_array():
+    temp_dir = os.path.expanduser("~/temp/test_precomp_anno")
+    os.makedirs(temp_dir, exist_ok=True)
+    file_dir = os.path.join(temp_dir, "write_array")
+
+    lines = lines_to_array(
+        [
+            LineAnnotation(line_id=1, start=(10.0, 10.0, 10.0), end=(30.0, 10.0, 10.0)),
+            LineAnnotation(line_id=2, start=(60.0, 70.0, 80.0), end=(61.0, 71.0, 81.0)),
+        ]
+    )
+    index = VolumetricIndex.from_coords([0, 0, 0], [100, 100, 100], Vec3D(1, 1, 1))
+    sf = AnnotationLayer(file_dir, index, [[100, 100, 100], [25, 25, 25]])
+    sf.clear()
+    sf.write_annotations(lines, all_levels=False)
+    sf.post_process()
+
+    # line 1 spans two chunks of the lowest level
+    assert len(sf.read_all(filter_duplicates=False)) == 3
+    np.testing.assert_array_equal(np.sort(sf.read_all(), order="id"), lines)
+    level0_lines = sf.read_all(spatial_level=0, filter_duplicates=False)
+    np.testing.assert_array_equal(np.sort(level0_lines, order="id"), lines)
+
+    # Only non-empty chunks are written, and those that become empty are removed
+    precomp_annotations.subdivide(lines, index, [[50, 50, 50]], file_dir)
+    assert sorted(os.listdir(os.path.join(file_dir, "spatial0"))) == ["0_0_0", "1_1_1"]
+    entries = precomp_annotations.subdivide(lines[:1], index, [[50, 50, 50]], file_dir)
+    assert os.listdir(os.path.join(file_dir, "spatial0")) == ["0_0_0"]
+    assert entries[0].limit == 1
+
+    shutil.rmtree(file_dir)
+
+
+SHARDING = {
+    "@type": "neuroglancer_uint64_sharded_v1",
+    "hash": "murmurhash3_x86_128",
+    "preshift_bits": 0,
+    "minishard_bits": 1,
+    "shard_bits": 1,
+    "minishard_index_encoding": "gzip",
+    "data_encoding": "gzip",
+}
+
+
+def make_related_lines(rows) -> np.ndarray:
+    lines = np.zeros(len(rows), dtype=line_dtype(["pre_segment", "post_segment"]))
+    for i, (line_id, start, end, pre, post) in enumerate(rows):
+        lines[i] = (line_id, start, end, pre, post)
+    return lines
+
+
+def test_sharded_round_trip():
+    temp_dir = os.path.expanduser("~/temp/test_precomp_anno")
+    os.makedirs(temp_dir, exist_ok=True)
+    file_dir = os.path.join(temp_dir, "sharded_round_trip")
+
+    lines = make_related_lines(
+        [
+            (1, (10.0, 10.0, 10.0), (20.0, 10.0, 10.0), 7, 8),
+            (2, (60.0, 70.0, 80.0), (61.0, 71.0, 81.0), 7, 9),
+            (3, (90.0, 10.0, 90.0), (91.0, 11.0, 91.0), 9, 0),
+            (4, (40.0, 40.0, 40.0), (45.0, 45.0, 45.0), 10, 8),
+        ]
+    )
+    index = VolumetricIndex.from_coords([0, 0, 0], [100, 100, 100], Vec3D(1, 1, 1))
+    sf = precomp_annotations.build_annotation_layer(
+        file_dir,
+        index=index,
+        chunk_sizes=[[100, 100, 100], [25, 25, 25]],
+        mode="replace",
+        sharding=SHARDING,
+        relationships=["pre_segment", "post_segment"],
+    )
+    sf.write_annotations(lines, all_levels=False)
+    sf.post_process()
+
+    # Every index is stored in (at most 2) shard files
+    for key in ["spatial0", "spatial1", "by_id", "rel_pre_segment", "rel_post_segment"]:
+        names = os.listdir(os.path.join(file_dir, key))
+        assert 0 < len(names) <= 2
+        assert all(name.endswith(".shard") for name in names)
+
+    sf = precomp_annotations.build_annotation_layer(file_dir, mode="read")
+    assert sf.sharding == SHARDING
+    assert sf.relationships == ["pre_segment", "post_segment"]
+    spatial_lines = precomp_annotations.strip_relationships(lines)
+    np.testing.assert_array_equal(np.sort(sf.read_all(), order="id"), spatial_lines)
+    np.testing.assert_array_equal(np.sort(sf.read_all(spatial_level=0), order="id"), spatial_lines)
+    in_bounds = sf.read_in_bounds(BBox3D.from_coords((0, 0, 0), (24, 24, 24), Vec3D(1, 1, 1)))
+    assert in_bounds["id"].tolist() == [1]
+
+    np.testing.assert_array_equal(sf.read_by_id([4, 2, 5]), lines[[3, 1]])
+    assert sorted(sf.read_related("pre_segment", [7])["id"].tolist()) == [1, 2]
+    assert sorted(sf.read_related("post_segment", [8, 9])["id"].tolist()) == [1, 2, 4]
+    assert len(sf.read_related("post_segment", [0])) == 0
+    with pytest.raises(ValueError):
+        sf.read_related("synapse", [7])
+
+    # Clearing removes the old lines from every index, and their relationships too
+    sf.write_annotations(
+        make_related_lines([(5, (11.0, 11.0, 11.0), (12.0, 12.0, 12.0), 10, 0)]),
+        clearing_bbox=BBox3D.from_coords((0, 0, 0), (25, 25, 25), Vec3D(1, 1, 1)),
+    )
+    assert sorted(sf.read_all()["id"].tolist()) == [2, 3, 4, 5]
+    assert sorted(sf.read_all(spatial_level=0)["id"].tolist()) == [2, 3, 4, 5]
+    assert sorted(sf.read_by_id([1, 2, 3, 4, 5])["id"].tolist()) == [2, 3, 4, 5]
+    assert sorted(sf.read_related("pre_segment", [7])["id"].tolist()) == [2]
+    assert sorted(sf.read_related("pre_segment", [10])["id"].tolist()) == [4, 5]
+    assert sf.read_related("post_segment", [8])["id"].tolist() == [4]
+
+    shutil.rmtree(file_dir)
+
+
+def test_sharded_chunk_io():
+    temp_dir = os.path.expanduser("~/temp/test_precomp_anno")
+    dir_path = os.path.join(temp_dir, "sharded_chunk_io")
+    sharding = {**SHARDING, "minishard_index_encoding": "raw", "data_encoding": "raw"}
+    chunks = {key: bytes([key]) * key for key in range(1, 20)}
+
+    precomp_annotations.update_sharded_chunks(
+        dir_path, sharding, list(chunks), lambda key, old: chunks[key]
+    )
+    names = precomp_annotations.list_shard_files(dir_path)
+    assert len(names) == 2
+    read = precomp_annotations.read_shard_files(dir_path, sharding, names)
+    assert {k: v for e in read.values() for k, v in e.items()} == chunks
+    assert precomp_annotations.read_sharded_chunks(dir_path, sharding, [3, 20, 19]) == [
+        chunks[3],
+        None,
+        chunks[19],
+    ]
+
+    # Deleting every chunk of a shard removes its file
+    spec = ShardingSpecification.from_dict(sharding)
+    shard_keys = [
+        k for k in chunks if f"{spec.compute_shard_location(k).shard_number}.shard" == names[0]
+    ]
+    precomp_annotations.update_sharded_chunks(
+        dir_path, sharding, shard_keys, lambda key, old: None
+    )
+    assert precomp_annotations.list_shard_files(dir_path) == names[1:]
+    assert precomp_annotations.read_sharded_chunks(dir_path, sharding, shard_keys[:1]) == [None]
+
+    shutil.rmtree(dir_path)
+    assert precomp_annotations.list_shard_files(dir_path) == []
+
+
+def test_sharded_requires_sharding():
+    index = VolumetricIndex.from_coords([0, 0, 0], [100, 100, 100], Vec3D(1, 1, 1))
+    with pytest.raises(ValueError):
+        AnnotationLayer("/dev/null", index, relationships=["pre_segment"])
+    with pytest.raises(ValueError):
+        AnnotationLayer("/dev/null", index, sharding=SHARDING, relationships=["id"])
+    with pytest.raises(ValueError):
+        AnnotationLayer("/dev/null", index).read_by_id([1])
+    sf = AnnotationLayer("/dev/null", index, sharding=SHARDING, relationships=["pre_segment"])
+    with pytest.raises(ValueError):
+        sf.write_annotations([LineAnnotation(1, (1.0, 1.0, 1.0), (2.0, 2.0, 2.0))])
+
+
+@pytest.mark.parametrize("sharding", [None, SHARDING])
+def test_post_process_flow(sharding):
+    temp_dir = os.path.expanduser("~/temp/test_precomp_anno")
+    os.makedirs(temp_dir, exist_ok=True)
+    file_dir = os.path.join(temp_dir, "post_process_flow")
+    expected_dir = os.path.join(temp_dir, "post_process_expected")
+
+    rng = np.random.default_rng(0)
+    lines = np.zeros(200, dtype=precomp_annotations.LINE_DTYPE)
+    lines["id"] = np.arange(1, 201)
+    lines["start"] = rng.uniform(0, 40, (200, 3))
+    lines["end"] = lines["start"] + rng.uniform(-5, 5, (200, 3))
+    index = VolumetricIndex.from_coords([0, 0, 0], [100, 100, 100], Vec3D(1, 1, 1))
+    chunk_sizes = [[100, 100, 100], [50, 50, 50], [25, 25, 25]]
+
+    layers = []
+    for path in [file_dir, expected_dir]:
+        sf = AnnotationLayer(path, index, chunk_sizes, sharding=sharding)
+        sf.clear()
+        sf.write_annotations(lines, all_levels=False)
+        layers.append(sf)
+    layers[1].post_process()
+    # Chunks of the higher levels that are no longer in the lowest level are removed
+    layers[0].write_annotations(
+        [LineAnnotation(1000, (90.0, 90.0, 90.0), (91.0, 91.0, 91.0))], all_levels=True
+    )
+    # (sharded layers are post-processed from their staged lowest level)
+    lowest_key = "spatial2" if sharding is None else precomp_annotations.UNSHARDED_KEY
+    os.remove(os.path.join(file_dir, lowest_key, "3_3_3"))
+    flow = precomp_annotations.post_process_annotation_layer_flow(layers[0], block_shape=(1, 1, 1))
+    # Dry runs do not modify the layer
+    files = {os.path.join(r, f) for r, _, fs in os.walk(file_dir) for f in fs}
+    mazepa.dryrun.get_expected_operation_counts([flow])
+    assert {os.path.join(r, f) for r, _, fs in os.walk(file_dir) for f in fs} == files
+    mazepa.execute(flow, show_progress=False, do_dryrun_estimation=False)
+
+    assert not os.path.exists(os.path.join(file_dir, precomp_annotations.POST_PROCESS_KEY))
+    for level in range(len(chunk_sizes)):
+        np.testing.assert_array_equal(
+            np.sort(layers[0].read_all(spatial_level=level), order="id"),
+            np.sort(layers[1].read_all(spatial_level=level), order="id"),
+        )
+        assert len(layers[0].read_all(spatial_level=level, filter_duplicates=False)) == len(
+            layers[1].read_all(spatial_level=level, filter_duplicates=False)
+        )
+    assert [e.limit for e in precomp_annotations.read_info(file_dir)[3]] == [
+        e.limit for e in precomp_annotations.read_info(expected_dir)[3]
+    ]
+    assert precomp_annotations.read_info(file_dir)[3][0].limit == 200
+    if sharding is not None:
+        np.testing.assert_array_equal(
+            layers[0].read_by_id(range(1, 1001)), layers[1].read_by_id(range(1, 1001))
+        )
+
+    shutil.rmtree(file_dir)
+    shutil.rmtree(expected_dir)
+
+
+@pytest.mark.parametrize("distributed", [False, True])
+def test_sharded_parallel_writes(distributed):
+    temp_dir = os.path.expanduser("~/temp/test_precomp_anno")
+    os.makedirs(temp_dir, exist_ok=True)
+    file_dir = os.path.join(temp_dir, "sharded_parallel_writes")
+
+    rng = np.random.default_rng(0)
+    lines = np.zeros(200, dtype=line_dtype(["pre_segment", "post_segment"]))
+    lines["id"] = np.arange(1, 201)
+    lines["start"] = rng.integers(0, 100, (200, 3))
+    lines["end"] = np.clip(lines["start"] + rng.integers(-5, 6, (200, 3)), 0, 99)
+    lines["pre_segment"] = rng.integers(0, 20, 200)
+    lines["post_segment"] = rng.integers(0, 20, 200)
+    index = VolumetricIndex.from_coords([0, 0, 0], [100, 100, 100], Vec3D(1, 1, 1))
+    sf = AnnotationLayer(
+        file_dir,
+        index,
+        [[100, 100, 100], [25, 25, 25]],
+        sharding=SHARDING,
+        relationships=["pre_segment", "post_segment"],
+    )
+    sf.clear()
+    # Writers of different regions share the shard files of every index, but only
+    # write the staged lowest level, each from its own snapshot of the layer
+    writers = [AnnotationLayer(file_dir) for _ in range(2)]
+    in_first = lines["start"][:, 0] < 50
+    writers[0].write_annotations(lines[in_first], all_levels=False)
+    writers[1].write_annotations(lines[~in_first], all_levels=False)
+    assert len(sf.read_by_id(lines["id"].tolist())) == 0
+
+    if distributed:
+        flow = precomp_annotations.post_process_annotation_layer_flow(sf, block_shape=(2, 2, 2))
+        mazepa.execute(flow, show_progress=False, do_dryrun_estimation=False)
+    else:
+        sf.post_process()
+
+    np.testing.assert_array_equal(np.sort(sf.read_by_id(lines["id"].tolist()), order="id"), lines)
+    spatial_lines = precomp_annotations.strip_relationships(lines)
+    for level in [0, 1]:
+        np.testing.assert_array_equal(
+            np.sort(sf.read_all(spatial_level=level), order="id"), spatial_lines
+        )
+    for name in ["pre_segment", "post_segment"]:
+        for segment_id in range(1, 20):
+            assert sorted(sf.read_related(name, [segment_id])["id"].tolist()) == sorted(
+                lines["id"][lines[name] == segment_id].tolist()
+            )
+        assert len(sf.read_related(name, [0])) == 0
+
+    shutil.rmtree(file_dir)
+
+
 if __name__ == "__main__":
     test_round_trip()
     test_edge_cases()
@@ -444,3 +444,40 @@ def test_bbox_strider_exc(mocker):
             stride=IntVec3D(2, 2, 2),
             max_superchunk_size=IntVec3D(1, 1, 1),
         )
+
+
+@pytest.mark.parametrize(
+    "start_coord, end_coord, resolution, chunk_size, stride, stride_start_offset, mode, max_superchunk_size",
+    [
+        [Vec3D(0, 0, 0), Vec3D(4, 5, 6), Vec3D(1, 1, 1), IntVec3D(3, 3, 3), IntVec3D(2, 2, 2), None, "expand", None],
+        [Vec3D(-4, 0, 0), Vec3D(4, 5, 6), Vec3D(1, 1, 1), IntVec3D(3, 3, 3), IntVec3D(2, 2, 2), IntVec3D(1, 1, 1), "shrink", None],
+        [Vec3D(0, -1, 0), Vec3D(4, 4, 5), Vec3D(1, 1, 1), IntVec3D(2, 2, 2), IntVec3D(2, 2, 2), IntVec3D(-2, -2, 0), "exact", None],
+        [Vec3D(0, -1, 0), Vec3D(4, 4, 5), Vec3D(1, 1, 1), IntVec3D(2, 2, 2), IntVec3D(2, 2, 2), IntVec3D(-2, -2, 0), "exact", IntVec3D(4, 4, 4)],
+        [Vec3D(0, -1, 0), Vec3D(2, 3, 4), Vec3D(0.1, 0.6 / 3.0, 0.1 + 0.2), IntVec3D(2, 2, 2), IntVec3D(2, 2, 2), None, "exact", None],
+    ],
+)
+def test_bbox_strider_iter_chunk_bboxes(
+    start_coord,
+    end_coord,
+    resolution,
+    chunk_size,
+    stride,
+    stride_start_offset,
+    mode,
+    max_superchunk_size,
+):
+    strider = BBoxStrider(
+        bbox=BBox3D.from_coords(
+            start_coord=start_coord, end_coord=end_coord, resolution=resolution
+        ),
+        chunk_size=chunk_size,
+        resolution=resolution,
+        stride=stride,
+        stride_start_offset=stride_start_offset,
+        mode=mode,
+        max_superchunk_size=max_superchunk_size,
+    )
+    expected = [strider.get_nth_chunk_bbox(i) for i in range(strider.num_chunks)]
+    assert list(strider.iter_chunk_bboxes()) == expected
+    assert list(strider.iter_chunk_bboxes(1, 3)) == expected[1:3]
+    assert strider.get_chunk_bounds(2, 2).shape == (0, 3, 2)
@@ -2,6 +2,7 @@
 import typing
 from math import ceil, floor, trunc
 
+import attrs
 import numpy as np
 import pytest
 import typeguard
@@ -117,6 +118,13 @@ def test_hash(arg1, arg2, is_equal):
     assert (arg1[0].__hash__() == arg2[0].__hash__()) == is_equal
 
 
+def test_cached_hash_not_a_field():
+    vec = Vec3D(1, 2, 3)
+    hash(vec)
+    assert attrs.asdict(vec) == {"x": 1, "y": 2, "z": 3}
+    assert attrs.evolve(vec, x=4) == Vec3D(4, 2, 3)
+
+
 @pytest.mark.parametrize(
     "arg1, arg2, is_lt",
     [
@@ -276,7 +284,9 @@ def test_ops(arg1, arg2, fname, dtype):
         [None, vec3d, "-", TypeError],
         [vec3d, "hi", "*", typeguard.TypeCheckError],
         ["hi", vec3d, "/", typeguard.TypeCheckError],
-        ["hi", vec3d, "//", TypeError],
+        ["hi", vec3d, "//", typeguard.TypeCheckError],
+        [vec3d, [1, 2, 3, 4], "//", typeguard.TypeCheckError],
+        [vec3d, (1, 2, 3), "//", typeguard.TypeCheckError],
     ],
 )
 def test_unimplemented_ops(arg1, arg2, fname, exc):
@@ -1,7 +1,6 @@
 # pylint: disable=missing-docstring,redefined-outer-name,unused-argument,pointless-statement,line-too-long,protected-access,too-few-public-methods
 import os
 import pathlib
-from copy import deepcopy
 
 import numpy as np
 import pytest
@@ -28,15 +27,27 @@ LAYER_SCRATCH1_PATH = "file://" + os.path.join(INFOS_DIR, "scratch", "layer_x1")
 
 # Hack to mock a immutable method `write_info`
 _write_info_notmock = precomputed._write_info
-_TensorStore_notmock = deepcopy(tensorstore.TensorStore)
+# Classes are not copied by `deepcopy`, so the mocked methods are restored one by one
+_TensorStore_notmock = {
+    k: tensorstore.TensorStore.__dict__[k] for k in ("__getitem__", "__setitem__")
+}
+
+
+def _reset_mocks():
+    precomputed._write_info = _write_info_notmock
+    for k, v in _TensorStore_notmock.items():
+        setattr(tensorstore.TensorStore, k, v)
 
 
 @pytest.fixture
 def clear_caches_reset_mocks():
     _clear_ts_cache()
     precomputed._info_cache.clear()
-    precomputed._write_info = _write_info_notmock
-    tensorstore.TensorStore = deepcopy(_TensorStore_notmock)
+    _reset_mocks()
+    yield
+    # Tests of other modules use the TensorStore backend too
+    _reset_mocks()
+    _clear_ts_cache()
 
 
 def test_ts_backend_bad_path_exc(clear_caches_reset_mocks):
@@ -0,0 +1,236 @@
+# pylint: disable=missing-docstring,redefined-outer-name,unused-argument
+import numpy as np
+import pytest
+
+from zetta_utils.geometry import BBox3D, Vec3D
+from zetta_utils.layer.volumetric import VolumetricIndex
+from zetta_utils.layer.volumetric.chunk_cache import (
+    ChunkCache,
+    configure_chunk_cache,
+    get_chunk_cache,
+)
+from zetta_utils.layer.volumetric.cloudvol import build_cv_layer
+from zetta_utils.layer.volumetric.tensorstore import build_ts_layer
+
+SOURCE = np.arange(2 * 8 * 8 * 4, dtype=np.float32).reshape(2, 8, 8, 4)
+
+
+class CountingReader:
+    def __init__(self):
+        self.calls = []
+
+    def __call__(self, start, stop):
+        self.calls.append((tuple(start), tuple(stop)))
+        return SOURCE[(slice(None), *(slice(a, b) for a, b in zip(start, stop)))].copy()
+
+
+def _read(cache, reader, start, stop, options=None):
+    return cache.read(
+        path="file://x",
+        resolution=(1, 1, 1),
+        start=start,
+        stop=stop,
+        grid_offset=(0, 0, 0),
+        chunk_size=(4, 4, 2),
+        read_fn=reader,
+        options=options,
+    )
+
+
+def test_disabled_passthrough():
+    cache = ChunkCache(max_bytes=0)
+    reader = CountingReader()
+    result = _read(cache, reader, (1, 1, 1), (3, 3, 2))
+    np.testing.assert_array_equal(result, SOURCE[:, 1:3, 1:3, 1:2])
+    assert reader.calls == [((1, 1, 1), (3, 3, 2))]
+    assert cache.get_stats().misses == 0
+
+
+def test_read_through_hits():
+    cache = ChunkCache(max_bytes=2 ** 20)
+    reader = CountingReader()
+    result = _read(cache, reader, (1, 1, 1), (7, 3, 3))
+    np.testing.assert_array_equal(result, SOURCE[:, 1:7, 1:3, 1:3])
+    assert reader.calls == [((0, 0, 0), (8, 4, 4))]
+
+    result = _read(cache, reader, (2, 0, 0), (8, 4, 2))
+    np.testing.assert_array_equal(result, SOURCE[:, 2:8, 0:4, 0:2])
+    assert len(reader.calls) == 1
+    stats = cache.get_stats()
+    assert stats.misses == 4
+    assert stats.hits == 2
+    assert stats.num_bytes == 4 * SOURCE[:, :4, :4, :2].nbytes
+
+
+def test_read_empty_region():
+    cache = ChunkCache(max_bytes=2 ** 20)
+    reader = CountingReader()
+    result = _read(cache, reader, (1, 1, 1), (1, 3, 2))
+    assert result.shape == (2, 0, 2, 1)
+    assert result.dtype == SOURCE.dtype
+    assert cache.get_stats().misses == 0
+
+
+def test_read_fetches_only_missing():
+    cache = ChunkCache(max_bytes=2 ** 20)
+    reader = CountingReader()
+    _read(cache, reader, (0, 0, 0), (4, 4, 2))
+    result = _read(cache, reader, (2, 2, 0), (6, 6, 2))
+    np.testing.assert_array_equal(result, SOURCE[:, 2:6, 2:6, 0:2])
+    # The missing chunks form an L shape around the cached one, which is not read again
+    assert sorted(reader.calls[1:]) == [((0, 4, 0), (8, 8, 2)), ((4, 0, 0), (8, 4, 2))]
+
+
+def test_read_fetches_missing_boxes():
+    cache = ChunkCache(max_bytes=2 ** 20)
+    reader = CountingReader()
+    _read(cache, reader, (4, 4, 2), (8, 8, 4))
+    result = _read(cache, reader, (0, 0, 0), (8, 8, 4))
+    np.testing.assert_array_equal(result, SOURCE)
+    calls = reader.calls[1:]
+    # 7 missing chunks, each read exactly once in 3 boxes
+    assert len(calls) == 3
+    assert sum(np.prod([b - a for a, b in zip(*e)]) for e in calls) == 7 * 4 * 4 * 2
+
+
+def test_eviction():
+    chunk_bytes = SOURCE[:, :4, :4, :2].nbytes
+    cache = ChunkCache(max_bytes=2 * chunk_bytes)
+    reader = CountingReader()
+    _read(cache, reader, (0, 0, 0), (8, 8, 2))
+    stats = cache.get_stats()
+    assert stats.evictions == 2
+    assert stats.num_bytes == 2 * chunk_bytes
+
+
+def test_invalidate():
+    cache = ChunkCache(max_bytes=2 ** 20)
+    reader = CountingReader()
+    _read(cache, reader, (0, 0, 0), (8, 8, 2))
+    cache.invalidate(
+        "file://x",
+        resolution=(1, 1, 1),
+        start=(0, 0, 0),
+        stop=(4, 4, 2),
+        grid_offset=(0, 0, 0),
+        chunk_size=(4, 4, 2),
+    )
+    assert cache.get_stats().num_bytes == 3 * SOURCE[:, :4, :4, :2].nbytes
+    cache.invalidate("file://x")
+    assert cache.get_stats().num_bytes == 0
+
+
+def test_options_cached_separately():
+    cache = ChunkCache(max_bytes=2 ** 20)
+    reader = CountingReader()
+    _read(cache, reader, (0, 0, 0), (4, 4, 2), options="a")
+    _read(cache, reader, (0, 0, 0), (4, 4, 2), options="b")
+    _read(cache, reader, (0, 0, 0), (4, 4, 2), options="a")
+    assert len(reader.calls) == 2
+    cache.invalidate(
+        "file://x",
+        resolution=(1, 1, 1),
+        start=(0, 0, 0),
+        stop=(4, 4, 2),
+        grid_offset=(0, 0, 0),
+        chunk_size=(4, 4, 2),
+    )
+    assert cache.get_stats().num_bytes == 0
+
+
+def test_negative_budget_exc():
+    with pytest.raises(ValueError):
+        ChunkCache(max_bytes=-1)
+
+
+def test_configure_chunk_cache():
+    assert not get_chunk_cache().enabled
+    with configure_chunk_cache(1024) as cache:
+        assert get_chunk_cache() is cache
+        assert cache.enabled
+    assert not get_chunk_cache().enabled
+
+
+@pytest.mark.parametrize("build_fn", [build_cv_layer, build_ts_layer])
+def test_layer_write_read_consistency(build_fn, tmp_path):
+    path = f"file://{tmp_path}/layer"
+    layer = build_fn(
+        path,
+        info_type="image",
+        info_data_type="float32",
+        info_num_channels=1,
+        info_chunk_size=[4, 4, 1],
+        info_bbox=BBox3D.from_coords([0, 0, 0], [8, 8, 2], [1, 1, 1]),
+        info_scales=[[1, 1, 1]],
+        info_encoding="raw",
+    )
+    idx = VolumetricIndex.from_coords([0, 0, 0], [8, 8, 2], Vec3D(1, 1, 1))
+    subidx = VolumetricIndex.from_coords([2, 2, 0], [6, 6, 1], Vec3D(1, 1, 1))
+    with configure_chunk_cache(2 ** 20) as cache:
+        layer[idx] = np.ones((1, 8, 8, 2), dtype=np.float32)
+        np.testing.assert_array_equal(layer[subidx], np.ones((1, 4, 4, 1)))
+        np.testing.assert_array_equal(layer[subidx], np.ones((1, 4, 4, 1)))
+        assert cache.get_stats().hits == 4
+
+        layer[idx] = np.full((1, 8, 8, 2), 2, dtype=np.float32)
+        np.testing.assert_array_equal(layer[subidx], np.full((1, 4, 4, 1), 2))
+
+
+def test_fetch_racing_invalidate_not_cached():
+    cache = ChunkCache(max_bytes=2 ** 20)
+
+    def invalidating_reader(start, stop):
+        cache.invalidate("file://x")
+        return CountingReader()(start, stop)
+
+    _read(cache, invalidating_reader, (0, 0, 0), (4, 4, 2))
+    assert cache.get_stats().num_bytes == 0
+
+
+def _build_float_layer(build_fn, tmp_path):
+    layer = build_fn(
+        f"file://{tmp_path}/layer",
+        info_type="image",
+        info_data_type="float32",
+        info_num_channels=1,
+        info_chunk_size=[4, 4, 1],
+        info_bbox=BBox3D.from_coords([0, 0, 0], [8, 8, 2], [1, 1, 1]),
+        info_scales=[[1, 1, 1]],
+        info_encoding="raw",
+    )
+    idx = VolumetricIndex.from_coords([0, 0, 0], [8, 8, 2], Vec3D(1, 1, 1))
+    layer[idx] = SOURCE[:1, :, :, :2]
+    return layer
+
+
+@pytest.mark.parametrize("build_fn", [build_cv_layer, build_ts_layer])
+@pytest.mark.parametrize("cache_bytes", [0, 2 ** 20])
+def test_read_async(build_fn, cache_bytes, tmp_path):
+    layer = _build_float_layer(build_fn, tmp_path)
+    idx = VolumetricIndex.from_coords([-2, 2, 0], [6, 10, 2], Vec3D(1, 1, 1))
+    with configure_chunk_cache(cache_bytes):
+        result = layer.backend.read_async(idx).result()
+    np.testing.assert_array_equal(result, layer.backend.read(idx))
+
+
+@pytest.mark.parametrize("build_fn", [build_cv_layer, build_ts_layer])
+def test_prefetch_warms_cache(build_fn, tmp_path):
+    layer = _build_float_layer(build_fn, tmp_path)
+    idx = VolumetricIndex.from_coords([0, 0, 0], [4, 8, 1], Vec3D(1, 1, 1))
+    with configure_chunk_cache(2 ** 20) as cache:
+        layer.backend.read_async(idx).result()
+        layer.prefetch(idx)
+        np.testing.assert_array_equal(layer[idx], SOURCE[:1, :4, :, :1])
+        assert cache.get_stats().hits >= 2
+
+
+def test_prefetch_without_cache_warns(tmp_path, mocker):
+    layer = _build_float_layer(build_cv_layer, tmp_path)
+    read_spy = mocker.spy(layer.backend, "read")
+    warning_spy = mocker.patch("zetta_utils.layer.volumetric.backend.logger.warning")
+    mocker.patch("zetta_utils.layer.volumetric.backend._warned_prefetch_without_cache", False)
+    idx = VolumetricIndex.from_coords([0, 0, 0], [4, 8, 1], Vec3D(1, 1, 1))
+    layer.prefetch(idx)
+    layer.prefetch(idx)
+    read_spy.assert_not_called()
+    warning_spy.assert_called_once()
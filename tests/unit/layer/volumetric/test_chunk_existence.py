@@ -0,0 +1,97 @@
+# pylint: disable=missing-docstring,redefined-outer-name
+import os
+
+import numpy as np
+import pytest
+
+from zetta_utils.geometry import BBox3D, Vec3D
+from zetta_utils.layer.volumetric import ChunkExistence, VolumetricIndex
+from zetta_utils.layer.volumetric.cloudvol import build_cv_layer
+from zetta_utils.layer.volumetric.tensorstore import build_ts_layer
+
+BBOX = BBox3D.from_coords([-16, 0, 0], [32, 16, 2], [1, 1, 1])
+SHARDING = {
+    "@type": "neuroglancer_uint64_sharded_v1",
+    "hash": "identity",
+    "minishard_bits": 0,
+    "minishard_index_encoding": "raw",
+    "preshift_bits": 0,
+    "shard_bits": 0,
+    "data_encoding": "raw",
+}
+
+
+def make_idx(start, end) -> VolumetricIndex:
+    return VolumetricIndex(
+        resolution=Vec3D(1, 1, 1), bbox=BBox3D.from_coords(start, end, Vec3D(1, 1, 1))
+    )
+
+
+@pytest.fixture(params=[build_cv_layer, build_ts_layer])
+def make_layer(request, tmp_path):
+    def _make_layer(extra_scale_data=None):
+        return request.param(
+            path=f"file://{tmp_path}/layer",
+            info_type="image",
+            info_data_type="uint8",
+            info_num_channels=1,
+            info_scales=[[1, 1, 1]],
+            info_chunk_size=[8, 8, 1],
+            info_encoding="raw",
+            info_bbox=BBOX,
+            info_extra_scale_data=extra_scale_data,
+        )
+
+    return _make_layer
+
+
+def test_get_chunk_existence(make_layer):
+    layer = make_layer()
+    layer[make_idx([-16, 0, 0], [-8, 8, 1])] = np.ones((1, 8, 8, 1), dtype=np.uint8)
+    layer[make_idx([16, 8, 1], [24, 16, 2])] = np.ones((1, 8, 8, 1), dtype=np.uint8)
+
+    existence = layer.backend.get_chunk_existence(make_idx([-12, 0, 0], [32, 16, 2]))
+    assert existence is not None
+    assert existence.start == Vec3D(-16, 0, 0)
+    assert existence.exists.shape == (6, 2, 2)
+    assert existence.exists.sum() == 2
+    assert existence.any_in(make_idx([-10, 2, 0], [-9, 3, 1]))
+    assert existence.any_in(make_idx([0, 0, 0], [24, 16, 2]))
+    assert not existence.any_in(make_idx([-8, 0, 0], [16, 16, 2]))
+    # Nothing is known outside of the listed region
+    assert existence.any_in(make_idx([32, 0, 0], [40, 8, 1]))
+
+
+def test_get_chunk_existence_missing_scale(make_layer):
+    layer = make_layer()
+    idx = VolumetricIndex(
+        resolution=Vec3D(2, 2, 1), bbox=BBox3D.from_coords([0, 0, 0], [16, 16, 1], [1, 1, 1])
+    )
+    assert layer.backend.get_chunk_existence(idx) is None
+
+
+def test_get_chunk_existence_sharded(make_layer, tmp_path):
+    layer = make_layer({"sharding": SHARDING})
+    idx = make_idx([-16, 0, 0], [32, 16, 2])
+    existence = layer.backend.get_chunk_existence(idx)
+    assert existence is not None
+    assert not existence.exists.any()
+
+    # With no shard bits, every chunk is in the same shard
+    os.makedirs(os.path.join(tmp_path, "layer", "1_1_1"), exist_ok=True)
+    with open(os.path.join(tmp_path, "layer", "1_1_1", "0.shard"), "wb"):
+        pass
+    existence = layer.backend.get_chunk_existence(idx)
+    assert existence is not None
+    assert existence.exists.all()
+
+
+def test_chunk_existence_any_in_resolution():
+    existence = ChunkExistence(
+        resolution=Vec3D(2, 2, 1),
+        start=Vec3D[int](0, 0, 0),
+        chunk_size=Vec3D[int](4, 4, 1),
+        exists=np.array([[[True]], [[False]]]),
+    )
+    assert existence.any_in(make_idx([0, 0, 0], [9, 8, 1]))
+    assert not existence.any_in(make_idx([8, 0, 0], [16, 8, 1]))
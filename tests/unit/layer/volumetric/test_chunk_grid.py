@@ -0,0 +1,100 @@
+# pylint: disable=missing-docstring,redefined-outer-name,unused-argument
+import numpy as np
+import pytest
+
+from zetta_utils.geometry import BBox3D, BBoxStrider, IntVec3D, Vec3D
+from zetta_utils.layer.volumetric import (
+    ChunkGrid,
+    VolumetricIndex,
+    VolumetricIndexChunker,
+)
+
+IDX = VolumetricIndex.from_coords([-3, 2, 0], [13, 20, 5], Vec3D(4, 4, 40), chunk_id=7)
+
+
+@pytest.mark.parametrize("mode", ["shrink", "expand", "exact"])
+@pytest.mark.parametrize("max_superchunk_size", [None, IntVec3D(8, 8, 4)])
+def test_chunk_grid_matches_chunker(mode, max_superchunk_size):
+    chunker = VolumetricIndexChunker(
+        chunk_size=IntVec3D(4, 4, 2), max_superchunk_size=max_superchunk_size
+    )
+    expected = chunker(IDX, mode=mode, chunk_id_increment=3)
+    grid = chunker.get_chunk_grid(IDX, mode=mode, chunk_id_increment=3)
+    assert len(grid) == len(expected)
+    assert list(grid) == expected
+    assert grid[-1] == expected[-1]
+    np.testing.assert_array_equal(grid.starts, [list(e.start) for e in expected])
+    np.testing.assert_array_equal(grid.stops, [list(e.stop) for e in expected])
+
+
+@pytest.mark.parametrize(
+    "other",
+    [
+        VolumetricIndex.from_coords([0, 4, 1], [6, 11, 3], Vec3D(4, 4, 40)),
+        VolumetricIndex.from_coords([-10, -10, -10], [0, 0, 0], Vec3D(4, 4, 40)),
+        IDX,
+    ],
+)
+def test_chunk_grid_intersects_contained_in(other):
+    chunker = VolumetricIndexChunker(chunk_size=IntVec3D(3, 4, 2), stride=IntVec3D(2, 3, 2))
+    chunks = chunker(IDX)
+    grid = chunker.get_chunk_grid(IDX)
+    assert grid.intersects(other).tolist() == [e.intersects(other) for e in chunks]
+    assert grid.contained_in(other).tolist() == [e.contained_in(other) for e in chunks]
+
+
+def test_chunk_grid_padded_cropped():
+    chunker = VolumetricIndexChunker(chunk_size=IntVec3D(4, 4, 2))
+    grid = chunker.get_chunk_grid(IDX, mode="exact")
+    assert list(grid.padded([1, 2, 0])) == [e.padded([1, 2, 0]) for e in grid]
+    assert list(grid.cropped([1, 1, 0])) == [e.cropped([1, 1, 0]) for e in grid]
+
+
+def test_chunk_grid_overlap_ranges():
+    red_grid = VolumetricIndexChunker(chunk_size=IntVec3D(8, 8, 2)).get_chunk_grid(
+        IDX, mode="exact"
+    )
+    task_grid = (
+        VolumetricIndexChunker(chunk_size=IntVec3D(4, 4, 1))
+        .get_chunk_grid(IDX, mode="exact")
+        .padded([1, 1, 0])
+    )
+    ranges = red_grid.get_overlap_ranges(task_grid)
+    for red_ind, red_chunk in enumerate(red_grid):
+        red_steps = np.unravel_index(red_ind, red_grid.shape, order="F")
+        block = task_grid.get_block_indices(
+            [(int(lo[e]), int(hi[e])) for (lo, hi), e in zip(ranges, red_steps)]
+        )
+        expected = [i for i, e in enumerate(task_grid) if e.intersects(red_chunk)]
+        assert block.tolist() == expected
+
+
+def test_chunk_grid_from_index():
+    grid = ChunkGrid.from_index(IDX)
+    assert list(grid) == [IDX]
+    assert grid.shape == Vec3D(1, 1, 1)
+
+
+def test_chunk_grid_exc():
+    strider = BBoxStrider(
+        bbox=BBox3D.from_coords([0, 0, 0], [8, 8, 8], [1, 1, 1]),
+        resolution=Vec3D(1, 1, 1),
+        chunk_size=IntVec3D(3, 3, 3),
+        stride=IntVec3D(3, 3, 3),
+    )
+    with pytest.raises(ValueError):
+        ChunkGrid.from_bbox_strider(strider, resolution=[2, 2, 2])
+    grid = ChunkGrid.from_bbox_strider(strider, resolution=[1, 1, 1])
+    with pytest.raises(IndexError):
+        _ = grid[len(grid)]
+    other = ChunkGrid.from_bbox_strider(
+        BBoxStrider(
+            bbox=BBox3D.from_coords([0, 0, 0], [8, 8, 8], [2, 2, 2]),
+            resolution=Vec3D(2, 2, 2),
+            chunk_size=IntVec3D(4, 4, 4),
+            stride=IntVec3D(4, 4, 4),
+        ),
+        resolution=[2, 2, 2],
+    )
+    with pytest.raises(ValueError):
+        grid.get_overlap_ranges(other)
@@ -0,0 +1,162 @@
+# pylint: disable=missing-docstring,redefined-outer-name,unused-argument
+import os
+
+import numpy as np
+import pytest
+
+from zetta_utils.geometry import Vec3D
+from zetta_utils.layer.volumetric import (
+    MemoryBufferPool,
+    MemoryVolumetricBackend,
+    VolumetricIndex,
+    configure_memory_buffer_pool,
+    get_memory_buffer_pool,
+)
+
+RESOLUTION = Vec3D(1, 1, 1)
+
+
+def _write(pool, name, start, data):
+    pool.write(
+        name=name,
+        resolution=RESOLUTION,
+        start=start,
+        data=data,
+        grid_offset=(0, 0, 0),
+        chunk_size=(4, 4, 2),
+        dtype=np.dtype("float32"),
+    )
+
+
+def _read(pool, name, start, stop):
+    return pool.read(
+        name=name,
+        resolution=RESOLUTION,
+        start=start,
+        stop=stop,
+        grid_offset=(0, 0, 0),
+        chunk_size=(4, 4, 2),
+        num_channels=2,
+        dtype=np.dtype("float32"),
+    )
+
+
+def test_read_write():
+    pool = MemoryBufferPool(max_bytes=2 ** 20)
+    data = np.random.rand(2, 6, 5, 3).astype(np.float32)
+    _write(pool, "a", (1, 2, 1), data)
+    np.testing.assert_array_equal(_read(pool, "a", (1, 2, 1), (7, 7, 4)), data)
+    # Regions that were never written read as zeros
+    result = _read(pool, "a", (0, 0, 0), (8, 8, 4))
+    assert result.flags.f_contiguous
+    np.testing.assert_array_equal(result[:, 1:7, 2:7, 1:4], data)
+    assert result.sum() == pytest.approx(data.sum())
+    np.testing.assert_array_equal(_read(pool, "b", (1, 2, 1), (7, 7, 4)), 0)
+
+
+def test_partial_overwrite():
+    pool = MemoryBufferPool(max_bytes=2 ** 20)
+    _write(pool, "a", (0, 0, 0), np.ones((2, 8, 8, 2), dtype=np.float32))
+    _write(pool, "a", (2, 2, 0), np.full((2, 4, 4, 1), 2, dtype=np.float32))
+    result = _read(pool, "a", (0, 0, 0), (8, 8, 2))
+    assert result[0, 3, 3, 0] == 2
+    assert result[0, 3, 3, 1] == 1
+    assert result.sum() == 2 * (64 * 2 + 16)
+
+
+def test_spill(tmp_path):
+    chunk_bytes = 2 * 4 * 4 * 2 * 4
+    pool = MemoryBufferPool(max_bytes=2 * chunk_bytes, spill_dir=str(tmp_path))
+    data = np.random.rand(2, 8, 8, 2).astype(np.float32)
+    _write(pool, "a", (0, 0, 0), data)
+    stats = pool.get_stats()
+    assert stats.num_bytes == 2 * chunk_bytes
+    assert stats.num_spilled_bytes == 2 * chunk_bytes
+    assert len(os.listdir(tmp_path)) == 2
+
+    np.testing.assert_array_equal(_read(pool, "a", (0, 0, 0), (8, 8, 2)), data)
+    # The spilled chunks are loaded at once, and the ones they evict are only spilled
+    # after the read
+    stats = pool.get_stats()
+    assert stats.loads == 2
+    assert stats.spills == 4
+    assert stats.num_spilled_bytes == 2 * chunk_bytes
+
+    pool.delete("a")
+    stats = pool.get_stats()
+    assert stats.num_bytes == 0
+    assert stats.num_spilled_bytes == 0
+    assert len(os.listdir(tmp_path)) == 0
+    np.testing.assert_array_equal(_read(pool, "a", (0, 0, 0), (8, 8, 2)), 0)
+
+
+def test_delete_with_prefix(tmp_path):
+    chunk_bytes = 2 * 4 * 4 * 2 * 4
+    pool = MemoryBufferPool(max_bytes=2 * chunk_bytes, spill_dir=str(tmp_path))
+    for name in ["dir/a_1", "dir/a_2", "dir/b"]:
+        _write(pool, name, (0, 0, 0), np.ones((2, 8, 4, 2), dtype=np.float32))
+    pool.delete_with_prefix("dir/a_")
+    stats = pool.get_stats()
+    assert stats.num_bytes + stats.num_spilled_bytes == 2 * chunk_bytes
+    np.testing.assert_array_equal(_read(pool, "dir/a_1", (0, 0, 0), (8, 4, 2)), 0)
+    np.testing.assert_array_equal(_read(pool, "dir/b", (0, 0, 0), (8, 4, 2)), 1)
+
+
+def test_close_removes_spill_dir():
+    pool = MemoryBufferPool(max_bytes=0)
+    _write(pool, "a", (0, 0, 0), np.ones((2, 8, 4, 2), dtype=np.float32))
+    spill_dir = pool._spill_dir  # pylint: disable=protected-access
+    assert spill_dir is not None and os.path.isdir(spill_dir)
+    pool.close()
+    assert not os.path.exists(spill_dir)
+
+
+def test_max_bytes_exc():
+    with pytest.raises(ValueError):
+        MemoryBufferPool(max_bytes=-1)
+
+
+def test_configure():
+    prev_pool = get_memory_buffer_pool()
+    with configure_memory_buffer_pool(1024) as pool:
+        assert get_memory_buffer_pool() is pool
+        assert pool.max_bytes == 1024
+    assert get_memory_buffer_pool() is prev_pool
+
+
+def test_backend():
+    backend = MemoryVolumetricBackend(name="layer", dtype="uint8", num_channels=1).with_changes(
+        voxel_offset_res=(Vec3D(-4, -4, 0), RESOLUTION),
+        chunk_size_res=(Vec3D(4, 4, 1), RESOLUTION),
+        dataset_size_res=(Vec3D(16, 16, 2), RESOLUTION),
+    )
+    assert backend.get_bounds(RESOLUTION) == VolumetricIndex.from_coords(
+        (-4, -4, 0), (12, 12, 2), RESOLUTION
+    )
+    idx = VolumetricIndex.from_coords((-2, 0, 0), (5, 3, 2), RESOLUTION)
+    data = np.random.randint(0, 255, (1, 7, 3, 2), dtype=np.uint8)
+    with configure_memory_buffer_pool(2 ** 20):
+        backend.write(idx, data)
+        np.testing.assert_array_equal(backend.read(idx), data)
+        assert backend.read(idx).dtype == np.uint8
+        backend.delete()
+        np.testing.assert_array_equal(backend.read(idx), 0)
+
+
+def test_backend_chunk_aligned_writes():
+    backend = MemoryVolumetricBackend(name="layer", dtype="float32").with_changes(
+        chunk_size_res=(Vec3D(4, 4, 1), RESOLUTION),
+        dataset_size_res=(Vec3D(16, 16, 2), RESOLUTION),
+        enforce_chunk_aligned_writes=True,
+    )
+    with configure_memory_buffer_pool(2 ** 20):
+        with pytest.raises(ValueError):
+            backend.write(
+                VolumetricIndex.from_coords((0, 0, 0), (3, 4, 1), RESOLUTION),
+                np.zeros((1, 3, 4, 1), dtype=np.float32),
+            )
+
+
+def test_backend_with_changes_exc():
+    with pytest.raises(KeyError):
+        MemoryVolumetricBackend(name="layer", dtype="float32").with_changes(path="x")
@@ -3,7 +3,7 @@ from __future__ import annotations
 
 import pytest
 
-from zetta_utils.mazepa import Dependency, Flow, dryrun
+from zetta_utils.mazepa import Dependency, Flow, dryrun, flow_schema_cls
 
 from .maker_utils import make_test_flow, make_test_task
 
@@ -68,3 +68,50 @@ def test_dryrun_execution_counts(
 ):
     result = dryrun.get_expected_operation_counts(flows)
     assert result == expected
+
+
+@flow_schema_cls
+class EstimatedFlowSchema:
+    def flow(self, num_tasks):  # pylint: disable=no-self-use,unused-argument
+        raise AssertionError("Flows with estimates must not be run")
+        yield  # pylint: disable=unreachable
+
+    def estimate_task_counts(self, num_tasks):  # pylint: disable=no-self-use
+        return {"OperationE": num_tasks}
+
+
+def test_dryrun_uses_estimates():
+    estimated = EstimatedFlowSchema()(num_tasks=5)
+    flow = make_test_flow(
+        fn=dummy_iter,
+        id_="flow_0",
+        iterable=[
+            estimated,
+            estimated,
+            make_test_task(fn=lambda: None, id_="a", operation_name="OperationE"),
+        ],
+    )
+    assert dryrun.get_expected_operation_counts([flow]) == {"OperationE": 6}
+    # flows are left untouched by the dryrun
+    assert flow.get_next_batch() == [estimated]
+
+
+@flow_schema_cls
+class SelfModifyingFlowSchema:
+    def __init__(self):
+        self.num_runs = 0
+
+    def flow(self, ids):
+        self.num_runs += 1
+        ids.append("b")
+        for id_ in ids:
+            yield make_test_task(fn=lambda: None, id_=id_, operation_name="OperationM")
+
+
+def test_dryrun_leaves_flow_arguments_untouched():
+    schema = SelfModifyingFlowSchema()
+    ids = ["a"]
+    flow = schema(ids=ids)
+    assert dryrun.get_expected_operation_counts([flow]) == {"OperationM": 2}
+    assert schema.num_runs == 0
+    assert ids == ["a"]
@@ -2,6 +2,8 @@
 from __future__ import annotations
 
 import functools
+import threading
+import time
 from contextlib import AbstractContextManager
 from typing import Any, Iterable
 from unittest.mock import MagicMock
@@ -19,7 +21,7 @@ from zetta_utils.mazepa import (
 )
 from zetta_utils.mazepa.autoexecute_task_queue import AutoexecuteTaskQueue
 from zetta_utils.mazepa.exceptions import MazepaExecutionFailure, MazepaTimeoutError
-from zetta_utils.mazepa.execution import Executor
+from zetta_utils.mazepa.execution import Executor, OutcomeDrainer
 from zetta_utils.mazepa.task_outcome import OutcomeReport
 from zetta_utils.mazepa.tasks import Task
 from zetta_utils.mazepa.transient_errors import (
@@ -174,6 +176,20 @@ def test_local_execution_state(reset_task_count):
     assert TASK_COUNT == 6
 
 
+def test_local_execution_no_checkpoint_ids(reset_task_count):
+    state = InMemoryExecutionState([dummy_flow("f1"), dummy_flow("f2")])
+    execute(
+        state,
+        execution_id="yo",
+        batch_gap_sleep_sec=0,
+        do_dryrun_estimation=False,
+        checkpoint_interval_sec=None,
+    )
+    assert TASK_COUNT == 4
+    assert len(state.get_completed_ids()) > 0
+    assert not state.pop_new_completed_ids()
+
+
 def test_local_execution_state_queue(reset_task_count):
     q = AutoexecuteTaskQueue(debug=True)
     execute(
@@ -204,9 +220,11 @@ def test_local_no_sleep(mocker):
     sleep_m.assert_not_called()
 
 
-def test_non_local_sleep(mocker):
+def test_non_local_no_sleep(mocker):
     sleep_m = mocker.patch("time.sleep")
     queue_m = mocker.MagicMock(spec=MessageQueue)
+    queue_m.pull.return_value = []
+    start = time.time()
     execute(
         empty_flow(),
         batch_gap_sleep_sec=10,
@@ -215,7 +233,8 @@ def test_non_local_sleep(mocker):
         task_queue=queue_m,
         outcome_queue=queue_m,
     )
-    sleep_m.assert_called_once()
+    sleep_m.assert_not_called()
+    assert time.time() - start < 10
 
 
 def test_local_execution_backup_write(reset_task_count, mocker):
@@ -242,7 +261,7 @@ def test_local_execution_backup_write(reset_task_count, mocker):
 def test_local_execution_backup_read(reset_task_count, mocker):
     task1 = dummy_task.make_task(argument="f1-x1")
     mocker.patch(
-        "zetta_utils.mazepa.execution_state.read_execution_checkpoint",
+        "zetta_utils.mazepa.execution_state.iter_execution_checkpoint_ids",
         return_value=set([task1.id_]),
     )
 
@@ -276,6 +295,22 @@ def test_autoexecute_task_error(mocker):
         )
 
 
+@pytest.mark.parametrize("read_ahead", [True, False])
+def test_autoexecute_read_ahead(mocker, read_ahead):
+    manager = MagicMock()
+    tasks = [Task(manager.fn, kwargs={"i": i}) for i in range(3)]
+    q = AutoexecuteTaskQueue(read_ahead=read_ahead)
+    q.push(tasks)
+    q.pull()
+    runs = [mocker.call.fn(i=i) for i in range(3)]
+    if read_ahead:
+        # The inputs of each task are fetched before the previous one runs
+        prefetches = [mocker.call.fn.prefetch(i=i) for i in range(1, 3)]
+        assert manager.mock_calls == [prefetches[0], runs[0], prefetches[1], runs[1], runs[2]]
+    else:
+        assert manager.mock_calls == runs
+
+
 def test_autoexecute_task_transient_error(mocker):
     q = AutoexecuteTaskQueue(handle_exceptions=True)
     task_fn: MagicMock = mocker.MagicMock(side_effect=[ExplicitTransientError(), 10])
@@ -337,3 +372,44 @@ def test_parallel_acknowledgement(reset_task_count):
         do_dryrun_estimation=False,
     )
     assert TASK_COUNT == 2
+
+
+def test_outcome_drainer_pull_num(mocker):
+    queue_m = mocker.MagicMock(spec=MessageQueue)
+    pulls = [[mocker.MagicMock()] * 10, [mocker.MagicMock()] * 20, [mocker.MagicMock()] * 3]
+    queue_m.pull.side_effect = lambda max_num: pulls.pop(0) if pulls else []
+    with OutcomeDrainer(queue_m, max_idle_sleep_sec=0.01, min_pull_num=10) as drainer:
+        result = drainer.get(timeout_sec=1)
+        while len(result) < 33:
+            result += drainer.get(timeout_sec=1)
+    assert [e.kwargs["max_num"] for e in queue_m.pull.call_args_list[:3]] == [10, 20, 40]
+    assert drainer.pull_num <= 20
+
+
+def test_outcome_drainer_exc(mocker):
+    queue_m = mocker.MagicMock(spec=MessageQueue)
+    queue_m.pull.side_effect = RuntimeError
+    with pytest.raises(RuntimeError):
+        execute(
+            empty_flow(),
+            batch_gap_sleep_sec=0.01,
+            do_dryrun_estimation=False,
+            task_queue=queue_m,
+            outcome_queue=queue_m,
+        )
+
+
+@taskable_operation
+def barrier_task(barrier: threading.Barrier) -> Any:
+    barrier.wait()
+
+
+@pytest.mark.parametrize("num_threads, succeeds", [[1, False], [4, True]])
+def test_autoexecute_num_threads(num_threads, succeeds):
+    # The tasks only get past the barrier when all of them run at the same time
+    barrier = threading.Barrier(4, timeout=0.5)
+    q = AutoexecuteTaskQueue(handle_exceptions=True, num_threads=num_threads)
+    q.push([barrier_task.make_task(barrier) for _ in range(4)])
+    outcomes = q.pull(max_num=4)
+    assert len(outcomes) == 4
+    assert all((e.payload.outcome.exception is None) == succeeds for e in outcomes)
@@ -0,0 +1,72 @@
+# pylint: disable=missing-docstring,redefined-outer-name,unused-argument
+import json
+import os
+
+import fsspec
+import pytest
+
+from zetta_utils.mazepa.execution_checkpoint import (
+    CHECKPOINT_SEGMENT_SUFFIX,
+    iter_execution_checkpoint_ids,
+    read_execution_checkpoint,
+    record_execution_checkpoint,
+)
+
+TASK_IDS = [f"task-{i:032x}" for i in range(5)]
+FLOW_IDS = [f"flow-{i:032x}" for i in range(3)]
+OTHER_IDS = ["46ab2f9e-6de1-11ee-b962-0242ac120002", "my-literal-id"]
+
+
+@pytest.fixture
+def ckpt_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("EXECUTION_CHECKPOINT_PATH", str(tmp_path))
+    monkeypatch.setenv("ZETTA_USER", "test_user")
+    return tmp_path / "test_user" / "exec"
+
+
+def test_segment_roundtrip(ckpt_dir):
+    assert record_execution_checkpoint("exec", "seg", TASK_IDS + FLOW_IDS + OTHER_IDS)
+    segment = str(ckpt_dir / f"seg{CHECKPOINT_SEGMENT_SUFFIX}")
+    assert read_execution_checkpoint(segment) == set(TASK_IDS + FLOW_IDS + OTHER_IDS)
+    assert read_execution_checkpoint(str(ckpt_dir), ignore_prefix=["flow-"]) == set(
+        TASK_IDS + OTHER_IDS
+    )
+    assert read_execution_checkpoint(str(ckpt_dir), ignore_prefix=["task-00", "my"]) == set(
+        FLOW_IDS + OTHER_IDS[:1]
+    )
+
+
+def test_segments_compaction(ckpt_dir):
+    for i, e in enumerate(TASK_IDS[:4]):
+        record_execution_checkpoint("exec", f"seg_{i}", [e], compaction_threshold=3)
+    assert len(os.listdir(ckpt_dir)) == 2
+    assert sorted(iter_execution_checkpoint_ids(str(ckpt_dir))) == TASK_IDS[:4]
+
+
+def test_segments_compaction_merges_overlapping(ckpt_dir, mocker):
+    mocker.patch("zetta_utils.mazepa.execution_checkpoint.READ_CHUNK_DIGESTS", 2)
+    segments = [TASK_IDS[:3] + FLOW_IDS[:1], TASK_IDS[2:] + OTHER_IDS, FLOW_IDS + TASK_IDS[::2]]
+    for i, e in enumerate(segments):
+        record_execution_checkpoint("exec", f"seg_{i}", e, compaction_threshold=3)
+    (compacted,) = os.listdir(ckpt_dir)
+    assert f"_compacted_{len(TASK_IDS + FLOW_IDS + OTHER_IDS)}" in compacted
+    assert sorted(iter_execution_checkpoint_ids(str(ckpt_dir))) == sorted(
+        TASK_IDS + FLOW_IDS + OTHER_IDS
+    )
+
+
+def test_read_legacy_checkpoint(tmp_path):
+    path = str(tmp_path / "legacy.zstd")
+    with fsspec.open(path, "w", compression="zstd") as f:
+        json.dump(TASK_IDS + FLOW_IDS, f, indent=2)
+    assert read_execution_checkpoint(path, ignore_prefix="flow-") == set(TASK_IDS)
+
+
+def test_record_exc(ckpt_dir, mocker):
+    mocker.patch(
+        "zetta_utils.mazepa.execution_checkpoint.encode_checkpoint_segment",
+        side_effect=OSError,
+    )
+    assert not record_execution_checkpoint("exec", "seg", TASK_IDS)
+    with pytest.raises(OSError):
+        record_execution_checkpoint("exec", "seg", TASK_IDS, raise_on_error=True)
@@ -1,6 +1,8 @@
 from __future__ import annotations
 
+import gc
 import multiprocessing
+import weakref
 from functools import partial
 from typing import Any, Callable, Mapping
 
@@ -8,10 +10,13 @@ import attrs
 
 from zetta_utils import mazepa
 from zetta_utils.builder.building import BuilderPartial
+from zetta_utils.geometry import Vec3D
 from zetta_utils.geometry.bbox import BBox3D
+from zetta_utils.layer.volumetric import VolumetricIndex
 from zetta_utils.layer.volumetric.cloudvol.build import build_cv_layer
-from zetta_utils.mazepa import taskable_operation_cls
+from zetta_utils.mazepa import id_generation, taskable_operation_cls
 from zetta_utils.mazepa.id_generation import generate_invocation_id as gen_id
+from zetta_utils.mazepa.id_generation import get_structural_hash
 from zetta_utils.mazepa_layer_processing.common import build_subchunkable_apply_flow
 
 
@@ -264,3 +269,53 @@ def test_unpickleable_fn(mocker) -> None:
     unpickleable_fn = mocker.MagicMock()
     # gen_id will return a random UUID in case of pickle errors
     assert gen_id(unpickleable_fn, [], {}) != gen_id(unpickleable_fn, [], {})
+
+
+@taskable_operation_cls
+@attrs.frozen
+class TaskableMemoized:
+    a: int
+    calls: list = attrs.field(factory=list, eq=False)
+
+    __mazepa_hash_memoize__ = True
+
+    def __mazepa_hash__(self):
+        self.calls.append(1)
+        return self.a
+
+    def __call__(self, b):
+        return self.a * b
+
+
+def test_structural_hash_distinguishes_values() -> None:
+    values = [None, True, 1, 1.0, "1", b"1", (1,), [1], {1: 1}, ("1",), [(1,)], [1, 1]]
+    hashes = {get_structural_hash(e) for e in values}
+    assert len(hashes) == len(values)
+
+
+def test_structural_hash_geometry(mocker) -> None:
+    dill_hash = mocker.spy(id_generation, "get_dill_hash")
+    idx = VolumetricIndex.from_coords([0, 0, 0], [1, 2, 3], Vec3D(4, 4, 40))
+    idx_same = VolumetricIndex.from_coords([0, 0, 0], [1, 2, 3], Vec3D(4, 4, 40))
+    idx_other = VolumetricIndex.from_coords([0, 0, 0], [1, 2, 4], Vec3D(4, 4, 40))
+    assert get_structural_hash(idx) == get_structural_hash(idx_same)
+    assert get_structural_hash(idx) != get_structural_hash(idx_other)
+    assert get_structural_hash(idx) != get_structural_hash(idx.bbox)
+    assert dill_hash.call_count == 0
+
+
+def test_memoized_hash() -> None:
+    op = TaskableMemoized(1)
+    assert gen_id(op, [], {"b": 1}) == gen_id(op, [], {"b": 1})
+    assert gen_id(op, [], {"b": 1}) != gen_id(op, [], {"b": 2})
+    assert gen_id(op, [], {"b": 1}) != gen_id(TaskableMemoized(2), [], {"b": 1})
+    assert len(op.calls) == 1
+
+
+def test_memoized_hash_does_not_keep_objects_alive() -> None:
+    op = TaskableMemoized(1)
+    op_ref = weakref.ref(op)
+    gen_id(op, [], {"b": 1})
+    del op
+    gc.collect()
+    assert op_ref() is None
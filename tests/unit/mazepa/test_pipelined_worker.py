@@ -0,0 +1,244 @@
+# pylint: disable=missing-docstring,redefined-outer-name,unused-argument
+from __future__ import annotations
+
+import functools
+import time
+from typing import Any, Sequence
+
+import attrs
+import pytest
+
+from zetta_utils.mazepa import (
+    run_pipelined_worker,
+    taskable_operation,
+    taskable_operation_cls,
+)
+from zetta_utils.mazepa.exceptions import MazepaCancel, MazepaTimeoutError
+from zetta_utils.mazepa.task_outcome import OutcomeReport
+from zetta_utils.message_queues.base import MessageQueue, ReceivedMessage
+
+
+class ListQueue(MessageQueue):
+    def __init__(self, name: str):
+        self.name = name
+        self.items: list = []
+        self.acked: list = []
+
+    def push(self, payloads: Sequence[Any]) -> None:
+        self.items.extend(payloads)
+
+    def pull(self, max_num: int = 1) -> list[ReceivedMessage]:
+        result: list[ReceivedMessage] = []
+        while len(self.items) > 0 and len(result) < max_num:
+            payload = self.items.pop(0)
+            result.append(
+                ReceivedMessage(
+                    payload=payload, acknowledge_fn=functools.partial(self.acked.append, payload)
+                )
+            )
+        return result
+
+
+class LeaseListQueue(ListQueue):
+    def __init__(self, name: str):
+        super().__init__(name)
+        self.extended: list = []
+
+    def pull(self, max_num: int = 1) -> list[ReceivedMessage]:
+        return [
+            attrs.evolve(e, extend_lease_fn=functools.partial(self._extend, e.payload.id_))
+            for e in super().pull(max_num)
+        ]
+
+    def _extend(self, task_id: str, duration_sec: float) -> None:
+        self.extended.append((task_id, time.time()))
+
+
+WRITTEN: dict = {}
+READ_START: dict = {}
+BATCH_SIZES: list = []
+PREFETCHED: list = []
+
+
+@taskable_operation_cls
+@attrs.frozen
+class StagedSquare:
+    fail_on: int | None = None
+
+    def __call__(self, x: int) -> None:
+        self.write_outputs(self.compute_outputs(self.read_inputs(x)), x)
+
+    def read_inputs(self, x: int) -> int:
+        if x == self.fail_on:
+            raise RuntimeError("read failed")
+        return x
+
+    def compute_outputs(self, inputs: int) -> int:
+        return inputs ** 2
+
+    def compute_outputs_batch(self, inputs: list[int]) -> list[int]:
+        BATCH_SIZES.append(len(inputs))
+        return [self.compute_outputs(e) for e in inputs]
+
+    def write_outputs(self, outputs: int, x: int) -> None:
+        WRITTEN[x] = outputs
+
+
+@taskable_operation_cls
+@attrs.frozen
+class SlowStagedSquare(StagedSquare):
+    def compute_outputs(self, inputs: int) -> int:
+        time.sleep(2)
+        return inputs ** 2
+
+
+@taskable_operation_cls
+@attrs.frozen
+class SlowReadSquare(StagedSquare):
+    def read_inputs(self, x: int) -> int:
+        READ_START[x] = time.time()
+        time.sleep(0.5)
+        return x
+
+
+@taskable_operation_cls
+@attrs.frozen
+class PrefetchedSlowReadSquare(SlowReadSquare):
+    def prefetch(self, x: int) -> None:
+        PREFETCHED.append((x, time.time()))
+
+
+@taskable_operation
+def plain_square(x: int) -> int:
+    WRITTEN[x] = x ** 2
+    return x ** 2
+
+
+@pytest.fixture
+def reset_written():
+    WRITTEN.clear()
+    BATCH_SIZES.clear()
+    READ_START.clear()
+    PREFETCHED.clear()
+
+
+def _run(tasks, **kwargs) -> tuple[ListQueue, ListQueue]:
+    task_queue = ListQueue("tasks")
+    outcome_queue = ListQueue("outcomes")
+    task_queue.push(tasks)
+    run_pipelined_worker(
+        task_queue=task_queue,
+        outcome_queue=outcome_queue,
+        sleep_sec=0.01,
+        max_runtime=0.2,
+        **kwargs,
+    )
+    return task_queue, outcome_queue
+
+
+def _outcomes(outcome_queue: ListQueue) -> dict[str, OutcomeReport]:
+    return {e.task_id: e for e in outcome_queue.items}
+
+
+def test_pipelined_worker_staged(reset_written):
+    op = StagedSquare()
+    tasks = [op.make_task(x=i) for i in range(10)]
+    task_queue, outcome_queue = _run(tasks, max_pull_num=3, compute_batch_size=4)
+    assert WRITTEN == {i: i ** 2 for i in range(10)}
+    assert sum(BATCH_SIZES) <= 10
+    assert all(e <= 4 for e in BATCH_SIZES)
+    outcomes = _outcomes(outcome_queue)
+    assert set(outcomes) == {e.id_ for e in tasks}
+    assert all(e.outcome.exception is None for e in outcomes.values())
+    assert len(task_queue.acked) == 10
+
+
+def test_pipelined_worker_unstaged(reset_written):
+    tasks = [plain_square.make_task(x=i) for i in range(3)]
+    _, outcome_queue = _run(tasks)
+    assert WRITTEN == {i: i ** 2 for i in range(3)}
+    assert sorted(e.outcome.return_value for e in outcome_queue.items) == [0, 1, 4]
+
+
+def test_pipelined_worker_failure(reset_written):
+    op = StagedSquare(fail_on=1)
+    tasks = [op.make_task(x=i) for i in range(3)]
+    task_queue, outcome_queue = _run(tasks, compute_batch_size=2)
+    assert WRITTEN == {0: 0, 2: 4}
+    outcomes = _outcomes(outcome_queue)
+    assert isinstance(outcomes[tasks[1].id_].outcome.exception, RuntimeError)
+    assert outcomes[tasks[0].id_].outcome.exception is None
+    assert len(task_queue.acked) == 3
+
+
+def test_pipelined_worker_staged_runtime_limit(reset_written):
+    task = SlowStagedSquare().make_task(x=1)
+    task.runtime_limit_sec = 0.5
+    task_queue, outcome_queue = _run([task])
+    assert not WRITTEN
+    assert task.outcome is not None
+    assert isinstance(task.outcome.exception, MazepaTimeoutError)
+    # Timed out tasks are left in the queue to be retried
+    assert not outcome_queue.items
+    assert not task_queue.acked
+
+
+def test_pipelined_worker_upkeep_while_queued(reset_written):
+    tasks = [SlowReadSquare().make_task(x=i) for i in range(2)]
+    for task in tasks:
+        task.upkeep_settings.interval_sec = 0.05
+    task_queue = LeaseListQueue("tasks")
+    task_queue.push(tasks)
+    run_pipelined_worker(
+        task_queue=task_queue,
+        outcome_queue=ListQueue("outcomes"),
+        stage_concurrency={"read": 1, "write": 1, "cuda": 0, "cpu": 1},
+        sleep_sec=0.01,
+        max_pull_num=2,
+        max_runtime=0.2,
+    )
+    assert WRITTEN == {0: 0, 1: 1}
+    # The second task waits for the only reader, with its lease kept up
+    extended = [t for task_id, t in task_queue.extended if task_id == tasks[1].id_]
+    assert len(extended) > 0
+    assert min(extended) < READ_START[1]
+
+
+@pytest.mark.parametrize("read_ahead", [True, False])
+def test_pipelined_worker_read_ahead(reset_written, read_ahead):
+    tasks = [PrefetchedSlowReadSquare().make_task(x=i) for i in range(3)]
+    _run(
+        tasks,
+        stage_concurrency={"read": 2, "write": 1, "cuda": 0, "cpu": 1},
+        max_pull_num=3,
+        read_ahead=read_ahead,
+    )
+    assert WRITTEN == {0: 0, 1: 1, 2: 4}
+    if read_ahead:
+        # Only the third task waits for one of the two readers
+        assert [x for x, _ in PREFETCHED] == [2]
+        assert PREFETCHED[0][1] < READ_START[2]
+    else:
+        assert not PREFETCHED
+
+
+def test_pipelined_worker_filter(reset_written):
+    tasks = [plain_square.make_task(x=0)]
+    _, outcome_queue = _run(tasks, task_filter_fn=lambda task: False)
+    assert not WRITTEN
+    assert isinstance(outcome_queue.items[0].outcome.exception, MazepaCancel)
+
+
+@pytest.mark.parametrize(
+    "stage_concurrency",
+    [
+        {"read": 1, "write": 1, "cuda": 1},
+        {"read": 1, "write": 1, "cuda": 1, "cpu": 1, "gpu": 1},
+        {"read": 1, "write": 1, "cuda": -1, "cpu": 1},
+        {"read": 0, "write": 1, "cuda": 1, "cpu": 1},
+        {"read": 1, "write": 1, "cuda": 0, "cpu": 0},
+    ],
+)
+def test_pipelined_worker_concurrency_exc(stage_concurrency):
+    with pytest.raises(ValueError):
+        _run([], stage_concurrency=stage_concurrency)
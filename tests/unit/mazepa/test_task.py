@@ -75,3 +75,34 @@ def test_task_no_handle_exc() -> None:
     assert isinstance(task, Task)
     with pytest.raises(Exception):
         task(debug=False, handle_exceptions=False)
+
+
+def test_task_prefetch() -> None:
+    @taskable_operation_cls
+    @attrs.mutable
+    class DummyPrefetchCls:
+        prefetched: list = attrs.field(factory=list)
+
+        def __call__(self, x: int) -> int:
+            return x
+
+        def prefetch(self, x: int) -> None:
+            self.prefetched.append(x)
+
+    op = DummyPrefetchCls()
+    op.make_task(x=1).prefetch()
+    assert op.prefetched == [1]
+
+
+def test_task_prefetch_errors_ignored() -> None:
+    @taskable_operation_cls
+    @attrs.mutable
+    class DummyBadPrefetchCls:
+        def __call__(self) -> None:
+            pass
+
+        def prefetch(self) -> None:
+            raise RuntimeError()
+
+    DummyBadPrefetchCls().make_task().prefetch()
+    taskable_operation(lambda: None).make_task().prefetch()
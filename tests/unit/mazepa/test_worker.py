@@ -0,0 +1,188 @@
+# pylint: disable=missing-docstring
+import time
+from unittest.mock import MagicMock, call
+
+import attrs
+import pytest
+
+from zetta_utils.mazepa import (
+    TaskOutcome,
+    run_worker,
+    taskable_operation,
+    taskable_operation_cls,
+)
+from zetta_utils.mazepa.worker import AdaptivePuller, OutcomeBuffer
+from zetta_utils.message_queues.base import MessageQueue, ReceivedMessage
+
+
+@taskable_operation
+def dummy_task(i: int) -> int:
+    return i
+
+
+def make_queues() -> tuple[MagicMock, MagicMock, MagicMock]:
+    manager = MagicMock()
+    task_queue = MagicMock(spec=MessageQueue)
+    outcome_queue = MagicMock(spec=MessageQueue)
+    manager.attach_mock(task_queue.acknowledge, "acknowledge")
+    manager.attach_mock(outcome_queue.push, "push")
+    return task_queue, outcome_queue, manager
+
+
+def test_outcome_buffer_batches():
+    task_queue, outcome_queue, manager = make_queues()
+    msgs = [ReceivedMessage(payload=dummy_task.make_task(i)) for i in range(25)]
+    with OutcomeBuffer(task_queue, outcome_queue, max_len=10, max_wait_sec=100) as buffer:
+        for msg in msgs:
+            buffer.add(msg, TaskOutcome(return_value=msg.payload.id_))
+            buffer.flush_if_due()
+        assert outcome_queue.push.call_count == 2
+    # Outcomes are always pushed before their messages are acknowledged
+    assert [e[0] for e in manager.mock_calls] == ["push", "acknowledge"] * 3
+    assert task_queue.acknowledge.call_args_list == [
+        call(msgs[:10]),
+        call(msgs[10:20]),
+        call(msgs[20:]),
+    ]
+    pushed = [e for c in outcome_queue.push.call_args_list for e in c.args[0]]
+    assert [e.task_id for e in pushed] == [e.payload.id_ for e in msgs]
+
+
+def test_outcome_buffer_time_trigger():
+    task_queue, outcome_queue, _ = make_queues()
+    buffer = OutcomeBuffer(task_queue, outcome_queue, max_len=10, max_wait_sec=0)
+    buffer.flush_if_due()
+    outcome_queue.push.assert_not_called()
+    buffer.add(ReceivedMessage(payload=dummy_task.make_task(0)), TaskOutcome())
+    buffer.flush_if_due()
+    outcome_queue.push.assert_called_once()
+    task_queue.acknowledge.assert_called_once()
+
+
+def test_outcome_buffer_timer():
+    task_queue, outcome_queue, _ = make_queues()
+    with OutcomeBuffer(task_queue, outcome_queue, max_len=10, max_wait_sec=0.05) as buffer:
+        buffer.add(ReceivedMessage(payload=dummy_task.make_task(0)), TaskOutcome())
+        time.sleep(0.5)
+        outcome_queue.push.assert_called_once()
+        task_queue.acknowledge.assert_called_once()
+
+
+def test_outcome_buffer_timer_exc():
+    task_queue, outcome_queue, _ = make_queues()
+    outcome_queue.push.side_effect = RuntimeError
+    with OutcomeBuffer(task_queue, outcome_queue, max_len=10, max_wait_sec=0.05) as buffer:
+        buffer.add(ReceivedMessage(payload=dummy_task.make_task(0)), TaskOutcome())
+        time.sleep(0.5)
+        task_queue.acknowledge.assert_not_called()
+        with pytest.raises(RuntimeError):
+            buffer.flush()
+
+
+def test_run_worker_flushes_when_idle():
+    task_queue, outcome_queue, manager = make_queues()
+    msgs = [ReceivedMessage(payload=dummy_task.make_task(i)) for i in range(3)]
+    pulls = [msgs[:1], msgs[1:]]
+    task_queue.pull.side_effect = lambda max_num: pulls.pop(0) if pulls else []
+    puller = run_worker(
+        task_queue=task_queue,
+        outcome_queue=outcome_queue,
+        sleep_sec=0.01,
+        max_pull_num=3,
+        max_runtime=0.05,
+    )
+    assert puller.num_empty_pulls == puller.num_pulls - 2 > 0
+    # Short tasks make the worker pull more at a time
+    assert [e.kwargs["max_num"] for e in task_queue.pull.call_args_list[:2]] == [1, 3]
+    assert [e[0] for e in manager.mock_calls] == ["push", "acknowledge"]
+    assert [e.outcome.return_value for e in outcome_queue.push.call_args.args[0]] == [0, 1, 2]
+
+
+@taskable_operation_cls
+@attrs.mutable
+class RecordingSleep:
+    events: list = attrs.field(factory=list)
+
+    def __call__(self, i: int) -> None:
+        self.events.append(("start", i))
+        time.sleep(0.1)
+        self.events.append(("end", i))
+
+    def prefetch(self, i: int) -> None:
+        self.events.append(("prefetch", i))
+
+
+@pytest.mark.parametrize("read_ahead", [True, False])
+def test_run_worker_read_ahead(read_ahead):
+    task_queue, outcome_queue, _ = make_queues()
+    op = RecordingSleep()
+    msgs = [ReceivedMessage(payload=op.make_task(i=i)) for i in range(3)]
+    pulls = [msgs[:2], msgs[2:]]
+    task_queue.pull.side_effect = lambda max_num: pulls.pop(0) if pulls else []
+    run_worker(
+        task_queue=task_queue,
+        outcome_queue=outcome_queue,
+        sleep_sec=0.01,
+        max_pull_num=2,
+        max_runtime=0.4,
+        read_ahead=read_ahead,
+    )
+    runs = [("start", 0), ("end", 0), ("start", 1), ("end", 1), ("start", 2), ("end", 2)]
+    assert [e for e in op.events if e[0] != "prefetch"] == runs
+    if read_ahead:
+        # The first task of the next pull is fetched while the last one of a pull runs
+        assert op.events.index(("prefetch", 1)) < op.events.index(("end", 0))
+        assert op.events.index(("prefetch", 2)) < op.events.index(("end", 1))
+        assert len(op.events) == len(runs) + 2
+    else:
+        assert op.events == runs
+
+
+def test_run_worker_read_ahead_gives_back_unused():
+    task_queue, outcome_queue, _ = make_queues()
+    op = RecordingSleep()
+    msgs = [
+        ReceivedMessage(payload=op.make_task(i=i), extend_lease_fn=MagicMock()) for i in range(2)
+    ]
+    pulls = [msgs[:1], msgs[1:]]
+    task_queue.pull.side_effect = lambda max_num: pulls.pop(0) if pulls else []
+    run_worker(
+        task_queue=task_queue,
+        outcome_queue=outcome_queue,
+        max_runtime=0.05,
+        read_ahead=True,
+    )
+    # The worker stops after the first task, so the task pulled ahead is not run
+    assert sorted(op.events) == [("end", 0), ("prefetch", 1), ("start", 0)]
+    assert op.events[-1] == ("end", 0)
+    msgs[0].extend_lease_fn.assert_not_called()
+    msgs[1].extend_lease_fn.assert_called_once_with(0)
+
+
+def test_adaptive_puller_backoff():
+    puller = AdaptivePuller(max_sleep_sec=0.4, min_sleep_sec=0.1)
+    sleeps = [puller.record_pull(0, pull_sec=0) for _ in range(5)]
+    for sleep_sec, backoff_sec in zip(sleeps, [0.1, 0.2, 0.4, 0.4, 0.4]):
+        assert backoff_sec / 2 <= sleep_sec <= backoff_sec
+    # Long polls count towards the sleep
+    assert puller.record_pull(0, pull_sec=1.0) == 0
+    assert puller.record_pull(3, pull_sec=0) == 0
+    assert puller.backoff_sec == 0
+    assert puller.num_pulls == 7
+    assert puller.num_empty_pulls == 6
+    assert puller.idle_sec == pytest.approx(sum(sleeps) + 1.0)
+
+
+def test_adaptive_puller_pull_num():
+    puller = AdaptivePuller(max_pull_num=8, target_batch_sec=1.0)
+    assert puller.pull_num == 1
+    puller.record_task(0.25)
+    assert puller.pull_num == 4
+    puller.record_task(0.01)
+    assert puller.pull_num == 7
+    for _ in range(10):
+        puller.record_task(0.01)
+    assert puller.pull_num == 8
+    for _ in range(20):
+        puller.record_task(2.0)
+    assert puller.pull_num == 1
@@ -0,0 +1,104 @@
+# pylint: disable=missing-docstring,redefined-outer-name
+import numpy as np
+import pytest
+
+from zetta_utils import mazepa
+from zetta_utils.geometry import BBox3D, Vec3D
+from zetta_utils.layer.volumetric import VolumetricIndex
+from zetta_utils.layer.volumetric.cloudvol import build_cv_layer
+from zetta_utils.mazepa_layer_processing.common import build_interpolate_flow
+
+BBOX = BBox3D.from_coords([0, 0, 0], [64, 64, 2], [1, 1, 1])
+DST_RESOLUTIONS = [[2, 2, 1], [4, 4, 1], [16, 16, 1]]
+
+
+@pytest.fixture
+def make_layer(tmp_path):
+    def _make_layer(name, data_type, encoding):
+        return build_cv_layer(
+            path=f"file://{tmp_path}/{name}",
+            info_type="segmentation" if data_type == "uint64" else "image",
+            info_data_type=data_type,
+            info_num_channels=1,
+            info_scales=[[1, 1, 1], *DST_RESOLUTIONS],
+            info_chunk_size=[4, 4, 1],
+            info_encoding=encoding,
+            info_bbox=BBOX,
+        )
+
+    return _make_layer
+
+
+@pytest.mark.parametrize(
+    "mode, data_type, encoding",
+    [["img", "float32", "raw"], ["segmentation", "uint64", "raw"], ["mask", "float32", "raw"]],
+)
+def test_fused_matches_sequential(make_layer, mode, data_type, encoding):
+    src = make_layer("src", data_type, encoding)
+    rng = np.random.default_rng(0)
+    src[VolumetricIndex(resolution=Vec3D(1, 1, 1), bbox=BBOX)] = rng.integers(
+        0, 5, (1, 64, 64, 2)
+    ).astype(data_type)
+    dsts = {}
+    for fused in [False, True]:
+        dsts[fused] = make_layer(f"dst_{fused}", data_type, encoding)
+        flow = build_interpolate_flow(
+            src=src,
+            dst=dsts[fused],
+            src_resolution=[1, 1, 1],
+            dst_resolutions=DST_RESOLUTIONS,
+            mode=mode,
+            processing_chunk_sizes=[[4, 4, 1]],
+            skip_intermediaries=True,
+            bbox=BBOX,
+            fused=fused,
+        )
+        mazepa.execute(flow, show_progress=False, do_dryrun_estimation=False)
+
+    for res in DST_RESOLUTIONS:
+        idx = VolumetricIndex(resolution=Vec3D(*res), bbox=BBOX)
+        np.testing.assert_allclose(dsts[True][idx], dsts[False][idx], rtol=1e-6)
+
+
+def test_fused_task_count(make_layer):
+    flow = build_interpolate_flow(
+        src=make_layer("src", "float32", "raw"),
+        dst=make_layer("dst", "float32", "raw"),
+        src_resolution=[1, 1, 1],
+        dst_resolutions=DST_RESOLUTIONS,
+        mode="img",
+        processing_chunk_sizes=[[2, 2, 1]],
+        skip_intermediaries=True,
+        bbox=BBOX,
+        fused=True,
+    )
+    # One task for each chunk of the coarsest resolution
+    assert flow.estimate_task_counts() == {"InterpolatePyramid<img>": 8}
+
+
+def test_fused_exc(make_layer):
+    layer = make_layer("layer", "float32", "raw")
+    with pytest.raises(ValueError):
+        build_interpolate_flow(
+            src=layer,
+            dst=layer,
+            src_resolution=[2, 2, 1],
+            dst_resolutions=[[1, 1, 1], [4, 4, 1]],
+            mode="img",
+            processing_chunk_sizes=[[2, 2, 1]],
+            skip_intermediaries=True,
+            bbox=BBOX,
+            fused=True,
+        )
+    with pytest.raises(ValueError):
+        build_interpolate_flow(
+            src=layer,
+            dst=layer,
+            src_resolution=[1, 1, 1],
+            dst_resolutions=DST_RESOLUTIONS,
+            mode="img",
+            processing_chunk_sizes=[[2, 2, 1]],
+            level_intermediaries_dirs=["file://tmp"],
+            bbox=BBOX,
+            fused=True,
+        )
@@ -0,0 +1,291 @@
+# pylint: disable=missing-docstring,redefined-outer-name
+import os
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from zetta_utils import mazepa
+from zetta_utils.geometry import BBox3D, Vec3D
+from zetta_utils.layer.volumetric import VolumetricIndex, configure_memory_buffer_pool
+from zetta_utils.layer.volumetric.cloudvol import build_cv_layer
+from zetta_utils.mazepa_layer_processing.common import (
+    VolumetricCallableOperation,
+    build_subchunkable_apply_flow,
+)
+from zetta_utils.mazepa_layer_processing.common.volumetric_apply_flow import (
+    REDUCTION_READ_NUM_THREADS,
+    VolumetricApplyFlowSchema,
+    _read_intersections,
+)
+
+BBOX = BBox3D.from_coords([0, 0, 0], [96, 64, 4], [1, 1, 1])
+
+
+def identity(src):
+    return src
+
+
+processed_shapes: list = []
+
+
+def recording_identity(src):
+    processed_shapes.append(tuple(src.shape))
+    return src
+
+
+@pytest.fixture
+def make_layer(tmp_path):
+    def _make_layer(name):
+        return build_cv_layer(
+            path=f"file://{tmp_path}/{name}",
+            info_type="image",
+            info_data_type="float32",
+            info_num_channels=1,
+            info_scales=[[1, 1, 1]],
+            info_chunk_size=[8, 8, 1],
+            info_encoding="raw",
+            info_bbox=BBOX,
+        )
+
+    return _make_layer
+
+
+def _get_actual_counts(flow: mazepa.Flow) -> dict[str, int]:
+    return {k: len(v) for k, v in mazepa.dryrun.dryrun_for_task_ids([flow]).items()}
+
+
+@pytest.mark.parametrize(
+    "schema_kwargs",
+    [
+        {},
+        {"force_intermediaries": True},
+        {"force_intermediaries": True, "processing_gap": Vec3D(4, 4, 0)},
+        {"roi_crop_pad": Vec3D(8, 8, 0)},
+        {"processing_blend_pad": Vec3D(4, 4, 0), "processing_blend_mode": "linear"},
+        {"processing_blend_pad": Vec3D(4, 4, 0), "processing_blend_mode": "defer"},
+        {"processing_blend_pad": Vec3D(4, 4, 0), "max_reduction_chunk_size": Vec3D(32, 32, 2)},
+    ],
+)
+def test_estimate_task_counts(make_layer, tmp_path, schema_kwargs):
+    schema: VolumetricApplyFlowSchema = VolumetricApplyFlowSchema(
+        op=VolumetricCallableOperation(identity),
+        processing_chunk_size=Vec3D(16, 16, 1),
+        dst_resolution=Vec3D(1, 1, 1),
+        intermediaries_dir=f"file://{tmp_path}/intermediaries",
+        **schema_kwargs,
+    )
+    idx = VolumetricIndex(resolution=Vec3D(1, 1, 1), bbox=BBOX)
+    flow = schema(idx, make_layer("dst"), (), {"src": make_layer("src")})
+    estimate = flow.estimate_task_counts()
+    assert estimate == _get_actual_counts(flow)
+    assert mazepa.dryrun.get_expected_operation_counts([flow]) == estimate
+
+
+def test_subchunkable_expected_counts(make_layer, tmp_path):
+    flow = build_subchunkable_apply_flow(
+        fn=identity,
+        op_kwargs={"src": make_layer("src")},
+        dst=make_layer("dst"),
+        dst_resolution=[1, 1, 1],
+        processing_chunk_sizes=[[32, 32, 2], [16, 16, 1]],
+        processing_crop_pads=[[0, 0, 0], [2, 2, 0]],
+        level_intermediaries_dirs=[f"file://{tmp_path}/l1", f"file://{tmp_path}/l0"],
+        bbox=BBOX,
+    )
+    expected = mazepa.dryrun.get_expected_operation_counts([flow])
+    assert expected == _get_actual_counts(flow)
+    assert expected == flow.estimate_task_counts()
+
+
+@pytest.mark.parametrize("memory_intermediaries", [True, False])
+def test_subchunkable_memory_intermediaries(make_layer, tmp_path, memory_intermediaries):
+    src = make_layer("src")
+    idx = VolumetricIndex(resolution=Vec3D(1, 1, 1), bbox=BBOX)
+    data = np.random.rand(1, *idx.shape).astype(np.float32)
+    src[idx] = data
+    dst = make_layer("dst")
+    flow = build_subchunkable_apply_flow(
+        fn=identity,
+        op_kwargs={"src": src},
+        dst=dst,
+        dst_resolution=[1, 1, 1],
+        processing_chunk_sizes=[[32, 32, 2], [16, 16, 1]],
+        processing_blend_pads=[[0, 0, 0], [4, 4, 0]],
+        processing_blend_modes="linear",
+        level_intermediaries_dirs=[f"file://{tmp_path}/l1", f"file://{tmp_path}/l0"],
+        memory_intermediaries=memory_intermediaries,
+        bbox=BBOX,
+    )
+    with configure_memory_buffer_pool(2**20) as pool:
+        mazepa.execute(flow, show_progress=False, do_dryrun_estimation=False)
+        assert pool.get_stats().num_bytes == 0
+    np.testing.assert_allclose(dst[idx], data, rtol=1e-6)
+    # Only the bottom level writes to the intermediaries dir when it fits in memory
+    assert os.path.exists(tmp_path / "l0") != memory_intermediaries
+
+
+def failing_identity(src):
+    processed_shapes.append(tuple(src.shape))
+    if len(processed_shapes) == 3:
+        raise RuntimeError("Failed")
+    return src
+
+
+def test_subchunkable_memory_intermediaries_freed_on_failure(make_layer, tmp_path):
+    processed_shapes.clear()
+    src = make_layer("src")
+    dst = make_layer("dst")
+    flow = build_subchunkable_apply_flow(
+        fn=failing_identity,
+        op_kwargs={"src": src},
+        dst=dst,
+        dst_resolution=[1, 1, 1],
+        processing_chunk_sizes=[[32, 32, 2], [16, 16, 1]],
+        processing_blend_pads=[[0, 0, 0], [4, 4, 0]],
+        processing_blend_modes="linear",
+        level_intermediaries_dirs=[f"file://{tmp_path}/l1", f"file://{tmp_path}/l0"],
+        memory_intermediaries=True,
+        bbox=BBOX,
+    )
+    with configure_memory_buffer_pool(2**20) as pool:
+        with pytest.raises(RuntimeError):
+            mazepa.execute(flow, show_progress=False, do_dryrun_estimation=False)
+        stats = pool.get_stats()
+        assert stats.num_bytes == 0
+        assert stats.num_spilled_bytes == 0
+
+
+def test_subchunkable_num_threads(make_layer, tmp_path):
+    src = make_layer("src")
+    idx = VolumetricIndex(resolution=Vec3D(1, 1, 1), bbox=BBOX)
+    data = np.random.rand(1, *idx.shape).astype(np.float32)
+    src[idx] = data
+    dst = make_layer("dst")
+    flow = build_subchunkable_apply_flow(
+        fn=identity,
+        op_kwargs={"src": src},
+        dst=dst,
+        dst_resolution=[1, 1, 1],
+        processing_chunk_sizes=[[32, 32, 2], [16, 16, 1]],
+        processing_blend_pads=[[0, 0, 0], [4, 4, 0]],
+        processing_blend_modes="linear",
+        level_intermediaries_dirs=[f"file://{tmp_path}/l1", f"file://{tmp_path}/l0"],
+        subchunk_num_threads=4,
+        bbox=BBOX,
+    )
+    mazepa.execute(flow, show_progress=False, do_dryrun_estimation=False)
+    np.testing.assert_allclose(dst[idx], data, rtol=1e-6)
+
+    # Only the level right below the top gets a thread pool
+    flow = build_subchunkable_apply_flow(
+        fn=identity,
+        op_kwargs={"src": src},
+        dst=dst,
+        dst_resolution=[1, 1, 1],
+        processing_chunk_sizes=[[32, 32, 2], [16, 16, 2], [8, 8, 1]],
+        subchunk_num_threads=4,
+        skip_intermediaries=True,
+        bbox=BBOX,
+    )
+    level_2_op = flow.fn.__self__.op  # type: ignore[attr-defined]
+    assert level_2_op.num_threads == 4
+    assert level_2_op.flow_schema.op.num_threads == 1
+
+    with pytest.raises(ValueError):
+        build_subchunkable_apply_flow(
+            fn=identity,
+            op_kwargs={"src": src},
+            dst=dst,
+            dst_resolution=[1, 1, 1],
+            processing_chunk_sizes=[[16, 16, 1]],
+            subchunk_num_threads=0,
+            skip_intermediaries=True,
+            bbox=BBOX,
+        )
+
+
+def test_subchunkable_skip_empty_inputs(make_layer):
+    src = make_layer("src")
+    idx = VolumetricIndex(resolution=Vec3D(1, 1, 1), bbox=BBOX)
+    data = np.zeros((1, *idx.shape), dtype=np.float32)
+    data[:, :16, :16, :1] = np.random.rand(1, 16, 16, 1)
+    src[
+        VolumetricIndex(
+            resolution=Vec3D(1, 1, 1), bbox=BBox3D.from_coords([0, 0, 0], [16, 16, 1], [1, 1, 1])
+        )
+    ] = data[:, :16, :16, :1]
+    dst = make_layer("dst")
+    processed_shapes.clear()
+    flow = build_subchunkable_apply_flow(
+        fn=recording_identity,
+        op_kwargs={"src": src},
+        dst=dst,
+        dst_resolution=[1, 1, 1],
+        processing_chunk_sizes=[[32, 32, 2]],
+        skip_intermediaries=True,
+        skip_empty_inputs=True,
+        bbox=BBOX,
+    )
+    mazepa.execute(flow, show_progress=False, do_dryrun_estimation=False)
+    np.testing.assert_allclose(dst[idx], data, rtol=1e-6)
+    # Only the one of the 12 chunks that overlaps the written data is processed
+    assert len(processed_shapes) == 1
+
+
+def test_subchunkable_skip_empty_inputs_blended(make_layer, tmp_path):
+    src = make_layer("src")
+    idx = VolumetricIndex(resolution=Vec3D(1, 1, 1), bbox=BBOX)
+    data = np.zeros((1, *idx.shape), dtype=np.float32)
+    data[:, :8, :8, :1] = np.random.rand(1, 8, 8, 1)
+    src[
+        VolumetricIndex(
+            resolution=Vec3D(1, 1, 1), bbox=BBox3D.from_coords([0, 0, 0], [8, 8, 1], [1, 1, 1])
+        )
+    ] = data[:, :8, :8, :1]
+    dst = make_layer("dst")
+    processed_shapes.clear()
+    flow = build_subchunkable_apply_flow(
+        fn=recording_identity,
+        op_kwargs={"src": src},
+        dst=dst,
+        dst_resolution=[1, 1, 1],
+        processing_chunk_sizes=[[32, 32, 2], [16, 16, 1]],
+        processing_crop_pads=[[0, 0, 0], [2, 2, 0]],
+        processing_blend_pads=[[8, 8, 0], [0, 0, 0]],
+        processing_blend_modes="linear",
+        level_intermediaries_dirs=[f"file://{tmp_path}/l1", f"file://{tmp_path}/l0"],
+        skip_empty_inputs=True,
+        bbox=BBOX,
+    )
+    mazepa.execute(flow, show_progress=False, do_dryrun_estimation=False)
+    np.testing.assert_allclose(dst[idx], data, rtol=1e-6)
+    # Only the one of the 12 top level tasks that reads the written data is processed,
+    # with 3x3x2 subchunks
+    assert len(processed_shapes) == 18
+
+
+class CountingLayer:
+    def __init__(self):
+        self.num_reads = 0
+        self.lock = threading.Lock()
+
+    def __getitem__(self, idx):
+        with self.lock:
+            self.num_reads += 1
+        return np.zeros((1, *idx.shape), dtype=np.float32)
+
+
+def test_read_intersections_bounded():
+    red_idx = VolumetricIndex(resolution=Vec3D(1, 1, 1), bbox=BBOX)
+    src_idxs = [red_idx.padded(Vec3D(i, i, 0)) for i in range(3 * REDUCTION_READ_NUM_THREADS)]
+    layer = CountingLayer()
+    reads = _read_intersections(src_idxs, [layer] * len(src_idxs), red_idx)
+    subidx, data = next(reads)
+    assert data.shape == (1, *red_idx.shape)
+    time.sleep(0.1)
+    # Only a window of reads is run ahead of the one being accumulated
+    assert layer.num_reads <= REDUCTION_READ_NUM_THREADS
+    assert len([subidx, *(e for e, _ in reads)]) == len(src_idxs)
+    assert layer.num_reads == len(src_idxs)
@@ -0,0 +1,165 @@
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import numpy as np
+
+from zetta_utils.message_queues.process.queue import ProcessQueue
+
+
+def success_fn():
+    return "Success"
+
+
+def pull_without_acknowledging(q: ProcessQueue) -> None:
+    assert len(q.pull()) == 1
+
+
+def run_in_other_process(fn, q: ProcessQueue) -> None:
+    proc = multiprocessing.get_context("spawn").Process(target=fn, args=(q,))
+    proc.start()
+    proc.join()
+    assert proc.exitcode == 0
+
+
+def list_shared_memory() -> set[str]:
+    return {e for e in os.listdir("/dev/shm") if e.startswith("psm_")}
+
+
+def test_push_pull():
+    with ProcessQueue("test_queue") as q:
+        payloads = {None, 1, "asdfadsfdsa", success_fn}
+        q.push(list(payloads))
+        time.sleep(0.1)
+        result = q.pull(max_num=len(payloads))
+        assert len(result) == len(payloads)
+        received_payloads = {r.payload for r in result}
+        assert received_payloads == payloads
+
+
+def test_push_pull_lambda():
+    with ProcessQueue("test_queue") as q:
+        q.push([lambda x: x + 1])
+        assert q.pull()[0].payload(1) == 2
+
+
+def test_pull_max_num():
+    with ProcessQueue("test_queue") as q:
+        q.push(list(range(5)))
+        time.sleep(0.1)
+        assert [e.payload for e in q.pull(max_num=3)] == [0, 1, 2]
+        assert [e.payload for e in q.pull(max_num=3)] == [3, 4]
+
+
+def test_pull_empty():
+    with ProcessQueue("test_queue", pull_wait_sec=0.1) as q:
+        start = time.time()
+        assert len(q.pull()) == 0
+        assert time.time() - start >= 0.1
+
+
+def test_shared_memory():
+    before = list_shared_memory()
+    with ProcessQueue("test_queue", shared_memory_min_bytes=1024) as q:
+        large = np.random.rand(64, 64)
+        small = np.arange(4)
+        q.push([{"large": large, "small": small}])
+        assert len(list_shared_memory() - before) == 1
+        msg = q.pull()[0]
+        np.testing.assert_array_equal(msg.payload["large"], large)
+        np.testing.assert_array_equal(msg.payload["small"], small)
+        msg.acknowledge_fn()
+        time.sleep(0.1)
+        q.requeue_expired()
+        assert list_shared_memory() == before
+
+
+def test_exit_releases_shared_memory():
+    before = list_shared_memory()
+    with ProcessQueue("test_queue", shared_memory_min_bytes=1024) as q:
+        q.push([np.random.rand(64, 64)] * 3)
+    assert list_shared_memory() == before
+
+
+def test_exit_releases_leased_shared_memory():
+    before = list_shared_memory()
+    with ProcessQueue("test_queue", shared_memory_min_bytes=1024) as q:
+        q.push([np.random.rand(64, 64)])
+        assert len(q.pull()) == 1
+    assert list_shared_memory() == before
+
+
+def test_exit_releases_shared_memory_leased_by_other_process():
+    before = list_shared_memory()
+    with ProcessQueue("test_queue", shared_memory_min_bytes=1024) as q:
+        q.push([np.random.rand(64, 64)])
+        run_in_other_process(pull_without_acknowledging, q)
+    assert list_shared_memory() == before
+
+
+def test_unacknowledged_by_other_process_requeued():
+    with ProcessQueue("test_queue", pull_wait_sec=0.1, pull_lease_sec=0.2) as q:
+        q.push([1])
+        run_in_other_process(pull_without_acknowledging, q)
+        time.sleep(0.3)
+        assert q.requeue_expired() == 1
+        assert [e.payload for e in q.pull()] == [1]
+
+
+def test_unacknowledged_requeued():
+    with ProcessQueue("test_queue", pull_wait_sec=0.1, pull_lease_sec=0.2) as q:
+        q.push([1, 2])
+        msgs = q.pull()
+        assert len(msgs) == 2
+        msgs[0].acknowledge_fn()
+        time.sleep(0.1)
+        assert q.requeue_expired() == 0
+        time.sleep(0.2)
+        assert q.requeue_expired() == 1
+        assert [e.payload for e in q.pull()] == [2]
+
+
+def test_extend_lease():
+    with ProcessQueue("test_queue", pull_wait_sec=0.1, pull_lease_sec=0.2) as q:
+        q.push([1])
+        msgs = q.pull()
+        msgs[0].extend_lease_fn(10)
+        time.sleep(0.3)
+        assert q.requeue_expired() == 0
+        assert len(q.pull()) == 0
+
+
+def test_requeue_expired_concurrent_with_pull_and_acknowledge():
+    errors = []
+    stop = threading.Event()
+
+    def requeue_loop(q: ProcessQueue):
+        try:
+            while not stop.is_set():
+                q.requeue_expired()
+        except Exception as e:  # pylint: disable=broad-except
+            errors.append(e)
+
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        with ProcessQueue("test_queue", pull_wait_sec=0.01) as q:
+            # Many outstanding leases, so that each `requeue_expired` scans for a while
+            q.push(list(range(5000)))
+            while len(q.pull(max_num=5000)) > 0:
+                pass
+            thread = threading.Thread(target=requeue_loop, args=(q,))
+            thread.start()
+            deadline = time.time() + 1.0
+            while time.time() < deadline and len(errors) == 0:
+                q.push(list(range(10)))
+                # Leave half of the messages leased, so the number of leases changes
+                for msg in q.pull(max_num=10)[::2]:
+                    msg.acknowledge_fn()
+            stop.set()
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    assert errors == []
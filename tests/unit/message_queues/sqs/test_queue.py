@@ -100,6 +100,25 @@ def test_delete(raw_queue):
     assert len(result_empty) == 0
 
 
+def test_acknowledge(raw_queue):
+    raw_queue_name, region_name, endpoint_url = raw_queue
+    q = SQSQueue[Any](
+        raw_queue_name,
+        region_name=region_name,
+        endpoint_url=endpoint_url,
+        insertion_threads=0,
+        pull_lease_sec=1,
+    )
+    q.push(list(range(12)))
+    time.sleep(0.1)
+    result = q.pull(max_num=12)
+    assert len(result) == 12
+    q.acknowledge(result)
+    time.sleep(1.1)
+    result_empty = q.pull()
+    assert len(result_empty) == 0
+
+
 def test_extend_lease(raw_queue):
     raw_queue_name, region_name, endpoint_url = raw_queue
     q = SQSQueue[Any](
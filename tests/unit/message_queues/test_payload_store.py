@@ -0,0 +1,105 @@
+# pylint: disable=missing-docstring,redefined-outer-name
+import os
+import time
+
+import attrs
+import numpy as np
+import pytest
+
+from zetta_utils.mazepa import taskable_operation_cls
+from zetta_utils.message_queues import (
+    FileQueue,
+    PayloadStore,
+    payload_store,
+    serialization,
+)
+
+
+@attrs.frozen
+class Payload:
+    shared: np.ndarray
+    small: int
+
+    def get_shared_payload_parts(self) -> list:
+        return [self.shared, self.small]
+
+
+@taskable_operation_cls
+@attrs.frozen
+class AddWeights:
+    weights: tuple
+
+    def __call__(self, x: int) -> float:
+        return sum(self.weights) + x
+
+
+def test_roundtrip_stores_shared_part_once(tmp_path):
+    store = PayloadStore(str(tmp_path))
+    shared = np.arange(4096)
+    payloads = [Payload(shared=shared, small=i) for i in range(5)]
+    messages = [serialization.serialize(e, payload_store=store) for e in payloads]
+    assert os.listdir(tmp_path) == [store.put(shared)[1]]
+    assert all(len(e) < shared.nbytes / 10 for e in messages)
+
+    received = [serialization.deserialize(e) for e in messages]
+    assert [e.small for e in received] == list(range(5))
+    np.testing.assert_array_equal(received[0].shared, shared)
+    assert all(e.shared is received[0].shared for e in received)
+
+
+def test_small_parts_inline(tmp_path):
+    store = PayloadStore(str(tmp_path), min_shared_bytes=2 ** 20)
+    payload = Payload(shared=np.arange(4), small=1)
+    message = serialization.serialize(payload, payload_store=store)
+    assert not os.listdir(tmp_path)
+    result = serialization.deserialize(message)
+    np.testing.assert_array_equal(result.shared, payload.shared)
+
+
+def test_no_shared_parts(tmp_path):
+    store = PayloadStore(str(tmp_path))
+    message = serialization.serialize({"a": 1}, payload_store=store)
+    assert message == serialization.serialize({"a": 1})
+    assert serialization.deserialize(message) == {"a": 1}
+
+
+def test_part_pickled_once(tmp_path, mocker):
+    store = PayloadStore(str(tmp_path))
+    dumps_spy = mocker.spy(payload_store, "dumps_part")
+    payload = Payload(shared=np.arange(4096), small=1)
+    result = serialization.deserialize(serialization.serialize(payload, payload_store=store))
+    assert dumps_spy.call_count == 2
+    assert result.small == 1
+
+
+def test_delete_uploaded(tmp_path):
+    store = PayloadStore(str(tmp_path))
+    serialization.serialize(Payload(shared=np.arange(4096), small=0), payload_store=store)
+    assert len(os.listdir(tmp_path)) == 1
+    store.delete_uploaded()
+    assert not os.listdir(tmp_path)
+
+
+def test_missing_part_exc(tmp_path):
+    store = PayloadStore(str(tmp_path))
+    message = serialization.serialize(
+        Payload(shared=np.arange(4096), small=0), payload_store=store
+    )
+    for e in os.listdir(tmp_path):
+        os.remove(tmp_path / e)
+    with pytest.raises(FileNotFoundError):
+        serialization.deserialize(message)
+
+
+def test_file_queue_task_roundtrip(tmp_path):
+    op = AddWeights(weights=tuple(range(1000)))
+    tasks = [op.make_task(x=i) for i in range(3)]
+    with FileQueue("test_queue", payload_store=PayloadStore(str(tmp_path))) as q:
+        q.push(tasks)
+        time.sleep(0.1)
+        result = q.pull(max_num=3)
+        assert len(os.listdir(tmp_path)) == 1
+    assert not os.listdir(tmp_path)
+    received = sorted((e.payload for e in result), key=lambda e: e.kwargs["x"])
+    assert [e.id_ for e in received] == [e.id_ for e in tasks]
+    assert [e().return_value for e in received] == [sum(range(1000)) + i for i in range(3)]
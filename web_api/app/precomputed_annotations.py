@@ -15,6 +15,7 @@ from zetta_utils.db_annotations import precomp_annotations
 from zetta_utils.db_annotations.annotation import AnnotationDBEntry, NgAnnotation
 from zetta_utils.db_annotations.precomp_annotations import (
     AnnotationLayer,
+    array_to_lines,
     build_annotation_layer,
 )
 from zetta_utils.geometry import BBox3D, Vec3D
@@ -45,7 +46,8 @@ async def read_in_bounds(
     bbox = BBox3D.from_coords(bbox_start, bbox_end, resolution_vec)
     layer = build_annotation_layer(path, mode="read")
     response = []
-    for line in layer.read_in_bounds(bbox, strict=True, annotation_resolution=resolution_vec):
+    lines = layer.read_in_bounds(bbox, strict=True, annotation_resolution=resolution_vec)
+    for line in array_to_lines(lines):
         annotation = AnnotationDBEntry(
             id=line.id,
             layer_group="",
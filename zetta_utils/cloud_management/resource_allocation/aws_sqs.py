@@ -31,3 +31,5 @@ def sqs_queue_ctx_mngr(run_id: str, queue: SQSQueue):
         logger.debug(f"Deleting SQS queue with URL={_queue['QueueUrl']}")
         sqs.delete_queue(QueueUrl=_queue["QueueUrl"])
         deregister_resource(_id)
+        if queue.payload_store is not None:
+            queue.payload_store.delete_uploaded()
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+from typing import Sequence
+
 import attrs
 import torch
 from numpy import typing as npt
@@ -18,7 +20,7 @@ class SimpleInferenceRunner:  # pragma: no cover
     model_path: str
     unsqueeze_to: int | None = None
 
-    def __call__(self, src: Tensor) -> npt.NDArray:
+    def _get_model(self) -> tuple[torch.nn.Module, str]:
         if torch.cuda.is_available():
             device = "cuda"
         else:
@@ -26,8 +28,33 @@ class SimpleInferenceRunner:  # pragma: no cover
 
         # load model during the call _with caching_
         model = convnet.utils.load_model(self.model_path, device=device, use_cache=True)
+        return model, device
+
+    def __call__(self, src: Tensor) -> npt.NDArray:
+        model, device = self._get_model()
 
         if self.unsqueeze_to is not None:
             src = tensor_ops.unsqueeze_to(src, self.unsqueeze_to)
         result = to_np(model(to_torch(src).to(device)))
         return result
+
+    def call_batch(self, kwargs_list: Sequence[dict[str, Tensor]]) -> list[npt.NDArray]:
+        """
+        Runs the model once on the ``src`` inputs of several calls, concatenated along
+        the leading dimension added by ``unsqueeze_to``. Falls back to separate calls
+        when there is no such dimension or the input shapes differ.
+        """
+        srcs = [kwargs["src"] for kwargs in kwargs_list]
+        if (
+            self.unsqueeze_to is None
+            or self.unsqueeze_to <= srcs[0].ndim
+            or len({tuple(src.shape) for src in srcs}) > 1
+        ):
+            return [self(**kwargs) for kwargs in kwargs_list]
+
+        model, device = self._get_model()
+        batch = torch.cat(
+            [to_torch(tensor_ops.unsqueeze_to(src, self.unsqueeze_to)) for src in srcs]
+        )
+        result = to_np(model(batch.to(device)))
+        return [result[i : i + 1] for i in range(len(srcs))]
@@ -1,3 +1,4 @@
+# pylint: disable=too-many-lines
 """
 Module to support writing of annotations in precomputed format.
 
@@ -11,24 +12,53 @@ References:
 	https://github.com/google/neuroglancer/blob/master/src/datasource/precomputed/annotations.md
 """
 
-import io
 import itertools
 import json
 import os
+import re
 import struct
+from collections import defaultdict
 from math import ceil
-from random import shuffle
-from typing import IO, Literal, Optional, Sequence
+from typing import IO, Callable, Iterator, Literal, Optional, Sequence, Union
 
-from cloudfiles import CloudFile, CloudFiles
+import numpy as np
+from cloudfiles import CloudFile, CloudFiles, compression
+from cloudvolume.datasource.precomputed.image.common import compressed_morton_code
+from cloudvolume.datasource.precomputed.sharding import (
+    ShardingSpecification,
+    synthesize_shard_file,
+)
+from numpy import typing as npt
 
 from zetta_utils import builder, log, mazepa
 from zetta_utils.geometry import BBox3D, Vec3D
 from zetta_utils.geometry.vec import VEC3D_PRECISION
 from zetta_utils.layer.volumetric.index import VolumetricIndex
+from zetta_utils.mazepa import Dependency
 
 logger = log.get_logger("zetta_utils")
 
+# Number of chunk files read and written concurrently
+ANNOTATION_IO_NUM_THREADS = 16
+
+# Number of chunk files updated at once by ``AnnotationLayer.write_annotations``, which
+# bounds the amount of chunk data held in memory
+ANNOTATION_IO_BATCH_SIZE = 1000
+
+CACHE_CONTROL = "no-cache, no-store, max-age=0, must-revalidate"
+
+BY_ID_KEY = "by_id"
+
+# Staged copy of the lowest spatial level of sharded layers, as unsharded chunk files
+# of lines with their relationships, from which post-processing builds every index
+UNSHARDED_KEY = "unsharded"
+
+# Scratch directory of ``post_process_annotation_layer_flow``, under the layer path
+POST_PROCESS_KEY = "post_process"
+
+_CHUNK_FILE_NAME_RE = re.compile(r"^\d+_\d+_\d+$")
+_SHARD_FILE_NAME_RE = re.compile(r"^[0-9a-f]+\.shard$")
+
 
 def is_local_filesystem(path: str) -> bool:
     return path.startswith("file://") or "://" not in path
@@ -48,6 +78,11 @@ def path_join(*paths: str):
 
 
 class LineAnnotation:
+    """
+    A single line annotation.  Sets of lines are read, written and subdivided as
+    structured arrays of ``LINE_DTYPE`` (see ``lines_to_array`` and ``array_to_lines``).
+    """
+
     BYTES_PER_ENTRY = 24  # start (3 floats), end (3 floats)
 
     def __init__(self, line_id: int, start: Sequence[float], end: Sequence[float]):
@@ -125,6 +160,191 @@ class LineAnnotation:
         return LineAnnotation(self.id, new_start, new_end)
 
 
+# In-memory representation of a set of lines, one record per line.  Coordinates are
+# kept in double precision in memory, and stored as little-endian floats on disk.
+LINE_DTYPE = np.dtype([("id", "<u8"), ("start", "<f8", 3), ("end", "<f8", 3)])
+
+Lines = Union[npt.NDArray, Sequence[LineAnnotation]]
+
+
+def line_dtype(relationships: Sequence[str] = ()) -> np.dtype:
+    """
+    Return the structured dtype of lines that carry, besides the fields of
+    ``LINE_DTYPE``, the related segment id (0 for none) for each of the given
+    relationships, e.g. ``("pre_segment", "post_segment")``.
+    """
+    return np.dtype(LINE_DTYPE.descr + [(name, "<u8") for name in relationships])
+
+
+def lines_to_array(lines: Lines) -> npt.NDArray:
+    """
+    Convert a sequence of LineAnnotations to a structured array of ``LINE_DTYPE``.
+    Arrays are returned as they are.
+    """
+    if isinstance(lines, np.ndarray):
+        return lines
+    result = np.empty(len(lines), dtype=LINE_DTYPE)
+    for i, line in enumerate(lines):
+        result[i] = (line.id, line.start, line.end)
+    return result
+
+
+def array_to_lines(lines: npt.NDArray) -> list[LineAnnotation]:
+    """
+    Convert a structured array of ``LINE_DTYPE`` to a list of LineAnnotations.
+    """
+    return [
+        LineAnnotation(int(line_id), tuple(start.tolist()), tuple(end.tolist()))
+        for line_id, start, end in zip(lines["id"], lines["start"], lines["end"])
+    ]
+
+
+def select_relationships(lines: npt.NDArray, relationships: Sequence[str]) -> npt.NDArray:
+    """
+    Return the given lines as a structured array of ``line_dtype(relationships)``,
+    dropping any other fields.
+    """
+    dtype = line_dtype(relationships)
+    if lines.dtype == dtype:
+        return lines
+    result = np.empty(len(lines), dtype=dtype)
+    for name in dtype.names or ():
+        result[name] = lines[name]
+    return result
+
+
+def strip_relationships(lines: npt.NDArray) -> npt.NDArray:
+    """
+    Return the given lines as a structured array of ``LINE_DTYPE``, dropping any
+    relationship fields (see ``line_dtype``).
+    """
+    return select_relationships(lines, ())
+
+
+def convert_line_coordinates(lines: npt.NDArray, from_res: Vec3D, to_res: Vec3D) -> npt.NDArray:
+    """
+    Return a copy of the given lines with their coordinates converted from one
+    resolution to another.
+    """
+    scale = np.array(from_res, dtype=np.float64) / np.array(to_res, dtype=np.float64)
+    result = lines.copy()
+    result["start"] = np.round(lines["start"] * scale, VEC3D_PRECISION)
+    result["end"] = np.round(lines["end"] * scale, VEC3D_PRECISION)
+    return result
+
+
+def points_in_bounds(points: npt.NDArray, bounds: VolumetricIndex) -> npt.NDArray:
+    """
+    Return which of the given (N, 3) points are within the given bounds, with the
+    same semi-inclusive convention as ``VolumetricIndex.contains``.
+    """
+    start = np.array(bounds.start, dtype=np.float64)
+    stop = np.array(bounds.stop, dtype=np.float64)
+    return np.all((start <= points) & (points < stop), axis=1)
+
+
+def _segments_intersect_boxes(
+    point1: npt.NDArray, point2: npt.NDArray, start: npt.NDArray, stop: npt.NDArray
+) -> npt.NDArray:
+    """
+    Return which segments from ``point1`` to ``point2`` intersect the boxes from
+    ``start`` to ``stop``, with the same convention as ``BBox3D.line_intersects``.
+    All arguments broadcast to (N, 3).
+    """
+    in_box1 = np.all((start <= point1) & (point1 < stop), axis=-1)
+    in_box2 = np.all((start <= point2) & (point2 < stop), axis=-1)
+    direction = point2 - point1
+    parallel = direction == 0
+    # Liang-Barsky line clipping, with all three axes at once
+    with np.errstate(divide="ignore", invalid="ignore"):
+        t1 = (start - point1) / direction
+        t2 = (stop - point1) / direction
+    tmin = np.maximum(0.0, np.where(parallel, 0.0, np.minimum(t1, t2)).max(axis=-1))
+    tmax = np.minimum(1.0, np.where(parallel, 1.0, np.maximum(t1, t2)).min(axis=-1))
+    parallel_inside = np.all(~parallel | ((start <= point1) & (point1 < stop)), axis=-1)
+    return in_box1 | in_box2 | (parallel_inside & (tmin <= tmax))
+
+
+def lines_in_bounds(lines: npt.NDArray, bounds: VolumetricIndex) -> npt.NDArray:
+    """
+    Return which of the given lines intersect the given bounds, as a boolean array.
+    This is a vectorized version of ``VolumetricIndex.line_intersects``.
+    (Assumes the coordinates of the lines match that of the given VolumetricIndex.)
+    """
+    return _segments_intersect_boxes(
+        lines["start"],
+        lines["end"],
+        np.array(bounds.start, dtype=np.float64),
+        np.array(bounds.stop, dtype=np.float64),
+    )
+
+
+def bin_lines(
+    lines: npt.NDArray, bounds: VolumetricIndex, chunk_size: Sequence[int]
+) -> list[tuple[tuple[int, int, int], npt.NDArray]]:
+    """
+    Assign the given lines to the chunks of the grid that subdivides ``bounds`` into
+    ``chunk_size`` chunks.  A line goes to every chunk it intersects (as defined by
+    ``lines_in_bounds``), so it may go to more than one.
+
+    :return: for each non-empty chunk, its grid position and the indices of its lines,
+        ordered by grid position.
+    """
+    origin = np.array(bounds.start, dtype=np.float64)
+    size = np.array(chunk_size, dtype=np.float64)
+    grid_shape = np.ceil(np.array(bounds.shape) / size).astype(np.int64)
+    if len(lines) == 0:
+        return []
+
+    # Candidate chunks are those overlapping the bounding box of each line, including
+    # those it only touches with their upper faces
+    low = np.minimum(lines["start"], lines["end"])
+    high = np.maximum(lines["start"], lines["end"])
+    low_cell = np.maximum(np.ceil((low - origin) / size).astype(np.int64) - 1, 0)
+    high_cell = np.minimum(np.floor((high - origin) / size).astype(np.int64), grid_shape - 1)
+    extent = np.maximum(high_cell - low_cell + 1, 0)
+    counts = extent.prod(axis=1)
+
+    # One (line, chunk) pair for each candidate, kept if they really intersect
+    line_indices = np.repeat(np.arange(len(lines)), counts)
+    offsets = np.arange(counts.sum()) - np.repeat(np.cumsum(counts) - counts, counts)
+    pair_extent = extent[line_indices]
+    cells = low_cell[line_indices] + np.stack(
+        [
+            offsets // (pair_extent[:, 1] * pair_extent[:, 2]),
+            offsets // pair_extent[:, 2] % pair_extent[:, 1],
+            offsets % pair_extent[:, 2],
+        ],
+        axis=1,
+    )
+    cell_start = origin + cells * size
+    hit = _segments_intersect_boxes(
+        lines["start"][line_indices], lines["end"][line_indices], cell_start, cell_start + size
+    )
+    line_indices = line_indices[hit]
+    cells = cells[hit]
+
+    # Group the lines by chunk
+    keys = np.ravel_multi_index(tuple(cells.T), tuple(grid_shape))
+    order = np.argsort(keys, kind="stable")
+    _, group_starts = np.unique(keys[order], return_index=True)
+    return [
+        (tuple(cells[order[group_start]].tolist()), group)
+        for group_start, group in zip(
+            group_starts, np.split(line_indices[order], group_starts[1:])
+        )
+    ]
+
+
+def unique_lines(lines: npt.NDArray) -> npt.NDArray:
+    """
+    Return the given lines with duplicates (by id) removed, keeping the order of
+    first appearance.
+    """
+    _, first_indices = np.unique(lines["id"], return_index=True)
+    return lines[np.sort(first_indices)]
+
+
 class SpatialEntry:
     """
     This is a helper class, mainly used internally, to define each level of subdivision
@@ -137,26 +357,41 @@ class SpatialEntry:
       of annotations in any chunk at this level, or 1 for no subsampling.  It's confusing, but
       see:
       https://github.com/google/neuroglancer/issues/227#issuecomment-2246350747
+    sharding: optional "neuroglancer_uint64_sharded_v1" sharding specification; if given,
+      the chunks of this level are stored in shard files, keyed by the compressed Morton
+      code of their grid position, rather than in one file each.
     """
 
-    def __init__(self, chunk_size: Sequence[int], grid_shape: Sequence[int], key: str, limit: int):
+    def __init__(
+        self,
+        chunk_size: Sequence[int],
+        grid_shape: Sequence[int],
+        key: str,
+        limit: int,
+        sharding: Optional[dict] = None,
+    ):
         self.chunk_size = chunk_size
         self.grid_shape = grid_shape
         self.key = key
         self.limit = limit
+        self.sharding = sharding
 
     def __repr__(self):
         return (
             f"SpatialEntry(chunk_size={self.chunk_size}, grid_shape={self.grid_shape}, "
-            f'key="{self.key}", limit={self.limit})'
+            f'key="{self.key}", limit={self.limit}, sharding={self.sharding})'
         )
 
     def to_json(self):
+        sharding_json = ""
+        if self.sharding is not None:
+            sharding_json = f""",
+            "sharding" : {json.dumps(self.sharding)}"""
         return f"""{{
             "chunk_size" : {list(self.chunk_size)},
             "grid_shape" : {list(self.grid_shape)},
             "key" : "{self.key}",
-            "limit": {self.limit}
+            "limit": {self.limit}{sharding_json}
         }}"""
 
 
@@ -170,40 +405,130 @@ def write_bytes(file_or_gs_path: str, data: bytes):
     if "//" not in file_or_gs_path:
         file_or_gs_path = "file://" + file_or_gs_path
     cf = CloudFile(file_or_gs_path)
-    cf.put(data, cache_control="no-cache, no-store, max-age=0, must-revalidate")
+    cf.put(data, cache_control=CACHE_CONTROL)
 
 
-def write_lines(file_or_gs_path: str, lines: Sequence[LineAnnotation], randomize: bool = True):
+def encode_lines(lines: Lines, randomize: bool = True) -> bytes:
     """
-    Write a set of lines to the given file, in 'multiple annotation encoding' format:
+    Encode a set of lines in 'multiple annotation encoding' format:
             1. Line count (uint64le)
             2. Data for each line (excluding ID), one after the other
             3. The line IDs (also as uint64le)
 
-    :param file_path: local file or GS path of file to write
-    :param lines: iterable of LineAnnotation objects
-    :param randomize: if True, the lines will be written in random
+    :param lines: structured array of ``LINE_DTYPE``, or sequence of LineAnnotations
+    :param randomize: if True, the lines will be encoded in random
             order (without mutating the lines parameter)
     """
-    lines = list(lines)
+    lines_arr = lines_to_array(lines)
     if randomize:
-        lines = lines[:]
-        shuffle(lines)
+        lines_arr = lines_arr[np.random.permutation(len(lines_arr))]
+    coords = np.concatenate([lines_arr["start"], lines_arr["end"]], axis=1).astype("<f4")
+    # NOTE: if you change or add to the line data, be sure to also
+    # change LineAnnotation.BYTES_PER_ENTRY accordingly.
+    return b"".join(
+        [
+            np.array([len(lines_arr)], dtype="<u8").tobytes(),
+            coords.tobytes(),
+            lines_arr["id"].astype("<u8").tobytes(),
+        ]
+    )
+
 
-    buffer = io.BytesIO()
-    # first write the count
-    buffer.write(struct.pack("<Q", len(lines)))
+def decode_lines(data: bytes | None) -> npt.NDArray:
+    """
+    Decode a set of lines in 'multiple annotation encoding' format, as defined
+    in encode_lines above, into a structured array of ``LINE_DTYPE``.
+    """
+    if data is None or len(data) == 0:
+        return np.empty(0, dtype=LINE_DTYPE)
+    line_count = int(np.frombuffer(data, dtype="<u8", count=1)[0])
+    coords = np.frombuffer(data, dtype="<f4", count=line_count * 6, offset=8)
+    coords = coords.reshape(line_count, 6)
+    result = np.empty(line_count, dtype=LINE_DTYPE)
+    result["start"] = coords[:, :3]
+    result["end"] = coords[:, 3:]
+    result["id"] = np.frombuffer(
+        data,
+        dtype="<u8",
+        count=line_count,
+        offset=8 + line_count * LineAnnotation.BYTES_PER_ENTRY,
+    )
+    return result
+
+
+def encode_line_by_id(line: npt.NDArray, relationships: Sequence[str] = ()) -> bytes:
+    """
+    Encode a single line in 'single annotation encoding' format, as used by the
+    ``by_id`` index:
+            1. Data for the line (excluding ID)
+            2. For each relationship, the count of related IDs (uint32le), followed by
+               the related IDs (uint64le).  A related ID of 0 is written as none.
+
+    :param line: one element of a structured array of ``line_dtype(relationships)``
+    :param relationships: names of the relationships, in info file order
+    """
+    parts = [np.concatenate([line["start"], line["end"]]).astype("<f4").tobytes()]
+    for name in relationships:
+        segment_id = int(line[name])
+        if segment_id == 0:
+            parts.append(struct.pack("<I", 0))
+        else:
+            parts.append(struct.pack("<IQ", 1, segment_id))
+    return b"".join(parts)
+
+
+def decode_line_by_id(line_id: int, data: bytes, relationships: Sequence[str] = ()) -> npt.NDArray:
+    """
+    Decode a single line in 'single annotation encoding' format, as defined in
+    encode_line_by_id above, into a 0-d structured array of ``line_dtype(relationships)``.
+    Only the first related ID of each relationship is kept.
+    """
+    result = np.zeros((), dtype=line_dtype(relationships))
+    coords = np.frombuffer(data, dtype="<f4", count=6)
+    result["id"] = line_id
+    result["start"] = coords[:3]
+    result["end"] = coords[3:]
+    offset = LineAnnotation.BYTES_PER_ENTRY
+    for name in relationships:
+        (count,) = struct.unpack_from("<I", data, offset)
+        if count > 0:
+            result[name] = struct.unpack_from("<Q", data, offset + 4)[0]
+        offset += 4 + 8 * count
+    return result
+
+
+def encode_related_lines(lines: npt.NDArray, relationships: Sequence[str] = ()) -> bytes:
+    """
+    Encode a set of lines together with their relationships, as the raw records of
+    a structured array of ``line_dtype(relationships)``.  This is the format of the
+    staged (unsharded) chunk files of sharded layers, which unlike 'multiple
+    annotation encoding' keeps everything needed to build the by_id and relationship
+    indices.
+    """
+    return select_relationships(lines, relationships).tobytes()
+
+
+def decode_related_lines(data: bytes | None, relationships: Sequence[str] = ()) -> npt.NDArray:
+    """
+    Decode a set of lines encoded by encode_related_lines above into a structured
+    array of ``line_dtype(relationships)``.
+    """
+    if data is None or len(data) == 0:
+        return np.empty(0, dtype=line_dtype(relationships))
+    return np.frombuffer(data, dtype=line_dtype(relationships)).copy()
 
-    # then write the line data
-    for line in lines:
-        line.write(buffer)
 
-    # finally write the ids at the end of the buffer
-    for line in lines:
-        buffer.write(struct.pack("<Q", line.id))
+def write_lines(file_or_gs_path: str, lines: Lines, randomize: bool = True):
+    """
+    Write a set of lines to the given file, in 'multiple annotation encoding' format
+    (see encode_lines).
 
-    buffer.seek(0)  # Rewind buffer to the beginning
-    write_bytes(file_or_gs_path, buffer.getvalue())
+    :param file_path: local file or GS path of file to write
+    :param lines: structured array of ``LINE_DTYPE``, or sequence of LineAnnotations
+    :param randomize: if True, the lines will be written in random
+            order (without mutating the lines parameter)
+    """
+    write_bytes(file_or_gs_path, encode_lines(lines, randomize))
 
 
 def line_count_from_file_size(file_size: int) -> int:
@@ -238,41 +563,378 @@ def read_bytes(file_or_gs_path: str):
     return cf.get()
 
 
-def read_lines(file_or_gs_path: str) -> list[LineAnnotation]:
+def read_lines_array(file_or_gs_path: str) -> npt.NDArray:
     """
     Read a set of lines from the given file, which should be in
-    'multiple annotation encoding' as defined in write_lines above.
+    'multiple annotation encoding' as defined in encode_lines above,
+    as a structured array of ``LINE_DTYPE``.
     """
-    data = read_bytes(file_or_gs_path)
-    lines: list[LineAnnotation] = []
-    if data is None or len(data) == 0:
-        return lines
-    with io.BytesIO(data) as buffer:
-        # first read the count
-        line_count = struct.unpack("<Q", buffer.read(8))[0]
+    return decode_lines(read_bytes(file_or_gs_path))
+
+
+def read_lines(file_or_gs_path: str) -> list[LineAnnotation]:
+    """
+    Read a set of lines from the given file, as a list of LineAnnotations.
+    """
+    return array_to_lines(read_lines_array(file_or_gs_path))
 
-        # then read the line data
-        for _ in range(line_count):
-            line = LineAnnotation.read(buffer)
-            lines.append(line)
 
-        # finally read the ids at the end of the buffer
-        for i in range(line_count):
-            line_id = struct.unpack("<Q", buffer.read(8))[0]
-            lines[i].id = line_id
-    return lines
+def _get_cloudfiles(dir_path: str, progress: bool = False) -> CloudFiles:
+    if "//" not in dir_path:
+        dir_path = "file://" + dir_path
+    return CloudFiles(dir_path, num_threads=ANNOTATION_IO_NUM_THREADS, progress=progress)
 
 
-def format_info(dimensions, lower_bound, upper_bound, spatial_data):
+def _chunk_file_name(cell: Sequence[int]) -> str:
+    x, y, z = cell
+    return f"{x}_{y}_{z}"
+
+
+def list_chunk_files(level_dir: str) -> list[str]:
+    """
+    List the names of the chunk files of one spatial level, in grid order, with a
+    single listing of the level directory.
+    """
+    try:
+        names = [
+            e for e in _get_cloudfiles(level_dir).list(flat=True) if _CHUNK_FILE_NAME_RE.match(e)
+        ]
+    except FileNotFoundError:
+        # Local levels have no directory until they are written to
+        return []
+    return sorted(names, key=lambda e: tuple(int(c) for c in e.split("_")))
+
+
+def read_chunk_files(
+    level_dir: str,
+    names: Sequence[str],
+    progress: bool = False,
+    relationships: Optional[Sequence[str]] = None,
+) -> list[npt.NDArray]:
+    """
+    Read the given chunk files of one spatial level concurrently, as structured arrays
+    of ``LINE_DTYPE`` in the same order.  Missing files read as empty arrays.
+    If ``relationships`` is given, the files are staged chunk files (see
+    ``encode_related_lines``), read as arrays of ``line_dtype(relationships)``.
+    """
+    if len(names) == 0:
+        return []
+    contents = _get_cloudfiles(level_dir, progress).get(list(names), return_dict=True)
+    assert isinstance(contents, dict)
+    if relationships is not None:
+        return [decode_related_lines(contents[name], relationships) for name in names]
+    return [decode_lines(contents[name]) for name in names]
+
+
+def write_chunk_files(
+    level_dir: str,
+    chunks: Sequence[tuple[str, Lines]],
+    progress: bool = False,
+    relationships: Optional[Sequence[str]] = None,
+):
+    """
+    Write the given (name, lines) chunk files of one spatial level concurrently.
+    If ``relationships`` is given, they are written as staged chunk files (see
+    ``encode_related_lines``).
+    """
+    if relationships is not None:
+        contents = (
+            (name, encode_related_lines(lines_to_array(lines), relationships))
+            for name, lines in chunks
+        )
+    else:
+        contents = ((name, encode_lines(lines)) for name, lines in chunks)
+    _get_cloudfiles(level_dir, progress).puts(
+        contents, cache_control=CACHE_CONTROL, total=len(chunks)
+    )
+
+
+def _shard_file_name(spec: ShardingSpecification, key: int) -> str:
+    return f"{spec.compute_shard_location(key).shard_number}.shard"
+
+
+def _decode_shard_chunk(spec: ShardingSpecification, data: bytes) -> bytes:
+    if spec.data_encoding != "raw":
+        return compression.decompress(data, spec.data_encoding)
+    return data
+
+
+def _decode_minishard_index(
+    spec: ShardingSpecification, data: bytes
+) -> tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
+    """
+    Decode a minishard index into the keys of its chunks, in increasing order, and
+    their [start, end) byte ranges within the shard file.
+    """
+    if spec.minishard_index_encoding != "raw":
+        data = compression.decompress(data, spec.minishard_index_encoding)
+    index = np.frombuffer(data, dtype="<u8").reshape(3, -1)
+    keys = np.cumsum(index[0])
+    # Each start offset is relative to the end of the previous chunk, and all offsets
+    # are relative to the end of the shard index
+    ends = np.cumsum(index[1] + index[2]) + np.uint64(spec.index_length())
+    return keys, ends - index[2], ends
+
+
+def _parse_shard_file(spec: ShardingSpecification, data: bytes) -> dict[int, bytes]:
+    index_length = spec.index_length()
+    shard_index = np.frombuffer(data, dtype="<u8", count=index_length // 8).reshape(-1, 2)
+    result = {}
+    for start, end in shard_index.tolist():
+        if start == end:
+            continue
+        keys, starts, ends = _decode_minishard_index(
+            spec, data[index_length + start : index_length + end]
+        )
+        for key, chunk_start, chunk_end in zip(keys.tolist(), starts.tolist(), ends.tolist()):
+            result[key] = _decode_shard_chunk(spec, data[chunk_start:chunk_end])
+    return result
+
+
+def _get_byte_ranges(
+    cf: CloudFiles, ranges: Sequence[tuple[str, int, int]]
+) -> dict[tuple[str, int, int], Optional[bytes]]:
+    results = cf.get([{"path": path, "start": start, "end": end} for path, start, end in ranges])
+    return {(e["path"], *e["byte_range"]): e["content"] for e in results}
+
+
+def list_shard_files(dir_path: str) -> list[str]:
+    """
+    List the names of the shard files of one sharded index (spatial level, by_id or
+    relationship).
+    """
+    try:
+        names = [
+            e for e in _get_cloudfiles(dir_path).list(flat=True) if _SHARD_FILE_NAME_RE.match(e)
+        ]
+    except FileNotFoundError:
+        # Local indices have no directory until they are written to
+        return []
+    return sorted(names)
+
+
+def read_shard_files(
+    dir_path: str, sharding: dict, names: Sequence[str], progress: bool = False
+) -> dict[str, dict[int, bytes]]:
+    """
+    Read the given shard files of one sharded index concurrently, returning the
+    (decoded) chunks of each by key.  Missing files read as having no chunks.
+    """
+    spec = ShardingSpecification.from_dict(sharding)
+    if len(names) == 0:
+        return {}
+    contents = _get_cloudfiles(dir_path, progress).get(list(names), return_dict=True)
+    assert isinstance(contents, dict)
+    return {
+        name: _parse_shard_file(spec, contents[name]) if contents[name] else {} for name in names
+    }
+
+
+def read_sharded_chunks(  # pylint: disable=too-many-locals
+    dir_path: str, sharding: dict, keys: Sequence[int], progress: bool = False
+) -> list[Optional[bytes]]:
+    """
+    Read the given chunks of one sharded index, in the same order, without reading
+    whole shard files: the shard indices, then the minishard indices, then the chunks
+    themselves are fetched as concurrent byte range reads.  Missing chunks read as None.
+    """
+    spec = ShardingSpecification.from_dict(sharding)
+    if len(keys) == 0:
+        return []
+    cf = _get_cloudfiles(dir_path, progress)
+    index_length = spec.index_length()
+    locations = [
+        (_shard_file_name(spec, key), spec.compute_shard_location(key).minishard_number)
+        for key in keys
+    ]
+
+    shard_indices = _get_byte_ranges(
+        cf, sorted({(name, 0, index_length) for name, _ in locations})
+    )
+    minishard_ranges = {}
+    for name, minishard_number in set(locations):
+        shard_index = shard_indices[(name, 0, index_length)]
+        if shard_index is None:
+            continue
+        start, end = np.frombuffer(shard_index, dtype="<u8").reshape(-1, 2)[minishard_number]
+        if start < end:
+            minishard_ranges[(name, minishard_number)] = (
+                name,
+                index_length + int(start),
+                index_length + int(end),
+            )
+    minishard_indices = {
+        byte_range: _decode_minishard_index(spec, content)
+        for byte_range, content in _get_byte_ranges(cf, sorted(minishard_ranges.values())).items()
+        if content is not None
+    }
+
+    chunk_ranges: list[Optional[tuple[str, int, int]]] = []
+    for key, location in zip(keys, locations):
+        byte_range = minishard_ranges.get(location)
+        if byte_range is None or byte_range not in minishard_indices:
+            chunk_ranges.append(None)
+            continue
+        chunk_keys, starts, ends = minishard_indices[byte_range]
+        pos = int(np.searchsorted(chunk_keys, np.uint64(key)))
+        if pos < len(chunk_keys) and chunk_keys[pos] == key:
+            chunk_ranges.append((location[0], int(starts[pos]), int(ends[pos])))
+        else:
+            chunk_ranges.append(None)
+    chunks = _get_byte_ranges(cf, sorted({e for e in chunk_ranges if e is not None}))
+    result: list[Optional[bytes]] = []
+    for byte_range in chunk_ranges:
+        content = None if byte_range is None else chunks[byte_range]
+        result.append(None if content is None else _decode_shard_chunk(spec, content))
+    return result
+
+
+def write_shard_files(
+    dir_path: str,
+    sharding: dict,
+    chunks_by_shard: dict[str, dict[int, bytes]],
+    progress: bool = False,
+):
+    """
+    Write the given shard files of one sharded index concurrently, from all of the
+    chunks (by key) that each should contain.  Shard files that should contain no
+    chunks are deleted.
+    """
+    spec = ShardingSpecification.from_dict(sharding)
+    cf = _get_cloudfiles(dir_path, progress)
+    to_write = [name for name, chunks in chunks_by_shard.items() if chunks]
+    cf.puts(
+        ((name, synthesize_shard_file(spec, chunks_by_shard[name])) for name in to_write),
+        cache_control=CACHE_CONTROL,
+        total=len(to_write),
+    )
+    cf.delete(sorted(name for name, chunks in chunks_by_shard.items() if not chunks))
+
+
+def write_sharded_index(
+    dir_path: str, sharding: dict, chunks: dict[int, bytes], progress: bool = False
+):
+    """
+    Write one sharded index from scratch, from all of the chunks (by key) that it
+    should contain.  Shard files left over from earlier writes are deleted.
+    """
+    spec = ShardingSpecification.from_dict(sharding)
+    chunks_by_shard: dict[str, dict[int, bytes]] = {
+        name: {} for name in list_shard_files(dir_path)
+    }
+    for key, content in chunks.items():
+        chunks_by_shard.setdefault(_shard_file_name(spec, key), {})[key] = content
+    logger.info(
+        f"Writing {len(chunks)} chunks to {len(chunks_by_shard)} shard files in {dir_path}"
+    )
+    write_shard_files(dir_path, sharding, chunks_by_shard, progress)
+
+
+def update_sharded_chunks(
+    dir_path: str,
+    sharding: dict,
+    keys: Sequence[int],
+    update: Callable[[int, Optional[bytes]], Optional[bytes]],
+    progress: bool = False,
+):
+    """
+    Read-modify-write the given chunks of one sharded index.  Each chunk is replaced
+    by ``update(key, old_content)`` (with None for missing chunks), or deleted if that
+    returns None.  As shard files cannot be updated in place, every shard file with
+    any of the given chunks is read and rewritten whole, ``ANNOTATION_IO_NUM_THREADS``
+    shard files at a time.  Concurrent updates of the same shard file lose chunks, so
+    there must be a single writer per index.
+    """
+    spec = ShardingSpecification.from_dict(sharding)
+    keys_by_shard = defaultdict(list)
+    for key in keys:
+        keys_by_shard[_shard_file_name(spec, key)].append(key)
+    names = sorted(keys_by_shard)
+    logger.info(f"Updating {len(keys)} chunks in {len(names)} shard files in {dir_path}")
+    for batch_start in range(0, len(names), ANNOTATION_IO_NUM_THREADS):
+        batch = names[batch_start : batch_start + ANNOTATION_IO_NUM_THREADS]
+        chunks_by_shard = read_shard_files(dir_path, sharding, batch, progress)
+        for name in batch:
+            chunks = chunks_by_shard[name]
+            for key in keys_by_shard[name]:
+                content = update(key, chunks.get(key))
+                if content is None:
+                    chunks.pop(key, None)
+                else:
+                    chunks[key] = content
+        write_shard_files(dir_path, sharding, chunks_by_shard, progress)
+
+
+def spatial_chunk_keys(cells: Sequence[Sequence[int]], grid_shape: Sequence[int]) -> list[int]:
+    """
+    Return the keys of the given chunks (by grid position) of a sharded spatial level,
+    i.e. their compressed Morton codes within the grid.
+    """
+    if len(cells) == 0:
+        return []
+    return compressed_morton_code(np.array(cells), list(grid_shape)).tolist()
+
+
+def relationship_key(relationship: str) -> str:
+    """
+    Return the key (subdirectory) of the index of the given relationship.
+    """
+    return f"rel_{relationship}"
+
+
+def by_id_chunks(lines: npt.NDArray, relationships: Sequence[str] = ()) -> dict[int, bytes]:
+    """
+    Return the chunks (by key) of the by_id index of the given lines of
+    ``line_dtype(relationships)``, which should have no duplicates.
+    """
+    return {
+        line_id: encode_line_by_id(line, relationships)
+        for line_id, line in zip(lines["id"].tolist(), lines)
+    }
+
+
+def relationship_chunks(lines: npt.NDArray, relationship: str) -> dict[int, bytes]:
+    """
+    Return the chunks (by key, i.e. segment id) of the index of the given relationship
+    of the given lines, which should have no duplicates.  Lines related to no
+    segment (0) are left out.
+    """
+    spatial_lines = strip_relationships(lines)
+    segment_ids = lines[relationship]
+    order = np.argsort(segment_ids, kind="stable")
+    segments, group_starts = np.unique(segment_ids[order], return_index=True)
+    return {
+        segment_id: encode_lines(spatial_lines[group])
+        for segment_id, group in zip(segments.tolist(), np.split(order, group_starts[1:]))
+        if segment_id != 0
+    }
+
+
+def format_info(
+    dimensions,
+    lower_bound,
+    upper_bound,
+    spatial_data,
+    sharding: Optional[dict] = None,
+    relationships: Sequence[str] = (),
+):
     spatial_json = "    " + ",\n        ".join([se.to_json() for se in spatial_data])
+    by_id: dict = {"key": BY_ID_KEY}
+    relationships_data: list[dict] = [
+        {"id": name, "key": relationship_key(name)} for name in relationships
+    ]
+    if sharding is not None:
+        by_id["sharding"] = sharding
+        for entry in relationships_data:
+            entry["sharding"] = sharding
     return f"""{{
     "@type" : "neuroglancer_annotations_v1",
     "annotation_type" : "LINE",
-    "by_id" : {{ "key" : "by_id" }},
+    "by_id" : {json.dumps(by_id)},
     "dimensions" : {str(dimensions).replace("'", '"')},
     "lower_bound" : {list(lower_bound)},
     "properties" : [],
-    "relationships" : [],
+    "relationships" : {json.dumps(relationships_data)},
     "spatial" : [
     {spatial_json}
     ],
@@ -281,7 +943,15 @@ def format_info(dimensions, lower_bound, upper_bound, spatial_data):
 """
 
 
-def write_info(dir_path, dimensions, lower_bound, upper_bound, spatial_data):
+def write_info(
+    dir_path,
+    dimensions,
+    lower_bound,
+    upper_bound,
+    spatial_data,
+    sharding: Optional[dict] = None,
+    relationships: Sequence[str] = (),
+):
     """
     Write out the info (JSON) file describing a precomputed annotation file
     into the given directory.
@@ -291,9 +961,13 @@ def write_info(dir_path, dimensions, lower_bound, upper_bound, spatial_data):
     :lower_bound: start of the data volume (in voxels)
     :upper_bound: end of the data volume (in voxels)
     :spatial_data: list of SpatialEntry objects
+    :sharding: sharding specification of the by_id and relationship indices, if sharded
+    :relationships: names of the relationships, e.g. ["pre_segment", "post_segment"]
     """
     file_path = path_join(dir_path, "info")  # (note: not info.json as you would expect)
-    info_content = format_info(dimensions, lower_bound, upper_bound, spatial_data)
+    info_content = format_info(
+        dimensions, lower_bound, upper_bound, spatial_data, sharding, relationships
+    )
     write_bytes(file_path, info_content.encode("utf-8"))
 
 
@@ -309,32 +983,67 @@ def parse_info(info_json):
     lower_bound = data["lower_bound"]
     upper_bound = data["upper_bound"]
     spatial_data = tuple(
-        SpatialEntry(entry["chunk_size"], entry["grid_shape"], entry["key"], entry["limit"])
+        SpatialEntry(
+            entry["chunk_size"],
+            entry["grid_shape"],
+            entry["key"],
+            entry["limit"],
+            entry.get("sharding"),
+        )
         for entry in data["spatial"]
     )
 
     return dimensions, lower_bound, upper_bound, spatial_data
 
 
-def read_info(dir_path):
+def parse_info_indices(info_json) -> tuple[Optional[dict], list[str]]:
     """
-    Read the info file within the given directory, and return:
+    Parse the given info file (in JSON format), and return the sharding specification
+    of its by_id index (None if unsharded) and the names of its relationships.
+    """
+    data = json.loads(info_json)
+    sharding = data.get("by_id", {}).get("sharding")
+    return sharding, [entry["id"] for entry in data.get("relationships", [])]
 
-     dimensions (dict), lower_bound, upper_bound, spatial_data (tuple of SpatialEntry)
 
-    If the file is empty or does not exist, return (None, None, None, None)
-    """
+def _read_info_json(dir_path) -> Optional[str]:
     file_path = path_join(dir_path, "info")  # (note: not info.json as you would expect)
     try:
         data = read_bytes(file_path)
     except NotADirectoryError:
         data = None
     if data is None or len(data) == 0:
+        return None
+    return data.decode("utf-8")
+
+
+def read_info(dir_path):
+    """
+    Read the info file within the given directory, and return:
+
+     dimensions (dict), lower_bound, upper_bound, spatial_data (tuple of SpatialEntry)
+
+    If the file is empty or does not exist, return (None, None, None, None)
+    """
+    info_json = _read_info_json(dir_path)
+    if info_json is None:
         return (None, None, None, None)
-    return parse_info(data.decode("utf-8"))
+    return parse_info(info_json)
 
 
-def read_data(dir_path, spatial_entry):
+def read_info_indices(dir_path) -> tuple[Optional[dict], list[str]]:
+    """
+    Read the info file within the given directory, and return the sharding
+    specification of its by_id index (None if unsharded) and the names of its
+    relationships.  If the file is empty or does not exist, return (None, []).
+    """
+    info_json = _read_info_json(dir_path)
+    if info_json is None:
+        return (None, [])
+    return parse_info_indices(info_json)
+
+
+def read_data(dir_path, spatial_entry, progress: bool = False):
     """
     Read all the line annotations in the given precomputed file hierarchy
     which are under the given spatial entry.  Normally this would be the
@@ -342,78 +1051,102 @@ def read_data(dir_path, spatial_entry):
     the only one guaranteed to contain all the data.  But it's up to the
     caller; if you really want to read from some other chunk size, feel free.
     """
-    se = spatial_entry
-    result = []
-    for x in range(0, se.grid_shape[0]):
-        for y in range(0, se.grid_shape[1]):
-            for z in range(0, se.grid_shape[2]):
-                level_dir = path_join(dir_path, se.key)
-                anno_file_path = path_join(level_dir, f"{x}_{y}_{z}")
-                result += read_lines(anno_file_path)
-    return result
+    level_dir = path_join(dir_path, spatial_entry.key)
+    if spatial_entry.sharding is not None:
+        names = list_shard_files(level_dir)
+        logger.info(f"Reading {len(names)} shard files from {level_dir}")
+        chunks_by_shard = read_shard_files(level_dir, spatial_entry.sharding, names, progress)
+        chunks = [
+            decode_lines(content) for name in names for content in chunks_by_shard[name].values()
+        ]
+    else:
+        names = list_chunk_files(level_dir)
+        logger.info(f"Reading {len(names)} chunk files from {level_dir}")
+        chunks = read_chunk_files(level_dir, names, progress)
+    return np.concatenate([np.empty(0, dtype=LINE_DTYPE)] + chunks)
 
 
-# pylint: disable=too-many-locals,too-many-nested-blocks,cell-var-from-loop
-def subdivide(data, bounds: VolumetricIndex, chunk_sizes, write_to_dir=None, levels_to_write=None):
+def delete_tree(dir_path: str):
+    """
+    Delete all files under the given directory (local or GCS path).
+    """
+    path = dir_path
+    if "//" not in path:
+        path = "file://" + path
+    cf = CloudFiles(path)
+    cf.delete(cf.list())
+    if path.startswith("file://"):
+        # also delete the empty directories (which sadly CloudFiles cannot do)
+        local_path = path[len("file://") :]
+        for root, dirs, _ in os.walk(local_path, topdown=False):
+            for directory in dirs:
+                os.rmdir(os.path.join(root, directory))
+        if os.path.isdir(local_path):
+            os.rmdir(local_path)
+
+
+def _write_level(
+    level_dir: str,
+    data: npt.NDArray,
+    cells: list[tuple[tuple, npt.NDArray]],
+    grid_shape: Sequence[int],
+    sharding: Optional[dict] = None,
+):
+    """
+    Write the chunk files (or shard files, if ``sharding`` is given) of one spatial
+    level, for the given non-empty chunks (as returned by ``bin_lines``).  Files left
+    over from earlier writes that are now empty are deleted.
+    """
+    if sharding is not None:
+        keys = spatial_chunk_keys([cell for cell, _ in cells], grid_shape)
+        write_sharded_index(
+            level_dir,
+            sharding,
+            {key: encode_lines(data[line_indices]) for key, (_, line_indices) in zip(keys, cells)},
+        )
+        return
+    names = [_chunk_file_name(cell) for cell, _ in cells]
+    stale = set(list_chunk_files(level_dir)) - set(names)
+    logger.info(f"Writing {len(names)} chunk files to {level_dir}")
+    write_chunk_files(
+        level_dir, [(name, data[line_indices]) for name, (_, line_indices) in zip(names, cells)]
+    )
+    _get_cloudfiles(level_dir).delete(sorted(stale))
+
+
+def subdivide(
+    data: Lines,
+    bounds: VolumetricIndex,
+    chunk_sizes,
+    write_to_dir=None,
+    levels_to_write=None,
+    sharding: Optional[dict] = None,
+):
     """
     Subdivide the given data and bounds into chunks and subchunks of
     arbitrary depth, per the given chunk_sizes.  Return a list of
     SpatialEntry objects suitable for creating the info file.
     If write_to_dir is not None, then also write out the binary
-    files ('multiple annotation encoding') for each chunk under
+    files ('multiple annotation encoding') for each non-empty chunk under
     subdirectories named with the appropriate keys, for all levels
-    specified (by number) in levels_to_write (defaults to all).
+    specified (by number) in levels_to_write (defaults to all).  If sharding
+    is given, the chunks are written to shard files instead.
     """
+    data = strip_relationships(lines_to_array(data))
     if levels_to_write is None:
         levels_to_write = range(0, len(chunk_sizes))
     spatial_entries = []
     bounds_size = bounds.shape
     for level, chunk_size_seq in enumerate(chunk_sizes):
         chunk_size: Vec3D = Vec3D(*chunk_size_seq)
-        limit = 0
         grid_shape = ceil(bounds_size / chunk_size)
         logger.info(f"subdividing {bounds} by {chunk_size}, for grid_shape {grid_shape}")
         level_key = f"spatial{level}"
-        # total_qty = grid_shape[0] * grid_shape[1] * grid_shape[2]
-        qty_done = 0
-        for x in range(grid_shape[0]):
-            x_start = bounds.start[0] + x * chunk_size[0]
-            x_end = x_start + chunk_size[0]
-            x_idx = VolumetricIndex.from_coords(
-                (x_start, bounds.start[1], bounds.start[2]),
-                (x_end, bounds.stop[1], bounds.stop[2]),
-                bounds.resolution,
-            )
-            data_within_x = list(filter(lambda d: d.in_bounds(x_idx), data))
-            for y in range(grid_shape[1]):
-                y_start = bounds.start[1] + y * chunk_size[1]
-                y_end = y_start + chunk_size[1]
-                y_idx = VolumetricIndex.from_coords(
-                    (x_start, y_start, bounds.start[2]),
-                    (x_end, y_end, bounds.stop[2]),
-                    bounds.resolution,
-                )
-                data_within_xy = list(filter(lambda d: d.in_bounds(y_idx), data_within_x))
-                for z in range(grid_shape[2]):
-                    qty_done += 1
-                    chunk_start = bounds.start + Vec3D(x, y, z) * chunk_size
-                    chunk_end = chunk_start + chunk_size
-                    chunk_bounds = VolumetricIndex.from_coords(
-                        chunk_start, chunk_end, bounds.resolution
-                    )
-                    # pylint: disable=cell-var-from-loop
-                    chunk_data: Sequence[LineAnnotation] = list(
-                        filter(lambda d: d.in_bounds(chunk_bounds), data_within_xy)
-                    )
-                    # logger.info(f'spatial{level}/{x}_{y}_{z} contains {len(chunk_data)} lines')
-                    limit = max(limit, len(chunk_data))
-                    if write_to_dir is not None and level in levels_to_write:
-                        level_dir = path_join(write_to_dir, level_key)
-                        if not os.path.exists(level_dir):
-                            os.makedirs(level_dir)
-                        anno_file_path = path_join(level_dir, f"{x}_{y}_{z}")
-                        write_lines(anno_file_path, chunk_data)
-        spatial_entries.append(SpatialEntry(chunk_size, grid_shape, level_key, limit))
+        cells = bin_lines(data, bounds, chunk_size)
+        limit = max((len(line_indices) for _, line_indices in cells), default=0)
+        if write_to_dir is not None and level in levels_to_write:
+            _write_level(path_join(write_to_dir, level_key), data, cells, grid_shape, sharding)
+        spatial_entries.append(SpatialEntry(chunk_size, grid_shape, level_key, limit, sharding))
 
     return spatial_entries
 
@@ -431,6 +1164,13 @@ class AnnotationLayer:
     each subdirectory, there is a binary file for each chunk, named by its position
     within the grid, e.g. "1_2_0".  This class manages all that so you shouldn't
     have to worry about it.
+
+    Sharded layers instead store each subdirectory as a few shard files (per
+    the "neuroglancer_uint64_sharded_v1" format), and also have a "by_id"
+    index of every annotation, and an index of the annotations related to each
+    segment for each relationship (e.g. "rel_pre_segment").  As shard files can
+    only be rewritten whole, writes to the lowest level are staged as unsharded
+    chunk files (in "unsharded"), from which post-processing builds all of these.
     """
 
     def __init__(
@@ -438,6 +1178,8 @@ class AnnotationLayer:
         path: str,
         index: Optional[VolumetricIndex] = None,
         chunk_sizes: Optional[Sequence[Sequence[int]]] = None,
+        sharding: Optional[dict] = None,
+        relationships: Optional[Sequence[str]] = None,
     ):
         """
         Initialize an AnnotationLayer.
@@ -446,14 +1188,20 @@ class AnnotationLayer:
         :param index: bounding box and resolution defining volume containing the data
         :param chunk_sizes: list of 3-element tuples/lists defining chunk sizes,
             in voxels (defaults to a single chunk containing the entire bounds)
+        :param sharding: "neuroglancer_uint64_sharded_v1" sharding specification; if
+            given, all the indices are sharded, and the by_id and relationship indices
+            are written too.
+        :param relationships: names of the relationships of the annotations, e.g.
+            ["pre_segment", "post_segment"]; requires sharding.
 
         Note that index may be omitted ONLY if this is an existing file, in which case
-        it will be inferred from the info file on disk.  But chunk_sizes may be omitted
-        even for new files; in this case, the chunk size will be set to the full bounds
-        (so you get only one spatial level).
+        it (and the sharding and relationships) will be inferred from the info file on
+        disk.  But chunk_sizes may be omitted even for new files; in this case, the
+        chunk size will be set to the full bounds (so you get only one spatial level).
         """
         assert path, "path parameter is required"
         if index is None:
+            sharding, relationships = read_info_indices(path)
             dims, lower_bound, upper_bound, spatial_entries = read_info(path)
             if dims is None:
                 raise ValueError("index is required when file does not exist")  # pragma: no cover
@@ -470,14 +1218,24 @@ class AnnotationLayer:
 
         if chunk_sizes is None:
             chunk_sizes = [tuple(index.shape)]
+        if relationships is None:
+            relationships = []
+        if relationships and sharding is None:
+            raise ValueError("relationships are only supported for sharded layers")
+        reserved = {"id", "start", "end"} & set(relationships)
+        if reserved:
+            raise ValueError(f"relationship names {sorted(reserved)} are reserved")
         self.path = os.path.expanduser(path)
         self.index = index
         self.chunk_sizes = chunk_sizes
+        self.sharding = sharding
+        self.relationships = list(relationships)
 
     def __repr__(self):
         return (
             f"AnnotationLayer(path='{self.path}', index={self.index}, "
-            f"chunk_sizes={self.chunk_sizes})"
+            f"chunk_sizes={self.chunk_sizes}, sharding={self.sharding}, "
+            f"relationships={self.relationships})"
         )
 
     def exists(self) -> bool:
@@ -495,18 +1253,7 @@ class AnnotationLayer:
         """
         Completely delete this precomputed annotation file.
         """
-        # Delete all files under our path
-        path = self.path
-        if "//" not in path:
-            path = "file://" + path
-        cf = CloudFiles(path)
-        cf.delete(cf.list())
-        if path.startswith("file://"):
-            # also delete the empty directories (which sadly CloudFiles cannot do)
-            local_path = path[len("file://") :]
-            for root, dirs, _ in os.walk(local_path, topdown=False):
-                for directory in dirs:
-                    os.rmdir(os.path.join(root, directory))
+        delete_tree(self.path)
 
     def clear(self):
         """
@@ -533,7 +1280,9 @@ class AnnotationLayer:
             grid_shape = ceil(bounds_size / chunk_size)
             logger.info(f"subdividing {bounds_size} by {chunk_size}, for grid_shape {grid_shape}")
             level_key = f"spatial{level}"
-            result.append(SpatialEntry(chunk_size, grid_shape, level_key, limit_value))
+            result.append(
+                SpatialEntry(chunk_size, grid_shape, level_key, limit_value, self.sharding)
+            )
         return result
 
     def write_info_file(self, spatial_data: Optional[Sequence[SpatialEntry]] = None):
@@ -553,33 +1302,51 @@ class AnnotationLayer:
             lower_bound=self.index.start,
             upper_bound=self.index.stop,
             spatial_data=spatial_data,
+            sharding=self.sharding,
+            relationships=self.relationships,
         )
 
-    def write_annotations(
+    def write_annotations(  # pylint: disable=too-many-locals
         self,
-        annotations: Sequence[LineAnnotation],
+        annotations: Lines,
         annotation_resolution: Optional[Vec3D] = None,
         all_levels: bool = True,
         clearing_bbox: Optional[BBox3D] = None,
+        progress: bool = False,
     ):
         """
         Write a set of line annotations to the file, adding to any already there.
 
-        :param annotations: sequence of LineAnnotations to add.
-        :param annotation_resolution: resolution of given LineAnnotation coordinates;
+        :param annotations: structured array of ``LINE_DTYPE`` (or of
+            ``line_dtype(self.relationships)`` for layers with relationships), or
+            sequence of LineAnnotations, to add.
+        :param annotation_resolution: resolution of given annotation coordinates;
         if not specified, assumes native coordinates (i.e. self.index.resolution)
         :param all_levels: if true, write to all spatial levels (chunk sizes).
             If false, write only to the lowest level (smallest chunks).
         :param clearing_bbox: if given, clear any existing data within these bounds.
+            For sharded layers, the annotations cleared from the lowest level are also
+            removed from the by_id and relationship indices.
+        :param progress: whether to show the progress of reading and writing chunk files.
+
+        For sharded layers, writing only to the lowest level writes to its staged
+        chunk files, and none of the sharded indices is updated until the layer is
+        post-processed (see ``post_process`` and ``post_process_annotation_layer_flow``).
+        This is how sharded layers should be written by parallel tasks.  Writing to all
+        levels also read-modify-writes the shard files of every index, most of which
+        any write touches, so it must not run concurrently with any other write.
         """
-        if not annotations:
+        if len(annotations) == 0:
             logger.info("write_annotations called with 0 annotations to write")
             return
+        annotations = lines_to_array(annotations)
+        missing = [e for e in self.relationships if e not in (annotations.dtype.names or ())]
+        if missing:
+            raise ValueError(f"annotations have no fields for the relationships {missing}")
         if annotation_resolution and annotation_resolution != self.index.resolution:
-            annotations = [
-                x.with_converted_coordinates(annotation_resolution, self.index.resolution)
-                for x in annotations
-            ]
+            annotations = convert_line_coordinates(
+                annotations, annotation_resolution, self.index.resolution
+            )
         qty_levels = len(self.chunk_sizes)
         levels = range(0, qty_levels) if all_levels else [qty_levels - 1]
         bounds_size = self.index.shape
@@ -592,140 +1359,193 @@ class AnnotationLayer:
                 self.index.resolution,
             )
 
+        spatial_annotations = strip_relationships(annotations)
+        if self.sharding is not None:
+            self._update_chunk_files(
+                path_join(self.path, UNSHARDED_KEY),
+                bin_lines(spatial_annotations, self.index, Vec3D(*self.chunk_sizes[-1])),
+                select_relationships(annotations, self.relationships),
+                clearing_idx,
+                progress,
+                self.relationships,
+            )
+            if not all_levels:
+                return
+
+        cleared_ids: set[int] = set()
         for level in levels:
-            limit = 0
             chunk_size = Vec3D(*self.chunk_sizes[level])
             grid_shape = ceil(bounds_size / chunk_size)
             logger.info(f"subdividing {bounds_size} by {chunk_size}, for grid_shape {grid_shape}")
             level_key = f"spatial{level}"
             level_dir = path_join(self.path, level_key)
-            if is_local_filesystem(self.path):
-                os.makedirs(level_dir, exist_ok=True)
-
-            # Yes, there are terser ways to do this 3D iteration in Python,
-            # but they result in having to filter the full set of annotations
-            # for every chunk, which turns out to be very slow.  Much faster
-            # is to do one level at a time, filtering at each level, so that
-            # the final filters don't have to wade through as much data.
-            for x in range(grid_shape[0]):
-                logger.debug(f"x = {x} of {grid_shape[0]}")
-                split_by_x = VolumetricIndex.from_coords(
-                    (
-                        self.index.start[0] + x * chunk_size[0],
-                        self.index.start[1],
-                        self.index.start[2],
-                    ),
-                    (
-                        self.index.start[0] + (x + 1) * chunk_size[0],
-                        self.index.stop[1],
-                        self.index.stop[2],
-                    ),
-                    self.index.resolution,
-                )
-                # pylint: disable=cell-var-from-loop
-                split_data_by_x: list[LineAnnotation] = list(
-                    filter(lambda d: d.in_bounds(split_by_x), annotations)
+
+            cells = bin_lines(spatial_annotations, self.index, chunk_size)
+            if self.sharding is not None:
+                level_cleared_ids = self._update_sharded_level(
+                    level_dir, grid_shape, cells, spatial_annotations, clearing_idx, progress
                 )
-                logger.debug(f":  {len(split_data_by_x)} lines")
-                if not split_data_by_x:
-                    continue
-                for y in range(grid_shape[1]):
-                    logger.debug(f"    y = {y} of {grid_shape[1]}")
-                    split_by_y = VolumetricIndex.from_coords(
-                        (
-                            self.index.start[0] + x * chunk_size[0],
-                            self.index.start[1] + y * chunk_size[1],
-                            self.index.start[2],
-                        ),
-                        (
-                            self.index.start[0] + (x + 1) * chunk_size[0],
-                            self.index.start[1] + (y + 1) * chunk_size[1],
-                            self.index.stop[2],
-                        ),
-                        self.index.resolution,
-                    )
-                    # pylint: disable=cell-var-from-loop
-                    split_data_by_y: list[LineAnnotation] = list(
-                        filter(lambda d: d.in_bounds(split_by_y), split_data_by_x)
-                    )
-                    logger.debug(f":  {len(split_data_by_y)} lines")
-                    if not split_data_by_y:
-                        continue
-                    for z in range(grid_shape[2]):
-                        split_by_z = VolumetricIndex.from_coords(
-                            (
-                                self.index.start[0] + x * chunk_size[0],
-                                self.index.start[1] + y * chunk_size[1],
-                                self.index.start[2] + z * chunk_size[2],
-                            ),
-                            (
-                                self.index.start[0] + (x + 1) * chunk_size[0],
-                                self.index.start[1] + (y + 1) * chunk_size[1],
-                                self.index.start[2] + (z + 1) * chunk_size[2],
-                            ),
-                            self.index.resolution,
-                        )
-                        # Sanity check: manually compute the single-chunk bounds.
-                        # It should be equal to split_by_z.
-                        chunk_start = self.index.start + Vec3D(x, y, z) * chunk_size
-                        chunk_end = chunk_start + chunk_size
-                        chunk_bounds = VolumetricIndex.from_coords(
-                            chunk_start, chunk_end, self.index.resolution
-                        )
-                        assert chunk_bounds == split_by_z
-                        # pylint: disable=cell-var-from-loop
-                        chunk_data: list[LineAnnotation] = list(
-                            filter(lambda d: d.in_bounds(chunk_bounds), split_data_by_y)
-                        )
-                        if not chunk_data:
-                            continue
-                        anno_file_path = path_join(level_dir, f"{x}_{y}_{z}")
-                        old_data = read_lines(anno_file_path)
-                        if clearing_idx:
-                            old_data = list(
-                                filter(lambda d: not d.in_bounds(clearing_idx), old_data)
-                            )
-                        chunk_data += old_data
-                        limit = max(limit, len(chunk_data))
-                        write_lines(anno_file_path, chunk_data)
+                if level == qty_levels - 1:
+                    cleared_ids = level_cleared_ids
+                continue
+            self._update_chunk_files(level_dir, cells, spatial_annotations, clearing_idx, progress)
+
+        if self.sharding is not None:
+            self._update_by_id(annotations, cleared_ids, progress)
+
+    def _update_chunk_files(  # pylint: disable=too-many-arguments
+        self,
+        level_dir: str,
+        cells: list[tuple[tuple, npt.NDArray]],
+        annotations: npt.NDArray,
+        clearing_idx: Optional[VolumetricIndex],
+        progress: bool,
+        relationships: Optional[Sequence[str]] = None,
+    ):
+        """
+        Add the given lines to the given chunk files (as returned by ``bin_lines``) of
+        one unsharded spatial level, or of the staged lowest level if ``relationships``
+        is given.
+        """
+        logger.info(f"Updating {len(cells)} chunk files in {level_dir}")
+        for batch_start in range(0, len(cells), ANNOTATION_IO_BATCH_SIZE):
+            batch = cells[batch_start : batch_start + ANNOTATION_IO_BATCH_SIZE]
+            names = [_chunk_file_name(cell) for cell, _ in batch]
+            chunks = []
+            for name, (_, line_indices), old_data in zip(
+                names, batch, read_chunk_files(level_dir, names, progress, relationships)
+            ):
+                if clearing_idx:
+                    old_data = old_data[~lines_in_bounds(old_data, clearing_idx)]
+                chunks.append((name, np.concatenate([annotations[line_indices], old_data])))
+            write_chunk_files(level_dir, chunks, progress, relationships)
+
+    def _update_sharded_level(  # pylint: disable=too-many-arguments
+        self,
+        level_dir: str,
+        grid_shape: Sequence[int],
+        cells: list[tuple[tuple, npt.NDArray]],
+        annotations: npt.NDArray,
+        clearing_idx: Optional[VolumetricIndex],
+        progress: bool,
+    ) -> set[int]:
+        """
+        Add the given lines to the given chunks (as returned by ``bin_lines``) of one
+        sharded spatial level, and return the ids of the existing lines cleared from them.
+        """
+        assert self.sharding is not None
+        keys = spatial_chunk_keys([cell for cell, _ in cells], grid_shape)
+        line_indices_by_key = dict(zip(keys, (line_indices for _, line_indices in cells)))
+        cleared_ids: set[int] = set()
+
+        def update(key: int, content: Optional[bytes]) -> bytes:
+            old_data = decode_lines(content)
+            if clearing_idx:
+                cleared = lines_in_bounds(old_data, clearing_idx)
+                cleared_ids.update(old_data["id"][cleared].tolist())
+                old_data = old_data[~cleared]
+            return encode_lines(np.concatenate([annotations[line_indices_by_key[key]], old_data]))
+
+        update_sharded_chunks(level_dir, self.sharding, keys, update, progress)
+        return cleared_ids
+
+    def _update_by_id(self, annotations: npt.NDArray, cleared_ids: set[int], progress: bool):
+        """
+        Write the given lines to the by_id index, and remove the given cleared lines
+        (unless rewritten) from it.  The relationship indices are updated to match.
+        """
+        assert self.sharding is not None
+        new_indices = {line_id: i for i, line_id in enumerate(annotations["id"].tolist())}
+        removed_ids = cleared_ids - new_indices.keys()
+        # Segments related to the lines being replaced or removed, whose entries may
+        # still list them
+        old_segment_ids: dict[str, set[int]] = {name: set() for name in self.relationships}
+
+        def update(key: int, content: Optional[bytes]) -> Optional[bytes]:
+            if content is not None:
+                old_line = decode_line_by_id(key, content, self.relationships)
+                for name in self.relationships:
+                    old_segment_ids[name].add(int(old_line[name]))
+            if key in removed_ids:
+                return None
+            return encode_line_by_id(annotations[new_indices[key]], self.relationships)
+
+        stale_ids = sorted(new_indices.keys() | removed_ids)
+        update_sharded_chunks(
+            path_join(self.path, BY_ID_KEY), self.sharding, stale_ids, update, progress
+        )
+        for name in self.relationships:
+            self._update_relationship(
+                name,
+                annotations,
+                np.array(stale_ids, dtype=np.uint64),
+                old_segment_ids[name],
+                progress,
+            )
+
+    def _update_relationship(  # pylint: disable=too-many-arguments
+        self,
+        relationship: str,
+        annotations: npt.NDArray,
+        stale_ids: npt.NDArray,
+        old_segment_ids: set[int],
+        progress: bool,
+    ):
+        """
+        Update the index of the given relationship with the given lines, first removing
+        the lines with the given stale ids from the entries of the given segments.
+        """
+        assert self.sharding is not None
+        spatial_annotations = strip_relationships(annotations)
+        segment_ids = annotations[relationship]
+        order = np.argsort(segment_ids, kind="stable")
+        segments, group_starts = np.unique(segment_ids[order], return_index=True)
+        groups = dict(zip(segments.tolist(), np.split(order, group_starts[1:])))
+
+        def update(key: int, content: Optional[bytes]) -> Optional[bytes]:
+            old_data = decode_lines(content)
+            data = np.concatenate(
+                [
+                    spatial_annotations[groups.get(key, [])],
+                    old_data[~np.isin(old_data["id"], stale_ids)],
+                ]
+            )
+            return encode_lines(data) if len(data) > 0 else None
+
+        update_sharded_chunks(
+            path_join(self.path, relationship_key(relationship)),
+            self.sharding,
+            sorted((groups.keys() | old_segment_ids) - {0}),
+            update,
+            progress,
+        )
 
     def read_all(
         self,
         spatial_level: int = -1,
         filter_duplicates: bool = True,
         annotation_resolution: Optional[Vec3D] = None,
-    ):
+        progress: bool = False,
+    ) -> npt.NDArray:
         """
-        Read and return all annotations from the given spatial level.
+        Read and return all annotations from the given spatial level, as a
+        structured array of ``LINE_DTYPE`` (see ``array_to_lines`` to get
+        LineAnnotations instead).
         Note that an annotation that spans chunk boundaries will appear in
         multiple chunks.  In that case, the behavior of this function is
         determined by filter_duplicates: if filter_duplicates is True,
         then no annotation (by id) will appear in the results more than
         once, even if it spans chunk boundaries; but if it is False, then
         the same annotation may appear multiple times.
+        Only the chunk files that exist are read, as found by listing the level.
         """
         level = spatial_level if spatial_level >= 0 else len(self.chunk_sizes) + spatial_level
-        result = []
-        bounds_size = self.index.shape
-        chunk_size = Vec3D(*self.chunk_sizes[level])
-        grid_shape = ceil(bounds_size / chunk_size)
-        level_key = f"spatial{level}"
-        level_dir = path_join(self.path, level_key)
-        # total_chunks = grid_shape[0] * grid_shape[1] * grid_shape[2]
-        chunks_read = 0
-        for x in range(0, grid_shape[0]):
-            for y in range(0, grid_shape[1]):
-                for z in range(0, grid_shape[2]):
-                    chunks_read += 1
-                    anno_file_path = path_join(level_dir, f"{x}_{y}_{z}")
-                    result += read_lines(anno_file_path)
+        lines = read_data(self.path, self.get_spatial_entries()[level], progress)
         if filter_duplicates:
-            result_dict = {line.id: line for line in result}
-            result = list(result_dict.values())
+            lines = unique_lines(lines)
         if annotation_resolution:
-            for line in result:
-                line.convert_coordinates(self.index.resolution, annotation_resolution)
-        return result
+            lines = convert_line_coordinates(lines, self.index.resolution, annotation_resolution)
+        return lines
 
     def find_max_size(self, spatial_level: int = -1):
         """
@@ -737,6 +1557,18 @@ class AnnotationLayer:
         grid_shape = ceil(bounds_size / chunk_size)
         level_key = f"spatial{level}"
         level_dir = path_join(self.path, level_key)
+        if self.sharding is not None:
+            chunks_by_shard = read_shard_files(
+                level_dir, self.sharding, list_shard_files(level_dir)
+            )
+            return max(
+                (
+                    line_count_from_file_size(len(content))
+                    for chunks in chunks_by_shard.values()
+                    for content in chunks.values()
+                ),
+                default=0,
+            )
         if "//" not in level_dir:
             level_dir = "file://" + level_dir
         cf = CloudFiles(level_dir)
@@ -751,21 +1583,27 @@ class AnnotationLayer:
         return line_count_from_file_size(max_file_size)
 
     def read_in_bounds(
-        self, roi: BBox3D, annotation_resolution: Optional[Vec3D] = None, strict: bool = False
-    ):
+        self,
+        roi: BBox3D,
+        annotation_resolution: Optional[Vec3D] = None,
+        strict: bool = False,
+        progress: bool = False,
+        spatial_level: int = -1,
+    ) -> npt.NDArray:
         """
         Return all annotations within the given bounds (index).
 
         :param roi: region of interest
-        :param annotation_resolution: resolution of returned LineAnnotation coordinates;
+        :param annotation_resolution: resolution of returned annotation coordinates;
         if not specified, uses native coordinates (i.e. self.index.resolution)
         :param strict: if True, return ONLY annotations entirely within the given bounds;
         if False, then you may also get some annotations that are partially or entirely
         outside the given bounds
-        :return: list of LineAnnotation objects
+        :param progress: whether to show the progress of reading chunk files
+        :param spatial_level: spatial level to read from; defaults to the lowest level
+        :return: structured array of ``LINE_DTYPE``
         """
-        level = len(self.chunk_sizes) - 1
-        result = []
+        level = spatial_level if spatial_level >= 0 else len(self.chunk_sizes) + spatial_level
         bounds_size_vx = self.index.shape
         chunk_size_vx = Vec3D(*self.chunk_sizes[level])
         grid_shape = ceil(bounds_size_vx / chunk_size_vx)
@@ -778,21 +1616,118 @@ class AnnotationLayer:
 
         start_chunk = (roi_index.start - self.index.start) // chunk_size_vx
         end_chunk = (roi_index.stop - self.index.start) // chunk_size_vx
-        for x in range(max(0, start_chunk[0]), min(grid_shape[0], end_chunk[0] + 1)):
-            for y in range(max(0, start_chunk[1]), min(grid_shape[1], end_chunk[1] + 1)):
-                for z in range(max(0, start_chunk[2]), min(grid_shape[2], end_chunk[2] + 1)):
-                    anno_file_path = path_join(level_dir, f"{x}_{y}_{z}")
-                    result += read_lines(anno_file_path)
+        cells = list(
+            itertools.product(
+                *(
+                    range(max(0, start_chunk[i]), min(grid_shape[i], end_chunk[i] + 1))
+                    for i in range(3)
+                )
+            )
+        )
+        if self.sharding is not None:
+            keys = spatial_chunk_keys(cells, grid_shape)
+            chunks = [
+                decode_lines(content)
+                for content in read_sharded_chunks(level_dir, self.sharding, keys, progress)
+            ]
+        else:
+            names = [_chunk_file_name(cell) for cell in cells]
+            chunks = read_chunk_files(level_dir, names, progress)
+        lines = np.concatenate([np.empty(0, dtype=LINE_DTYPE)] + chunks)
         if strict:
-            result = list(
-                filter(lambda x: roi_index.contains(x.start) and roi_index.contains(x.end), result)
+            lines = lines[
+                points_in_bounds(lines["start"], roi_index)
+                & points_in_bounds(lines["end"], roi_index)
+            ]
+        lines = unique_lines(lines)
+        if annotation_resolution:
+            lines = convert_line_coordinates(lines, self.index.resolution, annotation_resolution)
+        return lines
+
+    def read_by_id(
+        self,
+        ids: Sequence[int],
+        annotation_resolution: Optional[Vec3D] = None,
+        progress: bool = False,
+    ) -> npt.NDArray:
+        """
+        Return the annotations with the given ids, looked up in the by_id index (which
+        only sharded layers have).  Ids that are not found are skipped.
+
+        :param ids: ids of the annotations to return
+        :param annotation_resolution: resolution of returned annotation coordinates;
+        if not specified, uses native coordinates (i.e. self.index.resolution)
+        :param progress: whether to show the progress of reading the index
+        :return: structured array of ``line_dtype(self.relationships)``, in the order
+            of the given ids
+        """
+        if self.sharding is None:
+            raise ValueError("only sharded layers have a by_id index")
+        ids = [int(e) for e in ids]
+        contents = read_sharded_chunks(
+            path_join(self.path, BY_ID_KEY), self.sharding, ids, progress
+        )
+        found = [(e, content) for e, content in zip(ids, contents) if content is not None]
+        lines = np.empty(len(found), dtype=line_dtype(self.relationships))
+        for i, (line_id, content) in enumerate(found):
+            lines[i] = decode_line_by_id(line_id, content, self.relationships)
+        if annotation_resolution:
+            lines = convert_line_coordinates(lines, self.index.resolution, annotation_resolution)
+        return lines
+
+    def read_related(
+        self,
+        relationship: str,
+        segment_ids: Sequence[int],
+        annotation_resolution: Optional[Vec3D] = None,
+        progress: bool = False,
+    ) -> npt.NDArray:
+        """
+        Return the annotations related to any of the given segments by the given
+        relationship, looked up in the index of that relationship.
+
+        :param relationship: name of the relationship, e.g. "pre_segment"
+        :param segment_ids: ids of the related segments
+        :param annotation_resolution: resolution of returned annotation coordinates;
+        if not specified, uses native coordinates (i.e. self.index.resolution)
+        :param progress: whether to show the progress of reading the index
+        :return: structured array of ``LINE_DTYPE``
+        """
+        if relationship not in self.relationships:
+            raise ValueError(
+                f"unknown relationship {relationship}; expected one of {self.relationships}"
+            )
+        assert self.sharding is not None
+        contents = read_sharded_chunks(
+            path_join(self.path, relationship_key(relationship)),
+            self.sharding,
+            [int(e) for e in segment_ids],
+            progress,
+        )
+        lines = unique_lines(
+            np.concatenate(
+                [np.empty(0, dtype=LINE_DTYPE)] + [decode_lines(content) for content in contents]
             )
-        result_dict = {line.id: line for line in result}
-        result = list(result_dict.values())
+        )
         if annotation_resolution:
-            for line in result:
-                line.convert_coordinates(self.index.resolution, annotation_resolution)
-        return result
+            lines = convert_line_coordinates(lines, self.index.resolution, annotation_resolution)
+        return lines
+
+    def read_staged(self, progress: bool = False) -> npt.NDArray:
+        """
+        Read and return all annotations from the staged lowest level of this (sharded)
+        layer, without duplicates, as a structured array of
+        ``line_dtype(self.relationships)``.
+        """
+        if self.sharding is None:
+            raise ValueError("only sharded layers have a staged lowest level")
+        staged_dir = path_join(self.path, UNSHARDED_KEY)
+        names = list_chunk_files(staged_dir)
+        logger.info(f"Reading {len(names)} chunk files from {staged_dir}")
+        chunks = read_chunk_files(staged_dir, names, progress, self.relationships)
+        return unique_lines(
+            np.concatenate([np.empty(0, dtype=line_dtype(self.relationships))] + chunks)
+        )
 
     def post_process(self):
         """
@@ -801,8 +1736,26 @@ class AnnotationLayer:
           2. The info file, with correct limits for each level.
         This is useful after writing out a bunch of data with
           write_annotations(data, False), which writes to only the lowest-level chunks.
+        Sharded layers are read from their staged lowest level instead, and every
+        level, the by_id index and the relationship indices are rewritten from it.
         """
-        if len(self.chunk_sizes) == 1:
+        if self.sharding is not None:
+            all_data = self.read_staged()
+            spatial_entries = subdivide(
+                all_data, self.index, self.chunk_sizes, self.path, sharding=self.sharding
+            )
+            write_sharded_index(
+                path_join(self.path, BY_ID_KEY),
+                self.sharding,
+                by_id_chunks(all_data, self.relationships),
+            )
+            for name in self.relationships:
+                write_sharded_index(
+                    path_join(self.path, relationship_key(name)),
+                    self.sharding,
+                    relationship_chunks(all_data, name),
+                )
+        elif len(self.chunk_sizes) == 1:
             # Special case: only one chunk size, no subdivision.
             # In this case, we can cheat considerably.
             # Just iterate over the spatial entry files, getting the line
@@ -836,6 +1789,8 @@ def build_annotation_layer(  # pylint: disable=too-many-locals, too-many-branche
     index: VolumetricIndex | None = None,
     chunk_sizes: Sequence[Sequence[int]] | None = None,
     mode: Literal["read", "write", "replace", "update"] = "write",
+    sharding: dict | None = None,
+    relationships: Sequence[str] | None = None,
 ) -> AnnotationLayer:  # pragma: no cover # trivial conditional, delegation only
     """Build an AnnotationLayer (spatially indexed annotations in precomputed file format).
 
@@ -853,6 +1808,11 @@ def build_annotation_layer(  # pylint: disable=too-many-locals, too-many-branche
        "write": for writing; throws error if file exists.
        "replace": for writing; if file exists, it is cleared of all data.
        "update": for writing additional data; throws error if file does not exist.
+    :sharding: "neuroglancer_uint64_sharded_v1" sharding specification for all the
+      indices of new files, which also get by_id and relationship indices
+      (existing files keep their own).
+    :relationships: Names of the relationships of the annotations of new files, e.g.
+      ["pre_segment", "post_segment"]; requires `sharding`.
     """
     dims, lower_bound, upper_bound, spatial_entries = read_info(path)
     file_exists = spatial_entries is not None
@@ -867,6 +1827,8 @@ def build_annotation_layer(  # pylint: disable=too-many-locals, too-many-branche
         # pylint: disable=E1120
         file_index = VolumetricIndex.from_coords(lower_bound, upper_bound, Vec3D(*file_resolution))
         file_chunk_sizes = [se.chunk_size for se in spatial_entries]
+        if mode in ("read", "update"):
+            sharding, relationships = read_info_indices(path)
 
     if mode in ("read", "update") and not file_exists:
         raise IOError(
@@ -913,18 +1875,384 @@ def build_annotation_layer(  # pylint: disable=too-many-locals, too-many-branche
                 f"but existing file chunk_sizes is {file_chunk_sizes}"
             )
 
-    sf = AnnotationLayer(path, index, chunk_sizes)
+    sf = AnnotationLayer(path, index, chunk_sizes, sharding, relationships)
     if mode in ("write", "replace"):
         sf.clear()
     return sf
 
 
+def _iter_cell_blocks(
+    grid_shape: Sequence[int], block_shape: Sequence[int]
+) -> Iterator[tuple[tuple[int, ...], tuple[int, ...]]]:
+    """
+    Yield the [start, stop) grid positions of the blocks of chunks that partition
+    a grid of the given shape.
+    """
+    for start in itertools.product(
+        *(range(0, size, step) for size, step in zip(grid_shape, block_shape))
+    ):
+        yield start, tuple(min(a + b, c) for a, b, c in zip(start, block_shape, grid_shape))
+
+
+def _write_count(counts_dir: str, level: int, name: str, count: int):
+    write_bytes(path_join(counts_dir, str(level), name), str(count).encode())
+
+
+def _read_max_count(counts_dir: str, level: int) -> int:
+    level_counts_dir = path_join(counts_dir, str(level))
+    try:
+        names = list(_get_cloudfiles(level_counts_dir).list(flat=True))
+    except FileNotFoundError:
+        return 0
+    contents = _get_cloudfiles(level_counts_dir).get(names, return_dict=True)
+    assert isinstance(contents, dict)
+    return max((int(e) for e in contents.values() if e), default=0)
+
+
+@mazepa.taskable_operation
+def count_annotation_chunks_op(
+    target: AnnotationLayer,
+    level: int,
+    cells_start: Sequence[int],
+    cells_stop: Sequence[int],
+    counts_dir: str,
+):
+    """
+    Record the maximum number of lines in any chunk of the given (unsharded) spatial
+    level within the given block of grid positions.
+    """
+    level_dir = path_join(target.path, f"spatial{level}")
+    cells = list(itertools.product(*(range(a, b) for a, b in zip(cells_start, cells_stop))))
+    file_sizes = _get_cloudfiles(level_dir).size([_chunk_file_name(e) for e in cells])
+    count = max((line_count_from_file_size(e) for e in file_sizes.values() if e), default=0)
+    _write_count(counts_dir, level, _chunk_file_name(cells_start), count)
+
+
+@mazepa.taskable_operation
+def subdivide_annotation_block_op(  # pylint: disable=too-many-locals
+    target: AnnotationLayer,
+    level: int,
+    cells_start: Sequence[int],
+    cells_stop: Sequence[int],
+    dst_dir: str,
+    counts_dir: str,
+):
+    """
+    Write the chunks of the given spatial level within the given block of grid
+    positions to ``dst_dir``, from the lines of the next finer level, and record their
+    maximum number of lines.  Chunk files of the block that are now empty are deleted.
+    """
+    chunk_size = Vec3D[int](*target.chunk_sizes[level])
+    block_start = target.index.start + Vec3D[int](*cells_start) * chunk_size
+    block_stop = target.index.start + Vec3D[int](*cells_stop) * chunk_size
+    roi = BBox3D.from_coords(block_start, block_stop, target.index.resolution)
+    lines = target.read_in_bounds(roi, spatial_level=level + 1)
+
+    cells = [
+        (cell, line_indices)
+        for cell, line_indices in bin_lines(lines, target.index, chunk_size)
+        if all(a <= c < b for a, c, b in zip(cells_start, cell, cells_stop))
+    ]
+    names = [_chunk_file_name(cell) for cell, _ in cells]
+    stale = {
+        _chunk_file_name(cell)
+        for cell in itertools.product(*(range(a, b) for a, b in zip(cells_start, cells_stop)))
+    } - set(names)
+    write_chunk_files(
+        dst_dir, [(name, lines[line_indices]) for name, (_, line_indices) in zip(names, cells)]
+    )
+    _get_cloudfiles(dst_dir).delete(sorted(stale))
+    count = max((len(line_indices) for _, line_indices in cells), default=0)
+    _write_count(counts_dir, level, _chunk_file_name(cells_start), count)
+
+
+@mazepa.taskable_operation
+def assemble_annotation_shard_op(
+    target: AnnotationLayer, level: int, shard_name: str, src_dir: str, names: Sequence[str]
+):
+    """
+    Write the given shard file of the given (sharded) spatial level, from all of its
+    chunk files in ``src_dir``.
+    """
+    assert target.sharding is not None
+    grid_shape = ceil(target.index.shape / Vec3D(*target.chunk_sizes[level]))
+    contents = _get_cloudfiles(src_dir).get(list(names), return_dict=True)
+    assert isinstance(contents, dict)
+    keys = spatial_chunk_keys([[int(c) for c in e.split("_")] for e in names], grid_shape)
+    write_shard_files(
+        path_join(target.path, f"spatial{level}"),
+        target.sharding,
+        {shard_name: {key: contents[name] for key, name in zip(keys, names)}},
+    )
+
+
+@mazepa.taskable_operation
+def assemble_staged_annotation_shard_op(
+    target: AnnotationLayer, shard_name: str, names: Sequence[str], counts_dir: str
+):
+    """
+    Write the given shard file of the lowest spatial level of the given (sharded)
+    layer, from all of its staged chunk files, and record their maximum number of lines.
+    """
+    assert target.sharding is not None
+    level = len(target.chunk_sizes) - 1
+    grid_shape = ceil(target.index.shape / Vec3D(*target.chunk_sizes[level]))
+    chunks = read_chunk_files(
+        path_join(target.path, UNSHARDED_KEY), names, relationships=target.relationships
+    )
+    keys = spatial_chunk_keys([[int(c) for c in e.split("_")] for e in names], grid_shape)
+    write_shard_files(
+        path_join(target.path, f"spatial{level}"),
+        target.sharding,
+        {shard_name: {key: encode_lines(strip_relationships(e)) for key, e in zip(keys, chunks)}},
+    )
+    _write_count(counts_dir, level, shard_name, max((len(e) for e in chunks), default=0))
+
+
+@mazepa.taskable_operation
+def bucket_annotation_block_op(
+    target: AnnotationLayer,
+    cells_start: Sequence[int],
+    cells_stop: Sequence[int],
+    buckets_dir: str,
+):
+    """
+    Split the staged lines of the given block of lowest-level grid positions of the
+    given (sharded) layer by the shard file of the by_id index and of each relationship
+    index that they go to, into one bucket file per shard file under ``buckets_dir``.
+    """
+    assert target.sharding is not None
+    spec = ShardingSpecification.from_dict(target.sharding)
+    names = [
+        _chunk_file_name(cell)
+        for cell in itertools.product(*(range(a, b) for a, b in zip(cells_start, cells_stop)))
+    ]
+    chunks = read_chunk_files(
+        path_join(target.path, UNSHARDED_KEY), names, relationships=target.relationships
+    )
+    lines = unique_lines(
+        np.concatenate([np.empty(0, dtype=line_dtype(target.relationships))] + chunks)
+    )
+    indices = [(BY_ID_KEY, lines, lines["id"])]
+    for name in target.relationships:
+        related = lines[lines[name] != 0]
+        indices.append((relationship_key(name), related, related[name]))
+    buckets = []
+    for index_key, index_lines, keys in indices:
+        shard_names = np.array([_shard_file_name(spec, key) for key in keys.tolist()])
+        for shard_name in np.unique(shard_names).tolist():
+            buckets.append(
+                (
+                    f"{index_key}/{shard_name}/{_chunk_file_name(cells_start)}",
+                    encode_related_lines(
+                        index_lines[shard_names == shard_name], target.relationships
+                    ),
+                )
+            )
+    _get_cloudfiles(buckets_dir).puts(buckets, cache_control=CACHE_CONTROL)
+
+
+@mazepa.taskable_operation
+def assemble_annotation_index_shard_op(
+    target: AnnotationLayer,
+    shard_name: str,
+    src_dir: str,
+    names: Sequence[str],
+    relationship: Optional[str] = None,
+):
+    """
+    Write the given shard file of the by_id index of the given (sharded) layer, or of
+    the index of the given relationship, from all of its bucket files in ``src_dir``.
+    """
+    assert target.sharding is not None
+    chunks = read_chunk_files(src_dir, names, relationships=target.relationships)
+    lines = unique_lines(
+        np.concatenate([np.empty(0, dtype=line_dtype(target.relationships))] + chunks)
+    )
+    if relationship is None:
+        index_key = BY_ID_KEY
+        index_chunks = by_id_chunks(lines, target.relationships)
+    else:
+        index_key = relationship_key(relationship)
+        index_chunks = relationship_chunks(lines, relationship)
+    write_shard_files(
+        path_join(target.path, index_key), target.sharding, {shard_name: index_chunks}
+    )
+
+
+@mazepa.taskable_operation
+def write_annotation_limits_op(target: AnnotationLayer, counts_dir: str):
+    """
+    Rewrite the info file of the given layer, with the limit of each spatial level
+    set to the maximum of the chunk line counts recorded for it.
+    """
+    spatial_entries = target.get_spatial_entries()
+    for level, entry in enumerate(spatial_entries):
+        entry.limit = _read_max_count(counts_dir, level)
+    target.write_info_file(spatial_entries)
+
+
+@mazepa.taskable_operation
+def delete_stale_shard_files_op(dir_path: str, keep: Sequence[str]):
+    """
+    Delete the shard files of the given sharded index (spatial level, by_id or
+    relationship) other than the given ones, which are being written.
+    """
+    stale = set(list_shard_files(dir_path)) - set(keep)
+    _get_cloudfiles(dir_path).delete(sorted(stale))
+
+
 @mazepa.taskable_operation
-def post_process_annotation_layer_op(target: AnnotationLayer):  # pragma: no cover
-    target.post_process()
+def clear_annotation_scratch_op(scratch_dir: str, finished: bool):
+    """
+    Delete the scratch files of ``post_process_annotation_layer_flow``: before it
+    starts, those left by an earlier run that did not finish, and once it is done, its
+    own.  ``finished`` tells the two tasks apart, so that resuming an execution skips
+    the first one but not the last.
+    """
+    logger.info(f"Clearing {scratch_dir} {'after' if finished else 'before'} post-processing.")
+    delete_tree(scratch_dir)
+
+
+def _group_by_shard(
+    sharding: dict, names: Sequence[str], grid_shape: Sequence[int]
+) -> dict[str, list[str]]:
+    """
+    Group the given chunk file names of a spatial level by the shard file that their
+    chunks go to.
+    """
+    spec = ShardingSpecification.from_dict(sharding)
+    keys = spatial_chunk_keys([[int(c) for c in e.split("_")] for e in names], grid_shape)
+    names_by_shard = defaultdict(list)
+    for key, name in zip(keys, names):
+        names_by_shard[_shard_file_name(spec, key)].append(name)
+    return names_by_shard
+
+
+def _make_index_shard_tasks(
+    target: AnnotationLayer, buckets_dir: str, relationship: Optional[str]
+) -> list[mazepa.Task]:
+    """
+    Make the tasks that write the by_id index of the given (sharded) layer, or the
+    index of the given relationship, from the bucket files in ``buckets_dir``, and the
+    task that deletes the shard files of the index that none of them writes.
+    """
+    index_key = BY_ID_KEY if relationship is None else relationship_key(relationship)
+    index_dir = path_join(target.path, index_key)
+    index_buckets_dir = path_join(buckets_dir, index_key)
+    try:
+        bucket_names = list(_get_cloudfiles(index_buckets_dir).list())
+    except FileNotFoundError:
+        bucket_names = []
+    names_by_shard = defaultdict(list)
+    for e in bucket_names:
+        shard_name, name = e.split("/")
+        names_by_shard[shard_name].append(name)
+    logger.info(f"Writing {len(names_by_shard)} shard files of {index_dir}.")
+    return [
+        assemble_annotation_index_shard_op.make_task(
+            target, shard_name, path_join(index_buckets_dir, shard_name), names, relationship
+        )
+        for shard_name, names in names_by_shard.items()
+    ] + [delete_stale_shard_files_op.make_task(index_dir, sorted(names_by_shard))]
 
 
 @builder.register("post_process_annotation_layer_flow")
 @mazepa.flow_schema
-def post_process_annotation_layer_flow(target: AnnotationLayer):  # pragma: no cover
-    yield post_process_annotation_layer_op.make_task(target)
+def post_process_annotation_layer_flow(  # pylint: disable=too-many-locals
+    target: AnnotationLayer, block_shape: Sequence[int] = (8, 8, 8)
+):
+    """
+    Distributed version of ``AnnotationLayer.post_process``: rewrite the higher-level
+    chunks of the given layer from its lowest-level chunks, and the info file with
+    the correct limits for each level.  For sharded layers, the lowest level, the
+    by_id index and the relationship indices are rewritten too, from the staged
+    lowest level.
+
+    Each level is split into blocks of chunks that are processed by separate tasks,
+    and is built from the next finer level once that one is done, so that no task
+    holds more than the lines of one block.  The chunk line counts recorded by
+    the tasks are reduced into the limits by a final task.  The by_id and
+    relationship indices are built by first splitting the lines of each block of
+    the staged lowest level by the shard file they go to, then writing each shard
+    file from its lines by a separate task.
+
+    Storage is only modified by the tasks, and the scratch files are cleared by the
+    first and the last task, so that dry runs leave the layer alone, and resumed
+    executions still find the outputs of the tasks that completed before.
+
+    :param target: layer to post-process, whose lowest level has been written.
+    :param block_shape: shape of the blocks of chunks processed by each task.
+    """
+    scratch_dir = path_join(target.path, POST_PROCESS_KEY)
+    counts_dir = path_join(scratch_dir, "counts")
+    buckets_dir = path_join(scratch_dir, "buckets")
+    yield clear_annotation_scratch_op.make_task(scratch_dir, finished=False)
+    yield Dependency()
+    lowest_level = len(target.chunk_sizes) - 1
+    for level in range(lowest_level, -1, -1):
+        grid_shape = ceil(target.index.shape / Vec3D(*target.chunk_sizes[level]))
+        level_dir = path_join(target.path, f"spatial{level}")
+        if level == lowest_level and target.sharding is None:
+            tasks = [
+                count_annotation_chunks_op.make_task(target, level, start, stop, counts_dir)
+                for start, stop in _iter_cell_blocks(grid_shape, block_shape)
+            ]
+            logger.info(f"Counting the chunks of {level_dir} with {len(tasks)} tasks.")
+            yield tasks
+            continue
+        if level == lowest_level:
+            assert target.sharding is not None
+            names_by_shard = _group_by_shard(
+                target.sharding,
+                list_chunk_files(path_join(target.path, UNSHARDED_KEY)),
+                grid_shape,
+            )
+            tasks = [
+                assemble_staged_annotation_shard_op.make_task(
+                    target, shard_name, shard_names, counts_dir
+                )
+                for shard_name, shard_names in names_by_shard.items()
+            ] + [
+                bucket_annotation_block_op.make_task(target, start, stop, buckets_dir)
+                for start, stop in _iter_cell_blocks(grid_shape, block_shape)
+            ]
+            tasks.append(delete_stale_shard_files_op.make_task(level_dir, sorted(names_by_shard)))
+            logger.info(
+                f"Assembling {len(names_by_shard)} shard files of {level_dir}, and "
+                f"bucketing its lines by index shard file, with {len(tasks)} tasks."
+            )
+            yield tasks
+            continue
+
+        yield Dependency()
+        # Sharded levels are written unsharded first, then assembled into shards
+        dst_dir = level_dir if target.sharding is None else path_join(scratch_dir, str(level))
+        tasks = [
+            subdivide_annotation_block_op.make_task(
+                target, level, start, stop, dst_dir, counts_dir
+            )
+            for start, stop in _iter_cell_blocks(grid_shape, block_shape)
+        ]
+        logger.info(f"Writing {level_dir} with {len(tasks)} tasks.")
+        yield tasks
+        if target.sharding is not None:
+            yield Dependency()
+            names_by_shard = _group_by_shard(
+                target.sharding, list_chunk_files(dst_dir), grid_shape
+            )
+            logger.info(f"Assembling {len(names_by_shard)} shard files of {level_dir}.")
+            yield [
+                assemble_annotation_shard_op.make_task(
+                    target, level, shard_name, dst_dir, shard_names
+                )
+                for shard_name, shard_names in names_by_shard.items()
+            ] + [delete_stale_shard_files_op.make_task(level_dir, sorted(names_by_shard))]
+
+    yield Dependency()
+    yield write_annotation_limits_op.make_task(target, counts_dir)
+    if target.sharding is not None:
+        for relationship in [None] + target.relationships:
+            yield _make_index_shard_tasks(target, buckets_dir, relationship)
+    yield Dependency()
+    yield clear_annotation_scratch_op.make_task(scratch_dir, finished=True)
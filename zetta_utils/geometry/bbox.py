@@ -59,6 +59,9 @@ class BBox3D:  # pylint: disable=too-many-public-methods # fundamental class
             ),
         )
 
+    def __mazepa_hash__(self) -> tuple:
+        return (self.bounds, self.unit, tuple(self.pprint_px_resolution))
+
     @property
     def ndim(self) -> int:
         return 3
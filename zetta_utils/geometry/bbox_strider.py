@@ -1,11 +1,12 @@
 # pylint: disable=missing-docstring, no-else-raise
 from __future__ import annotations
 
-import multiprocessing
 from math import ceil, floor
-from typing import List, Literal, Optional, Tuple
+from typing import Iterator, List, Literal, Optional, Tuple
 
 import attrs
+import numpy as np
+from numpy import typing as npt
 from typeguard import typechecked
 
 from zetta_utils import builder, log
@@ -16,6 +17,9 @@ from .bbox import BBox3D
 
 logger = log.get_logger("zetta_utils")
 
+# Number of chunk bounds computed at once by ``BBoxStrider.iter_chunk_bboxes``
+CHUNK_BBOX_BLOCK_SIZE = 4096
+
 
 @builder.register("BBoxStrider")
 @attrs.frozen
@@ -240,14 +244,98 @@ class BBoxStrider:
 
     def get_all_chunk_bboxes(self) -> List[BBox3D]:
         """Get all of the chunks."""
-        if self.num_chunks > multiprocessing.cpu_count():
-            with multiprocessing.Pool() as pool_obj:
-                result = pool_obj.map(self.get_nth_chunk_bbox, range(self.num_chunks))
+        return list(self.iter_chunk_bboxes())
+
+    def iter_chunk_bboxes(self, start: int = 0, stop: Optional[int] = None) -> Iterator[BBox3D]:
+        """Lazily iterate over the chunks with indices in ``[start, stop)``, in order.
+
+        Chunk bounds are computed in blocks of ``CHUNK_BBOX_BLOCK_SIZE``, so only
+        one block is kept in memory at a time.
+
+        :param start: Index of the first chunk.
+        :param stop: Index past the last chunk. Defaults to ``self.num_chunks``.
+        """
+        if stop is None:
+            stop = self.num_chunks
+        for block_start in range(start, stop, CHUNK_BBOX_BLOCK_SIZE):
+            block_stop = min(block_start + CHUNK_BBOX_BLOCK_SIZE, stop)
+            for bounds in self.get_chunk_bounds(block_start, block_stop).tolist():
+                yield BBox3D(bounds=(tuple(bounds[0]), tuple(bounds[1]), tuple(bounds[2])))
+
+    def get_chunk_bounds(self, start: int = 0, stop: Optional[int] = None) -> npt.NDArray:
+        """Get the bounds of the chunks with indices in ``[start, stop)``, computed
+        for all of the chunks at once. Produces the same chunks as ``get_nth_chunk_bbox``.
+
+        :param start: Index of the first chunk.
+        :param stop: Index past the last chunk. Defaults to ``self.num_chunks``.
+        :return: ``(N, 3, 2)`` array of the (start, end) bounds of each chunk along X, Y, Z.
+        """
+        if stop is None:
+            stop = self.num_chunks
+        return self._get_chunk_bounds(np.arange(start, max(start, stop), dtype=np.int64))
+
+    def get_dim_bounds(self) -> Tuple[npt.NDArray, npt.NDArray, npt.NDArray]:
+        """Get the bounds of the chunks along each dimension. The chunks form a rectilinear
+        grid, so the chunk at steps ``(i, j, k)`` spans the ``i``-th X bounds, the ``j``-th
+        Y bounds and the ``k``-th Z bounds.
+
+        :return: For each of X, Y, Z, a ``(step_limits[dim], 2)`` array of (start, end) bounds,
+            or empty arrays if there are no chunks.
+        """
+        if self.num_chunks == 0:
+            empty = np.zeros((0, 2), dtype=np.float64)
+            return (empty, empty, empty)
+        step_along_x = np.arange(self.step_limits[0], dtype=np.int64)
+        step_along_y = np.arange(self.step_limits[1], dtype=np.int64) * self.step_limits[0]
+        step_along_z = (
+            np.arange(self.step_limits[2], dtype=np.int64)
+            * self.step_limits[0]
+            * self.step_limits[1]
+        )
+        return (
+            self._get_chunk_bounds(step_along_x)[:, 0],
+            self._get_chunk_bounds(step_along_y)[:, 1],
+            self._get_chunk_bounds(step_along_z)[:, 2],
+        )
+
+    def _get_chunk_bounds(self, n: npt.NDArray) -> npt.NDArray:
+        if len(n) == 0:
+            return np.zeros((0, 3, 2), dtype=np.float64)
+        step_limits = np.array(self.step_limits, dtype=np.int64)
+        steps_along_dim = np.stack(
+            [
+                n % step_limits[0],
+                (n // step_limits[0]) % step_limits[1],
+                (n // (step_limits[0] * step_limits[1])) % step_limits[2],
+            ],
+            axis=1,
+        )
+        snapped_start = np.array(self.bbox_snapped.start, dtype=np.float64)
+        stride_in_unit = np.array(self.stride_in_unit, dtype=np.float64)
+        chunk_size_in_unit = np.array(self.chunk_size_in_unit, dtype=np.float64)
+        if self.mode in ("shrink", "expand"):
+            chunk_origin_in_unit = snapped_start + stride_in_unit * steps_along_dim
+            chunk_end_in_unit = chunk_origin_in_unit + chunk_size_in_unit
         else:
-            result = [
-                self.get_nth_chunk_bbox(i) for i in range(self.num_chunks)
-            ]  # TODO: generator?
-        return result
+            start_partial = np.array(self.step_start_partial)
+            end_partial = np.array(self.step_end_partial)
+            chunk_origin_in_unit = snapped_start + stride_in_unit * (
+                steps_along_dim - start_partial.astype(np.int64)
+            )
+            chunk_end_in_unit = chunk_origin_in_unit + chunk_size_in_unit
+            is_start = (steps_along_dim == 0) & start_partial
+            chunk_origin_in_unit = np.where(
+                is_start, np.array(self.bbox.start, dtype=np.float64), chunk_origin_in_unit
+            )
+            chunk_end_in_unit = np.where(is_start, snapped_start, chunk_end_in_unit)
+            is_end = (steps_along_dim == step_limits - 1) & end_partial
+            chunk_origin_in_unit = np.where(
+                is_end, np.array(self.bbox_snapped.end, dtype=np.float64), chunk_origin_in_unit
+            )
+            chunk_end_in_unit = np.where(
+                is_end, np.array(self.bbox.end, dtype=np.float64), chunk_end_in_unit
+            )
+        return np.stack([chunk_origin_in_unit, chunk_end_in_unit], axis=-1)
 
     def get_nth_chunk_bbox(self, n: int) -> BBox3D:
         """Get nth chunk bbox, in order.
@@ -2,25 +2,51 @@
 from __future__ import annotations
 
 import math
+import os
 from collections import abc
-from typing import Any, Sequence, Tuple, TypeVar, Union, overload
+from typing import Any, Callable, Sequence, Tuple, TypeVar, Union, overload
 
 import attrs
 import numpy as np
-from typeguard import typechecked
+from typeguard import TypeCheckError, typechecked
 from typing_extensions import TypeGuard
 
 BuiltinInt = int
 BuiltinFloat = float
 
 T = TypeVar("T", bound=float)
+C = TypeVar("C", bound=type)
 
 VEC3D_PRECISION = 10
 
+VEC3D_TYPECHECK_ENV_VAR = "ZETTA_VEC3D_TYPECHECK"
 
-@attrs.frozen(init=False)
-@typechecked
-class Vec3D(abc.Sequence[T]):
+
+def _typechecked_if_enabled(cls: C) -> C:
+    """
+    ``Vec3D`` is on the hot path of index arithmetic, so runtime type checking of its
+    methods is only enabled when ``ZETTA_VEC3D_TYPECHECK=1`` is set for debugging.
+    Unsupported operands are rejected either way.
+    """
+    if os.environ.get(VEC3D_TYPECHECK_ENV_VAR, "0") == "1":  # pragma: no cover
+        return typechecked(cls)
+    return cls
+
+
+def _operand_error(other: Any, expected: str) -> TypeCheckError:
+    return TypeCheckError(f'argument "other" ({type(other).__qualname__}) is not {expected}')
+
+
+class _HashSlot:  # pylint: disable=too-few-public-methods
+    # Holds the cached hash of ``Vec3D`` outside of its attrs fields, so that it does not
+    # show up in ``attrs.asdict``, ``attrs.fields`` or ``attrs.evolve``
+    __slots__ = ("_hash",)
+    _hash: BuiltinInt | None
+
+
+@attrs.frozen(init=False, slots=True)
+@_typechecked_if_enabled
+class Vec3D(_HashSlot, abc.Sequence[T]):
     """
     Primitive for an 3-dimensional vector.  Code for other dimensionalities will be autogenerated.
     """
@@ -31,20 +57,22 @@ class Vec3D(abc.Sequence[T]):
 
     # TODO: Support type inference for np.generic types
     def __init__(self, x: T | np.generic, y: T | np.generic, z: T | np.generic):
-        if isinstance(x, np.generic):
-            object.__setattr__(self, "x", x.item())
-        else:
-            object.__setattr__(self, "x", x)
+        object.__setattr__(self, "x", x.item() if isinstance(x, np.generic) else x)
+        object.__setattr__(self, "y", y.item() if isinstance(y, np.generic) else y)
+        object.__setattr__(self, "z", z.item() if isinstance(z, np.generic) else z)
+        object.__setattr__(self, "_hash", None)
 
-        if isinstance(y, np.generic):
-            object.__setattr__(self, "y", y.item())
-        else:
-            object.__setattr__(self, "y", y)
+    def __hash__(self) -> BuiltinInt:
+        if self._hash is None:
+            object.__setattr__(self, "_hash", hash((self.x, self.y, self.z)))
+        return self._hash  # type: ignore # set above
 
-        if isinstance(z, np.generic):
-            object.__setattr__(self, "z", z.item())
-        else:
-            object.__setattr__(self, "z", z)
+    def __mazepa_hash__(self) -> tuple[T, T, T]:
+        return (self.x, self.y, self.z)
+
+    def __reduce__(self) -> Tuple[Callable[..., Vec3D[T]], Tuple[T, T, T]]:
+        # keeps the cached hash out of pickles, which are used for task IDs
+        return (Vec3D, (self.x, self.y, self.z))
 
     @property
     def vec(self) -> tuple[T, T, T]:
@@ -59,25 +87,25 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __getitem__(self, key):
-        return self.vec[key]
+        return (self.x, self.y, self.z)[key]
 
     def __iter__(self):
-        return self.vec.__iter__()
+        return iter((self.x, self.y, self.z))
 
     def __len__(self) -> BuiltinInt:
         return 3
 
     def __lt__(self, other) -> bool:
-        return all(s < o for (s, o) in zip(self.vec, other.vec))
+        return self.x < other.x and self.y < other.y and self.z < other.z
 
     def __le__(self, other) -> bool:
-        return all(s <= o for (s, o) in zip(self.vec, other.vec))
+        return self.x <= other.x and self.y <= other.y and self.z <= other.z
 
     def __gt__(self, other) -> bool:
-        return all(s > o for (s, o) in zip(self.vec, other.vec))
+        return self.x > other.x and self.y > other.y and self.z > other.z
 
     def __ge__(self, other) -> bool:
-        return all(s >= o for (s, o) in zip(self.vec, other.vec))
+        return self.x >= other.x and self.y >= other.y and self.z >= other.z
 
     def isclose(
         self,
@@ -109,22 +137,25 @@ class Vec3D(abc.Sequence[T]):
         return all(self.isclose(other, rel_tol=rel_tol, abs_tol=abs_tol))
 
     def __repr__(self) -> str:
-        return f"Vec3D({', '.join(str(e) for e in self)})"
+        return f"Vec3D({self.x}, {self.y}, {self.z})"
 
     def __truediv__(self, other: Vec3D | BuiltinFloat) -> Vec3D[BuiltinFloat]:
         if isinstance(other, (BuiltinFloat, BuiltinInt)):
-            return Vec3D[BuiltinFloat](*(e / other for e in self))
-        else:
-            return Vec3D[BuiltinFloat](*(e / f for (e, f) in zip(self, other)))
+            return Vec3D(self.x / other, self.y / other, self.z / other)
+        elif isinstance(other, Vec3D):
+            return Vec3D(self.x / other.x, self.y / other.y, self.z / other.z)
+        raise _operand_error(other, "a Vec3D or a number")
 
     def __rtruediv__(self, other: BuiltinFloat) -> Vec3D[BuiltinFloat]:
-        return Vec3D[BuiltinFloat](*(other / e for e in self))
+        if not isinstance(other, (BuiltinFloat, BuiltinInt)):
+            raise _operand_error(other, "a number")
+        return Vec3D(other / self.x, other / self.y, other / self.z)
 
     def __neg__(self) -> Vec3D[T]:
-        return Vec3D[T](*(-e for e in self))
+        return Vec3D(-self.x, -self.y, -self.z)  # type: ignore[arg-type]
 
     def __abs__(self) -> Vec3D[T]:
-        return Vec3D[T](*(abs(e) for e in self))
+        return Vec3D(abs(self.x), abs(self.y), abs(self.z))  # type: ignore[arg-type]
 
     @overload
     def __round__(self) -> Vec3D[BuiltinInt]:
@@ -136,17 +167,17 @@ class Vec3D(abc.Sequence[T]):
 
     def __round__(self, ndigits: int | None = None):
         if ndigits is None:
-            return Vec3D[BuiltinInt](*(round(e) for e in self))
-        return Vec3D[T](*(round(e, ndigits) for e in self))
+            return Vec3D(round(self.x), round(self.y), round(self.z))
+        return Vec3D(round(self.x, ndigits), round(self.y, ndigits), round(self.z, ndigits))
 
     def __floor__(self) -> Vec3D[BuiltinInt]:
-        return Vec3D[BuiltinInt](*(math.floor(e) for e in self))
+        return Vec3D(math.floor(self.x), math.floor(self.y), math.floor(self.z))
 
     def __ceil__(self) -> Vec3D[BuiltinInt]:
-        return Vec3D[BuiltinInt](*(math.ceil(e) for e in self))
+        return Vec3D(math.ceil(self.x), math.ceil(self.y), math.ceil(self.z))
 
     def __trunc__(self) -> Vec3D[BuiltinInt]:
-        return Vec3D[BuiltinInt](*(math.trunc(e) for e in self))
+        return Vec3D(math.trunc(self.x), math.trunc(self.y), math.trunc(self.z))
 
     @overload
     def __add__(self, other: Union[Vec3D[BuiltinInt], BuiltinInt]) -> Vec3D[T]:
@@ -157,14 +188,11 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __add__(self, other: Vec3D | BuiltinInt | BuiltinFloat):
-        if isinstance(other, BuiltinInt):
-            return Vec3D[T](*(e + other for e in self))
-        elif isinstance(other, BuiltinFloat):
-            return Vec3D[BuiltinFloat](*(e + other for e in self))
-        elif is_int_vec(other):
-            return Vec3D[T](*(e + f for (e, f) in zip(self, other)))  # type: ignore
-        else:
-            return Vec3D[T](*(e + f for (e, f) in zip(self, other)))
+        if isinstance(other, Vec3D):
+            return Vec3D(self.x + other.x, self.y + other.y, self.z + other.z)
+        elif isinstance(other, (BuiltinInt, BuiltinFloat)):
+            return Vec3D(self.x + other, self.y + other, self.z + other)
+        raise _operand_error(other, "a Vec3D or a number")
 
     @overload
     def __radd__(self, other: BuiltinInt) -> Vec3D[T]:
@@ -175,10 +203,7 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __radd__(self, other):
-        if isinstance(other, BuiltinInt):
-            return Vec3D[T](*(other + e for e in self))
-        else:
-            return Vec3D[BuiltinFloat](*(other + e for e in self))
+        return Vec3D(other + self.x, other + self.y, other + self.z)
 
     @overload
     def __sub__(self, other: Union[Vec3D[BuiltinInt], BuiltinInt]) -> Vec3D[T]:
@@ -189,14 +214,11 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __sub__(self, other):
-        if isinstance(other, (BuiltinInt)):
-            return Vec3D[T](*(e - other for e in self))
-        elif isinstance(other, (BuiltinFloat)):
-            return Vec3D[BuiltinFloat](*(e - other for e in self))
-        elif is_int_vec(other):
-            return Vec3D[T](*(e - f for (e, f) in zip(self, other)))  # type: ignore
-        else:
-            return Vec3D[BuiltinFloat](*(e - f for (e, f) in zip(self, other)))
+        if isinstance(other, Vec3D):
+            return Vec3D(self.x - other.x, self.y - other.y, self.z - other.z)
+        elif isinstance(other, (BuiltinInt, BuiltinFloat)):
+            return Vec3D(self.x - other, self.y - other, self.z - other)
+        raise _operand_error(other, "a Vec3D or a number")
 
     @overload
     def __rsub__(self, other: BuiltinInt) -> Vec3D[T]:
@@ -207,10 +229,7 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __rsub__(self, other):
-        if isinstance(other, BuiltinInt):
-            return Vec3D[T](*(other - e for e in self))
-        else:
-            return Vec3D[BuiltinFloat](*(other - e for e in self))
+        return Vec3D(other - self.x, other - self.y, other - self.z)
 
     @overload
     def __mul__(self, other: Union[Vec3D[BuiltinInt], BuiltinInt]) -> Vec3D[T]:
@@ -221,14 +240,11 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __mul__(self, other):
-        if isinstance(other, (BuiltinInt)):
-            return Vec3D[T](*(e * other for e in self))
-        elif isinstance(other, (BuiltinFloat)):
-            return Vec3D[BuiltinFloat](*(e * other for e in self))
-        elif is_int_vec(other):
-            return Vec3D[T](*(e * f for (e, f) in zip(self, other)))  # type: ignore
-        else:
-            return Vec3D[BuiltinFloat](*(e * f for (e, f) in zip(self, other)))
+        if isinstance(other, Vec3D):
+            return Vec3D(self.x * other.x, self.y * other.y, self.z * other.z)
+        elif isinstance(other, (BuiltinInt, BuiltinFloat)):
+            return Vec3D(self.x * other, self.y * other, self.z * other)
+        raise _operand_error(other, "a Vec3D or a number")
 
     @overload
     def __rmul__(self, other: BuiltinInt) -> Vec3D[T]:
@@ -239,10 +255,7 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __rmul__(self, other):
-        if isinstance(other, BuiltinInt):
-            return Vec3D[T](*(other * e for e in self))
-        else:
-            return Vec3D[BuiltinFloat](*(other * e for e in self))
+        return Vec3D(other * self.x, other * self.y, other * self.z)
 
     @overload
     def __floordiv__(self, other: Union[Vec3D[BuiltinInt], BuiltinInt]) -> Vec3D[T]:
@@ -253,9 +266,11 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __floordiv__(self, other):
-        if isinstance(other, (BuiltinFloat, BuiltinInt)):
-            return Vec3D[BuiltinInt](*(e // other for e in self))
-        return Vec3D[BuiltinInt](*(e // f for (e, f) in zip(self, other)))
+        if isinstance(other, Vec3D):
+            return Vec3D(self.x // other.x, self.y // other.y, self.z // other.z)
+        elif isinstance(other, (BuiltinInt, BuiltinFloat)):
+            return Vec3D(self.x // other, self.y // other, self.z // other)
+        raise _operand_error(other, "a Vec3D or a number")
 
     @overload
     def __rfloordiv__(self, other: BuiltinInt) -> Vec3D[T]:
@@ -266,7 +281,9 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __rfloordiv__(self, other):
-        return Vec3D[BuiltinInt](*(other // e for e in self))
+        if not isinstance(other, (BuiltinFloat, BuiltinInt)):
+            raise _operand_error(other, "a number")
+        return Vec3D(other // self.x, other // self.y, other // self.z)
 
     @overload
     def __mod__(self, other: Union[Vec3D[BuiltinInt], BuiltinInt]) -> Vec3D[T]:
@@ -277,14 +294,11 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __mod__(self, other):
-        if isinstance(other, (BuiltinInt)):
-            return Vec3D[T](*(e % other for e in self))
-        elif isinstance(other, (BuiltinFloat)):
-            return Vec3D[BuiltinFloat](*(e % other for e in self))
-        elif is_int_vec(other):
-            return Vec3D[T](*(e % f for (e, f) in zip(self, other)))  # type: ignore
-        else:
-            return Vec3D[BuiltinFloat](*(e % f for (e, f) in zip(self, other)))
+        if isinstance(other, Vec3D):
+            return Vec3D(self.x % other.x, self.y % other.y, self.z % other.z)
+        elif isinstance(other, (BuiltinInt, BuiltinFloat)):
+            return Vec3D(self.x % other, self.y % other, self.z % other)
+        raise _operand_error(other, "a Vec3D or a number")
 
     @overload
     def __rmod__(self, other: BuiltinInt) -> Vec3D[T]:
@@ -295,16 +309,13 @@ class Vec3D(abc.Sequence[T]):
         ...
 
     def __rmod__(self, other):
-        if isinstance(other, BuiltinInt):
-            return Vec3D[T](*(other % e for e in self))
-        else:
-            return Vec3D[BuiltinFloat](*(other % e for e in self))
+        return Vec3D(other % self.x, other % self.y, other % self.z)
 
     def int(self) -> Vec3D[BuiltinInt]:
-        return Vec3D[BuiltinInt](*(BuiltinInt(arg) for arg in self.vec))
+        return Vec3D(BuiltinInt(self.x), BuiltinInt(self.y), BuiltinInt(self.z))
 
     def float(self) -> Vec3D[BuiltinFloat]:
-        return Vec3D[BuiltinFloat](*(BuiltinFloat(arg) for arg in self.vec))
+        return Vec3D(BuiltinFloat(self.x), BuiltinFloat(self.y), BuiltinFloat(self.z))
 
     def pformat(self) -> str:  # pragma: no cover
         return str(tuple(self))
@@ -23,6 +23,9 @@ class Backend(ABC, Generic[IndexT, DataT, DataWriteT]):  # pylint: disable=too-f
     def write(self, idx: IndexT, data: DataWriteT):
         """Writes given data to the given index"""
 
+    def prefetch(self, idx: IndexT) -> None:
+        """Hints that data at the given index will be read soon. Does nothing by default."""
+
     @abstractmethod
     def with_changes(self, **kwargs) -> Backend[IndexT, DataT, DataWriteT]:  # pragma: no cover
         """Remakes the Layer with the requested backend changes. The kwargs are not typed
@@ -34,6 +34,12 @@ class Layer(Generic[BackendIndexT, BackendDataT, BackendDataWriteT]):
         ...,
     ] = ()
 
+    # Layers are immutable and shared by all tasks of a flow
+    __mazepa_hash_memoize__ = True
+
+    def __mazepa_hash__(self) -> tuple:
+        return tuple(getattr(self, e.name) for e in attrs.fields(type(self)))
+
     def read_with_procs(
         self,
         idx: BackendIndexT,
@@ -62,6 +68,16 @@ class Layer(Generic[BackendIndexT, BackendDataT, BackendDataWriteT]):
 
         return data_proced
 
+    def prefetch_with_procs(self, idx: BackendIndexT) -> None:
+        """
+        Hints the backend that the given index will be read soon. Only the index
+        processors are applied, as joint processors may change the index at random.
+        """
+        idx_proced = idx
+        for proc_idx in self.index_procs:
+            idx_proced = proc_idx(idx_proced)
+        self.backend.prefetch(idx=idx_proced)
+
     def write_with_procs(
         self,
         idx: BackendIndexT,
@@ -2,14 +2,21 @@
 from __future__ import annotations
 
 import copy
+import itertools
 import math
 import os
+import posixpath
+import re
 from typing import Any, Literal, Sequence, Union
 
 import attrs
 import cachetools
+import numpy as np
 from cachetools.keys import hashkey
-from cloudfiles import CloudFile
+from cloudfiles import CloudFile, CloudFiles
+from cloudvolume.datasource.precomputed.image.common import compressed_morton_code
+from cloudvolume.datasource.precomputed.sharding import ShardingSpecification
+from numpy import typing as npt
 from typeguard import typechecked
 
 from zetta_utils.common import abspath, is_local
@@ -30,6 +37,9 @@ def get_info(path: str) -> dict[str, Any]:
     return _get_info_from_info_path(info_path)
 
 
+# Name of an unsharded chunk, e.g. `0-64_64-128_-8-0.gz`
+_CHUNK_NAME_RE = re.compile(r"^(-?\d+)-(-?\d+)_(-?\d+)-(-?\d+)_(-?\d+)-(-?\d+)(\.\w+)?$")
+
 PrecomputedVolumeDType = Literal[
     "uint8", "int8", "uint16", "int16", "uint32", "int32", "uint64", "float32"
 ]
@@ -425,6 +435,56 @@ def res_to_key(resolution: Sequence[float]) -> str:
     return "_".join([_str(v) for v in resolution])
 
 
+def get_chunk_existence(
+    path: str, resolution: Sequence[float], start: Sequence[int], stop: Sequence[int]
+) -> tuple[Vec3D[int], npt.NDArray] | None:
+    """
+    Find which storage chunks of the scale at ``resolution`` are present, among the chunks
+    overlapping the ``[start, stop)`` voxel region, with a single listing of the scale.
+    For sharded scales, a chunk is taken to be present when its shard is.
+    Returns None when the volume does not have the scale.
+
+    :return: The voxel start of the first chunk, and a boolean array over the chunks.
+    """
+    scales = [e for e in get_info(path)["scales"] if Vec3D(*e["resolution"]) == Vec3D(*resolution)]
+    if len(scales) == 0:
+        return None
+    scale = scales[0]
+    voxel_offset = Vec3D[int](*scale["voxel_offset"])
+    chunk_size = Vec3D[int](*scale["chunk_sizes"][0])
+    grid_start = (Vec3D[int](*start) - voxel_offset) // chunk_size
+    grid_stop = (Vec3D[int](*stop) - voxel_offset + chunk_size - 1) // chunk_size
+    exists = np.zeros(tuple(grid_stop - grid_start), dtype=bool)
+
+    try:
+        names = [
+            posixpath.basename(e)
+            for e in CloudFiles(abspath(path)).list(prefix=scale["key"] + "/", flat=True)
+        ]
+    except FileNotFoundError:
+        # Local volumes have no directory for the scale until it is written to
+        names = []
+    if "sharding" in scale:
+        spec = ShardingSpecification.from_dict(scale["sharding"])
+        shards = {name for name in names if name.endswith(".shard")}
+        grid_size = (Vec3D[int](*scale["size"]) + chunk_size - 1) // chunk_size
+        for coord in itertools.product(*(range(a, b) for a, b in zip(grid_start, grid_stop))):
+            if all(0 <= c < s for c, s in zip(coord, grid_size)):
+                code = compressed_morton_code(coord, grid_size)
+                shard = f"{spec.compute_shard_location(code).shard_number}.shard"
+                exists[tuple(c - a for c, a in zip(coord, grid_start))] = shard in shards
+    else:
+        for name in names:
+            match = _CHUNK_NAME_RE.match(name)
+            if match is None:
+                continue
+            chunk_start = Vec3D[int](*(int(match.group(i)) for i in (1, 3, 5)))
+            chunk_coord = (chunk_start - voxel_offset) // chunk_size - grid_start
+            if all(0 <= c < s for c, s in zip(chunk_coord, exists.shape)):
+                exists[tuple(chunk_coord)] = True
+    return voxel_offset + grid_start * chunk_size, exists
+
+
 def is_integer_within_eps(value: float, eps: float = 1e-5) -> bool:
     return abs(value - round(value)) < eps
 
@@ -5,6 +5,9 @@ from .index import (
     VolumetricIndex,
 )
 from .backend import VolumetricBackend
+from .chunk_grid import ChunkGrid
+from .chunk_cache import ChunkCache, configure_chunk_cache, get_chunk_cache
+from .chunk_existence import ChunkExistence
 from .frontend import (
     VolumetricFrontend,
     UserVolumetricIndex,
@@ -30,6 +33,12 @@ from .build import build_volumetric_layer
 from .tensorstore import build
 
 from .constant import ConstantVolumetricBackend, build_constant_volumetric_layer
+from .memory import (
+    MemoryBufferPool,
+    MemoryVolumetricBackend,
+    configure_memory_buffer_pool,
+    get_memory_buffer_pool,
+)
 from .layer_set import VolumetricLayerSet, build_volumetric_layer_set
 from .protocols import VolumetricBasedLayerProtocol
 
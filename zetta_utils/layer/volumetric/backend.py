@@ -1,25 +1,56 @@
 # pylint: disable=missing-docstring # pragma: no cover
 from __future__ import annotations
 
+import os
+import threading
 from abc import abstractmethod
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Literal, TypeVar
 
 import attrs
 import numpy as np
 
+from zetta_utils import log
 from zetta_utils.geometry import Vec3D
+from zetta_utils.mazepa.semaphores import semaphore
 
 from .. import Backend
 from . import VolumetricIndex
+from .chunk_cache import get_chunk_cache
+from .chunk_existence import ChunkExistence
+
+logger = log.get_logger("zetta_utils")
 
 DataT = TypeVar("DataT")
 DataWriteT = TypeVar("DataWriteT")
 
+READ_ASYNC_NUM_THREADS = 8
+
+_read_executor: ThreadPoolExecutor | None = None
+_read_executor_pid: int | None = None
+_read_executor_lock = threading.Lock()
+_warned_prefetch_without_cache = False
+
+
+def _get_read_executor() -> ThreadPoolExecutor:
+    # The executor threads do not survive a fork, so each process gets its own
+    global _read_executor, _read_executor_pid  # pylint: disable=global-statement
+    with _read_executor_lock:
+        if _read_executor is None or _read_executor_pid != os.getpid():
+            _read_executor = ThreadPoolExecutor(
+                max_workers=READ_ASYNC_NUM_THREADS, thread_name_prefix="read_async"
+            )
+            _read_executor_pid = os.getpid()
+        return _read_executor
+
 
 @attrs.mutable
 class VolumetricBackend(
     Backend[VolumetricIndex, DataT, DataWriteT]
 ):  # pylint: disable=too-few-public-methods
+    def __mazepa_hash__(self) -> tuple:
+        return tuple(getattr(self, e.name) for e in attrs.fields(type(self)))
+
     @property
     @abstractmethod
     def is_local(self) -> bool:
@@ -54,6 +85,46 @@ class VolumetricBackend(
     def clear_cache(self) -> None:
         ...
 
+    def read_async(self, idx: VolumetricIndex) -> Future[DataT]:
+        """
+        Starts reading data from the given index in the background.
+        The default implementation submits ``read`` to a process-wide thread pool.
+        """
+        return _get_read_executor().submit(self.read, idx)
+
+    def prefetch(self, idx: VolumetricIndex) -> None:
+        """
+        Starts fetching data at the given index into the process chunk cache, so that
+        a later ``read`` of an overlapping index is served from memory. The fetch holds
+        the ``read`` semaphore like any other read. Does nothing when the chunk cache is
+        disabled, as there would be nowhere to keep the data; a warning is logged once
+        per process in that case.
+        """
+        global _warned_prefetch_without_cache  # pylint: disable=global-statement
+        if not get_chunk_cache().enabled:
+            if not _warned_prefetch_without_cache:
+                logger.warning(
+                    "Prefetch requested with the chunk cache disabled; set a chunk cache "
+                    "budget for prefetching to take effect."
+                )
+                _warned_prefetch_without_cache = True
+            return
+        _get_read_executor().submit(self._read_with_semaphore, idx)
+
+    def _read_with_semaphore(self, idx: VolumetricIndex) -> DataT:
+        with semaphore("read"):
+            return self.read(idx)
+
+    def get_chunk_existence(  # pylint: disable=unused-argument
+        self, idx: VolumetricIndex
+    ) -> ChunkExistence | None:
+        """
+        Finds which storage chunks overlapping the given index are present. Returns None
+        by default, when the backend cannot tell, in which case all chunks must be taken
+        to be present.
+        """
+        return None
+
     @abstractmethod
     def get_voxel_offset(self, resolution: Vec3D) -> Vec3D[int]:
         ...
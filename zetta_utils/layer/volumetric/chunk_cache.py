@@ -0,0 +1,298 @@
+# pylint: disable=missing-docstring
+from __future__ import annotations
+
+import contextlib
+import itertools
+import threading
+from typing import Callable, Hashable, Iterator, Sequence
+
+import attrs
+import cachetools
+import numpy as np
+from numpy import typing as npt
+
+from zetta_utils import log
+
+logger = log.get_logger("zetta_utils")
+
+DEFAULT_CHUNK_CACHE_NUM_BYTES = 1024 ** 3
+
+ScaleKey = tuple
+ChunkKey = tuple
+
+
+@attrs.frozen
+class ChunkCacheStats:
+    hits: int
+    misses: int
+    evictions: int
+    num_bytes: int
+    max_bytes: int
+
+    def pformat(self) -> str:  # pragma: no cover
+        total = self.hits + self.misses
+        hit_rate = self.hits / total if total > 0 else 0.0
+        return (
+            f"hits: {self.hits}, misses: {self.misses} ({hit_rate:.1%} hit rate), "
+            f"evictions: {self.evictions}, "
+            f"size: {self.num_bytes / 2**20:.1f} / {self.max_bytes / 2**20:.1f} MiB"
+        )
+
+
+class _CountingLRUCache(cachetools.LRUCache):
+    def __init__(self, maxsize: int):
+        super().__init__(maxsize=maxsize, getsizeof=lambda e: e.nbytes)
+        self.evictions = 0
+
+    def popitem(self):
+        self.evictions += 1
+        return super().popitem()
+
+
+class ChunkCache:
+    """
+    Process-wide cache of decoded storage chunks, shared by all volumetric backends.
+
+    Chunks are keyed by ``(path, resolution, read options, chunk grid coordinate)`` and
+    evicted in LRU order once the total size of the cached arrays exceeds ``max_bytes``.
+    A cache with ``max_bytes == 0`` is disabled and passes all reads through.
+
+    :param max_bytes: Total byte budget of the cache.
+    """
+
+    def __init__(self, max_bytes: int = 0):
+        if max_bytes < 0:
+            raise ValueError("`max_bytes` must be nonnegative.")
+        self.max_bytes = max_bytes
+        self._cache = _CountingLRUCache(maxsize=max(max_bytes, 1))
+        self._lock = threading.Lock()
+        self._hits = 0
+        self._misses = 0
+        # Bumped on every invalidation, so that a fetch racing with a write
+        # does not put stale chunks back into the cache
+        self._generation = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def get_stats(self) -> ChunkCacheStats:
+        with self._lock:
+            return ChunkCacheStats(
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._cache.evictions,
+                num_bytes=int(self._cache.currsize),
+                max_bytes=self.max_bytes,
+            )
+
+    def clear(self) -> None:
+        with self._lock:
+            self._cache.clear()
+            self._generation += 1
+
+    def read(
+        self,
+        path: str,
+        resolution: Sequence[float],
+        start: Sequence[int],
+        stop: Sequence[int],
+        grid_offset: Sequence[int],
+        chunk_size: Sequence[int],
+        read_fn: Callable[[Sequence[int], Sequence[int]], npt.NDArray],
+        options: Hashable = None,
+    ) -> npt.NDArray:
+        """
+        Read the ``[start, stop)`` voxel region through the cache.
+
+        Chunks missing from the cache are split into boxes of missing chunks, so that
+        cached chunks are not read again, and each box is fetched with a single
+        ``read_fn`` call, split into chunks and inserted into the cache. ``read_fn``
+        receives voxel ``start`` and ``stop`` coordinates and must return a ``CXYZ``
+        array.
+
+        :param path: Absolute path of the layer.
+        :param resolution: Resolution of the read.
+        :param start: Start of the region, in voxels.
+        :param stop: End of the region, in voxels.
+        :param grid_offset: Offset of the storage chunk grid, in voxels.
+        :param chunk_size: Size of the storage chunks, in voxels.
+        :param read_fn: Function that reads a region from the storage.
+        :param options: Backend read options that affect the returned data; chunks read
+            with different options are cached separately.
+        """
+        if not self.enabled:
+            return read_fn(start, stop)
+        if any(b <= a for a, b in zip(start, stop)):
+            # Empty region: no chunks, so the backend gives the dtype and channels
+            return read_fn(start, stop)
+
+        scale_key = (path, tuple(resolution), options)
+        coords = list(_iter_grid_coords(start, stop, grid_offset, chunk_size))
+        chunks: dict[ChunkKey, npt.NDArray] = {}
+        with self._lock:
+            for coord in coords:
+                chunk = self._cache.get((scale_key, coord))
+                if chunk is not None:
+                    chunks[coord] = chunk
+            self._hits += len(chunks)
+            self._misses += len(coords) - len(chunks)
+            generation = self._generation
+
+        missing = [coord for coord in coords if coord not in chunks]
+        if len(missing) > 0:
+            chunks.update(
+                self._fetch(scale_key, missing, grid_offset, chunk_size, read_fn, generation),
+            )
+
+        any_chunk = next(iter(chunks.values()))
+        shape = [b - a for a, b in zip(start, stop)]
+        result = np.empty([any_chunk.shape[0]] + shape, dtype=any_chunk.dtype)
+        for coord, chunk in chunks.items():
+            chunk_start = [o + c * s for o, c, s in zip(grid_offset, coord, chunk_size)]
+            src, dst = _get_overlap_slices(chunk_start, chunk_size, start, stop)
+            result[(slice(None), *dst)] = chunk[(slice(None), *src)]
+        return result
+
+    def _fetch(
+        self,
+        scale_key: ScaleKey,
+        missing: list[ChunkKey],
+        grid_offset: Sequence[int],
+        chunk_size: Sequence[int],
+        read_fn: Callable[[Sequence[int], Sequence[int]], npt.NDArray],
+        generation: int,
+    ) -> dict[ChunkKey, npt.NDArray]:
+        result = {}
+        for coord_min, coord_max in _split_into_boxes(missing):
+            region_start = [o + c * s for o, c, s in zip(grid_offset, coord_min, chunk_size)]
+            region_stop = [o + c * s for o, c, s in zip(grid_offset, coord_max, chunk_size)]
+            data = read_fn(region_start, region_stop)
+            for coord in itertools.product(*(range(a, b) for a, b in zip(coord_min, coord_max))):
+                offset = [(c - c_min) * s for c, c_min, s in zip(coord, coord_min, chunk_size)]
+                slices = tuple(slice(o, o + s) for o, s in zip(offset, chunk_size))
+                result[coord] = np.ascontiguousarray(data[(slice(None), *slices)])
+
+        with self._lock:
+            if generation != self._generation:
+                return result
+            for coord, chunk in result.items():
+                try:
+                    self._cache[(scale_key, coord)] = chunk
+                except ValueError:  # chunk larger than the whole budget
+                    pass
+        return result
+
+    def invalidate(
+        self,
+        path: str,
+        resolution: Sequence[float] | None = None,
+        start: Sequence[int] | None = None,
+        stop: Sequence[int] | None = None,
+        grid_offset: Sequence[int] | None = None,
+        chunk_size: Sequence[int] | None = None,
+    ) -> None:
+        """
+        Drop cached chunks of the given layer, read with any options. If ``resolution``
+        is given, only the chunks at that resolution are dropped, and if the region and
+        chunk grid are given as well, only the chunks overlapping ``[start, stop)`` are
+        dropped.
+        """
+        if not self.enabled:
+            return
+        with self._lock:
+            keys = [k for k in self._cache if k[0][0] == path]
+            if resolution is not None:
+                keys = [k for k in keys if k[0][1] == tuple(resolution)]
+                if not (
+                    start is None or stop is None or grid_offset is None or chunk_size is None
+                ):
+                    coords = set(_iter_grid_coords(start, stop, grid_offset, chunk_size))
+                    keys = [k for k in keys if k[1] in coords]
+            for k in keys:
+                self._cache.pop(k, None)
+            self._generation += 1
+
+
+def _iter_grid_coords(
+    start: Sequence[int],
+    stop: Sequence[int],
+    grid_offset: Sequence[int],
+    chunk_size: Sequence[int],
+) -> Iterator[ChunkKey]:
+    ranges = [
+        range((a - o) // s, -((o - b) // s))
+        for a, b, o, s in zip(start, stop, grid_offset, chunk_size)
+    ]
+    return itertools.product(*ranges)
+
+
+def _split_into_boxes(coords: list[ChunkKey]) -> list[tuple[ChunkKey, ChunkKey]]:
+    """
+    Greedily partition the given grid coordinates into boxes, given as ``[min, max)``
+    coordinates, that contain only the given coordinates. Each box is grown from its
+    smallest coordinate along x, then y, then z.
+    """
+    remaining = set(coords)
+    boxes = []
+    for coord in sorted(coords):
+        if coord not in remaining:
+            continue
+        box_min = coord
+        box_max = [c + 1 for c in coord]
+        for axis in range(3):
+            while True:
+                # The slab of coordinates just past the box along the axis
+                ranges = [range(a, b) for a, b in zip(box_min, box_max)]
+                ranges[axis] = range(box_max[axis], box_max[axis] + 1)
+                if not all(e in remaining for e in itertools.product(*ranges)):
+                    break
+                box_max[axis] += 1
+        remaining.difference_update(
+            itertools.product(*(range(a, b) for a, b in zip(box_min, box_max)))
+        )
+        boxes.append((box_min, tuple(box_max)))
+    return boxes
+
+
+def _get_overlap_slices(
+    chunk_start: Sequence[int],
+    chunk_size: Sequence[int],
+    start: Sequence[int],
+    stop: Sequence[int],
+) -> tuple[tuple[slice, ...], tuple[slice, ...]]:
+    src = []
+    dst = []
+    for c, s, a, b in zip(chunk_start, chunk_size, start, stop):
+        lo = max(c, a)
+        hi = min(c + s, b)
+        src.append(slice(lo - c, hi - c))
+        dst.append(slice(lo - a, hi - a))
+    return tuple(src), tuple(dst)
+
+
+_chunk_cache = ChunkCache()
+
+
+def get_chunk_cache() -> ChunkCache:
+    """Returns the chunk cache of the current process."""
+    return _chunk_cache
+
+
+@contextlib.contextmanager
+def configure_chunk_cache(num_bytes: int = DEFAULT_CHUNK_CACHE_NUM_BYTES):
+    """
+    Context manager that sets up the process-wide chunk cache with the given byte budget,
+    restoring the previous cache on exit. ``num_bytes == 0`` disables the cache.
+    """
+    global _chunk_cache  # pylint: disable=global-statement
+    prev_cache = _chunk_cache
+    _chunk_cache = ChunkCache(max_bytes=num_bytes)
+    if num_bytes > 0:
+        logger.info(f"Configured chunk cache with {num_bytes / 2**20:.1f} MiB budget.")
+    try:
+        yield _chunk_cache
+    finally:
+        if _chunk_cache.enabled:
+            logger.info(f"Chunk cache stats: {_chunk_cache.get_stats().pformat()}")
+        _chunk_cache = prev_cache
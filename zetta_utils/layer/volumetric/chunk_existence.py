@@ -0,0 +1,43 @@
+# pylint: disable=missing-docstring
+from __future__ import annotations
+
+import math
+
+import attrs
+from numpy import typing as npt
+
+from zetta_utils.geometry import Vec3D
+
+from .index import VolumetricIndex
+
+
+@attrs.frozen(eq=False)
+class ChunkExistence:
+    """
+    Which storage chunks of a layer are present at a resolution, among the chunks
+    overlapping a region. Chunks outside of the region are taken to be present,
+    as nothing is known about them.
+
+    :param resolution: Resolution of the chunks.
+    :param start: Voxel start of the first chunk.
+    :param chunk_size: Size of the chunks, in voxels.
+    :param exists: For each chunk in X, Y, Z order, whether it is present.
+    """
+
+    resolution: Vec3D
+    start: Vec3D[int]
+    chunk_size: Vec3D[int]
+    exists: npt.NDArray
+
+    def any_in(self, idx: VolumetricIndex) -> bool:
+        """Whether any chunk overlapping the given index may be present."""
+        slices = []
+        for i in range(3):
+            start = math.floor(idx.bbox.start[i] / self.resolution[i])
+            stop = math.ceil(idx.bbox.end[i] / self.resolution[i])
+            grid_start = (start - self.start[i]) // self.chunk_size[i]
+            grid_stop = -((self.start[i] - stop) // self.chunk_size[i])
+            if grid_start < 0 or grid_stop > self.exists.shape[i]:
+                return True
+            slices.append(slice(grid_start, grid_stop))
+        return bool(self.exists[tuple(slices)].any())
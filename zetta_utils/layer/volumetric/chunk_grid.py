@@ -0,0 +1,216 @@
+# pylint: disable=missing-docstring
+from __future__ import annotations
+
+from typing import Iterator, Sequence, Tuple
+
+import attrs
+import numpy as np
+from numpy import typing as npt
+from typeguard import typechecked
+
+from zetta_utils.geometry import BBox3D, BBoxStrider, Vec3D
+
+from .index import VolumetricIndex
+
+DimBounds = Tuple[npt.NDArray, npt.NDArray, npt.NDArray]
+DimRanges = Tuple[npt.NDArray, npt.NDArray]
+
+
+@typechecked
+@attrs.frozen(eq=False)
+class ChunkGrid:
+    """
+    Compact representation of the chunks produced by a ``BBoxStrider``.
+
+    The chunks of a strider form a rectilinear grid, so instead of keeping one
+    ``VolumetricIndex`` per chunk, the grid keeps, for each dimension, the integer
+    voxel starts and stops of the chunks along that dimension. Chunks are ordered
+    as in ``BBoxStrider`` (X fastest) and only materialized as ``VolumetricIndex``
+    when indexed.
+
+    :param resolution: Resolution of the voxel coordinates.
+    :param dim_starts: For each of X, Y, Z, the sorted starts of the chunks along it.
+    :param dim_stops: For each of X, Y, Z, the sorted stops of the chunks along it.
+    :param chunk_id_start: ``chunk_id`` of the first chunk.
+    :param chunk_id_increment: Difference in ``chunk_id`` between consecutive chunks.
+    """
+
+    resolution: Vec3D
+    dim_starts: DimBounds
+    dim_stops: DimBounds
+    chunk_id_start: int = 0
+    chunk_id_increment: int = 0
+
+    @classmethod
+    def from_bbox_strider(
+        cls,
+        bbox_strider: BBoxStrider,
+        resolution: Sequence[float],
+        chunk_id_start: int = 0,
+        chunk_id_increment: int = 0,
+    ) -> ChunkGrid:
+        """
+        Build the grid of the chunks of ``bbox_strider``, in voxels at ``resolution``.
+
+        :param bbox_strider: Strider producing the chunks.
+        :param resolution: Resolution of the voxel coordinates of the grid. The chunk
+            bounds must be integral at this resolution.
+        :param chunk_id_start: ``chunk_id`` of the first chunk.
+        :param chunk_id_increment: Difference in ``chunk_id`` between consecutive chunks.
+        """
+        dim_starts = []
+        dim_stops = []
+        for dim, bounds in enumerate(bbox_strider.get_dim_bounds()):
+            bounds_in_vx = bounds / resolution[dim]
+            bounds_in_vx_int = np.round(bounds_in_vx).astype(np.int64)
+            if not np.allclose(bounds_in_vx, bounds_in_vx_int, rtol=0, atol=1e-4):
+                raise ValueError(
+                    f"Chunk bounds {bounds.tolist()} along dimension {dim} are not integral"
+                    f" at resolution {tuple(resolution)}."
+                )
+            dim_starts.append(bounds_in_vx_int[:, 0])
+            dim_stops.append(bounds_in_vx_int[:, 1])
+        return cls(
+            resolution=Vec3D(*resolution),
+            dim_starts=(dim_starts[0], dim_starts[1], dim_starts[2]),
+            dim_stops=(dim_stops[0], dim_stops[1], dim_stops[2]),
+            chunk_id_start=chunk_id_start,
+            chunk_id_increment=chunk_id_increment,
+        )
+
+    @classmethod
+    def from_index(cls, idx: VolumetricIndex) -> ChunkGrid:
+        """Build the grid consisting of the single chunk ``idx``."""
+        start = [np.array([e], dtype=np.int64) for e in idx.start]
+        stop = [np.array([e], dtype=np.int64) for e in idx.stop]
+        return cls(
+            resolution=idx.resolution,
+            dim_starts=(start[0], start[1], start[2]),
+            dim_stops=(stop[0], stop[1], stop[2]),
+            chunk_id_start=idx.chunk_id,
+        )
+
+    @property
+    def shape(self) -> Vec3D[int]:
+        """Number of chunks along each dimension."""
+        return Vec3D[int](*(len(e) for e in self.dim_starts))
+
+    def __len__(self) -> int:
+        return len(self.dim_starts[0]) * len(self.dim_starts[1]) * len(self.dim_starts[2])
+
+    def __getitem__(self, n: int) -> VolumetricIndex:
+        if not -len(self) <= n < len(self):
+            raise IndexError(f"Chunk index {n} out of range for {len(self)} chunks.")
+        if n < 0:
+            n += len(self)
+        steps = np.unravel_index(n, self.shape, order="F")
+        return VolumetricIndex(
+            resolution=self.resolution,
+            bbox=BBox3D.from_coords(
+                start_coord=[float(self.dim_starts[i][e]) for i, e in enumerate(steps)],
+                end_coord=[float(self.dim_stops[i][e]) for i, e in enumerate(steps)],
+                resolution=self.resolution,
+            ),
+            chunk_id=self.chunk_id_start + n * self.chunk_id_increment,
+        )
+
+    def __iter__(self) -> Iterator[VolumetricIndex]:
+        for n in range(len(self)):
+            yield self[n]
+
+    @property
+    def starts(self) -> npt.NDArray:
+        """``(N, 3)`` array of the voxel starts of all chunks, in chunk order."""
+        return self._broadcast(self.dim_starts)
+
+    @property
+    def stops(self) -> npt.NDArray:
+        """``(N, 3)`` array of the voxel stops of all chunks, in chunk order."""
+        return self._broadcast(self.dim_stops)
+
+    def _broadcast(self, dim_values: DimBounds) -> npt.NDArray:
+        grids = np.meshgrid(*dim_values, indexing="ij")
+        return np.stack([e.ravel(order="F") for e in grids], axis=1)
+
+    def padded(self, pad: Sequence[int]) -> ChunkGrid:
+        """Grid with every chunk padded by ``pad`` voxels on each side."""
+        return attrs.evolve(
+            self,
+            dim_starts=(
+                self.dim_starts[0] - pad[0],
+                self.dim_starts[1] - pad[1],
+                self.dim_starts[2] - pad[2],
+            ),
+            dim_stops=(
+                self.dim_stops[0] + pad[0],
+                self.dim_stops[1] + pad[1],
+                self.dim_stops[2] + pad[2],
+            ),
+        )
+
+    def cropped(self, crop: Sequence[int]) -> ChunkGrid:
+        """Grid with every chunk cropped by ``crop`` voxels on each side."""
+        return self.padded([-e for e in crop])
+
+    def intersects(self, idx: VolumetricIndex) -> npt.NDArray:
+        """Boolean mask of the chunks that intersect ``idx``, in chunk order."""
+        start, stop = self._get_idx_coords(idx)
+        return self._combine_dim_masks(
+            [
+                (self.dim_stops[i] > start[i]) & (self.dim_starts[i] < stop[i])
+                for i in range(3)
+            ]
+        )
+
+    def contained_in(self, idx: VolumetricIndex) -> npt.NDArray:
+        """Boolean mask of the chunks that are contained in ``idx``, in chunk order."""
+        start, stop = self._get_idx_coords(idx)
+        return self._combine_dim_masks(
+            [
+                (self.dim_starts[i] >= start[i]) & (self.dim_stops[i] <= stop[i])
+                for i in range(3)
+            ]
+        )
+
+    def _get_idx_coords(self, idx: VolumetricIndex) -> Tuple[npt.NDArray, npt.NDArray]:
+        start = np.array(idx.bbox.start, dtype=np.float64) / np.array(self.resolution)
+        stop = np.array(idx.bbox.end, dtype=np.float64) / np.array(self.resolution)
+        return start, stop
+
+    def _combine_dim_masks(self, dim_masks: list[npt.NDArray]) -> npt.NDArray:
+        mask = dim_masks[0][:, None, None] & dim_masks[1][None, :, None]
+        mask = mask & dim_masks[2][None, None, :]
+        return mask.ravel(order="F")
+
+    def get_overlap_ranges(self, other: ChunkGrid) -> Tuple[DimRanges, DimRanges, DimRanges]:
+        """
+        For each dimension and each chunk position along it, get the range of chunk
+        positions of ``other`` along the same dimension that overlap it. The chunks of
+        ``self`` at steps ``(i, j, k)`` therefore overlap exactly the block of chunks of
+        ``other`` given by ``get_block_indices`` of the ``i``-th X, ``j``-th Y and ``k``-th Z
+        ranges. Both grids must be at the same resolution.
+
+        :param other: Grid to find the overlapping chunks in.
+        :return: For each of X, Y, Z, the ``(lo, hi)`` arrays of the half-open ranges.
+        """
+        if self.resolution != other.resolution:
+            raise ValueError(
+                f"Grid resolutions differ: {self.resolution} and {other.resolution}."
+            )
+        ranges = [
+            (
+                np.searchsorted(other.dim_stops[i], self.dim_starts[i], side="right"),
+                np.searchsorted(other.dim_starts[i], self.dim_stops[i], side="left"),
+            )
+            for i in range(3)
+        ]
+        return (ranges[0], ranges[1], ranges[2])
+
+    def get_block_indices(self, ranges: Sequence[Tuple[int, int]]) -> npt.NDArray:
+        """
+        Flat indices, in chunk order, of the block of chunks spanning the given half-open
+        ranges of chunk positions along X, Y and Z.
+        """
+        steps = np.meshgrid(*(np.arange(lo, hi) for lo, hi in ranges), indexing="ij")
+        flat = np.ravel_multi_index(tuple(steps), self.shape, order="F")
+        return flat.ravel(order="F")
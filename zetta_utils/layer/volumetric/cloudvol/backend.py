@@ -2,7 +2,7 @@
 from __future__ import annotations
 
 from copy import deepcopy
-from typing import Any, Dict, Optional, Union
+from typing import Any, Dict, Optional, Sequence, Union
 
 import attrs
 import cachetools
@@ -15,12 +15,14 @@ from numpy import typing as npt
 from zetta_utils.common import abspath, is_local
 from zetta_utils.geometry import Vec3D
 
-from ...precomputed import PrecomputedInfoSpec, get_info
-from .. import VolumetricBackend, VolumetricIndex
+from ...precomputed import PrecomputedInfoSpec, get_chunk_existence, get_info
+from .. import ChunkExistence, VolumetricBackend, VolumetricIndex
+from ..chunk_cache import get_chunk_cache
 
 _cv_cache: cachetools.LRUCache = cachetools.LRUCache(maxsize=16)
 _cv_cached: Dict[str, set] = {}
 
+# Only used when the process-wide chunk cache is disabled
 IN_MEM_CACHE_NUM_BYTES_PER_CV = 128 * 1024 ** 2
 
 # To avoid reloading info file - note that an empty provenance is passed
@@ -35,7 +37,7 @@ def _get_cv_cached(
 ) -> cv.frontends.precomputed.CloudVolumePrecomputed:
     path_ = abspath(path)
     if cache_bytes_limit is None:
-        cache_bytes_limit = IN_MEM_CACHE_NUM_BYTES_PER_CV
+        cache_bytes_limit = 0 if get_chunk_cache().enabled else IN_MEM_CACHE_NUM_BYTES_PER_CV
     if (path_, resolution) in _cv_cache:
         return _cv_cache[(path_, resolution)]
     if resolution is not None:
@@ -69,8 +71,10 @@ def _clear_cv_cache(path: str | None = None) -> None:  # pragma: no cover
     if path is None:
         _cv_cached.clear()
         _cv_cache.clear()
+        get_chunk_cache().clear()
         return
     path_ = abspath(path)
+    get_chunk_cache().invalidate(path_)
     resolutions = _cv_cached.pop(path_, None)
     if resolutions is not None:
         for resolution in resolutions:
@@ -205,8 +209,32 @@ class CVBackend(VolumetricBackend):  # pylint: disable=too-few-public-methods
     def read(self, idx: VolumetricIndex) -> npt.NDArray:
         # Data out: cxyz
         cvol = _get_cv_cached(self.path, idx.resolution, **self.cv_kwargs)
-        data_raw = cvol[idx.to_slices()]
+        chunk_cache = get_chunk_cache()
+        if not chunk_cache.enabled or self.cv_kwargs["bounded"]:
+            return self._read_region(cvol, idx.start, idx.stop)
+        return chunk_cache.read(
+            path=abspath(self.path),
+            resolution=idx.resolution,
+            start=idx.start,
+            stop=idx.stop,
+            grid_offset=cvol.voxel_offset,
+            chunk_size=cvol.chunk_size,
+            read_fn=lambda start, stop: self._read_region(cvol, start, stop),
+            options=repr(sorted(self.cv_kwargs.items())),
+        )
 
+    def prefetch(self, idx: VolumetricIndex) -> None:
+        # bounded reads bypass the chunk cache, so there is nothing to prefetch into
+        if not self.cv_kwargs["bounded"]:
+            super().prefetch(idx)
+
+    @staticmethod
+    def _read_region(
+        cvol: cv.frontends.precomputed.CloudVolumePrecomputed,
+        start: Sequence[int],
+        stop: Sequence[int],
+    ) -> npt.NDArray:
+        data_raw = cvol[tuple(slice(a, b) for a, b in zip(start, stop))]
         result = np.transpose(data_raw, (3, 0, 1, 2))
         return np.array(result)
 
@@ -237,6 +265,16 @@ class CVBackend(VolumetricBackend):  # pylint: disable=too-few-public-methods
             data_final = data_final.astype(np.uint64)
         cvol[slices] = data_final
         cvol.autocrop = False
+        chunk_cache = get_chunk_cache()
+        if chunk_cache.enabled:
+            chunk_cache.invalidate(
+                abspath(self.path),
+                resolution=idx.resolution,
+                start=idx.start,
+                stop=idx.stop,
+                grid_offset=cvol.voxel_offset,
+                chunk_size=cvol.chunk_size,
+            )
 
     def with_changes(self, **kwargs) -> CVBackend:
         """Currently untyped. Supports:
@@ -300,6 +338,18 @@ class CVBackend(VolumetricBackend):  # pylint: disable=too-few-public-methods
         )
         return result
 
+    def get_chunk_existence(self, idx: VolumetricIndex) -> ChunkExistence | None:
+        result = get_chunk_existence(self.path, idx.resolution, idx.start, idx.stop)
+        if result is None:
+            return None
+        start, exists = result
+        return ChunkExistence(
+            resolution=idx.resolution,
+            start=start,
+            chunk_size=self.get_chunk_size(idx.resolution),
+            exists=exists,
+        )
+
     def get_voxel_offset(self, resolution: Vec3D) -> Vec3D[int]:
         cvol = _get_cv_cached(self.path, resolution=resolution, **self.cv_kwargs)
         return Vec3D[int](*cvol.voxel_offset)
@@ -77,6 +77,9 @@ class ConstantVolumetricBackend(VolumetricBackend):  # pylint: disable=too-few-p
     def clear_cache(self) -> None:  # pragma: no cover
         pass
 
+    def prefetch(self, idx: VolumetricIndex) -> None:  # pragma: no cover
+        pass
+
     def read(self, idx: VolumetricIndex) -> npt.NDArray:
         # Data out: cxyz
         slices = idx.to_slices()
@@ -38,6 +38,9 @@ class VolumetricIndex:  # pragma: no cover # pure delegation, no logic
     chunk_id: int = 0
     allow_slice_rounding: bool = False
 
+    def __mazepa_hash__(self) -> tuple:
+        return (self.resolution, self.bbox, self.chunk_id, self.allow_slice_rounding)
+
     @property
     def start(self) -> Vec3D[int]:
         return Vec3D[int](*(e.start for e in self.to_slices()))
@@ -37,6 +37,9 @@ class VolumetricLayer(Layer[VolumetricIndex, npt.NDArray, npt.NDArray | torch.Te
         idx_backend = self.frontend.convert_idx(idx)
         return self.read_with_procs(idx=idx_backend)
 
+    def prefetch(self, idx: UserVolumetricIndex) -> None:
+        self.prefetch_with_procs(idx=self.frontend.convert_idx(idx))
+
     def __setitem__(
         self, idx: UserVolumetricIndex, data: npt.NDArray | torch.Tensor | float | int | bool
     ):
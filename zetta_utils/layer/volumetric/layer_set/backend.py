@@ -182,6 +182,10 @@ class VolumetricSetBackend(
     def read(self, idx: VolumetricIndex) -> dict[str, npt.NDArray]:
         return {k: v.read_with_procs(idx) for k, v in self.layers.items()}
 
+    def prefetch(self, idx: VolumetricIndex) -> None:
+        for v in self.layers.values():
+            v.prefetch_with_procs(idx)
+
     def write(self, idx: VolumetricIndex, data: Mapping[str, npt.NDArray | torch.Tensor]):
         for k, v in data.items():
             self.layers[k].write_with_procs(idx, v)
@@ -0,0 +1,6 @@
+from .backend import MemoryVolumetricBackend
+from .buffer_pool import (
+    MemoryBufferPool,
+    configure_memory_buffer_pool,
+    get_memory_buffer_pool,
+)
@@ -0,0 +1,167 @@
+# pylint: disable=missing-docstring
+from __future__ import annotations
+
+from typing import Union
+
+import attrs
+import numpy as np
+from numpy import typing as npt
+
+from zetta_utils.geometry import Vec3D
+
+from .. import VolumetricBackend, VolumetricIndex
+from .buffer_pool import get_memory_buffer_pool
+
+
+@attrs.mutable
+class MemoryVolumetricBackend(VolumetricBackend):  # pylint: disable=too-few-public-methods
+    """
+    Backend that keeps its data in the memory buffer pool of the current process, which
+    spills to the local disk when it runs out of its byte budget. Meant for intermediary
+    layers that are written and read back by the same process; other processes see an
+    empty layer. Regions that were never written read as zeros.
+
+    :param name: Name of the layer in the pool.
+    :param dtype: Data type of the layer.
+    :param num_channels: Number of channels of the layer.
+    :param voxel_offsets: Voxel offset of the chunk grid at each resolution.
+    :param chunk_sizes: Chunk size at each resolution.
+    :param dataset_sizes: Dataset size at each resolution.
+    """
+
+    name: str
+    dtype: np.dtype = attrs.field(converter=np.dtype)
+    num_channels: int = 1
+    voxel_offsets: dict[Vec3D, Vec3D[int]] = attrs.field(factory=dict)
+    chunk_sizes: dict[Vec3D, Vec3D[int]] = attrs.field(factory=dict)
+    dataset_sizes: dict[Vec3D, Vec3D[int]] = attrs.field(factory=dict)
+    _enforce_chunk_aligned_writes: bool = False
+
+    @property
+    def is_local(self) -> bool:  # pragma: no cover
+        return True
+
+    @property
+    def enforce_chunk_aligned_writes(self) -> bool:  # pragma: no cover
+        return self._enforce_chunk_aligned_writes
+
+    @enforce_chunk_aligned_writes.setter
+    def enforce_chunk_aligned_writes(self, value: bool) -> None:  # pragma: no cover
+        self._enforce_chunk_aligned_writes = value
+
+    @property
+    def allow_cache(self) -> bool:  # pragma: no cover
+        return False
+
+    @allow_cache.setter
+    def allow_cache(self, value: Union[bool, str]) -> None:  # pragma: no cover
+        raise NotImplementedError("cannot set `allow_cache` for MemoryVolumetricBackend directly;")
+
+    @property
+    def use_compression(self) -> bool:  # pragma: no cover
+        return False
+
+    @use_compression.setter
+    def use_compression(self, value: bool) -> None:  # pragma: no cover
+        raise NotImplementedError(
+            "cannot set `use_compression` for MemoryVolumetricBackend directly;"
+        )
+
+    def clear_cache(self) -> None:  # pragma: no cover
+        pass
+
+    def prefetch(self, idx: VolumetricIndex) -> None:  # pragma: no cover
+        pass
+
+    def read(self, idx: VolumetricIndex) -> npt.NDArray:
+        # Data out: cxyz
+        return get_memory_buffer_pool().read(
+            name=self.name,
+            resolution=idx.resolution,
+            start=idx.start,
+            stop=idx.stop,
+            grid_offset=self.get_voxel_offset(idx.resolution),
+            chunk_size=self.get_chunk_size(idx.resolution),
+            num_channels=self.num_channels,
+            dtype=self.dtype,
+        )
+
+    def write(self, idx: VolumetricIndex, data: npt.NDArray):
+        # Data in: cxyz
+        if self.enforce_chunk_aligned_writes:
+            self.assert_idx_is_chunk_aligned(idx)
+        if data.size == 1 and len(data.shape) == 1:
+            data = np.broadcast_to(data, (self.num_channels, *idx.shape))
+        get_memory_buffer_pool().write(
+            name=self.name,
+            resolution=idx.resolution,
+            start=idx.start,
+            data=data,
+            grid_offset=self.get_voxel_offset(idx.resolution),
+            chunk_size=self.get_chunk_size(idx.resolution),
+            dtype=self.dtype,
+        )
+
+    def delete(self) -> None:
+        """Drop the data of the layer from the memory buffer pool."""
+        get_memory_buffer_pool().delete(self.name)
+
+    def with_changes(self, **kwargs) -> MemoryVolumetricBackend:
+        """Currently untyped. Supports:
+        "name" = value: str
+        "allow_cache" = value: Union[bool, str] - ignored, the data is always in memory
+        "use_compression" = Value: bool - ignored, the data is never compressed
+        "enforce_chunk_aligned_writes" = value: bool
+        "voxel_offset_res" = (voxel_offset, resolution): Tuple[Vec3D[int], Vec3D]
+        "chunk_size_res" = (chunk_size, resolution): Tuple[Vec3D[int], Vec3D]
+        "dataset_size_res" = (dataset_size, resolution): Tuple[Vec3D[int], Vec3D]
+        """
+        implemented_keys = [
+            "name",
+            "allow_cache",
+            "enforce_chunk_aligned_writes",
+            "voxel_offset_res",
+            "chunk_size_res",
+            "dataset_size_res",
+            "use_compression",
+        ]
+        keys_to_fields = {
+            "voxel_offset_res": "voxel_offsets",
+            "chunk_size_res": "chunk_sizes",
+            "dataset_size_res": "dataset_sizes",
+        }
+
+        evolve_kwargs: dict = {}
+        for k, v in kwargs.items():
+            if k not in implemented_keys:
+                raise KeyError(f"key `{k}` received, expected one of `{implemented_keys}`")
+            if k == "name":
+                evolve_kwargs["name"] = v
+            elif k == "enforce_chunk_aligned_writes":
+                evolve_kwargs["enforce_chunk_aligned_writes"] = v
+            elif k in keys_to_fields:
+                field = keys_to_fields[k]
+                value, resolution = v
+                evolve_kwargs[field] = {
+                    **getattr(self, field),
+                    Vec3D(*resolution): Vec3D[int](*value),
+                }
+        return attrs.evolve(self, **evolve_kwargs)
+
+    def get_voxel_offset(self, resolution: Vec3D) -> Vec3D[int]:
+        return self.voxel_offsets.get(Vec3D(*resolution), Vec3D[int](0, 0, 0))
+
+    def get_chunk_size(self, resolution: Vec3D) -> Vec3D[int]:
+        return self.chunk_sizes[Vec3D(*resolution)]
+
+    def get_dataset_size(self, resolution: Vec3D) -> Vec3D[int]:
+        return self.dataset_sizes[Vec3D(*resolution)]
+
+    def get_bounds(self, resolution: Vec3D) -> VolumetricIndex:
+        offset = self.get_voxel_offset(resolution)
+        return VolumetricIndex.from_coords(
+            offset, offset + self.get_dataset_size(resolution), Vec3D(*resolution)
+        )
+
+    def pformat(self) -> str:  # pragma: no cover
+        return f"MemoryVolumetricBackend<{self.name}>"
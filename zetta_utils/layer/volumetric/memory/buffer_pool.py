@@ -0,0 +1,325 @@
+# pylint: disable=missing-docstring
+from __future__ import annotations
+
+import contextlib
+import itertools
+import os
+import shutil
+import tempfile
+import threading
+from collections import OrderedDict, defaultdict
+from typing import Sequence
+
+import attrs
+import numpy as np
+from numpy import typing as npt
+
+from zetta_utils import log
+
+from ..chunk_cache import _get_overlap_slices, _iter_grid_coords
+
+logger = log.get_logger("zetta_utils")
+
+DEFAULT_MEMORY_BUFFER_POOL_NUM_BYTES = 4 * 1024 ** 3
+
+ChunkKey = tuple
+
+
+@attrs.frozen
+class MemoryBufferPoolStats:
+    num_bytes: int
+    max_bytes: int
+    num_spilled_bytes: int
+    spills: int
+    loads: int
+
+    def pformat(self) -> str:  # pragma: no cover
+        return (
+            f"size: {self.num_bytes / 2**20:.1f} / {self.max_bytes / 2**20:.1f} MiB, "
+            f"spilled: {self.num_spilled_bytes / 2**20:.1f} MiB, "
+            f"spills: {self.spills}, loads: {self.loads}"
+        )
+
+
+class MemoryBufferPool:  # pylint: disable=too-many-instance-attributes
+    """
+    Process-wide pool of the storage chunks of in-memory volumetric layers.
+
+    Chunks are keyed by ``(name, resolution, chunk grid coordinate)``. Once the total
+    size of the chunks held in memory exceeds ``max_bytes``, the least recently used
+    chunks are spilled to files under ``spill_dir`` and loaded back when they are next
+    accessed. Chunks that were never written read as zeros. Spilled chunks are written
+    and loaded without holding the lock of the pool, so that threads working on chunks
+    in memory are not held up by the disk.
+
+    :param max_bytes: Byte budget of the chunks held in memory.
+    :param spill_dir: Local directory for the spilled chunks. A temporary directory
+        is made on the first spill when not given.
+    """
+
+    def __init__(
+        self, max_bytes: int = DEFAULT_MEMORY_BUFFER_POOL_NUM_BYTES, spill_dir: str | None = None
+    ):
+        if max_bytes < 0:
+            raise ValueError("`max_bytes` must be nonnegative.")
+        self.max_bytes = max_bytes
+        self._spill_dir = spill_dir
+        self._owns_spill_dir = False
+        self._chunks: OrderedDict[ChunkKey, npt.NDArray] = OrderedDict()
+        # Chunks evicted from memory that are being written to disk, with their spill ID
+        self._spilling: dict[ChunkKey, tuple[npt.NDArray, int]] = {}
+        self._spilled: dict[ChunkKey, tuple[str, int]] = {}
+        # Spilled chunks that are being loaded back
+        self._loading: set[ChunkKey] = set()
+        self._keys_by_name: defaultdict[str, set[ChunkKey]] = defaultdict(set)
+        self._spill_ids = itertools.count()
+        self._lock = threading.Lock()
+        self._loaded = threading.Condition(self._lock)
+        self._num_bytes = 0
+        self._num_spilled_bytes = 0
+        self._spills = 0
+        self._loads = 0
+
+    def get_stats(self) -> MemoryBufferPoolStats:
+        with self._lock:
+            return MemoryBufferPoolStats(
+                num_bytes=self._num_bytes,
+                max_bytes=self.max_bytes,
+                num_spilled_bytes=self._num_spilled_bytes,
+                spills=self._spills,
+                loads=self._loads,
+            )
+
+    def read(
+        self,
+        name: str,
+        resolution: Sequence[float],
+        start: Sequence[int],
+        stop: Sequence[int],
+        grid_offset: Sequence[int],
+        chunk_size: Sequence[int],
+        num_channels: int,
+        dtype: np.dtype,
+    ) -> npt.NDArray:
+        """
+        Read the ``[start, stop)`` voxel region of the given layer as a ``CXYZ`` array.
+
+        :param name: Name of the layer.
+        :param resolution: Resolution of the read.
+        :param start: Start of the region, in voxels.
+        :param stop: End of the region, in voxels.
+        :param grid_offset: Offset of the chunk grid, in voxels.
+        :param chunk_size: Size of the chunks, in voxels.
+        :param num_channels: Number of channels of the layer.
+        :param dtype: Data type of the layer.
+        """
+        shape = [b - a for a, b in zip(start, stop)]
+        result = np.zeros([num_channels] + shape, dtype=dtype, order="F")
+        coords = list(_iter_grid_coords(start, stop, grid_offset, chunk_size))
+        keys = [(name, tuple(resolution), coord) for coord in coords]
+        to_spill: list[tuple[ChunkKey, npt.NDArray, int]] = []
+        with self._lock:
+            self._load_spilled(keys, to_spill)
+            for key, coord in zip(keys, coords):
+                chunk = self._get_chunk(key, to_spill)
+                if chunk is None:
+                    continue
+                chunk_start = [o + c * s for o, c, s in zip(grid_offset, coord, chunk_size)]
+                src, dst = _get_overlap_slices(chunk_start, chunk_size, start, stop)
+                result[(slice(None), *dst)] = chunk[(slice(None), *src)]
+        self._spill(to_spill)
+        return result
+
+    def write(
+        self,
+        name: str,
+        resolution: Sequence[float],
+        start: Sequence[int],
+        data: npt.NDArray,
+        grid_offset: Sequence[int],
+        chunk_size: Sequence[int],
+        dtype: np.dtype,
+    ) -> None:
+        """
+        Write the ``CXYZ`` array ``data`` to the given layer, starting at ``start``.
+        Parts of the chunks that are not covered by ``data`` keep their values.
+
+        :param name: Name of the layer.
+        :param resolution: Resolution of the write.
+        :param start: Start of the region, in voxels.
+        :param data: Data to write.
+        :param grid_offset: Offset of the chunk grid, in voxels.
+        :param chunk_size: Size of the chunks, in voxels.
+        :param dtype: Data type of the layer.
+        """
+        stop = [a + s for a, s in zip(start, data.shape[1:])]
+        coords = list(_iter_grid_coords(start, stop, grid_offset, chunk_size))
+        keys = [(name, tuple(resolution), coord) for coord in coords]
+        to_spill: list[tuple[ChunkKey, npt.NDArray, int]] = []
+        with self._lock:
+            self._load_spilled(keys, to_spill)
+            for key, coord in zip(keys, coords):
+                chunk = self._get_chunk(key, to_spill)
+                if chunk is None:
+                    chunk = np.zeros([data.shape[0]] + list(chunk_size), dtype=dtype, order="F")
+                    self._insert(key, chunk, to_spill)
+                chunk_start = [o + c * s for o, c, s in zip(grid_offset, coord, chunk_size)]
+                src, dst = _get_overlap_slices(chunk_start, chunk_size, start, stop)
+                # The chunk has to be updated before the next one is fetched, which
+                # may evict it
+                chunk[(slice(None), *src)] = data[(slice(None), *dst)]
+        self._spill(to_spill)
+
+    def delete(self, name: str) -> None:
+        """Drop all chunks of the given layer, both in memory and spilled."""
+        spill_paths = []
+        with self._lock:
+            for key in self._keys_by_name.pop(name, set()):
+                chunk = self._chunks.pop(key, None)
+                if chunk is not None:
+                    self._num_bytes -= chunk.nbytes
+                self._spilling.pop(key, None)
+                self._loading.discard(key)
+                if key in self._spilled:
+                    spill_path, nbytes = self._spilled.pop(key)
+                    self._num_spilled_bytes -= nbytes
+                    spill_paths.append(spill_path)
+        for spill_path in spill_paths:
+            os.remove(spill_path)
+
+    def delete_with_prefix(self, prefix: str) -> None:
+        """Drop all chunks of the layers whose name starts with ``prefix``."""
+        with self._lock:
+            names = [e for e in self._keys_by_name if e.startswith(prefix)]
+        for name in names:
+            self.delete(name)
+
+    def close(self) -> None:
+        """Drop all chunks, and remove the spill directory if it was made by the pool."""
+        with self._lock:
+            if not self._owns_spill_dir:
+                for spill_path, _ in self._spilled.values():
+                    os.remove(spill_path)
+            self._chunks.clear()
+            self._spilling.clear()
+            self._spilled.clear()
+            self._loading.clear()
+            self._keys_by_name.clear()
+            self._num_bytes = 0
+            self._num_spilled_bytes = 0
+            if self._owns_spill_dir and self._spill_dir is not None:
+                shutil.rmtree(self._spill_dir, ignore_errors=True)
+                self._spill_dir = None
+                self._owns_spill_dir = False
+
+    def _load_spilled(
+        self, keys: list[ChunkKey], to_spill: list[tuple[ChunkKey, npt.NDArray, int]]
+    ) -> None:
+        """
+        Load the given chunks that are spilled back into memory. Has to be called with
+        the lock held, which is released while the files are read.
+        """
+        while True:
+            self._loaded.wait_for(lambda: self._loading.isdisjoint(keys))
+            to_load = {key: self._spilled.pop(key) for key in keys if key in self._spilled}
+            if len(to_load) == 0:
+                return
+            self._loading.update(to_load)
+            self._num_spilled_bytes -= sum(nbytes for _, nbytes in to_load.values())
+            loaded = {}
+            self._lock.release()
+            try:
+                for key, (spill_path, _) in to_load.items():
+                    loaded[key] = np.load(spill_path)
+                    os.remove(spill_path)
+            finally:
+                self._lock.acquire()  # pylint: disable=consider-using-with
+                for key in to_load:
+                    # Chunks of layers deleted in the meantime are dropped
+                    if key in self._loading and key in loaded:
+                        self._insert(key, loaded[key], to_spill)
+                        self._loads += 1
+                    self._loading.discard(key)
+                self._loaded.notify_all()
+
+    def _get_chunk(
+        self, key: ChunkKey, to_spill: list[tuple[ChunkKey, npt.NDArray, int]]
+    ) -> npt.NDArray | None:
+        chunk = self._chunks.get(key)
+        if chunk is not None:
+            self._chunks.move_to_end(key)
+            return chunk
+        if key in self._spilling:
+            # Still in memory, so the spill is called off
+            chunk = self._spilling.pop(key)[0]
+            self._insert(key, chunk, to_spill)
+            return chunk
+        assert key not in self._spilled and key not in self._loading
+        return None
+
+    def _insert(
+        self,
+        key: ChunkKey,
+        chunk: npt.NDArray,
+        to_spill: list[tuple[ChunkKey, npt.NDArray, int]],
+    ) -> None:
+        self._chunks[key] = chunk
+        self._keys_by_name[key[0]].add(key)
+        self._num_bytes += chunk.nbytes
+        # Always keep the chunk that was just inserted, as the caller is about to use it
+        while self._num_bytes > self.max_bytes and len(self._chunks) > 1:
+            evicted_key, evicted = self._chunks.popitem(last=False)
+            self._num_bytes -= evicted.nbytes
+            spill_id = next(self._spill_ids)
+            self._spilling[evicted_key] = (evicted, spill_id)
+            to_spill.append((evicted_key, evicted, spill_id))
+        if len(to_spill) > 0 and self._spill_dir is None:
+            self._spill_dir = tempfile.mkdtemp(prefix="zetta_memory_pool_")
+            self._owns_spill_dir = True
+
+    def _spill(self, to_spill: list[tuple[ChunkKey, npt.NDArray, int]]) -> None:
+        """Write the evicted chunks to disk. Has to be called without the lock held."""
+        for key, chunk, spill_id in to_spill:
+            with self._lock:
+                # The chunk may have been accessed or deleted since it was evicted
+                if self._spilling.get(key, (None, None))[1] != spill_id:
+                    continue
+                assert self._spill_dir is not None
+                spill_path = os.path.join(self._spill_dir, f"{spill_id}.npy")
+            np.save(spill_path, chunk)
+            with self._lock:
+                if self._spilling.get(key, (None, None))[1] == spill_id:
+                    del self._spilling[key]
+                    self._spilled[key] = (spill_path, chunk.nbytes)
+                    self._num_spilled_bytes += chunk.nbytes
+                    self._spills += 1
+                    continue
+            os.remove(spill_path)
+
+
+_memory_buffer_pool = MemoryBufferPool()
+
+
+def get_memory_buffer_pool() -> MemoryBufferPool:
+    """Returns the memory buffer pool of the current process."""
+    return _memory_buffer_pool
+
+
+@contextlib.contextmanager
+def configure_memory_buffer_pool(
+    num_bytes: int = DEFAULT_MEMORY_BUFFER_POOL_NUM_BYTES, spill_dir: str | None = None
+):
+    """
+    Context manager that sets up the process-wide memory buffer pool with the given byte
+    budget and spill directory, restoring the previous pool on exit.
+    """
+    global _memory_buffer_pool  # pylint: disable=global-statement
+    prev_pool = _memory_buffer_pool
+    _memory_buffer_pool = MemoryBufferPool(max_bytes=num_bytes, spill_dir=spill_dir)
+    logger.info(f"Configured memory buffer pool with {num_bytes / 2**20:.1f} MiB budget.")
+    try:
+        yield _memory_buffer_pool
+    finally:
+        logger.info(f"Memory buffer pool stats: {_memory_buffer_pool.get_stats().pformat()}")
+        _memory_buffer_pool.close()
+        _memory_buffer_pool = prev_pool
@@ -41,6 +41,9 @@ class VolumetricBasedLayerProtocol(Protocol[DataT, IndexT]):
     def __getitem__(self, idx: IndexT) -> DataT:
         ...
 
+    def prefetch(self, idx: IndexT) -> None:
+        ...
+
     def pformat(self) -> str:
         ...
 
@@ -2,6 +2,7 @@
 from __future__ import annotations
 
 import ast
+from concurrent.futures import Future
 from copy import deepcopy
 from typing import Any, Dict, Optional, Union, overload
 
@@ -17,8 +18,9 @@ from zetta_utils import tensor_ops
 from zetta_utils.common import abspath, is_local
 from zetta_utils.geometry import Vec3D
 
-from ...precomputed import PrecomputedInfoSpec
-from .. import VolumetricBackend, VolumetricIndex
+from ...precomputed import PrecomputedInfoSpec, get_chunk_existence
+from .. import ChunkExistence, VolumetricBackend, VolumetricIndex
+from ..chunk_cache import get_chunk_cache
 from ..cloudvol import CVBackend
 from ..layer_set import VolumetricSetBackend
 
@@ -56,7 +58,9 @@ def _clear_ts_cache(path: str | None = None) -> None:  # pragma: no cover
     if path is None:
         _ts_cached.clear()
         _ts_cache.clear()
+        get_chunk_cache().clear()
         return
+    get_chunk_cache().invalidate(abspath(path))
     resolutions = _ts_cached.pop(abspath(path), None)
     if resolutions is not None:
         for resolution in resolutions:
@@ -200,13 +204,60 @@ class TSBackend(VolumetricBackend):  # pylint: disable=too-few-public-methods
     def read(self, idx: VolumetricIndex) -> npt.NDArray:
         # Data out: cxyz
         ts = _get_ts_at_resolution(self.path, self.cache_bytes_limit, str(list(idx.resolution)))
+        chunk_cache = get_chunk_cache()
+        if not chunk_cache.enabled:
+            return self._read_region(ts, idx)
+        return chunk_cache.read(
+            path=abspath(self.path),
+            resolution=idx.resolution,
+            start=idx.start,
+            stop=idx.stop,
+            grid_offset=self.get_voxel_offset(idx.resolution),
+            chunk_size=self.get_chunk_size(idx.resolution),
+            read_fn=lambda start, stop: self._read_region(
+                ts, VolumetricIndex.from_coords(start, stop, idx.resolution)
+            ),
+        )
+
+    def read_async(self, idx: VolumetricIndex) -> Future[npt.NDArray]:
+        # With the chunk cache disabled, use the native TensorStore future; otherwise
+        # go through the thread pool so that the fetched chunks land in the cache
+        if get_chunk_cache().enabled:
+            return super().read_async(idx)
+        ts = _get_ts_at_resolution(self.path, self.cache_bytes_limit, str(list(idx.resolution)))
+        with suppress_type_checks():
+            bounds = self.get_bounds(idx.resolution)
+            idx_inbounds = bounds.intersection(idx)
+
+        result: Future[npt.NDArray] = Future()
+        result.set_running_or_notify_cancel()
 
+        def _on_done(ts_future: tensorstore.Future) -> None:
+            try:
+                result.set_result(
+                    self._finalize_read(np.array(ts_future.result()), idx, idx_inbounds, bounds)
+                )
+            except Exception as e:  # pylint: disable=broad-except
+                result.set_exception(e)
+
+        ts[idx_inbounds.to_slices()].read().add_done_callback(_on_done)
+        return result
+
+    def _read_region(self, ts: tensorstore.TensorStore, idx: VolumetricIndex) -> npt.NDArray:
         with suppress_type_checks():
             bounds = self.get_bounds(idx.resolution)
             idx_inbounds = bounds.intersection(idx)
 
         data_raw = np.array(ts[idx_inbounds.to_slices()])
+        return self._finalize_read(data_raw, idx, idx_inbounds, bounds)
 
+    @staticmethod
+    def _finalize_read(
+        data_raw: npt.NDArray,
+        idx: VolumetricIndex,
+        idx_inbounds: VolumetricIndex,
+        bounds: VolumetricIndex,
+    ) -> npt.NDArray:
         if idx_inbounds != idx:
             with suppress_type_checks():
                 _, subindex = bounds.get_intersection_and_subindex(idx)
@@ -248,6 +299,16 @@ class TSBackend(VolumetricBackend):  # pylint: disable=too-few-public-methods
         else:
             slices = idx.to_slices()
             ts[slices] = data_final
+        chunk_cache = get_chunk_cache()
+        if chunk_cache.enabled:
+            chunk_cache.invalidate(
+                abspath(self.path),
+                resolution=idx.resolution,
+                start=idx.start,
+                stop=idx.stop,
+                grid_offset=self.get_voxel_offset(idx.resolution),
+                chunk_size=self.get_chunk_size(idx.resolution),
+            )
 
     def with_changes(self, **kwargs) -> TSBackend:
         """Currently untyped. Supports:
@@ -307,6 +368,18 @@ class TSBackend(VolumetricBackend):  # pylint: disable=too-few-public-methods
             info_keep_existing_scales=True,
         )
 
+    def get_chunk_existence(self, idx: VolumetricIndex) -> ChunkExistence | None:
+        result = get_chunk_existence(self.path, idx.resolution, idx.start, idx.stop)
+        if result is None:
+            return None
+        start, exists = result
+        return ChunkExistence(
+            resolution=idx.resolution,
+            start=start,
+            chunk_size=self.get_chunk_size(idx.resolution),
+            exists=exists,
+        )
+
     def get_voxel_offset(self, resolution: Vec3D) -> Vec3D[int]:
         ts = _get_ts_at_resolution(self.path, self.cache_bytes_limit, str(list(resolution)))
         return Vec3D[int](*ts.chunk_layout.grid_origin[0:3])
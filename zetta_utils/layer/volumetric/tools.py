@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from typing import List, Literal, Optional, Sequence, Tuple
+from typing import Iterator, List, Literal, Optional, Sequence, Tuple
 
 import attrs
 import numpy as np
@@ -12,7 +12,7 @@ from zetta_utils.geometry import BBoxStrider, IntVec3D, Vec3D
 from zetta_utils.geometry.bbox import Slices3D
 
 from .. import IndexChunker, JointIndexDataProcessor
-from . import VolumetricIndex
+from . import ChunkGrid, VolumetricIndex
 
 logger = log.get_logger("zetta_utils")
 
@@ -265,10 +265,19 @@ class VolumetricIndexChunker(IndexChunker[VolumetricIndex]):
         `__call__(idx, stride_start_offset=None, mode="expand")`:
             Divides a `VolumetricIndex` into chunks based on specified parameters.
 
+        `iter_chunks(idx, stride_start_offset=None, mode="expand")`:
+            Same as `__call__`, but lazily yields the chunks one at a time.
+
+        `get_chunk_grid(idx, stride_start_offset=None, mode="expand")`:
+            Same as `__call__`, but returns the chunks as a compact `ChunkGrid`.
+
         `get_shape(idx, stride_start_offset=None, mode="expand")`:
             Returns the shape of the division (i.e., how many chunks the volume
             would be divided into in x, y, and z) without actually creating them.
 
+        `get_num_chunks(idx, stride_start_offset=None, mode="expand")`:
+            Returns the total number of chunks without actually creating them.
+
         `split_into_nonoverlapping_chunkers(pad=Vec3D[int](0, 0, 0))`:
             Returns 8 chunkers related to this one in the following way: each one
             has the same `chunk_size` and `resolution` as this one, but with
@@ -297,19 +306,38 @@ class VolumetricIndexChunker(IndexChunker[VolumetricIndex]):
         mode: Literal["shrink", "expand", "exact"] = "expand",
         chunk_id_increment: int = 0,
     ) -> List[VolumetricIndex]:
+        return list(self.iter_chunks(idx, stride_start_offset, mode, chunk_id_increment))
+
+    def iter_chunks(
+        self,
+        idx: VolumetricIndex,
+        stride_start_offset: Optional[Vec3D[int]] = None,
+        mode: Literal["shrink", "expand", "exact"] = "expand",
+        chunk_id_increment: int = 0,
+    ) -> Iterator[VolumetricIndex]:
         bbox_strider = self._get_bbox_strider(idx, stride_start_offset, mode)
         if self.max_superchunk_size is not None:
             logger.debug(f"Superchunk size: {bbox_strider.chunk_size}")  # pragma: no cover
-        bbox_chunks = bbox_strider.get_all_chunk_bboxes()
-        result = [
-            VolumetricIndex(
+        for i, bbox_chunk in enumerate(bbox_strider.iter_chunk_bboxes()):
+            yield VolumetricIndex(
                 resolution=idx.resolution,
                 bbox=bbox_chunk,
                 chunk_id=idx.chunk_id + i * chunk_id_increment,
             )
-            for i, bbox_chunk in enumerate(bbox_chunks)
-        ]
-        return result
+
+    def get_chunk_grid(
+        self,
+        idx: VolumetricIndex,
+        stride_start_offset: Optional[Vec3D[int]] = None,
+        mode: Literal["shrink", "expand", "exact"] = "expand",
+        chunk_id_increment: int = 0,
+    ) -> ChunkGrid:
+        return ChunkGrid.from_bbox_strider(
+            self._get_bbox_strider(idx, stride_start_offset, mode),
+            resolution=idx.resolution,
+            chunk_id_start=idx.chunk_id,
+            chunk_id_increment=chunk_id_increment,
+        )
 
     def get_shape(
         self,
@@ -319,6 +347,14 @@ class VolumetricIndexChunker(IndexChunker[VolumetricIndex]):
     ) -> Vec3D[int]:  # pragma: no cover
         return self._get_bbox_strider(idx, stride_start_offset, mode).shape
 
+    def get_num_chunks(
+        self,
+        idx: VolumetricIndex,
+        stride_start_offset: Optional[Vec3D[int]] = None,
+        mode: Literal["shrink", "expand", "exact"] = "expand",
+    ) -> int:
+        return self._get_bbox_strider(idx, stride_start_offset, mode).num_chunks
+
     def _get_bbox_strider(
         self,
         idx: VolumetricIndex,
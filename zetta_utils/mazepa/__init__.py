@@ -29,4 +29,5 @@ from . import dryrun
 from .progress_tracker import progress_ctx_mngr
 from .execution import Executor, execute
 from .worker import run_worker
+from .pipelined_worker import run_pipelined_worker
 from .semaphores import SemaphoreType, configure_semaphores, semaphore
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from concurrent.futures import ThreadPoolExecutor
 from typing import Iterable
 
 import attrs
@@ -18,10 +19,22 @@ logger = log.get_logger("mazepa")
 @typechecked
 @attrs.mutable
 class AutoexecuteTaskQueue(MessageQueue):
+    """
+    Queue that executes the tasks in the current process as they are pulled.
+
+    With ``num_threads > 1``, the tasks of each pull are executed concurrently on that
+    many threads. The pulled tasks are all ready to run, so they do not depend on each
+    other; the semaphores of the process still bound the concurrent reads, writes and
+    GPU usage of the tasks. Otherwise, with ``read_ahead``, the inputs of the next task
+    are fetched with ``Task.prefetch`` while the current one runs.
+    """
+
     name: str = "local_execution"
     tasks_todo: list[Task] = attrs.field(init=False, factory=list)
     debug: bool = False
     handle_exceptions: bool = False
+    num_threads: int = 1
+    read_ahead: bool = False
 
     def push(self, payloads: Iterable[Task]):
         # TODO: Fix progress bar issue with multiple live displays in rich
@@ -38,10 +51,23 @@ class AutoexecuteTaskQueue(MessageQueue):
         if len(self.tasks_todo) == 0:
             return []
         else:
+            # Tasks are taken off the list before running them, so that tasks pushed
+            # from other threads in the meantime are not lost
+            tasks = self.tasks_todo[:max_num]
+            del self.tasks_todo[:max_num]
+            if self.num_threads > 1 and len(tasks) > 1:
+                with ThreadPoolExecutor(max_workers=min(self.num_threads, len(tasks))) as pool:
+                    return list(
+                        pool.map(
+                            lambda task: execute_task(task, self.debug, self.handle_exceptions),
+                            tasks,
+                        )
+                    )
             results: list[ReceivedMessage[OutcomeReport]] = []
-            for task in self.tasks_todo[:max_num]:
+            for i, task in enumerate(tasks):
+                if self.read_ahead and i + 1 < len(tasks):
+                    tasks[i + 1].prefetch()
                 results.append(execute_task(task, self.debug, self.handle_exceptions))
-            self.tasks_todo = self.tasks_todo[max_num:]
             return results
 
 
@@ -3,3 +3,12 @@ from typing import Final
 DEFAULT_UPKEEP_INTERVAL: Final = 5
 DEFAULT_UPKEEPS_PER_LEASE: Final = 5
 UNKNOWN_TASK_ID: Final = "UNKNOWN_TASK_ID"
+# Outcomes are pushed in batches of up to the SQS batch limit
+MAX_OUTCOME_BATCH_LEN: Final = 10
+DEFAULT_OUTCOME_FLUSH_SEC: Final = 0.25
+# Adaptive pulling of the workers
+MIN_WORKER_SLEEP_SEC: Final = 0.05
+DEFAULT_TARGET_PULL_BATCH_SEC: Final = 2.0
+NUM_RECENT_TASK_DURATIONS: Final = 20
+# SQS task queues of workers long poll for up to the default `run_worker` sleep
+WORKER_TASK_PULL_WAIT_SEC: Final = 4.0
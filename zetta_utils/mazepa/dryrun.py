@@ -2,52 +2,86 @@ from __future__ import annotations
 
 import copy
 from collections import defaultdict
+from typing import Iterator, Optional, Union
 
 from typeguard import typechecked
 
 from zetta_utils import log
 
-from . import Dependency, Flow
+from . import Dependency, Flow, Task
 
 logger = log.get_logger("zetta_utils")
 
 
 @typechecked
 def get_expected_operation_counts(flows: list[Flow]) -> dict[str, int]:
-    operation_task_ids = dryrun_for_task_ids(flows)
-    return {k: len(v) for k, v in operation_task_ids.items()}
+    """
+    Number of tasks per operation that the given flows will make. Flows that report
+    their task counts through ``Flow.estimate_task_counts`` are not run.
+    """
+    estimated_counts: dict[str, int] = defaultdict(int)
+    logger.info("Starting dryrun....")
+    operation_task_ids = _dryrun_for_task_ids(flows, estimated_counts=estimated_counts)
+    logger.info("Dryrun finished.")
+    result = {k: len(v) for k, v in operation_task_ids.items()}
+    for k, v in estimated_counts.items():
+        result[k] = result.get(k, 0) + v
+    return result
 
 
 @typechecked
 def dryrun_for_task_ids(flows: list[Flow]) -> dict[str, set[str]]:
-    dryrun_flows = copy.deepcopy(flows)
     logger.info("Starting dryrun....")
-    result = _dryrun_for_task_ids(dryrun_flows)
+    result = _dryrun_for_task_ids(flows)
     logger.info("Dryrun finished.")
     return result
 
 
-@typechecked
-def _dryrun_for_task_ids(flows: list[Flow]) -> dict[str, set[str]]:
+def _iter_flow_children(flow: Flow, isolate: bool) -> Iterator[Union[Task, Flow]]:
+    # Runs the flow function anew, so the flow itself is not advanced. Flow functions may
+    # modify their schema or arguments, so with ``isolate`` they are run on copies.
+    if isolate:
+        fn, args, kwargs = copy.deepcopy((flow.fn, flow.args, flow.kwargs))
+    else:
+        fn, args, kwargs = flow.fn, flow.args, flow.kwargs
+    for flow_yield in fn(*args, **kwargs):
+        if isinstance(flow_yield, (Task, Flow)):
+            yield flow_yield
+        elif not isinstance(flow_yield, Dependency):
+            yield from flow_yield
+
+
+def _dryrun_for_task_ids(
+    flows: list[Flow], estimated_counts: Optional[dict[str, int]] = None
+) -> dict[str, set[str]]:
+    """
+    Stream the tasks of the flows and their children, keeping only the task IDs.
+    If ``estimated_counts`` is given, flows that can estimate their task counts are
+    not run, and their counts are added to it instead.
+    """
     result: dict[str, set[str]] = defaultdict(set)
+    estimated_flow_ids: set[str] = set()
+    # Only the given flows need to be copied; the flows made while running them are
+    # built from the copies
+    given_flows = {id(e) for e in flows}
 
-    for flow in flows:
-        flow_yield = flow.get_next_batch()
-
-        while flow_yield is not None:
-            if not isinstance(flow_yield, Dependency):
-                for e in flow_yield:
-                    if isinstance(e, Flow):
-                        this_flow_result = _dryrun_for_task_ids([e])
-                        result = defaultdict(
-                            set,
-                            {
-                                k: result[k].union(this_flow_result[k])
-                                for k in list(result.keys()) + list(this_flow_result.keys())
-                            },
-                        )
-                    else:
-                        result[e.operation_name].add(e.id_)
-            flow_yield = flow.get_next_batch()
+    stack: list[Iterator[Union[Task, Flow]]] = [iter(flows)]
+    while len(stack) > 0:
+        e = next(stack[-1], None)
+        if e is None:
+            stack.pop()
+        elif isinstance(e, Task):
+            result[e.operation_name].add(e.id_)
+        elif estimated_counts is not None and e.id_ in estimated_flow_ids:
+            pass
+        else:
+            estimate = e.estimate_task_counts() if estimated_counts is not None else None
+            if estimate is None:
+                stack.append(_iter_flow_children(e, isolate=id(e) in given_flows))
+            else:
+                assert estimated_counts is not None
+                estimated_flow_ids.add(e.id_)
+                for k, v in estimate.items():
+                    estimated_counts[k] += v
 
     return result
@@ -2,8 +2,10 @@
 from __future__ import annotations
 
 import os
+import queue
+import threading
 import time
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, ThreadPoolExecutor
 from contextlib import ExitStack
 from datetime import datetime
 from typing import Callable, Optional, Union
@@ -14,7 +16,11 @@ from typeguard import typechecked
 from zetta_utils import log
 from zetta_utils.common import ComparablePartial, get_unique_id
 from zetta_utils.mazepa.autoexecute_task_queue import AutoexecuteTaskQueue
-from zetta_utils.message_queues.base import PullMessageQueue, PushMessageQueue
+from zetta_utils.message_queues.base import (
+    PullMessageQueue,
+    PushMessageQueue,
+    ReceivedMessage,
+)
 
 from . import Flow, Task, dryrun, sequential_flow
 from .execution_checkpoint import EXECUTION_CHECKPOINT_PATH, record_execution_checkpoint
@@ -25,6 +31,10 @@ from .tasks import _TaskableOperation
 
 logger = log.get_logger("mazepa")
 
+MIN_OUTCOME_PULL_NUM = 10
+MAX_OUTCOME_PULL_NUM = 1000
+MIN_IDLE_SLEEP_SEC = 0.01
+
 
 @attrs.mutable
 class Executor:
@@ -162,13 +172,19 @@ def _execute_from_state(
     write_progress_summary: bool,
     require_interrupt_confirm: bool,
     num_procs: int = 8,
-):
+):  # pylint: disable=too-many-branches
     if do_dryrun_estimation:
         expected_operation_counts = dryrun.get_expected_operation_counts(state.get_ongoing_flows())
     else:
         expected_operation_counts = {}
 
+    if checkpoint_interval_sec is None:
+        state.record_new_completed_ids = False
+        state.pop_new_completed_ids()
+
     last_backup_ts = time.time()
+    last_backup: Future | None = None
+    last_backup_ids: list[str] = []
 
     with ExitStack() as stack:
         if show_progress:
@@ -189,41 +205,193 @@ def _execute_from_state(
             )
         else:
             progress_updater = lambda *args, **kwargs: None  # pylint: disable=C3001
+        # Checkpoints are written in the background, one at a time
+        backup_pool = stack.enter_context(ThreadPoolExecutor(max_workers=1))
         with ThreadPoolExecutor(max_workers=num_procs) as pool:
+            drainer: OutcomeDrainer | None = None
+            if not isinstance(task_queue, AutoexecuteTaskQueue):
+                drainer = stack.enter_context(
+                    OutcomeDrainer(outcome_queue, max_idle_sleep_sec=batch_gap_sleep_sec)
+                )
+            ack_futures: list[Future] = []
+            num_pushed = max_batch_len
             while True:
                 progress_updater(state.get_progress_reports())
-                if len(state.get_ongoing_flow_ids()) == 0:
+                if not state.has_ongoing_flows():
                     logger.debug("No ongoing flows left.")
                     break
 
-                submit_ready_tasks(
-                    task_queue, outcome_queue, state, execution_id, max_batch_len, pool=pool
-                )
-
-                if not isinstance(task_queue, AutoexecuteTaskQueue):
-                    logger.debug(f"Sleeping for {batch_gap_sleep_sec} between batches...")
-                    time.sleep(batch_gap_sleep_sec)
-                    logger.debug("Awake.")
+                if drainer is None:
+                    submit_ready_tasks(
+                        task_queue, outcome_queue, state, execution_id, max_batch_len, pool=pool
+                    )
+                else:
+                    # Only wait for outcomes when all of the ready tasks have been pushed
+                    task_outcomes = drainer.get(
+                        timeout_sec=0 if num_pushed >= max_batch_len else batch_gap_sleep_sec
+                    )
+                    if len(task_outcomes) > 0:
+                        update_with_outcomes(state, task_outcomes)
+                        ack_futures = [e for e in ack_futures if not _is_done(e)]
+                        ack_futures += [pool.submit(e.acknowledge_fn) for e in task_outcomes]
+                    num_pushed = push_ready_tasks(task_queue, state, execution_id, max_batch_len)
 
                 if (
                     checkpoint_interval_sec is not None
                     and time.time() > last_backup_ts + checkpoint_interval_sec
                 ):
-                    backup_completed_tasks(
-                        state, execution_id, raise_on_error=raise_on_failed_checkpoint
+                    # IDs of a segment that failed to save are carried over to the next one
+                    if last_backup is None or last_backup.result():
+                        last_backup_ids = []
+                    last_backup_ids = last_backup_ids + state.pop_new_completed_ids()
+                    last_backup = backup_pool.submit(
+                        backup_completed_tasks,
+                        last_backup_ids,
+                        execution_id,
+                        raise_on_error=raise_on_failed_checkpoint,
                     )
                     last_backup_ts = time.time()
 
+            for fut in ack_futures:
+                fut.result()
+
+        if last_backup is not None:
+            last_backup.result()
 
-def backup_completed_tasks(state: ExecutionState, execution_id: str, raise_on_error: bool = False):
-    completed_ids = list(state.get_completed_ids())
-    timestamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+
+def backup_completed_tasks(
+    completed_ids: list[str], execution_id: str, raise_on_error: bool = False
+) -> bool:
+    """
+    Append the given newly completed IDs to the checkpoint of the execution.
+
+    :return: Whether the checkpoint was saved.
+    """
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H%M%S_%f")
     ckpt_name = f"{timestamp}_{len(completed_ids)}"
-    record_execution_checkpoint(
+    return record_execution_checkpoint(
         execution_id, ckpt_name, completed_ids, raise_on_error=raise_on_error
     )
 
 
+def _is_done(fut: Future) -> bool:
+    # Reraises the exception of failed futures
+    if fut.done():
+        fut.result()
+        return True
+    return False
+
+
+class OutcomeDrainer:  # pylint: disable=too-many-instance-attributes
+    """
+    Context manager that keeps pulling task outcomes from ``outcome_queue`` on a background
+    thread, so that outcomes are drained while the scheduler updates the execution state
+    and pushes tasks.
+
+    The number of outcomes requested per pull doubles while pulls come back full and
+    halves while they come back less than half full. After empty pulls, the thread
+    sleeps with exponential backoff up to ``max_idle_sleep_sec``.
+    """
+
+    def __init__(
+        self,
+        outcome_queue: PullMessageQueue[OutcomeReport],
+        max_idle_sleep_sec: float,
+        min_pull_num: int = MIN_OUTCOME_PULL_NUM,
+        max_pull_num: int = MAX_OUTCOME_PULL_NUM,
+    ):
+        self.outcome_queue = outcome_queue
+        self.max_idle_sleep_sec = max_idle_sleep_sec
+        self.min_pull_num = min_pull_num
+        self.max_pull_num = max_pull_num
+        self.pull_num = min_pull_num
+        self._received: queue.Queue[list[ReceivedMessage[OutcomeReport]]] = queue.Queue()
+        self._stop_event = threading.Event()
+        self._exception: BaseException | None = None
+        self._thread = threading.Thread(target=self._run, name="outcome_drainer", daemon=True)
+
+    def __enter__(self) -> OutcomeDrainer:
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop_event.set()
+        self._thread.join(timeout=self.max_idle_sleep_sec + 1)
+
+    def _run(self):
+        idle_sleep_sec = 0.0
+        try:
+            while not self._stop_event.is_set():
+                task_outcomes = self.outcome_queue.pull(max_num=self.pull_num)
+                if len(task_outcomes) >= self.pull_num:
+                    self.pull_num = min(self.pull_num * 2, self.max_pull_num)
+                elif len(task_outcomes) < self.pull_num // 2:
+                    self.pull_num = max(self.pull_num // 2, self.min_pull_num)
+
+                if len(task_outcomes) > 0:
+                    self._received.put(task_outcomes)
+                    idle_sleep_sec = 0.0
+                else:
+                    idle_sleep_sec = min(
+                        max(idle_sleep_sec * 2, MIN_IDLE_SLEEP_SEC), self.max_idle_sleep_sec
+                    )
+                    self._stop_event.wait(idle_sleep_sec)
+        except BaseException as e:  # pylint: disable=broad-except
+            # Reraised in the scheduler thread by `get`
+            self._exception = e
+            self._received.put([])
+
+    def get(self, timeout_sec: float) -> list[ReceivedMessage[OutcomeReport]]:
+        """
+        Wait up to ``timeout_sec`` for outcomes to be received, then return all of the
+        outcomes received since the previous call.
+        """
+        result: list[ReceivedMessage[OutcomeReport]] = []
+        try:
+            result += self._received.get(timeout=timeout_sec) if timeout_sec > 0 else []
+            while True:
+                result += self._received.get_nowait()
+        except queue.Empty:
+            pass
+        if self._exception is not None:
+            raise self._exception
+        return result
+
+
+def update_with_outcomes(
+    state: ExecutionState, task_outcomes: list[ReceivedMessage[OutcomeReport]]
+):
+    logger.debug(f"Received {len(task_outcomes)} completed task outcomes.")
+    logger.debug("Updating execution state with task outcomes.")
+    state.update_with_task_outcomes(
+        task_outcomes={e.payload.task_id: e.payload.outcome for e in task_outcomes}
+    )
+
+
+def push_ready_tasks(
+    task_queue: PushMessageQueue[Task],
+    state: ExecutionState,
+    execution_id: str,
+    max_batch_len: int,
+) -> int:
+    """
+    Push the next batch of ready tasks to the task queue.
+
+    :return: The number of tasks pushed.
+    """
+    logger.debug("Getting next ready task batch.")
+    task_batch = state.get_task_batch(max_batch_len=max_batch_len)
+    logger.debug(f"A batch of {len(task_batch)} tasks ready for execution.")
+
+    for task in task_batch:
+        task.execution_id = execution_id
+    logger.debug("Pushing task batch to queue.")
+    task_queue.push(task_batch)
+    for task in task_batch:
+        task.status = TaskStatus.SUBMITTED
+    return len(task_batch)
+
+
 def submit_ready_tasks(
     task_queue: PushMessageQueue[Task],
     outcome_queue: PullMessageQueue[OutcomeReport],
@@ -236,12 +404,7 @@ def submit_ready_tasks(
     task_outcomes = outcome_queue.pull(max_num=100)
 
     if len(task_outcomes) > 0:
-        logger.debug(f"Received {len(task_outcomes)} completed task outcomes.")
-        logger.debug("Updating execution state with task outcomes.")
-        # breakpoint()
-        state.update_with_task_outcomes(
-            task_outcomes={e.payload.task_id: e.payload.outcome for e in task_outcomes}
-        )
+        update_with_outcomes(state, task_outcomes)
 
         # only acknowledge in parallel if task_queue is remote; else do so serially.
         # the timing of acknowledgements don't matter since
@@ -255,13 +418,4 @@ def submit_ready_tasks(
             for fut in futures:
                 fut.result()
 
-    logger.debug("Getting next ready task batch.")
-    task_batch = state.get_task_batch(max_batch_len=max_batch_len)
-    logger.debug(f"A batch of {len(task_batch)} tasks ready for execution.")
-
-    for task in task_batch:
-        task.execution_id = execution_id
-    logger.debug("Pushing task batch to queue.")
-    task_queue.push(task_batch)
-    for task in task_batch:
-        task.status = TaskStatus.SUBMITTED
+    push_ready_tasks(task_queue, state, execution_id, max_batch_len)
@@ -1,8 +1,12 @@
 from __future__ import annotations
 
+import heapq
+import itertools
 import json
 import os
-from typing import Optional, Sequence
+import re
+import struct
+from typing import IO, Iterable, Iterator, Optional, Sequence, Union
 
 import aiohttp.client_exceptions
 import fsspec
@@ -17,58 +21,263 @@ logger = log.get_logger("mazepa")
 
 EXECUTION_CHECKPOINT_PATH = "gs://zetta_utils_runs"
 CHECKPOINT_COMPRESSION = "zstd"
+CHECKPOINT_SEGMENT_SUFFIX = f".ckpt.{CHECKPOINT_COMPRESSION}"
+CHECKPOINT_COMPACTION_THRESHOLD = 16
 
+# Segment layout: magic, little-endian uint32 header length, JSON header, then one block
+# of sorted 16 byte digests for each ``[prefix, count]`` entry of ``header["blocks"]``.
+# IDs that are not ``<prefix><32 hex digits>`` are kept verbatim in ``header["other"]``.
+SEGMENT_MAGIC = b"ZUCKPT1\n"
+DIGEST_LEN = 16
+READ_CHUNK_DIGESTS = 2 ** 16
 
-def read_execution_checkpoint(
-    filepath: str, ignore_prefix: Optional[Sequence[str]] = None
-) -> set[str]:  # pragma: no cover
+_HASHED_ID_RE = re.compile(r"^(.*?)([0-9a-f]{32})$")
+
+CHECKPOINT_EXCEPTIONS = (
+    requests.exceptions.RequestException,
+    google.auth.exceptions.GoogleAuthError,
+    aiohttp.client_exceptions.ClientError,
+    # gcsfs doesn't have any useful base exception, gotta catch 'em all:
+    # https://github.com/fsspec/gcsfs/blob/dda390af941b57b6911261e5c76d01cc3ddccb10/gcsfs/retry.py#L68-L105
+    gcsfs.retry.HttpError,
+    gcsfs.retry.ChecksumError,
+    FileNotFoundError,
+    OSError,
+    ValueError,
+    RuntimeError,
+)
+
+
+def encode_checkpoint_segment(completed_ids: Iterable[str]) -> bytes:
     """
-    Read completed IDs from checkpoint file.
+    Encode completed IDs into the binary checkpoint segment layout.
+    """
+    blocks: dict[str, set[bytes]] = {}
+    other: set[str] = set()
+    for id_ in completed_ids:
+        match = _HASHED_ID_RE.match(id_)
+        if match is None:
+            other.add(id_)
+        else:
+            blocks.setdefault(match.group(1), set()).add(bytes.fromhex(match.group(2)))
+
+    parts = [_encode_segment_header({k: len(v) for k, v in blocks.items()}, other)]
+    for digests in blocks.values():
+        parts.append(b"".join(sorted(digests)))
+    return b"".join(parts)
+
+
+def _encode_segment_header(block_counts: dict[str, int], other: Iterable[str]) -> bytes:
+    header = json.dumps(
+        {"blocks": [[k, v] for k, v in block_counts.items()], "other": sorted(other)}
+    ).encode()
+    return SEGMENT_MAGIC + struct.pack("<I", len(header)) + header
+
+
+def _read_exact(f: IO[bytes], size: int) -> bytes:
+    result = f.read(size)
+    if len(result) != size:
+        raise ValueError("Truncated execution checkpoint segment.")
+    return result
+
+
+def _is_ignored(id_: str, ignore_prefix: Sequence[str]) -> bool:
+    return any(id_.startswith(prefix) for prefix in ignore_prefix)
+
+
+def _read_segment_header(f: IO[bytes]) -> dict:
+    (header_len,) = struct.unpack("<I", _read_exact(f, 4))
+    return json.loads(_read_exact(f, header_len))
+
+
+def _iter_segment_ids(f: IO[bytes], ignore_prefix: Sequence[str]) -> Iterator[str]:
+    header = _read_segment_header(f)
+    yield from (id_ for id_ in header["other"] if not _is_ignored(id_, ignore_prefix))
+    for prefix, count in header["blocks"]:
+        skip_block = _is_ignored(prefix, ignore_prefix)
+        check_ids = any(e.startswith(prefix) for e in ignore_prefix)
+        while count > 0:
+            num_digests = min(count, READ_CHUNK_DIGESTS)
+            data = _read_exact(f, num_digests * DIGEST_LEN)
+            count -= num_digests
+            if skip_block:
+                continue
+            ids = (
+                prefix + data[i : i + DIGEST_LEN].hex() for i in range(0, len(data), DIGEST_LEN)
+            )
+            if check_ids:
+                yield from (id_ for id_ in ids if not _is_ignored(id_, ignore_prefix))
+            else:
+                yield from ids
+
+
+def _iter_file_ids(
+    fs: fsspec.AbstractFileSystem, path: str, ignore_prefix: Sequence[str]
+) -> Iterator[str]:
+    with fs.open(path, "rb", compression=CHECKPOINT_COMPRESSION) as f:
+        if f.read(len(SEGMENT_MAGIC)) == SEGMENT_MAGIC:
+            yield from _iter_segment_ids(f, ignore_prefix)
+            return
+    # Checkpoints written before segments were introduced hold a JSON list of IDs
+    with fs.open(path, "r", compression=CHECKPOINT_COMPRESSION) as f:
+        completed_ids = json.load(f)
+    assert isinstance(completed_ids, list)
+    yield from (id_ for id_ in completed_ids if not _is_ignored(id_, ignore_prefix))
+
+
+def _iter_block_digests(fs: fsspec.AbstractFileSystem, path: str, prefix: str) -> Iterator[bytes]:
+    with fs.open(path, "rb", compression=CHECKPOINT_COMPRESSION) as f:
+        if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+            raise ValueError(f"'{path}' is not an execution checkpoint segment.")
+        for block_prefix, count in _read_segment_header(f)["blocks"]:
+            while count > 0:
+                num_digests = min(count, READ_CHUNK_DIGESTS)
+                data = _read_exact(f, num_digests * DIGEST_LEN)
+                count -= num_digests
+                if block_prefix == prefix:
+                    yield from (data[i : i + DIGEST_LEN] for i in range(0, len(data), DIGEST_LEN))
+            if block_prefix == prefix:
+                return
+
+
+def _iter_merged_digests(
+    fs: fsspec.AbstractFileSystem, paths: Sequence[str], prefix: str
+) -> Iterator[bytes]:
+    # Blocks are sorted, so merging them yields the sorted union with duplicates adjacent
+    merged = heapq.merge(*(_iter_block_digests(fs, e, prefix) for e in paths))
+    return (digest for digest, _ in itertools.groupby(merged))
+
+
+def _get_segment_paths(fs: fsspec.AbstractFileSystem, root: str) -> list[str]:
+    return sorted(e for e in fs.ls(root, detail=False) if e.endswith(CHECKPOINT_SEGMENT_SUFFIX))
+
 
+def iter_execution_checkpoint_ids(
+    path: str, ignore_prefix: Optional[Union[str, Sequence[str]]] = None
+) -> Iterator[str]:
+    """
+    Stream completed IDs from a checkpoint without loading it as a whole.
+
+    `path`: a checkpoint segment or legacy JSON checkpoint file, or an execution checkpoint
+    directory, in which case all of its segments are read.
     `ignore_prefix`: skip IDs with matching prefix, e.g. `['flow-']`, default `None`.
+    IDs may be repeated if they are present in several segments.
     """
     if ignore_prefix is None:
         ignore_prefix = []
+    elif isinstance(ignore_prefix, str):
+        ignore_prefix = [ignore_prefix]
 
-    logger.info(f"Reading execution checkpoint from {filepath}")
-    with fsspec.open(filepath, "r", compression=CHECKPOINT_COMPRESSION) as f:
-        completed_ids = json.load(f)
-    assert isinstance(completed_ids, list)
-    return set(
-        id_ for id_ in completed_ids if not any(id_.startswith(prefix) for prefix in ignore_prefix)
-    )
+    fs, root = fsspec.core.url_to_fs(path)
+    if fs.isdir(root):
+        paths = _get_segment_paths(fs, root)
+    else:
+        paths = [root]
+    logger.info(f"Reading {len(paths)} execution checkpoint file(s) from {path}")
+    for e in paths:
+        yield from _iter_file_ids(fs, e, ignore_prefix)
 
 
-def record_execution_checkpoint(
-    execution_id: str, ckpt_name: str, completed_ids: list[str], raise_on_error: bool = False
-):  # pragma: no cover
+def read_execution_checkpoint(
+    filepath: str, ignore_prefix: Optional[Union[str, Sequence[str]]] = None
+) -> set[str]:
     """
-    Save completed tasks to checkpoint file
+    Read completed IDs from checkpoint file or directory.
+
+    `ignore_prefix`: skip IDs with matching prefix, e.g. `['flow-']`, default `None`.
     """
+    return set(iter_execution_checkpoint_ids(filepath, ignore_prefix=ignore_prefix))
+
+
+def get_execution_checkpoint_dir(execution_id: str) -> str:
     zetta_user = os.environ["ZETTA_USER"]
     info_path = os.environ.get("EXECUTION_CHECKPOINT_PATH", EXECUTION_CHECKPOINT_PATH)
-    ckpt_path = os.path.join(
-        info_path, zetta_user, execution_id, f"{ckpt_name}.{CHECKPOINT_COMPRESSION}"
+    return os.path.join(info_path, zetta_user, execution_id)
+
+
+def compact_execution_checkpoint(
+    ckpt_dir: str, min_segments: int = CHECKPOINT_COMPACTION_THRESHOLD
+) -> bool:
+    """
+    Merge the segments of a checkpoint directory into a single segment
+    once there are at least ``min_segments`` of them.
+
+    The digest blocks of the segments are merged as streams, once to count the IDs for
+    the header and once to write them, so the IDs are never held in memory as a whole.
+
+    :return: Whether the segments were compacted.
+    """
+    fs, root = fsspec.core.url_to_fs(ckpt_dir)
+    paths = _get_segment_paths(fs, root)
+    if len(paths) < min_segments:
+        return False
+
+    prefixes: dict[str, None] = {}
+    other: set[str] = set()
+    for e in paths:
+        with fs.open(e, "rb", compression=CHECKPOINT_COMPRESSION) as f:
+            if f.read(len(SEGMENT_MAGIC)) != SEGMENT_MAGIC:
+                raise ValueError(f"'{e}' is not an execution checkpoint segment.")
+            header = _read_segment_header(f)
+        prefixes.update((prefix, None) for prefix, _ in header["blocks"])
+        other.update(header["other"])
+    block_counts = {
+        prefix: sum(1 for _ in _iter_merged_digests(fs, paths, prefix)) for prefix in prefixes
+    }
+    num_ids = len(other) + sum(block_counts.values())
+
+    # Segment names sort by timestamp, so the compacted segment takes the place of the last one
+    last_name = os.path.basename(paths[-1])[: -len(CHECKPOINT_SEGMENT_SUFFIX)]
+    compacted_path = os.path.join(
+        root, f"{last_name}_compacted_{num_ids}{CHECKPOINT_SEGMENT_SUFFIX}"
     )
+    logger.info(f"Compacting {len(paths)} execution checkpoint segments to '{compacted_path}'")
+    with fs.open(compacted_path, "wb", compression=CHECKPOINT_COMPRESSION) as f:
+        f.write(_encode_segment_header(block_counts, other))
+        for prefix in block_counts:
+            digests = _iter_merged_digests(fs, paths, prefix)
+            while chunk := b"".join(itertools.islice(digests, READ_CHUNK_DIGESTS)):
+                f.write(chunk)
+    # Readers tolerate IDs repeated across segments, so sources are removed only after
+    # the compacted segment is fully written
+    for e in paths:
+        fs.rm(e)
+    return True
+
+
+def record_execution_checkpoint(
+    execution_id: str,
+    ckpt_name: str,
+    completed_ids: list[str],
+    raise_on_error: bool = False,
+    compaction_threshold: Optional[int] = CHECKPOINT_COMPACTION_THRESHOLD,
+) -> bool:
+    """
+    Append a segment with the given completed IDs to the checkpoint of the execution,
+    compacting the checkpoint once it has ``compaction_threshold`` segments.
+
+    :return: Whether the segment was saved.
+    """
+    ckpt_dir = get_execution_checkpoint_dir(execution_id)
+    ckpt_path = os.path.join(ckpt_dir, f"{ckpt_name}{CHECKPOINT_SEGMENT_SUFFIX}")
 
     logger.info(f"Saving execution checkpoint to '{ckpt_path}'")
     try:
-        with fsspec.open(ckpt_path, "w", compression=CHECKPOINT_COMPRESSION) as f:
-            json.dump(completed_ids, f, indent=2)
-
-    except (
-        requests.exceptions.RequestException,
-        google.auth.exceptions.GoogleAuthError,
-        aiohttp.client_exceptions.ClientError,
-        # gcsfs doesn't have any useful base exception, gotta catch 'em all:
-        # https://github.com/fsspec/gcsfs/blob/dda390af941b57b6911261e5c76d01cc3ddccb10/gcsfs/retry.py#L68-L105
-        gcsfs.retry.HttpError,
-        gcsfs.retry.ChecksumError,
-        FileNotFoundError,
-        OSError,
-        ValueError,
-        RuntimeError,
-    ):
+        fs, root = fsspec.core.url_to_fs(ckpt_path)
+        fs.makedirs(os.path.dirname(root), exist_ok=True)
+        with fs.open(root, "wb", compression=CHECKPOINT_COMPRESSION) as f:
+            f.write(encode_checkpoint_segment(completed_ids))
+    except CHECKPOINT_EXCEPTIONS:
         if raise_on_error is True:
             raise
         logger.exception(f"Exception while saving checkpoint '{ckpt_name}'")
+        return False
+
+    if compaction_threshold is not None:
+        try:
+            compact_execution_checkpoint(ckpt_dir, min_segments=compaction_threshold)
+        except CHECKPOINT_EXCEPTIONS:
+            if raise_on_error is True:
+                raise
+            logger.exception(f"Exception while compacting checkpoint '{ckpt_dir}'")
+    return True
@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 from abc import ABC, abstractmethod
-from collections import defaultdict
+from collections import defaultdict, deque
 from typing import Optional, Set, Union
 
 import attrs
@@ -11,7 +11,7 @@ from zetta_utils import log
 from zetta_utils.mazepa import constants
 
 from .exceptions import MazepaExecutionFailure
-from .execution_checkpoint import read_execution_checkpoint
+from .execution_checkpoint import iter_execution_checkpoint_ids
 from .flows import Dependency, Flow
 from .task_outcome import TaskOutcome, TaskStatus
 from .tasks import Task
@@ -27,6 +27,8 @@ class ProgressReport:
 
 class ExecutionState(ABC):
     raise_on_failed_task: bool = True
+    # Only kept for checkpointing; executions without checkpoints turn it off
+    record_new_completed_ids: bool = True
 
     @abstractmethod
     def get_ongoing_flows(self) -> list[Flow]:
@@ -40,6 +42,9 @@ class ExecutionState(ABC):
     def get_ongoing_flow_ids(self) -> list[str]:
         ...
 
+    def has_ongoing_flows(self) -> bool:
+        return len(self.get_ongoing_flow_ids()) > 0
+
     @abstractmethod
     def update_with_task_outcomes(self, task_outcomes: dict[str, TaskOutcome]):
         ...
@@ -56,31 +61,44 @@ class ExecutionState(ABC):
     def get_completed_ids(self) -> set[str]:
         ...
 
+    @abstractmethod
+    def pop_new_completed_ids(self) -> list[str]:
+        """
+        Return the IDs completed since the previous call. IDs are only recorded while
+        ``record_new_completed_ids`` is set.
+        """
+
 
-@typechecked
 @attrs.mutable
 class InMemoryExecutionState(ExecutionState):  # pylint: disable=too-many-instance-attributes
     """
     ``ExecutionState`` implementation that keeps progress and dependency information
     as in-memory data structures.
+
+    Flows that can yield more tasks are kept in a ready queue, so that the cost of getting
+    a task batch does not depend on the number of blocked flows. The dependency maps only
+    hold entries for ongoing flows and tasks, and their entries are removed once completed.
     """
 
     ongoing_flows: list[Flow]
     ongoing_flows_dict: dict[str, Flow] = attrs.field(init=False)
     ongoing_exhausted_flow_ids: Set[str] = attrs.field(init=False, factory=set)
-    ongoing_parent_map: dict[str, Set[str]] = attrs.field(
-        init=False, factory=lambda: defaultdict(set)
-    )
-    ongoing_children_map: dict[str, Set[str]] = attrs.field(
-        init=False, factory=lambda: defaultdict(set)
-    )
+    ongoing_parent_map: dict[str, Set[str]] = attrs.field(init=False, factory=dict)
+    ongoing_children_map: dict[str, Set[str]] = attrs.field(init=False, factory=dict)
     ongoing_tasks_dict: dict[str, Task] = attrs.field(init=False, factory=dict)
+    # Flows that are neither exhausted nor blocked by dependencies. The queue may hold IDs
+    # of flows that have since stopped being ready; they are skipped when dequeued.
+    ready_flow_ids: Set[str] = attrs.field(init=False, factory=set)
+    ready_flow_queue: deque[str] = attrs.field(init=False, factory=deque)
     raise_on_failed_task: bool = True
+    record_new_completed_ids: bool = True
     completed_ids: Set[str] = attrs.field(
         init=False,
         factory=set,
     )
-    dependency_map: dict[str, Set[str]] = attrs.field(init=False, factory=lambda: defaultdict(set))
+    new_completed_ids: list[str] = attrs.field(init=False, factory=list)
+    # Only has entries for the blocked flows
+    dependency_map: dict[str, Set[str]] = attrs.field(init=False, factory=dict)
     submitted_counts: dict[str, int] = attrs.field(init=False, factory=lambda: defaultdict(int))
     completed_counts: dict[str, int] = attrs.field(init=False, factory=lambda: defaultdict(int))
     leftover_ready_tasks: list[Task] = attrs.field(init=False, factory=list)
@@ -88,12 +106,18 @@ class InMemoryExecutionState(ExecutionState):  # pylint: disable=too-many-instan
 
     def __attrs_post_init__(self):
         self.ongoing_flows_dict = {e.id_: e for e in self.ongoing_flows}
+        for flow_id in self.ongoing_flows_dict:
+            self._mark_ready(flow_id)
         if self.checkpoint is not None:
             self._load_completed_ids_from_file(self.checkpoint)
 
+    # Only the public methods are type checked, as the internal helpers run for every
+    # task and flow
+    @typechecked
     def get_ongoing_flows(self) -> list[Flow]:
         return self.ongoing_flows
 
+    @typechecked
     def get_progress_reports(self) -> dict[str, ProgressReport]:
         result: dict[str, ProgressReport] = {}
         for op_name, submitted_count in self.submitted_counts.items():
@@ -108,12 +132,18 @@ class InMemoryExecutionState(ExecutionState):  # pylint: disable=too-many-instan
 
         return result
 
+    @typechecked
     def get_ongoing_flow_ids(self) -> list[str]:
         """
         Return ids of the flows that haven't been completed.
         """
         return list(self.ongoing_flows_dict.keys())
 
+    @typechecked
+    def has_ongoing_flows(self) -> bool:
+        return len(self.ongoing_flows_dict) > 0
+
+    @typechecked
     def update_with_task_outcomes(self, task_outcomes: dict[str, TaskOutcome]):
         """
         Given a mapping from tasks ids to task outcomes, update dependency and state of the
@@ -140,6 +170,7 @@ class InMemoryExecutionState(ExecutionState):  # pylint: disable=too-many-instan
 
                 self._update_completed_id(task_id)
 
+    @typechecked
     def get_task_batch(self, max_batch_len: int = 10000) -> list[Task]:
         """
         Generate the next batch of tasks that are ready for execution.
@@ -150,31 +181,19 @@ class InMemoryExecutionState(ExecutionState):  # pylint: disable=too-many-instan
         """
 
         result = self.leftover_ready_tasks  # type: list[Task]
-        candidate_flows = list(self.ongoing_flows_dict.values())
-        while len(candidate_flows) > 0:
-            newly_added_flows = []
-            for flow in candidate_flows:
-                while (
-                    flow.id_ in self.ongoing_flows_dict
-                    and len(self.dependency_map[flow.id_]) == 0
-                    and len(result) < max_batch_len
-                    and flow.id_ not in self.ongoing_exhausted_flow_ids
-                ):
-                    flow_batch = self._get_batch_from_flow(flow)
-                    for e in flow_batch:
-                        if isinstance(e, Flow):
-                            self.ongoing_flows_dict[e.id_] = e
-                            newly_added_flows.append(e)
-                        else:
-                            assert isinstance(e, Task), "Typechecking error."
-                            result.append(e)
-
-                    if len(result) >= max_batch_len:
-                        break
-
-            if len(result) >= max_batch_len:
-                break
-            candidate_flows = newly_added_flows
+        while len(result) < max_batch_len and len(self.ready_flow_queue) > 0:
+            flow_id = self.ready_flow_queue[0]
+            while flow_id in self.ready_flow_ids and len(result) < max_batch_len:
+                flow_batch = self._get_batch_from_flow(self.ongoing_flows_dict[flow_id])
+                for e in flow_batch:
+                    if isinstance(e, Flow):
+                        self.ongoing_flows_dict[e.id_] = e
+                        self._mark_ready(e.id_)
+                    else:
+                        assert isinstance(e, Task), "Typechecking error."
+                        result.append(e)
+            if flow_id not in self.ready_flow_ids:
+                self.ready_flow_queue.popleft()
 
         result_final = result[:max_batch_len]
         self.leftover_ready_tasks = result[max_batch_len:]
@@ -187,41 +206,70 @@ class InMemoryExecutionState(ExecutionState):  # pylint: disable=too-many-instan
 
         return result_final
 
+    @typechecked
     def get_completed_ids(self) -> set[str]:
         return self.completed_ids
 
+    @typechecked
+    def pop_new_completed_ids(self) -> list[str]:
+        result = self.new_completed_ids
+        self.new_completed_ids = []
+        return result
+
+    def _mark_ready(self, flow_id: str):
+        if flow_id not in self.ready_flow_ids:
+            self.ready_flow_ids.add(flow_id)
+            self.ready_flow_queue.append(flow_id)
+
     def _add_dependency(self, flow_id: str, dep: Dependency):
+        children = self.ongoing_children_map.get(flow_id, set())
         if dep.ids is None:  # depend on all ongoing children
-            self.dependency_map[flow_id].update(self.ongoing_children_map[flow_id])
+            dep_ids = set(children)
         else:
+            dep_ids = set()
             for id_ in dep.ids:
                 if id_ not in self.completed_ids:
                     assert (
-                        id_ in self.ongoing_children_map[flow_id]
+                        id_ in children
                     ), f"Dependency on a non-child '{id_}' for flows '{flow_id}'"
 
-                    self.dependency_map[flow_id].add(id_)
+                    dep_ids.add(id_)
+        if len(dep_ids) > 0:
+            self.dependency_map.setdefault(flow_id, set()).update(dep_ids)
+            self.ready_flow_ids.discard(flow_id)
 
     def _update_completed_id(self, id_: str):
         self.completed_ids.add(id_)
+        if self.record_new_completed_ids:
+            self.new_completed_ids.append(id_)
         self.ongoing_exhausted_flow_ids.discard(id_)
 
         if id_ in self.ongoing_flows_dict:
             del self.ongoing_flows_dict[id_]
+            self.ready_flow_ids.discard(id_)
+            self.ongoing_children_map.pop(id_, None)
+            self.dependency_map.pop(id_, None)
         else:
             assert id_ in self.ongoing_tasks_dict
             self.completed_counts[self.ongoing_tasks_dict[id_].operation_name] += 1
             del self.ongoing_tasks_dict[id_]
 
-        parent_ids = self.ongoing_parent_map[id_]
+        parent_ids = self.ongoing_parent_map.pop(id_, set())
         for parent_id in parent_ids:
-            self.ongoing_children_map[parent_id].discard(id_)
-            self.dependency_map[parent_id].discard(id_)
-            if (
-                parent_id in self.ongoing_exhausted_flow_ids
-                and len(self.dependency_map[parent_id]) == 0
-            ):
-                self._update_completed_id(parent_id)
+            children = self.ongoing_children_map.get(parent_id)
+            if children is not None:
+                children.discard(id_)
+                if len(children) == 0:
+                    del self.ongoing_children_map[parent_id]
+            dep_ids = self.dependency_map.get(parent_id)
+            if dep_ids is not None and id_ in dep_ids:
+                dep_ids.remove(id_)
+                if len(dep_ids) == 0:
+                    del self.dependency_map[parent_id]
+                    if parent_id in self.ongoing_exhausted_flow_ids:
+                        self._update_completed_id(parent_id)
+                    else:
+                        self._mark_ready(parent_id)
 
     def _get_batch_from_flow(self, flow: Flow) -> list[Union[Task, Flow]]:
         """
@@ -236,8 +284,11 @@ class InMemoryExecutionState(ExecutionState):  # pylint: disable=too-many-instan
         result = []
         if flow_yield is None:  # Means the flows is exhausted
             self.ongoing_exhausted_flow_ids.add(flow.id_)
-            self.dependency_map[flow.id_].update(self.ongoing_children_map[flow.id_])
-            if len(self.dependency_map[flow.id_]) == 0:
+            self.ready_flow_ids.discard(flow.id_)
+            children = self.ongoing_children_map.get(flow.id_, set())
+            if len(children) > 0:
+                self.dependency_map.setdefault(flow.id_, set()).update(children)
+            if len(self.dependency_map.get(flow.id_, ())) == 0:
                 self._update_completed_id(flow.id_)
 
         elif isinstance(flow_yield, Dependency):
@@ -245,8 +296,8 @@ class InMemoryExecutionState(ExecutionState):  # pylint: disable=too-many-instan
         else:
             for e in flow_yield:
                 if e.id_ not in self.completed_ids:
-                    self.ongoing_children_map[flow.id_].add(e.id_)
-                    self.ongoing_parent_map[e.id_].add(flow.id_)
+                    self.ongoing_children_map.setdefault(flow.id_, set()).add(e.id_)
+                    self.ongoing_parent_map.setdefault(e.id_, set()).add(flow.id_)
                     result.append(e)
                 elif isinstance(e, Task):
                     # Task loaded from checkpoint - adjust the counter
@@ -255,7 +306,13 @@ class InMemoryExecutionState(ExecutionState):  # pylint: disable=too-many-instan
         return result
 
     def _load_completed_ids_from_file(self, filepath: str):
-        completed_ids = read_execution_checkpoint(filepath, ignore_prefix="flow-")
-
-        logger.info(f"Updating {len(completed_ids)} completed tasks from {self.checkpoint}")
-        self.completed_ids.update(completed_ids)
+        num_completed = len(self.completed_ids)
+        for id_ in iter_execution_checkpoint_ids(filepath, ignore_prefix=["flow-"]):
+            if id_ not in self.completed_ids:
+                self.completed_ids.add(id_)
+                # Keeps checkpoints of the resumed execution self-contained
+                self.new_completed_ids.append(id_)
+        logger.info(
+            f"Updated {len(self.completed_ids) - num_completed} completed tasks "
+            f"from {self.checkpoint}"
+        )
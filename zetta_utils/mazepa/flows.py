@@ -112,6 +112,18 @@ class Flow:
 
         return result
 
+    def estimate_task_counts(self) -> dict[str, int] | None:
+        """
+        Number of tasks per operation that the flow will make, as reported by the
+        ``estimate_task_counts`` method of its flow schema class when it has one.
+        The method takes the same arguments as the ``flow`` method of the class.
+        Returns ``None`` if the count is not known without running the flow.
+        """
+        estimate_fn = getattr(getattr(self.fn, "__self__", None), "estimate_task_counts", None)
+        if estimate_fn is None:
+            return None
+        return estimate_fn(*self.args, **self.kwargs)
+
 
 @attrs.mutable
 class _FlowSchema(Generic[P]):
@@ -1,9 +1,12 @@
 # pylint: disable=unused-argument
 from __future__ import annotations
 
+import threading
 import uuid
-from typing import Callable, Optional
+import weakref
+from typing import Any, Callable, Optional, Protocol, runtime_checkable
 
+import cachetools
 import dill
 import xxhash
 
@@ -11,6 +14,119 @@ from zetta_utils import log
 
 logger = log.get_logger("mazepa")
 
+HASH_MEMO_SIZE = 1024
+
+_hash_memo: cachetools.LRUCache = cachetools.LRUCache(maxsize=HASH_MEMO_SIZE)
+_hash_memo_lock = threading.Lock()
+
+
+@runtime_checkable
+class SupportsMazepaHash(Protocol):
+    """
+    Objects that can be hashed for invocation IDs without being pickled.
+
+    ``__mazepa_hash__`` returns a token that identifies the object among objects of
+    its class. The token may consist of ``None``, ``bool``, ``int``, ``float``,
+    ``str``, ``bytes``, tuples, lists and dicts of those, and of any other objects,
+    which are hashed recursively.
+
+    Classes of objects that are shared by many invocations, such as layers and
+    operations, can set ``__mazepa_hash_memoize__ = True`` to have their hashes
+    memoized by object identity. This is only correct if the objects are not modified
+    once they have been hashed; layers are immutable, and operations are not modified
+    once their tasks are being created. The memo only holds weak references, so it
+    does not keep short-lived objects alive.
+    """
+
+    def __mazepa_hash__(self) -> Any:
+        ...
+
+
+def get_dill_hash(obj: Any) -> str:
+    """Hash of the ``dill`` pickle of ``obj``."""
+    return xxhash.xxh128_hexdigest(
+        dill.dumps(
+            obj,
+            protocol=dill.DEFAULT_PROTOCOL,
+            byref=False,
+            recurse=True,
+            fmode=dill.FILE_FMODE,
+        )
+    )
+
+
+def get_structural_hash(obj: Any) -> str:
+    """
+    Hash of ``obj`` computed from its structure: builtins and containers are hashed
+    by value, objects implementing ``__mazepa_hash__`` by their class and token, and
+    any other objects by their ``dill`` pickle.
+    """
+    x = xxhash.xxh128()
+    _update_structural_hash(x, obj)
+    return x.hexdigest()
+
+
+def _get_object_hash(obj: Any) -> str:
+    cls = type(obj)
+    memoize = getattr(cls, "__mazepa_hash_memoize__", False)
+    if memoize:
+        with _hash_memo_lock:
+            memoized = _hash_memo.get(id(obj))
+        if memoized is not None and memoized[0]() is obj:
+            return memoized[1]
+
+    hash_fn = getattr(cls, "__mazepa_hash__", None)
+    if hash_fn is None:
+        result = get_dill_hash(obj)
+    else:
+        x = xxhash.xxh128()
+        x.update(f"{cls.__module__}.{cls.__qualname__}".encode())
+        _update_structural_hash(x, hash_fn(obj))
+        result = x.hexdigest()
+
+    if memoize:
+        try:
+            ref = weakref.ref(obj)
+        except TypeError:  # pragma: no cover
+            return result
+        with _hash_memo_lock:
+            _hash_memo[id(obj)] = (ref, result)
+    return result
+
+
+def _update_structural_hash(x: Any, obj: Any) -> None:
+    # Each value is prefixed with a type tag, and variable length values with
+    # their length, so that different structures cannot produce the same bytes
+    cls = type(obj)
+    if obj is None:
+        x.update(b"n")
+    elif cls is bool:
+        x.update(b"b1" if obj else b"b0")
+    elif cls is int or cls is float:
+        encoded = repr(obj).encode()
+        x.update(b"i" if cls is int else b"f")
+        x.update(len(encoded).to_bytes(8, "little"))
+        x.update(encoded)
+    elif cls is str or cls is bytes:
+        encoded = obj.encode() if cls is str else obj
+        x.update(b"s" if cls is str else b"y")
+        x.update(len(encoded).to_bytes(8, "little"))
+        x.update(encoded)
+    elif cls is tuple or cls is list:
+        x.update(b"t" if cls is tuple else b"l")
+        x.update(len(obj).to_bytes(8, "little"))
+        for e in obj:
+            _update_structural_hash(x, e)
+    elif cls is dict:
+        x.update(b"d")
+        x.update(len(obj).to_bytes(8, "little"))
+        for k, v in obj.items():
+            _update_structural_hash(x, k)
+            _update_structural_hash(x, v)
+    else:
+        x.update(b"o")
+        x.update(_get_object_hash(obj).encode())
+
 
 def generate_invocation_id(
     fn: Optional[Callable] = None,
@@ -19,7 +135,9 @@ def generate_invocation_id(
     prefix: Optional[str] = None,
 ) -> str:
     """Generate a unique and deterministic ID for a function invocation.
-    The ID is generated using xxhash and dill to hash the function and its arguments.
+    The ID is generated using xxhash to hash the function and its arguments with
+    ``get_structural_hash``, which falls back to dill for objects that do not
+    implement ``__mazepa_hash__``.
 
     :param fn: the function, or really any Callable, defaults to None
     :param args: the function arguments, or any list, defaults to None
@@ -28,25 +146,16 @@ def generate_invocation_id(
     :return: A unique, yet deterministic string that identifies (fn, args, kwargs) in
       the current Python environment.
     """
-    x = xxhash.xxh128()
     try:
-        x.update(
-            dill.dumps(
-                (fn, args, kwargs),
-                protocol=dill.DEFAULT_PROTOCOL,
-                byref=False,
-                recurse=True,
-                fmode=dill.FILE_FMODE,
-            )
-        )
+        result = get_structural_hash((fn, args, kwargs))
     except dill.PicklingError as e:
         logger.warning(f"Failed to pickle {fn} with args {args} and kwargs {kwargs}: {e}")
-        x.update(str(uuid.uuid4()))
+        result = xxhash.xxh128_hexdigest(str(uuid.uuid4()))
 
     if prefix is not None:
-        return f"{prefix}-{x.hexdigest()}"
+        return f"{prefix}-{result}"
     else:
-        return x.hexdigest()
+        return result
 
 
 def get_literal_id_fn(  # pylint: disable=unused-argument
@@ -0,0 +1,423 @@
+"""
+Worker that overlaps the reading, computing and writing parts of consecutive tasks.
+"""
+from __future__ import annotations
+
+import queue
+import sys
+import threading
+import time
+import traceback
+from typing import (
+    Any,
+    Callable,
+    Iterable,
+    Optional,
+    Protocol,
+    get_args,
+    runtime_checkable,
+)
+
+import attrs
+
+from zetta_utils import builder, log
+from zetta_utils.common import RepeatTimer
+from zetta_utils.message_queues.base import MessageQueue, ReceivedMessage
+
+from . import Task, constants
+from .exceptions import MazepaCancel, MazepaException
+from .semaphores import SemaphoreType
+from .task_outcome import OutcomeReport, TaskOutcome, TaskStatus
+from .worker import (
+    AcceptAllTasks,
+    OutcomeBuffer,
+    is_finished_processing,
+    report_pull_failure,
+    start_upkeep,
+)
+
+logger = log.get_logger("mazepa")
+
+DEFAULT_STAGE_CONCURRENCY: dict[SemaphoreType, int] = {
+    "read": 4,
+    "write": 4,
+    "cuda": 1,
+    "cpu": 0,
+}
+
+
+@runtime_checkable
+class StagedOperation(Protocol):
+    """
+    Interface of a task ``fn`` that can be split into stages by the pipelined worker.
+    ``read_inputs`` and ``write_outputs`` take the same arguments as ``__call__``.
+    The ``fn`` may additionally provide ``compute_outputs_batch``, which takes and
+    returns a list, to process the inputs of several tasks at once.
+    """
+
+    def read_inputs(self, *args, **kwargs) -> Any:
+        ...
+
+    def compute_outputs(self, inputs: Any) -> Any:
+        ...
+
+    def write_outputs(self, outputs: Any, *args, **kwargs) -> None:
+        ...
+
+
+@attrs.mutable
+class _PipelineItem:
+    msg: ReceivedMessage[Task]
+    upkeep: RepeatTimer | None = None
+    time_start: float = attrs.field(factory=time.time)
+    data: Any = None
+    exception: BaseException | None = None
+    traceback_text: str | None = None
+    outcome: TaskOutcome | None = None
+
+    @property
+    def task(self) -> Task:
+        return self.msg.payload
+
+    @property
+    def fn(self) -> Any:
+        return self.task.fn
+
+    @property
+    def is_staged(self) -> bool:
+        return isinstance(self.task.fn, StagedOperation)
+
+    def get_remaining_sec(self, debug: bool) -> float | None:
+        if debug or self.task.runtime_limit_sec is None:
+            return None
+        return self.task.runtime_limit_sec - (time.time() - self.time_start)
+
+    def run(self, fn: Callable, args: Iterable, kwargs: dict, debug: bool) -> Any:
+        """
+        Runs a stage of the task with its logging tags, within what remains of the
+        task runtime limit.
+        """
+        if self.exception is not None:
+            return None
+        try:
+            with log.logging_tag_ctx("task_id", self.task.id_):
+                with log.logging_tag_ctx("execution_id", self.task.execution_id):
+                    return self.task.call_with_runtime_limit(
+                        fn, args, kwargs, runtime_limit_sec=self.get_remaining_sec(debug)
+                    )
+        except (SystemExit, KeyboardInterrupt) as exc:  # pragma: no cover
+            raise exc
+        except Exception as exc:  # pylint: disable=broad-except
+            logger.error(f"Failed task execution of {self.task}.")
+            logger.exception(exc)
+            self.set_exception()
+            return None
+
+    def set_exception(self) -> None:
+        exc_type, exception, tb = sys.exc_info()
+        self.exception = exception
+        self.traceback_text = "".join(traceback.format_exception(exc_type, exception, tb))
+
+    def finalize(self) -> TaskOutcome:
+        if self.upkeep is not None:
+            self.upkeep.cancel()
+        if self.outcome is None:
+            self.outcome = TaskOutcome(
+                exception=self.exception,
+                traceback_text=self.traceback_text,
+                execution_sec=time.time() - self.time_start,
+                return_value=None,
+            )
+            self.task.outcome = self.outcome
+            if self.exception is None:
+                self.task.status = TaskStatus.SUCCEEDED
+            else:
+                self.task.status = TaskStatus.FAILED
+        return self.outcome
+
+
+_STOP = None
+
+
+class _Pipeline:
+    def __init__(
+        self,
+        stage_concurrency: dict[SemaphoreType, int],
+        queue_size: int,
+        compute_batch_size: int,
+        debug: bool,
+        read_ahead: bool = False,
+    ):
+        self.compute_batch_size = compute_batch_size
+        self.debug = debug
+        self.read_ahead = read_ahead
+        # Submitted tasks whose inputs are yet to be read, to tell which will wait
+        self.num_unread = 0
+        self.num_unread_lock = threading.Lock()
+        self.read_q: queue.Queue[_PipelineItem | None] = queue.Queue(maxsize=queue_size)
+        self.compute_q: queue.Queue[_PipelineItem | None] = queue.Queue(maxsize=queue_size)
+        self.write_q: queue.Queue[_PipelineItem | None] = queue.Queue(maxsize=queue_size)
+        self.done_q: queue.Queue[_PipelineItem] = queue.Queue()
+        self.threads: dict[str, list[threading.Thread]] = {
+            "read": self._start_threads(self._read_loop, stage_concurrency["read"]),
+            "compute": self._start_threads(
+                self._compute_loop, stage_concurrency["cuda"] + stage_concurrency["cpu"]
+            ),
+            "write": self._start_threads(self._write_loop, stage_concurrency["write"]),
+        }
+
+    @staticmethod
+    def _start_threads(target: Callable, num_threads: int) -> list[threading.Thread]:
+        threads = [threading.Thread(target=target, daemon=True) for _ in range(num_threads)]
+        for thread in threads:
+            thread.start()
+        return threads
+
+    def _read_loop(self) -> None:
+        while (item := self.read_q.get()) is not _STOP:
+            task = item.task
+            task.status = TaskStatus.RUNNING
+            item.time_start = time.time()
+            if item.is_staged:
+                item.data = item.run(item.fn.read_inputs, task.args, task.kwargs, self.debug)
+            with self.num_unread_lock:
+                self.num_unread -= 1
+            self.compute_q.put(item)
+
+    def _compute_loop(self) -> None:
+        pending: _PipelineItem | None = None
+        while True:
+            item = pending if pending is not None else self.compute_q.get()
+            pending = None
+            if item is _STOP:
+                break
+            batch = [item]
+            # Only consecutive tasks of the same operation are batched together
+            while item.is_staged and len(batch) < self.compute_batch_size:
+                try:
+                    nxt = self.compute_q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP or not nxt.is_staged or nxt.task.fn != item.task.fn:
+                    pending = nxt
+                    break
+                batch.append(nxt)
+            self._compute(batch)
+
+    def _compute(self, batch: list[_PipelineItem]) -> None:
+        if not batch[0].is_staged:
+            assert len(batch) == 1
+            item = batch[0]
+            # Tasks that cannot be split run in full in the compute stage
+            with log.logging_tag_ctx("task_id", item.task.id_):
+                with log.logging_tag_ctx("execution_id", item.task.execution_id):
+                    item.outcome = item.task(debug=self.debug, handle_exceptions=True)
+            self.write_q.put(item)
+            return
+
+        fn = batch[0].fn
+        todo = [item for item in batch if item.exception is None]
+        if len(todo) > 1 and hasattr(fn, "compute_outputs_batch"):
+            remaining = [
+                e for e in (item.get_remaining_sec(self.debug) for item in todo) if e is not None
+            ]
+            try:
+                outputs = todo[0].task.call_with_runtime_limit(
+                    fn.compute_outputs_batch,
+                    ([item.data for item in todo],),
+                    {},
+                    runtime_limit_sec=min(remaining) if len(remaining) > 0 else None,
+                )
+                for item, output in zip(todo, outputs):
+                    item.data = output
+            except (SystemExit, KeyboardInterrupt) as exc:  # pragma: no cover
+                raise exc
+            except Exception as exc:  # pylint: disable=broad-except
+                logger.error(f"Failed batched execution of {len(todo)} tasks.")
+                logger.exception(exc)
+                for item in todo:
+                    item.set_exception()
+        else:
+            for item in todo:
+                item.data = item.run(fn.compute_outputs, (item.data,), {}, self.debug)
+        for item in batch:
+            self.write_q.put(item)
+
+    def _write_loop(self) -> None:
+        while (item := self.write_q.get()) is not _STOP:
+            task = item.task
+            if item.is_staged:
+                item.run(item.fn.write_outputs, (item.data, *task.args), task.kwargs, self.debug)
+            item.data = None
+            item.finalize()
+            self.done_q.put(item)
+
+    def submit(self, msg: ReceivedMessage[Task]) -> None:
+        item = _PipelineItem(msg=msg)
+        # The lease is kept up from here, as the message may wait for a reader a while
+        if msg.payload.upkeep_settings.perform_upkeep:
+            item.upkeep = start_upkeep(msg.payload, msg.extend_lease_fn)
+        with self.num_unread_lock:
+            is_waiting = self.num_unread >= len(self.threads["read"])
+            self.num_unread += 1
+        # Tasks that wait for a reader to be free have their inputs fetched meanwhile
+        if self.read_ahead and is_waiting:
+            msg.payload.prefetch()
+        self.read_q.put(item)
+
+    def has_capacity(self) -> bool:
+        return not self.read_q.full()
+
+    def stop(self) -> None:
+        for stage_q, stage in (
+            (self.read_q, "read"),
+            (self.compute_q, "compute"),
+            (self.write_q, "write"),
+        ):
+            for _ in self.threads[stage]:
+                stage_q.put(_STOP)
+            for thread in self.threads[stage]:
+                thread.join()
+
+
+def _validate_stage_concurrency(stage_concurrency: dict[SemaphoreType, int]) -> None:
+    for name in stage_concurrency:
+        if name not in get_args(SemaphoreType):
+            raise ValueError(f"`{name}` is not a valid semaphore type.")
+    for name in get_args(SemaphoreType):
+        if name not in stage_concurrency:
+            raise ValueError(
+                "`stage_concurrency` must contain `read`, `write`, `cuda`, and `cpu`."
+            )
+        if stage_concurrency[name] < 0:
+            raise ValueError("Stage concurrency must be nonnegative.")
+    io_stages: tuple[SemaphoreType, ...] = ("read", "write")
+    for name in io_stages:
+        if stage_concurrency[name] == 0:
+            raise ValueError(f"Concurrency of the `{name}` stage must be positive.")
+    if stage_concurrency["cuda"] + stage_concurrency["cpu"] == 0:
+        raise ValueError("Sum of `cuda` and `cpu` concurrency must be positive.")
+
+
+@builder.register("run_pipelined_worker")
+def run_pipelined_worker(
+    task_queue: MessageQueue[Task],
+    outcome_queue: MessageQueue[OutcomeReport],
+    stage_concurrency: Optional[dict[SemaphoreType, int]] = None,
+    queue_size: int = 4,
+    compute_batch_size: int = 1,
+    sleep_sec: float = 4.0,
+    max_pull_num: int = 1,
+    max_runtime: Optional[float] = None,
+    task_filter_fn: Callable[[Task], bool] = AcceptAllTasks(),
+    outcome_batch_len: int = constants.MAX_OUTCOME_BATCH_LEN,
+    outcome_flush_sec: float = constants.DEFAULT_OUTCOME_FLUSH_SEC,
+    debug: bool = False,
+    read_ahead: bool = False,
+):
+    """
+    Runs tasks in a pipeline of reader, compute and writer threads connected by
+    bounded queues, so that the inputs of upcoming tasks are read and the outputs of
+    finished tasks are written while the current tasks compute.
+
+    Tasks whose ``fn`` implements ``StagedOperation`` are split into stages; other
+    tasks run in full in the compute stage. Operations still acquire their own
+    semaphores within each stage. Unless ``debug``, the runtime limit of a task covers
+    all of its stages, and each stage runs in a separate process when the task has one,
+    as in ``Task.__call__``.
+
+    :param stage_concurrency: Number of threads per stage, keyed by semaphore name.
+        ``read`` and ``write`` size the reader and writer stages, and the compute
+        stage runs ``cuda + cpu`` threads.
+    :param queue_size: Capacity of the queues in front of each stage. Tasks are only
+        pulled when there is room in the reader queue.
+    :param compute_batch_size: Maximum number of consecutive tasks of the same
+        operation whose inputs are passed to ``compute_outputs_batch`` at once.
+    :param outcome_batch_len: Maximum number of outcomes pushed to ``outcome_queue``
+        at once; see ``mazepa.worker.OutcomeBuffer``.
+    :param outcome_flush_sec: Maximum time an outcome is buffered before it is pushed.
+    :param read_ahead: Whether to start fetching the inputs of the tasks that wait in the
+        reader queue with ``Task.prefetch``. Prefetched data is kept in the chunk cache
+        of the process, so this only helps with a chunk cache.
+    """
+    if stage_concurrency is None:
+        stage_concurrency = DEFAULT_STAGE_CONCURRENCY
+    _validate_stage_concurrency(stage_concurrency)
+    if queue_size < 1 or compute_batch_size < 1:
+        raise ValueError("`queue_size` and `compute_batch_size` must be positive.")
+
+    pipeline = _Pipeline(stage_concurrency, queue_size, compute_batch_size, debug, read_ahead)
+    start_time = time.time()
+    num_in_flight = 0
+    with OutcomeBuffer(
+        task_queue, outcome_queue, max_len=outcome_batch_len, max_wait_sec=outcome_flush_sec
+    ) as outcome_buffer:
+        try:
+            while True:
+                outcome_buffer.flush_if_due()
+                if max_runtime is not None and time.time() - start_time > max_runtime:
+                    if num_in_flight == 0:
+                        break
+                    num_in_flight -= _report_done(pipeline, outcome_buffer, timeout=sleep_sec)
+                    continue
+
+                num_in_flight -= _report_done(pipeline, outcome_buffer, timeout=None)
+                if not pipeline.has_capacity():
+                    num_in_flight -= _report_done(pipeline, outcome_buffer, timeout=sleep_sec)
+                    continue
+
+                task_msgs = _pull(task_queue, outcome_queue, max_pull_num)
+                if len(task_msgs) == 0:
+                    outcome_buffer.flush()
+                    if num_in_flight == 0:
+                        logger.info(f"Sleeping for {sleep_sec} secs.")
+                    num_in_flight -= _report_done(pipeline, outcome_buffer, timeout=sleep_sec)
+                    continue
+
+                logger.info(f"Got {len(task_msgs)} tasks.")
+                for msg in task_msgs:
+                    if task_filter_fn(msg.payload):
+                        pipeline.submit(msg)
+                        num_in_flight += 1
+                    else:
+                        outcome_buffer.add(msg, TaskOutcome(exception=MazepaCancel()))
+        finally:
+            pipeline.stop()
+
+
+def _pull(
+    task_queue: MessageQueue[Task],
+    outcome_queue: MessageQueue[OutcomeReport],
+    max_pull_num: int,
+) -> list[ReceivedMessage[Task]]:
+    try:
+        return task_queue.pull(max_num=max_pull_num)
+    except (MazepaException, SystemExit, KeyboardInterrupt) as e:
+        raise e  # pragma: no cover
+    except Exception as e:  # pylint: disable=broad-except
+        report_pull_failure(outcome_queue, e)
+        raise e
+
+
+def _report_done(pipeline: _Pipeline, outcome_buffer: OutcomeBuffer, timeout: float | None) -> int:
+    """
+    Reports the outcomes of the finished tasks, waiting up to ``timeout`` seconds
+    for one to finish if there are none. Returns the number of reported tasks.
+    """
+    items = []
+    if timeout is not None:
+        try:
+            items.append(pipeline.done_q.get(timeout=timeout))
+        except queue.Empty:
+            return 0
+    while True:
+        try:
+            items.append(pipeline.done_q.get_nowait())
+        except queue.Empty:
+            break
+    for item in items:
+        assert item.outcome is not None
+        logger.info(f"Task {item.task.id_} done in: {item.outcome.execution_sec:.2f}sec.")
+        if is_finished_processing(item.msg, item.outcome):
+            outcome_buffer.add(item.msg, item.outcome)
+    return len(items)
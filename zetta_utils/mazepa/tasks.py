@@ -31,6 +31,7 @@ from .task_outcome import TaskOutcome, TaskStatus
 logger = log.get_logger("mazepa")
 
 R_co = TypeVar("R_co", covariant=True)
+R = TypeVar("R")
 P = ParamSpec("P")
 
 
@@ -71,18 +72,58 @@ class Task(Generic[R_co]):  # pylint: disable=too-many-instance-attributes
     def with_worker_type(self, worker_type: str | None) -> Task:
         return attrs.evolve(self, worker_type=worker_type)
 
+    def get_shared_payload_parts(self) -> list:
+        """
+        Parts of the task that are usually shared with the other tasks of its flow,
+        such as the operation and the layers, to be stored once when the task is
+        pushed to a queue with a ``PayloadStore``.
+        """
+        return [self.fn, *self.args, *self.kwargs.values()]
+
+    def prefetch(self) -> None:
+        """
+        Lets the task ``fn`` start fetching its inputs ahead of execution, if it
+        provides a ``prefetch`` method with the same signature as ``__call__``.
+        Prefetching is only a hint, so any errors are logged and ignored.
+        """
+        prefetch_fn = getattr(self.fn, "prefetch", None)
+        if prefetch_fn is None:
+            return
+        try:
+            prefetch_fn(*self.args, **self.kwargs)
+        except Exception as e:  # pylint: disable=broad-except
+            logger.debug(f"Failed to prefetch inputs of {self.id_}: {e}")
+
     def _call_task_fn(self, debug: bool = True) -> R_co:
-        if debug or self.runtime_limit_sec is None:
-            return_value = self.fn(*self.args, **self.kwargs)
-        else:
-            future = concurrent.process(timeout=self.runtime_limit_sec)(self.fn)(
-                *self.args, **self.kwargs
-            )
-            try:
-                return_value = future.result()
-            except PebbleTimeoutError as e:
-                raise exceptions.MazepaTimeoutError(f"Task '{self.id_}' took too long.") from e
-        return return_value
+        return self.call_with_runtime_limit(
+            self.fn,
+            self.args,
+            self.kwargs,
+            runtime_limit_sec=None if debug else self.runtime_limit_sec,
+        )
+
+    def call_with_runtime_limit(
+        self,
+        fn: Callable[..., R],
+        args: Iterable,
+        kwargs: dict,
+        runtime_limit_sec: float | None,
+    ) -> R:
+        """
+        Calls ``fn`` on behalf of this task. With a ``runtime_limit_sec``, the call runs
+        in a separate process and raises ``MazepaTimeoutError`` once the limit is exceeded.
+        Used to run the task ``fn`` as a whole, as well as its stages in the pipelined
+        worker.
+        """
+        if runtime_limit_sec is None:
+            return fn(*args, **kwargs)
+        if runtime_limit_sec <= 0:
+            raise exceptions.MazepaTimeoutError(f"Task '{self.id_}' took too long.")
+        future = concurrent.process(timeout=runtime_limit_sec)(fn)(*args, **kwargs)
+        try:
+            return future.result()
+        except PebbleTimeoutError as e:
+            raise exceptions.MazepaTimeoutError(f"Task '{self.id_}' took too long.") from e
 
     def __call__(self, debug: bool = True, handle_exceptions: bool = True) -> TaskOutcome[R_co]:
         logger.debug(f"STARTING: Execution of {self}.")
@@ -1,11 +1,16 @@
 from __future__ import annotations
 
 import math
+import random
 import sys
+import threading
 import time
 import traceback
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from typing import Any, Callable, Optional
 
+import attrs
 import tenacity
 
 from zetta_utils import builder, log
@@ -30,6 +35,206 @@ class AcceptAllTasks:
 logger = log.get_logger("mazepa")
 
 
+class OutcomeBuffer:  # pylint: disable=too-many-instance-attributes
+    """
+    Context manager that buffers the outcome reports of processed task messages, so
+    that they are pushed to the outcome queue and the messages are acknowledged in
+    batches. A batch is flushed once it holds ``max_len`` outcomes or its oldest outcome
+    is ``max_wait_sec`` old, and on exit. The latter is also checked on a background
+    timer, so that outcomes are not held back while the worker waits on a pull.
+
+    Outcomes are pushed before their messages are acknowledged, so that the tasks
+    of a worker that dies before flushing are retried rather than lost.
+    """
+
+    def __init__(
+        self,
+        task_queue: MessageQueue[Task],
+        outcome_queue: MessageQueue[OutcomeReport],
+        max_len: int = constants.MAX_OUTCOME_BATCH_LEN,
+        max_wait_sec: float = constants.DEFAULT_OUTCOME_FLUSH_SEC,
+    ):
+        self.task_queue = task_queue
+        self.outcome_queue = outcome_queue
+        self.max_len = max_len
+        self.max_wait_sec = max_wait_sec
+        self.msgs: list[ReceivedMessage[Task]] = []
+        self.outcome_reports: list[OutcomeReport] = []
+        self.oldest_ts = 0.0
+        self._lock = threading.Lock()
+        self._timer: RepeatTimer | None = None
+        self._timer_exception: Exception | None = None
+
+    def __enter__(self) -> OutcomeBuffer:
+        if self.max_wait_sec > 0:
+            self._timer = RepeatTimer(self.max_wait_sec / 2, self._flush_on_timer)
+            self._timer.daemon = True
+            self._timer.start()
+        return self
+
+    def __exit__(self, *args):
+        if self._timer is not None:
+            self._timer.cancel()
+        self.flush()
+
+    def _flush_on_timer(self) -> None:
+        try:
+            self.flush_if_due()
+        except Exception as e:  # pylint: disable=broad-except
+            # Reraised by the next `add` or `flush` from the worker
+            self._timer_exception = e
+
+    def _reraise_timer_exception(self) -> None:
+        if self._timer_exception is not None:
+            e, self._timer_exception = self._timer_exception, None
+            raise e
+
+    def add(self, msg: ReceivedMessage[Task], outcome: TaskOutcome) -> None:
+        self._reraise_timer_exception()
+        with self._lock:
+            if len(self.msgs) == 0:
+                self.oldest_ts = time.time()
+            self.msgs.append(msg)
+            self.outcome_reports.append(OutcomeReport(task_id=msg.payload.id_, outcome=outcome))
+            if len(self.msgs) >= self.max_len:
+                self._flush()
+
+    def flush_if_due(self) -> None:
+        with self._lock:
+            if len(self.msgs) > 0 and time.time() - self.oldest_ts >= self.max_wait_sec:
+                self._flush()
+
+    def flush(self) -> None:
+        self._reraise_timer_exception()
+        with self._lock:
+            self._flush()
+
+    def _flush(self) -> None:
+        if len(self.msgs) > 0:
+            msgs, outcome_reports = self.msgs, self.outcome_reports
+            self.msgs, self.outcome_reports = [], []
+            self.outcome_queue.push(outcome_reports)
+            self.task_queue.acknowledge(msgs)
+
+
+@attrs.mutable
+class AdaptivePuller:
+    """
+    Decides how many tasks a worker pulls at a time and how long it sleeps after
+    finding the task queue empty, and keeps count of the time spent idle.
+
+    After an empty pull, the worker sleeps with exponential backoff from
+    ``min_sleep_sec`` to ``max_sleep_sec`` with jitter, minus the time the pull itself
+    blocked for, so that queues that long poll are not waited on twice. After a
+    non-empty pull, the worker pulls again right away. ``pull_num`` is set so that a
+    batch of recent tasks takes about ``target_batch_sec``, up to ``max_pull_num``.
+
+    :param idle_sec: Total time spent in empty pulls and sleeping after them.
+    :param num_pulls: Total number of pulls.
+    :param num_empty_pulls: Number of pulls that returned no tasks.
+    """
+
+    max_pull_num: int = 1
+    max_sleep_sec: float = 4.0
+    min_sleep_sec: float = constants.MIN_WORKER_SLEEP_SEC
+    target_batch_sec: float = constants.DEFAULT_TARGET_PULL_BATCH_SEC
+    pull_num: int = 1
+    idle_sec: float = 0.0
+    num_pulls: int = 0
+    num_empty_pulls: int = 0
+    backoff_sec: float = 0.0
+    task_durations: deque[float] = attrs.field(
+        factory=lambda: deque(maxlen=constants.NUM_RECENT_TASK_DURATIONS)
+    )
+
+    def record_pull(self, num_msgs: int, pull_sec: float) -> float:
+        """Record the result of a pull, and return how long to sleep before the next."""
+        self.num_pulls += 1
+        if num_msgs > 0:
+            self.backoff_sec = 0.0
+            return 0.0
+        self.num_empty_pulls += 1
+        self.backoff_sec = min(max(self.backoff_sec * 2, self.min_sleep_sec), self.max_sleep_sec)
+        sleep_sec = max(random.uniform(self.backoff_sec / 2, self.backoff_sec) - pull_sec, 0.0)
+        self.idle_sec += pull_sec + sleep_sec
+        return sleep_sec
+
+    def record_task(self, duration_sec: float) -> None:
+        self.task_durations.append(duration_sec)
+        mean_duration_sec = sum(self.task_durations) / len(self.task_durations)
+        self.pull_num = min(
+            max(int(self.target_batch_sec / max(mean_duration_sec, 1e-6)), 1), self.max_pull_num
+        )
+
+
+class _PullAhead:
+    """
+    Context manager that pulls the next tasks of a worker on a background thread while
+    its current task runs, and starts fetching the inputs of the first of them. The
+    leases of the pulled messages are kept up until they are taken, as the current task
+    may run for longer; messages that are never taken are given back to the queue on
+    exit.
+    """
+
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._pulled: Future[list[ReceivedMessage[Task]]] | None = None
+        self._upkeeps: list[RepeatTimer] = []
+
+    def __enter__(self) -> _PullAhead:
+        return self
+
+    def __exit__(self, *args):
+        if self._pulled is not None:
+            try:
+                task_msgs = self.take()
+            except Exception:  # pylint: disable=broad-except
+                task_msgs = []
+            for msg in task_msgs:
+                try:
+                    msg.extend_lease_fn(0)
+                except Exception as e:  # pylint: disable=broad-except
+                    logger.warning(f"Could not give task {msg.payload.id_} back: {e}")
+        self._pool.shutdown()
+
+    def start(
+        self,
+        task_queue: MessageQueue[Task],
+        max_num: int,
+        task_filter_fn: Callable[[Task], bool],
+    ) -> None:
+        assert self._pulled is None
+        self._pulled = self._pool.submit(self._pull, task_queue, max_num, task_filter_fn)
+
+    def _pull(
+        self,
+        task_queue: MessageQueue[Task],
+        max_num: int,
+        task_filter_fn: Callable[[Task], bool],
+    ) -> list[ReceivedMessage[Task]]:
+        task_msgs = task_queue.pull(max_num=max_num)
+        for msg in task_msgs:
+            if msg.payload.upkeep_settings.perform_upkeep:
+                self._upkeeps.append(start_upkeep(msg.payload, msg.extend_lease_fn))
+        if len(task_msgs) > 0 and task_filter_fn(task_msgs[0].payload):
+            task_msgs[0].payload.prefetch()
+        return task_msgs
+
+    def is_started(self) -> bool:
+        return self._pulled is not None
+
+    def take(self) -> list[ReceivedMessage[Task]]:
+        """Waits for the pull to finish, and returns the pulled messages."""
+        assert self._pulled is not None
+        pulled, self._pulled = self._pulled, None
+        try:
+            return pulled.result()
+        finally:
+            for upkeep in self._upkeeps:
+                upkeep.cancel()
+            self._upkeeps = []
+
+
 @builder.register("run_worker")
 def run_worker(
     task_queue: MessageQueue[Task],
@@ -39,64 +244,107 @@ def run_worker(
     max_runtime: Optional[float] = None,
     task_filter_fn: Callable[[Task], bool] = AcceptAllTasks(),
     debug: bool = False,
-):
+    outcome_batch_len: int = constants.MAX_OUTCOME_BATCH_LEN,
+    outcome_flush_sec: float = constants.DEFAULT_OUTCOME_FLUSH_SEC,
+    read_ahead: bool = False,
+) -> AdaptivePuller:
+    """
+    Pulls tasks from ``task_queue`` and runs them until ``max_runtime`` is exceeded.
+    The number of tasks pulled at a time and the sleep time between empty pulls
+    adapt to the workload, see ``AdaptivePuller``; ``max_pull_num`` and ``sleep_sec``
+    are their upper bounds.
+    The outcomes are pushed to ``outcome_queue`` in batches of up to
+    ``outcome_batch_len``, flushed at least every ``outcome_flush_sec`` seconds and
+    whenever the task queue is found empty.
+
+    With ``read_ahead``, the inputs of the next task are fetched with ``Task.prefetch``
+    while the current task runs. While the last task of a pull runs, the next tasks
+    are pulled ahead so that the first of them can be prefetched too. Prefetched data
+    is kept in the chunk cache of the process, so this only helps with a chunk cache.
+
+    :return: The ``AdaptivePuller`` of the worker, with its idle time and pull counts.
+    """
     start_time = time.time()
-    time_slept = 0.0
-    while True:
-        try:
-            task_msgs = task_queue.pull(max_num=max_pull_num)
-        except (exceptions.MazepaException, SystemExit, KeyboardInterrupt) as e:
-            raise e  # pragma: no cover
-        except Exception as e:  # pylint: disable=broad-except
-            # The broad except here is OK because it will be propagated to the outcome
-            # queue and reraise the exception
-            logger.error("Failed pulling tasks from the queue:")
-            logger.exception(e)
-            exc_type, exception, tb = sys.exc_info()
-            traceback_text = "".join(traceback.format_exception(exc_type, exception, tb))
-
-            outcome = TaskOutcome[Any](
-                exception=exception,
-                traceback_text=traceback_text,
-                execution_sec=0,
-                return_value=None,
-            )
-            outcome_report = OutcomeReport(task_id=constants.UNKNOWN_TASK_ID, outcome=outcome)
-            outcome_queue.push([outcome_report])
-            raise e
+    puller = AdaptivePuller(max_pull_num=max_pull_num, max_sleep_sec=sleep_sec)
+    with OutcomeBuffer(
+        task_queue, outcome_queue, max_len=outcome_batch_len, max_wait_sec=outcome_flush_sec
+    ) as outcome_buffer, _PullAhead() as pull_ahead:
+        while True:
+            pull_start = time.time()
+            try:
+                if pull_ahead.is_started():
+                    task_msgs = pull_ahead.take()
+                else:
+                    task_msgs = task_queue.pull(max_num=puller.pull_num)
+            except (exceptions.MazepaException, SystemExit, KeyboardInterrupt) as e:
+                raise e  # pragma: no cover
+            except Exception as e:  # pylint: disable=broad-except
+                # The broad except here is OK because it will be propagated to the outcome
+                # queue and reraise the exception
+                report_pull_failure(outcome_queue, e)
+                raise e
+            pull_sleep_sec = puller.record_pull(len(task_msgs), time.time() - pull_start)
 
-        logger.info(f"Got {len(task_msgs)} tasks.")
+            logger.info(f"Got {len(task_msgs)} tasks.")
 
-        if len(task_msgs) == 0:
-            logger.info(f"Sleeping for {sleep_sec} secs.")
-            time.sleep(sleep_sec)
-            time_slept += sleep_sec
-        else:
-            logger.info("STARTING: task batch execution.")
-            time_slept = 0
-            time_start = time.time()
-            for msg in task_msgs:
-                task = msg.payload
-                with log.logging_tag_ctx("task_id", task.id_):
-                    with log.logging_tag_ctx("execution_id", task.execution_id):
-                        if task_filter_fn(task):
-                            ack_task, outcome = process_task_message(msg=msg, debug=debug)
-                        else:
-                            ack_task = True
-                            outcome = TaskOutcome(exception=MazepaCancel())
+            if len(task_msgs) == 0:
+                # Nothing else to do, so report the buffered outcomes right away
+                outcome_buffer.flush()
+                logger.info(
+                    f"Sleeping for {pull_sleep_sec:.2f} secs "
+                    f"({puller.num_empty_pulls}/{puller.num_pulls} empty pulls, "
+                    f"{puller.idle_sec:.1f}sec idle in total)."
+                )
+                time.sleep(pull_sleep_sec)
+            else:
+                logger.info("STARTING: task batch execution.")
+                time_start = time.time()
+                for i, msg in enumerate(task_msgs):
+                    task = msg.payload
+                    # Fetch the inputs of the next task while this one is running
+                    if read_ahead and i + 1 < len(task_msgs):
+                        if task_filter_fn(task_msgs[i + 1].payload):
+                            task_msgs[i + 1].payload.prefetch()
+                    elif read_ahead and (
+                        max_runtime is None or time.time() - start_time <= max_runtime
+                    ):
+                        pull_ahead.start(task_queue, puller.pull_num, task_filter_fn)
+                    with log.logging_tag_ctx("task_id", task.id_):
+                        with log.logging_tag_ctx("execution_id", task.execution_id):
+                            if task_filter_fn(task):
+                                task_start = time.time()
+                                ack_task, outcome = process_task_message(msg=msg, debug=debug)
+                                puller.record_task(time.time() - task_start)
+                            else:
+                                ack_task = True
+                                outcome = TaskOutcome(exception=MazepaCancel())
+
+                            if ack_task:
+                                outcome_buffer.add(msg, outcome)
+                    outcome_buffer.flush_if_due()
 
-                        if ack_task:
-                            outcome_report = OutcomeReport(
-                                task_id=msg.payload.id_, outcome=outcome
-                            )
-                            outcome_queue.push([outcome_report])
-                            msg.acknowledge_fn()
+                time_end = time.time()
+                logger.info(f"DONE: task batch execution ({time_end - time_start:.2f}sec).")
 
-            time_end = time.time()
-            logger.info(f"DONE: task batch execution ({time_end - time_start:.2f}sec).")
+            if max_runtime is not None and time.time() - start_time > max_runtime:
+                break
+    return puller
 
-        if max_runtime is not None and time.time() - start_time > max_runtime:
-            break
+
+def report_pull_failure(outcome_queue: MessageQueue[OutcomeReport], e: Exception) -> None:
+    logger.error("Failed pulling tasks from the queue:")
+    logger.exception(e)
+    exc_type, exception, tb = sys.exc_info()
+    traceback_text = "".join(traceback.format_exception(exc_type, exception, tb))
+
+    outcome = TaskOutcome[Any](
+        exception=exception,
+        traceback_text=traceback_text,
+        execution_sec=0,
+        return_value=None,
+    )
+    outcome_report = OutcomeReport(task_id=constants.UNKNOWN_TASK_ID, outcome=outcome)
+    outcome_queue.push([outcome_report])
 
 
 def process_task_message(
@@ -110,6 +358,15 @@ def process_task_message(
     else:
         outcome = task(debug=debug, handle_exceptions=handle_exceptions)
 
+    return is_finished_processing(msg, outcome), outcome
+
+
+def is_finished_processing(msg: ReceivedMessage[Task], outcome: TaskOutcome) -> bool:
+    """
+    Whether the task message should be acknowledged given its outcome, i.e. whether
+    the task succeeded or failed in a way that retrying would not fix.
+    """
+    task = msg.payload
     finished_processing: bool
     if outcome.exception is None:
         finished_processing = True
@@ -125,12 +382,12 @@ def process_task_message(
         else:
             finished_processing = True
 
-    return finished_processing, outcome
+    return finished_processing
 
 
-def _run_task_with_upkeep(
-    task: Task, extend_lease_fn: Callable, debug: bool, handle_exceptions: bool
-) -> TaskOutcome:
+def start_upkeep(task: Task, extend_lease_fn: Callable) -> RepeatTimer:
+    """Starts a timer that keeps extending the lease of the task message."""
+
     def _perform_upkeep_callbacks():
         assert task.upkeep_settings.interval_sec is not None
         try:
@@ -141,6 +398,13 @@ def _run_task_with_upkeep(
     assert task.upkeep_settings.interval_sec is not None
     upkeep = RepeatTimer(task.upkeep_settings.interval_sec, _perform_upkeep_callbacks)
     upkeep.start()
+    return upkeep
+
+
+def _run_task_with_upkeep(
+    task: Task, extend_lease_fn: Callable, debug: bool, handle_exceptions: bool
+) -> TaskOutcome:
+    upkeep = start_upkeep(task, extend_lease_fn)
     try:
         result = task(debug=debug, handle_exceptions=handle_exceptions)
     except Exception as e:  # pragma: no cover
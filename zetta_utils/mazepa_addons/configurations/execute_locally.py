@@ -3,17 +3,18 @@ from __future__ import annotations
 
 import os
 from contextlib import ExitStack
-from typing import Callable, Optional, Union
+from typing import Callable, Literal, Optional, Union
 
 from typeguard import typechecked
 
 from zetta_utils import builder, log
 from zetta_utils.common import ComparablePartial
+from zetta_utils.layer.volumetric.chunk_cache import configure_chunk_cache
 from zetta_utils.mazepa import Flow, SemaphoreType, Task, configure_semaphores, execute
 from zetta_utils.mazepa.execution_state import ExecutionState, InMemoryExecutionState
-from zetta_utils.message_queues import FileQueue
+from zetta_utils.message_queues import FileQueue, MessageQueue, ProcessQueue
 
-from .worker_pool import setup_local_worker_pool
+from .worker_pool import setup_local_worker_pool, setup_process_queue_worker_pool
 
 logger = log.get_logger("mazepa")
 
@@ -35,10 +36,22 @@ def execute_locally(
     raise_on_failed_checkpoint: bool = True,
     num_procs: int = 1,
     semaphores_spec: dict[SemaphoreType, int] | None = None,
+    chunk_cache_bytes: int = 0,
     debug: bool = False,
     write_progress_summary: bool = False,
     require_interrupt_confirm: bool = True,
+    queue_type: Literal["process", "file"] = "file",
 ):
+    """
+    Execute the target with a pool of ``num_procs`` local worker processes.
+
+    :param chunk_cache_bytes: Chunk cache budget of each worker; ``0`` disables it.
+        Each worker only sees its own writes, so enable it only when the layers read
+        during the run are not written by other workers.
+    :param queue_type: How tasks and outcomes are passed to and from the workers.
+        ``file`` uses ``FileQueue``s in ``queues_dir``, while ``process`` hands them
+        over directly through ``ProcessQueue``s.
+    """
 
     queues_dir_ = queues_dir if queues_dir else ""
 
@@ -48,18 +61,43 @@ def execute_locally(
             "creating local queues, allocating semaphores, and starting local workers."
         )
         stack.enter_context(configure_semaphores(semaphores_spec))
+        stack.enter_context(configure_chunk_cache(chunk_cache_bytes))
 
+        task_queue: MessageQueue | None
+        outcome_queue: MessageQueue | None
         if debug:
             logger.info("Debug mode: Using single process execution without local queues.")
             task_queue = None
             outcome_queue = None
+        elif queue_type == "process":
+            process_task_queue = stack.enter_context(
+                ProcessQueue(f"local_{os.getpid()}_task_queue")
+            )
+            process_outcome_queue = stack.enter_context(
+                ProcessQueue(f"local_{os.getpid()}_outcome_queue", pull_wait_sec=0.1)
+            )
+            task_queue, outcome_queue = process_task_queue, process_outcome_queue
+            stack.enter_context(
+                setup_process_queue_worker_pool(
+                    num_procs,
+                    process_task_queue,
+                    process_outcome_queue,
+                    chunk_cache_bytes=chunk_cache_bytes,
+                )
+            )
         else:
             task_queue_name = os.path.join(queues_dir_, f"local_{os.getpid()}_task_queue")
             outcome_queue_name = os.path.join(queues_dir_, f"local_{os.getpid()}_outcome_queue")
             task_queue = stack.enter_context(FileQueue(task_queue_name))
-            outcome_queue = stack.enter_context(FileQueue(outcome_queue_name))
+            # Outcomes are pulled on a background thread with its own idle backoff
+            outcome_queue = stack.enter_context(FileQueue(outcome_queue_name, pull_wait_sec=0))
             stack.enter_context(
-                setup_local_worker_pool(num_procs, task_queue_name, outcome_queue_name)
+                setup_local_worker_pool(
+                    num_procs,
+                    task_queue_name,
+                    outcome_queue_name,
+                    chunk_cache_bytes=chunk_cache_bytes,
+                )
             )
         execute(
             target=target,
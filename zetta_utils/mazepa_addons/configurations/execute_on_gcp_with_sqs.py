@@ -12,7 +12,7 @@ from typing_extensions import NotRequired
 
 from zetta_utils import builder, log, mazepa, run
 from zetta_utils.cloud_management.resource_allocation import aws_sqs, gcloud, k8s
-from zetta_utils.mazepa import SemaphoreType, execute
+from zetta_utils.mazepa import SemaphoreType, constants, execute
 from zetta_utils.mazepa.task_outcome import OutcomeReport
 from zetta_utils.mazepa.task_router import TaskRouter
 from zetta_utils.mazepa.tasks import Task
@@ -94,12 +94,23 @@ def _get_group_taskqueue_and_contexts(
     outcome_queue_spec: dict[str, Any],
     env_secret_mapping: dict[str, str],
     adc_available: bool = False,
+    payload_store_path: str | None = None,
 ) -> tuple[PushMessageQueue[Task], list[AbstractContextManager]]:
     ctx_managers: list[AbstractContextManager] = []
 
     work_queue_name = f"run-{execution_id}_{group_name}"
     work_queue_name += "_work"
-    task_queue_spec = {"@type": "SQSQueue", "name": work_queue_name}
+    task_queue_spec: dict[str, Any] = {
+        "@type": "SQSQueue",
+        "name": work_queue_name,
+        "pull_wait_sec": constants.WORKER_TASK_PULL_WAIT_SEC,
+    }
+    if payload_store_path is not None:
+        # Each queue gets its own store, so its parts can be deleted with the queue
+        task_queue_spec["payload_store"] = {
+            "@type": "PayloadStore",
+            "path": f"{payload_store_path.rstrip('/')}/{work_queue_name}",
+        }
     task_queue = builder.build(task_queue_spec)
     ctx_managers.append(aws_sqs.sqs_queue_ctx_mngr(execution_id, task_queue))
 
@@ -166,6 +177,7 @@ def get_gcp_with_sqs_config(
     groups: dict[str, WorkerGroupDict],
     cluster: k8s.ClusterInfo,
     ctx_managers: list[AbstractContextManager],
+    payload_store_path: str | None = None,
 ) -> tuple[PushMessageQueue[Task], PullMessageQueue[OutcomeReport], list[AbstractContextManager]]:
     task_queues = []
     secrets, env_secret_mapping, adc_available = k8s.get_secrets_and_mapping(
@@ -194,6 +206,7 @@ def get_gcp_with_sqs_config(
             outcome_queue_spec=outcome_queue_spec,
             env_secret_mapping=env_secret_mapping,
             adc_available=adc_available,
+            payload_store_path=payload_store_path,
         )
         task_queues.append(task_queue)
         ctx_managers.extend(group_ctx_managers)
@@ -225,6 +238,7 @@ def execute_on_gcp_with_sqs(  # pylint: disable=too-many-locals
     raise_on_failed_checkpoint: bool = True,
     write_progress_summary: bool = False,
     require_interrupt_confirm: bool = True,
+    payload_store_path: str | None = None,
 ):
     if debug and not local_test:
         raise ValueError("`debug` can only be set to `True` when `local_test` is also `True`.")
@@ -288,6 +302,7 @@ def execute_on_gcp_with_sqs(  # pylint: disable=too-many-locals
             groups=worker_groups,
             cluster=worker_cluster,
             ctx_managers=ctx_managers,
+            payload_store_path=payload_store_path,
         )
 
         with ExitStack() as stack:
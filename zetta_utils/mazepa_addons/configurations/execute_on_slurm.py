@@ -18,7 +18,7 @@ from zetta_utils.cloud_management.resource_allocation.k8s import (
     get_mazepa_worker_command,
 )
 from zetta_utils.common.ctx_managers import set_env_ctx_mngr
-from zetta_utils.mazepa import SemaphoreType, execute
+from zetta_utils.mazepa import SemaphoreType, constants, execute
 from zetta_utils.mazepa.task_outcome import OutcomeReport
 from zetta_utils.mazepa.tasks import Task
 from zetta_utils.message_queues import sqs  # pylint: disable=unused-import
@@ -163,6 +163,7 @@ def get_slurm_contex_managers(
     work_queue_name = f"run-{execution_id}-work"
     outcome_queue_name = f"run-{execution_id}-outcome"
 
+    task_queue_spec: dict[str, Any]
     if message_queue == "fq":
         task_queue_spec = {
             "@type": "FileQueue",
@@ -183,6 +184,7 @@ def get_slurm_contex_managers(
         task_queue_spec = {
             "@type": "SQSQueue",
             "name": work_queue_name,
+            "pull_wait_sec": constants.WORKER_TASK_PULL_WAIT_SEC,
         }
         outcome_queue_spec = {
             "@type": "SQSQueue",
@@ -3,6 +3,7 @@ from __future__ import annotations
 import contextlib
 import multiprocessing
 import sys
+import threading
 import time
 from contextlib import ExitStack
 from itertools import repeat
@@ -10,9 +11,18 @@ from itertools import repeat
 import pebble
 
 from zetta_utils import builder, log, try_load_train_inference
-from zetta_utils.mazepa import SemaphoreType, Task, configure_semaphores, run_worker
+from zetta_utils.layer.volumetric.chunk_cache import configure_chunk_cache
+from zetta_utils.mazepa import (
+    SemaphoreType,
+    Task,
+    configure_semaphores,
+    constants,
+    run_pipelined_worker,
+    run_worker,
+)
 from zetta_utils.mazepa.task_outcome import OutcomeReport
-from zetta_utils.message_queues import FileQueue, SQSQueue
+from zetta_utils.message_queues import FileQueue, ProcessQueue, SQSQueue
+from zetta_utils.message_queues.base import MessageQueue
 
 logger = log.get_logger("mazepa")
 
@@ -44,18 +54,84 @@ def run_local_worker(
     outcome_queue_name: str,
     local: bool = True,
     sleep_sec: float = 0.1,
+    chunk_cache_bytes: int = 0,
+    stage_concurrency: dict[SemaphoreType, int] | None = None,
+    compute_batch_size: int = 1,
 ) -> None:
     queue_type = FileQueue if local else SQSQueue
-    task_queue = queue_type(name=task_queue_name)
+    task_queue: MessageQueue[Task] = (
+        FileQueue(name=task_queue_name)
+        if local
+        else SQSQueue(name=task_queue_name, pull_wait_sec=constants.WORKER_TASK_PULL_WAIT_SEC)
+    )
     outcome_queue = queue_type(name=outcome_queue_name, pull_wait_sec=1.0)
-    run_worker(
-        task_queue=task_queue,
-        outcome_queue=outcome_queue,
+    # Each FileQueue message is its own file, so there is nothing to gain from batching
+    outcome_batch_len = 1 if local else constants.MAX_OUTCOME_BATCH_LEN
+    _run_worker_with_queues(
+        task_queue,
+        outcome_queue,
         sleep_sec=sleep_sec,
-        max_pull_num=1,
+        chunk_cache_bytes=chunk_cache_bytes,
+        stage_concurrency=stage_concurrency,
+        compute_batch_size=compute_batch_size,
+        outcome_batch_len=outcome_batch_len,
     )
 
 
+def run_process_queue_worker(
+    task_queue: ProcessQueue[Task],
+    outcome_queue: ProcessQueue[OutcomeReport],
+    sleep_sec: float,
+    chunk_cache_bytes: int,
+    stage_concurrency: dict[SemaphoreType, int] | None,
+    compute_batch_size: int,
+) -> None:
+    worker_init()
+    _run_worker_with_queues(
+        task_queue,
+        outcome_queue,
+        sleep_sec=sleep_sec,
+        chunk_cache_bytes=chunk_cache_bytes,
+        stage_concurrency=stage_concurrency,
+        compute_batch_size=compute_batch_size,
+        outcome_batch_len=1,
+    )
+
+
+def _run_worker_with_queues(
+    task_queue: MessageQueue[Task],
+    outcome_queue: MessageQueue[OutcomeReport],
+    sleep_sec: float,
+    chunk_cache_bytes: int,
+    stage_concurrency: dict[SemaphoreType, int] | None,
+    compute_batch_size: int,
+    outcome_batch_len: int,
+) -> None:
+    # Prefetched inputs are kept in the chunk cache, so only read ahead with one
+    read_ahead = chunk_cache_bytes > 0
+    with configure_chunk_cache(chunk_cache_bytes):
+        if stage_concurrency is None:
+            run_worker(
+                task_queue=task_queue,
+                outcome_queue=outcome_queue,
+                sleep_sec=sleep_sec,
+                max_pull_num=1,
+                outcome_batch_len=outcome_batch_len,
+                read_ahead=read_ahead,
+            )
+        else:
+            run_pipelined_worker(
+                task_queue=task_queue,
+                outcome_queue=outcome_queue,
+                stage_concurrency=stage_concurrency,
+                compute_batch_size=compute_batch_size,
+                sleep_sec=sleep_sec,
+                max_pull_num=1,
+                outcome_batch_len=outcome_batch_len,
+                read_ahead=read_ahead,
+            )
+
+
 @contextlib.contextmanager
 def setup_local_worker_pool(
     num_procs: int,
@@ -63,9 +139,18 @@ def setup_local_worker_pool(
     outcome_queue_name: str,
     local: bool = True,
     sleep_sec: float = 0.1,
+    chunk_cache_bytes: int = 0,
+    stage_concurrency: dict[SemaphoreType, int] | None = None,
+    compute_batch_size: int = 1,
 ):
     """
     Context manager for creating task/outcome queues, alongside a persistent pool of workers.
+    Each worker gets its own chunk cache with a budget of ``chunk_cache_bytes``. The cache
+    is off by default: it only sees the writes of its own worker, so enable it only when
+    the layers read during the run are not written by other workers. With the cache on,
+    the workers also fetch the inputs of their next task while running the current one.
+    If ``stage_concurrency`` is given, the workers run tasks in a read/compute/write
+    pipeline; see ``mazepa.run_pipelined_worker``.
     """
     try:
         pool = pebble.ProcessPool(
@@ -79,6 +164,9 @@ def setup_local_worker_pool(
             repeat(outcome_queue_name, num_procs),
             repeat(local, num_procs),
             repeat(sleep_sec, num_procs),
+            repeat(chunk_cache_bytes, num_procs),
+            repeat(stage_concurrency, num_procs),
+            repeat(compute_batch_size, num_procs),
         )
         logger.info(
             f"Created {num_procs} local workers attached to queues "
@@ -94,6 +182,94 @@ def setup_local_worker_pool(
         )
 
 
+@contextlib.contextmanager
+def setup_process_queue_worker_pool(
+    num_procs: int,
+    task_queue: ProcessQueue[Task],
+    outcome_queue: ProcessQueue[OutcomeReport],
+    sleep_sec: float = 0.1,
+    chunk_cache_bytes: int = 0,
+    stage_concurrency: dict[SemaphoreType, int] | None = None,
+    compute_batch_size: int = 1,
+):
+    """
+    Context manager for a pool of local workers that are handed the given task/outcome
+    ``ProcessQueue``s as they start, so that tasks and outcomes are passed between
+    processes directly rather than through the filesystem.
+
+    The pool is monitored from a background thread, which pushes messages whose lease
+    expired back to the queues and releases the shared memory of acknowledged ones. A
+    worker that exits unexpectedly is replaced, and its task is run again once its lease
+    expires.
+    """
+    ctx = multiprocessing.get_context("spawn")
+    worker_args = (
+        task_queue,
+        outcome_queue,
+        sleep_sec,
+        chunk_cache_bytes,
+        stage_concurrency,
+        compute_batch_size,
+    )
+    procs = [
+        ctx.Process(target=run_process_queue_worker, args=worker_args, daemon=True)
+        for _ in range(num_procs)
+    ]
+    stop_event = threading.Event()
+    monitor = threading.Thread(
+        target=_monitor_workers,
+        args=(procs, worker_args, [task_queue, outcome_queue], stop_event),
+        daemon=True,
+    )
+    try:
+        for proc in procs:
+            proc.start()
+        monitor.start()
+        logger.info(
+            f"Created {num_procs} local workers attached to queues "
+            f"`{task_queue.name}` / `{outcome_queue.name}`."
+        )
+        yield
+    finally:
+        stop_event.set()
+        if monitor.is_alive():
+            monitor.join()
+        for proc in procs:
+            if proc.pid is not None:
+                proc.terminate()
+                proc.join()
+        logger.info(
+            f"Cleaned up {num_procs} local workers that were attached to queues "
+            f"`{task_queue.name}` / `{outcome_queue.name}`."
+        )
+
+
+def _monitor_workers(
+    procs: list[multiprocessing.process.BaseProcess],
+    worker_args: tuple,
+    queues: list[ProcessQueue],
+    stop_event: threading.Event,
+) -> None:
+    ctx = multiprocessing.get_context("spawn")
+    while not stop_event.wait(1.0):
+        try:
+            for q in queues:
+                q.requeue_expired()
+            for i, proc in enumerate(procs):
+                if proc.exitcode is not None:
+                    logger.error(
+                        f"Local worker process {proc.pid} exited with code {proc.exitcode}; "
+                        "starting a new one."
+                    )
+                    procs[i] = ctx.Process(
+                        target=run_process_queue_worker, args=worker_args, daemon=True
+                    )
+                    procs[i].start()
+        except Exception:  # pylint: disable=broad-except
+            # Keep monitoring: without it, leases expire and crashed workers stay down
+            logger.exception("Error while monitoring the local worker processes.")
+
+
 @builder.register("mazepa.run_worker_manager")
 def run_worker_manager(
     task_queue: SQSQueue[Task],
@@ -101,6 +277,9 @@ def run_worker_manager(
     sleep_sec: float = 1.0,
     num_procs: int = 1,
     semaphores_spec: dict[SemaphoreType, int] | None = None,
+    chunk_cache_bytes: int = 0,
+    stage_concurrency: dict[SemaphoreType, int] | None = None,
+    compute_batch_size: int = 1,
 ):
     with ExitStack() as stack:
         stack.enter_context(configure_semaphores(semaphores_spec))
@@ -111,6 +290,9 @@ def run_worker_manager(
                 outcome_queue.name,
                 local=False,
                 sleep_sec=sleep_sec,
+                chunk_cache_bytes=chunk_cache_bytes,
+                stage_concurrency=stage_concurrency,
+                compute_batch_size=compute_batch_size,
             )
         )
         while True:
@@ -20,5 +20,6 @@ builder.register("mazepa.execute")(mazepa.execute)
 builder.register("mazepa.TaskRouter")(mazepa.TaskRouter)
 builder.register("mazepa.AutoexecuteTaskQueue")(mazepa.AutoexecuteTaskQueue)
 builder.register("mazepa.run_worker")(mazepa.run_worker)
+builder.register("mazepa.run_pipelined_worker")(mazepa.run_pipelined_worker)
 builder.register("mazepa.sequential_flow")(mazepa.sequential_flow)
 builder.register("mazepa.concurrent_flow")(mazepa.concurrent_flow)
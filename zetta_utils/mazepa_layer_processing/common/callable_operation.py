@@ -30,6 +30,18 @@ def _process_callable_kwargs(idx: IndexT, kwargs: dict) -> dict:
     return result
 
 
+def _prefetch_callable_kwargs(idx: IndexT, kwargs: dict) -> None:
+    for v in kwargs.values():
+        if isinstance(v, Layer):
+            v.prefetch_with_procs(idx)
+        elif isinstance(v, dict) and all(isinstance(vv, Layer) for vv in v.values()):
+            for vv in v.values():
+                vv.prefetch_with_procs(idx)
+        elif isinstance(v, collections.abc.Iterable) and all(isinstance(vv, Layer) for vv in v):
+            for vv in v:
+                vv.prefetch_with_procs(idx)
+
+
 @builder.register("CallableOperation")
 @mazepa.taskable_operation_cls
 @attrs.mutable
@@ -40,6 +52,8 @@ class CallableOperation(Generic[P, IndexT, R]):
 
     fn: Callable[P, R]
 
+    __mazepa_hash_memoize__ = True
+
     def __call__(
         self, idx: IndexT, dst: LayerWithIndexT[IndexT], *args: P.args, **kwargs: P.kwargs
     ) -> None:
@@ -48,6 +62,11 @@ class CallableOperation(Generic[P, IndexT, R]):
         result = self.fn(**fn_kwargs)
         dst[idx] = result
 
+    def prefetch(  # pylint: disable=unused-argument
+        self, idx: IndexT, dst: LayerWithIndexT[IndexT], *args: P.args, **kwargs: P.kwargs
+    ) -> None:
+        _prefetch_callable_kwargs(idx, kwargs)
+
 
 # TODO: fix mypy
 # Getting error: error:
@@ -1,13 +1,17 @@
 from __future__ import annotations
 
-from typing import Sequence, Union, cast
+import itertools
+from typing import Any, Sequence, Union, cast
 
+import attrs
 from numpy import typing as npt
 
 from zetta_utils import builder, mazepa, tensor_ops
 from zetta_utils.common import ComparablePartial
 from zetta_utils.geometry import BBox3D, Vec3D
+from zetta_utils.layer.volumetric import VolumetricIndex
 from zetta_utils.layer.volumetric.layer import VolumetricLayer
+from zetta_utils.mazepa import semaphore
 from zetta_utils.mazepa.flows import sequential_flow
 from zetta_utils.mazepa_layer_processing.common.subchunkable_apply_flow import (
     build_subchunkable_apply_flow,
@@ -52,6 +56,100 @@ def make_interpolate_operation(
     return op
 
 
+@mazepa.taskable_operation_cls
+@attrs.frozen
+class InterpolatePyramidOperation:
+    """
+    Reads the source once at ``src_resolution`` and writes its interpolation to
+    each of the ``dst_resolutions``, computing the finer results first and
+    interpolating each of the coarser ones from the previous one in memory.
+    Consecutive resolutions with the same scale factor are computed together,
+    which lets ``tinybrain`` produce all of them in a single call.
+
+    Tasks are given indices at the coarsest of the ``dst_resolutions``.
+    """
+
+    src_resolution: Sequence[float]
+    dst_resolutions: Sequence[Sequence[float]]
+    mode: tensor_ops.InterpolationMode
+    mask_value_thr: float = 0
+
+    __mazepa_hash_memoize__ = True
+
+    def get_operation_name(self) -> str:
+        return f"InterpolatePyramid<{self.mode}>"
+
+    def get_input_resolution(  # pylint: disable=unused-argument
+        self, dst_resolution: Vec3D
+    ) -> Vec3D:
+        return Vec3D(*self.src_resolution)
+
+    def with_added_crop_pad(self, crop_pad: Vec3D[int]) -> InterpolatePyramidOperation:
+        if crop_pad != Vec3D[int](0, 0, 0):
+            raise ValueError("`InterpolatePyramidOperation` does not support crop pads.")
+        return self
+
+    def __call__(
+        self,
+        idx: VolumetricIndex,
+        dst: VolumetricLayer,
+        src: VolumetricLayer,
+    ) -> None:
+        self.write_outputs(self.compute_outputs(self.read_inputs(idx, dst, src)), idx, dst, src)
+
+    def read_inputs(  # pylint: disable=unused-argument
+        self,
+        idx: VolumetricIndex,
+        dst: VolumetricLayer,
+        src: VolumetricLayer,
+    ) -> Any:
+        with semaphore("read"):
+            return src[self._get_src_idx(idx)]
+
+    def compute_outputs(self, inputs: Any) -> list:
+        res_change_mults = [
+            Vec3D(*res) / Vec3D(*last_res)
+            for last_res, res in zip(
+                [self.src_resolution, *self.dst_resolutions], self.dst_resolutions
+            )
+        ]
+        results: list = []
+        data = inputs
+        for res_change_mult, group in itertools.groupby(res_change_mults):
+            mips = tensor_ops.common.interpolate_pyramid(
+                data,
+                scale_factor=1 / res_change_mult,
+                num_mips=len(list(group)),
+                mode=self.mode,
+                mask_value_thr=self.mask_value_thr,
+            )
+            results.extend(mips)
+            data = mips[-1]
+        return results
+
+    def write_outputs(  # pylint: disable=unused-argument
+        self,
+        outputs: list,
+        idx: VolumetricIndex,
+        dst: VolumetricLayer,
+        src: VolumetricLayer,
+    ) -> None:
+        with semaphore("write"):
+            for res, output in zip(self.dst_resolutions, outputs):
+                dst[VolumetricIndex(resolution=Vec3D(*res), bbox=idx.bbox)] = output
+
+    def prefetch(  # pylint: disable=unused-argument
+        self,
+        idx: VolumetricIndex,
+        dst: VolumetricLayer,
+        src: VolumetricLayer,
+    ) -> None:
+        src.prefetch(self._get_src_idx(idx))
+
+    def _get_src_idx(self, idx: VolumetricIndex) -> VolumetricIndex:
+        return VolumetricIndex(resolution=Vec3D(*self.src_resolution), bbox=idx.bbox)
+
+
 @builder.register("build_interpolate_flow")
 def build_interpolate_flow(  # pylint: disable=too-many-locals
     src: VolumetricLayer,
@@ -71,7 +169,20 @@ def build_interpolate_flow(  # pylint: disable=too-many-locals
     auto_bbox: bool = False,
     dst_tighten_bounds: bool = False,
     mask_value_thr: float = 0,
+    fused: bool = False,
 ) -> mazepa.Flow:
+    """
+    Interpolates ``src`` at ``src_resolution`` to each of the ``dst_resolutions``,
+    from the finest to the coarsest. The remaining arguments are passed to
+    ``build_subchunkable_apply_flow``.
+
+    By default, each resolution is computed by a separate stage from the one before it,
+    reading back what the previous stage wrote. With ``fused``, a single stage reads
+    ``src`` once per chunk and writes all of the ``dst_resolutions`` from memory.
+    ``processing_chunk_sizes`` then apply to the coarsest resolution, so that every
+    task stays chunk aligned at all of the resolutions. ``fused`` requires
+    ``skip_intermediaries`` and resolutions that are all coarser than ``src_resolution``.
+    """
     if dst is None:
         dst = src
 
@@ -92,6 +203,36 @@ def build_interpolate_flow(  # pylint: disable=too-many-locals
                 "Cannot find a strictly increasing order for the given resolutions: " f"{a} {b}"
             )
 
+    if fused:
+        if not skip_intermediaries:
+            raise ValueError("`skip_intermediaries` must be True when `fused` is used.")
+        if not Vec3D(*src_resolution) <= dst_resolutions_vec_sorted[0]:
+            raise ValueError(
+                "`fused` requires all of the destination resolutions to be coarser than "
+                f"`src_resolution` {tuple(src_resolution)}."
+            )
+        return build_subchunkable_apply_flow(
+            op=InterpolatePyramidOperation(
+                src_resolution=tuple(src_resolution),
+                dst_resolutions=[tuple(e) for e in dst_resolutions_vec_sorted],
+                mode=mode,
+                mask_value_thr=mask_value_thr,
+            ),
+            dst=dst,
+            dst_resolution=dst_resolutions_vec_sorted[-1],
+            processing_chunk_sizes=processing_chunk_sizes,
+            skip_intermediaries=skip_intermediaries,
+            expand_bbox_resolution=expand_bbox_resolution,
+            expand_bbox_backend=expand_bbox_backend,
+            expand_bbox_processing=expand_bbox_processing,
+            shrink_processing_chunk=shrink_processing_chunk,
+            auto_divisibility=auto_divisibility,
+            bbox=bbox,
+            auto_bbox=auto_bbox,
+            dst_tighten_bounds=dst_tighten_bounds,
+            op_kwargs={"src": src},
+        )
+
     stages = []
     last_res = Vec3D(*src_resolution)
     last_src = src
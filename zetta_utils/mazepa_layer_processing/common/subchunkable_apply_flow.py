@@ -27,6 +27,7 @@ from zetta_utils.common.pprint import lrpad, utcnow_ISO8601
 from zetta_utils.geometry import BBox3D, Vec3D
 from zetta_utils.geometry.vec import VEC3D_PRECISION
 from zetta_utils.layer.volumetric import VolumetricBasedLayerProtocol, VolumetricIndex
+from zetta_utils.layer.volumetric.chunk_cache import get_chunk_cache
 from zetta_utils.layer.volumetric.cloudvol.build import build_cv_layer
 from zetta_utils.mazepa import SemaphoreType, id_generation
 from zetta_utils.ng.link_builder import make_ng_link
@@ -48,17 +49,20 @@ T = TypeVar("T")
 @attrs.mutable
 class DelegatedSubchunkedOperation(Generic[P]):
     """
-    An operation that delegates to a FlowSchema.
+    An operation that delegates to a FlowSchema, executing its tasks in the current
+    process on ``num_threads`` threads. When the chunk cache of the process is on,
+    the inputs of the next task are fetched while the current one runs.
     """
 
     flow_schema: VolumetricApplyFlowSchema[P, None]
     operation_name: str
     level: int
+    num_threads: int = 1
 
-    def get_input_resolution(  # pylint: disable=no-self-use
-        self, dst_resolution: Vec3D
-    ) -> Vec3D:  # pragma: no cover
-        return dst_resolution
+    __mazepa_hash_memoize__ = True
+
+    def get_input_resolution(self, dst_resolution: Vec3D) -> Vec3D:
+        return self.flow_schema.op.get_input_resolution(dst_resolution)
 
     def get_operation_name(self) -> str:
         return f"Level {self.level} {self.operation_name}"
@@ -70,10 +74,18 @@ class DelegatedSubchunkedOperation(Generic[P]):
         *op_args: P.args,
         **op_kwargs: P.kwargs,
     ) -> None:
-        mazepa.Executor(
-            do_dryrun_estimation=False,
-            show_progress=False,
-        )(self.flow_schema(idx, dst, op_args, op_kwargs))
+        queue = mazepa.AutoexecuteTaskQueue(
+            debug=True, num_threads=self.num_threads, read_ahead=get_chunk_cache().enabled
+        )
+        try:
+            mazepa.Executor(
+                task_queue=queue,
+                outcome_queue=queue,
+                do_dryrun_estimation=False,
+                show_progress=False,
+            )(self.flow_schema(idx, dst, op_args, op_kwargs))
+        finally:
+            self.flow_schema.delete_memory_intermediaries(idx)
 
 
 @builder.register("build_postpad_subchunkable_apply_flow")
@@ -89,6 +101,9 @@ def build_postpad_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before
     expand_bbox_processing: bool = True,
     expand_bbox_resolution: bool = False,
     allow_cache_up_to_level: int | None = None,
+    memory_intermediaries: bool = False,
+    subchunk_num_threads: int = 1,
+    skip_empty_inputs: bool = False,
     print_summary: bool = True,
     generate_ng_link: bool = False,
     op_worker_type: str | None = None,
@@ -182,6 +197,9 @@ def build_postpad_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before
         shrink_processing_chunk=False,
         auto_divisibility=True,
         allow_cache_up_to_level=allow_cache_up_to_level,
+        memory_intermediaries=memory_intermediaries,
+        subchunk_num_threads=subchunk_num_threads,
+        skip_empty_inputs=skip_empty_inputs,
         op_worker_type=op_worker_type,
         reduction_worker_type=reduction_worker_type,
         print_summary=print_summary,
@@ -221,6 +239,9 @@ def build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg,
     shrink_processing_chunk: bool = False,
     auto_divisibility: bool = False,
     allow_cache_up_to_level: int | None = None,
+    memory_intermediaries: bool = False,
+    subchunk_num_threads: int = 1,
+    skip_empty_inputs: bool = False,
     op_worker_type: str | None = None,
     reduction_worker_type: str | None = None,
     print_summary: bool = True,
@@ -324,6 +345,21 @@ def build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg,
     :param allow_cache_up_to_level: The subchunking level (smallest is 0) where the cache for
         different remote layers should be cleared after the processing is done. Recommended to
         keep this at the level of the largest subchunks (default).
+    :param memory_intermediaries: Whether the intermediaries of the levels below the top are
+        kept in the memory buffer pool of the worker instead of ``level_intermediaries_dirs``
+        when they fit in its byte budget. These levels run within a single worker, so their
+        intermediaries are never read by other workers. The pool spills to the local disk when
+        it runs out of memory. Off by default.
+    :param subchunk_num_threads: Number of threads that run the tasks of the levels below the
+        top within a worker. The thread pool is only made at the level right below the top;
+        the levels further down run within its threads, so a worker runs at most this many
+        threads regardless of the number of levels. The semaphores of the worker still bound
+        the concurrent reads, writes, and GPU usage.
+    :param skip_empty_inputs: Whether to list which storage chunks of the input layers in
+        ``op_kwargs`` are present before making the top level tasks, and to drop the tasks
+        whose inputs are entirely missing. Their outputs are not written, and read as zeros
+        when blended, so this is only correct for operations that output zeros on empty
+        inputs. Has no effect unless every input layer's backend can list its chunks.
     :param op_worker_type: The worker type required by the op. The subchunked tasks
         will be routed to only the workers that have the requested worker type.
     :param reduction_worker_type: The worker type required by the reduction process. The
@@ -355,6 +391,9 @@ def build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg,
 
     dst_resolution_ = Vec3D(*dst_resolution)
 
+    if subchunk_num_threads < 1:
+        raise ValueError("`subchunk_num_threads` must be positive.")
+
     if dst is None:
         if not skip_intermediaries:
             raise ValueError("`skip_intermediaries` must be True when `dst` is None.")
@@ -567,6 +606,9 @@ def build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg,
         processing_blend_pads=[Vec3D(*v) for v in processing_blend_pads_],
         processing_blend_modes=processing_blend_modes_,  # type: ignore # Literal gets lost
         allow_cache_up_to_level=allow_cache_up_to_level_,
+        memory_intermediaries=memory_intermediaries,
+        subchunk_num_threads=subchunk_num_threads,
+        skip_empty_inputs=skip_empty_inputs,
         max_reduction_chunk_size=Vec3D(*max_reduction_chunk_size_),
         op=op_,
         bbox=bbox_,
@@ -593,7 +635,6 @@ def parse_bbox(
     dst_resolution: Vec3D,
     auto_bbox: bool,
 ) -> BBox3D:
-
     if auto_bbox:
         if (
             start_coord is not None
@@ -1075,6 +1116,9 @@ def _build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg
     processing_blend_modes: Sequence[Literal["linear", "quadratic", "max", "defer"]],
     max_reduction_chunk_size: Vec3D[int],
     allow_cache_up_to_level: int,
+    memory_intermediaries: bool,
+    subchunk_num_threads: int,
+    skip_empty_inputs: bool,
     bbox: BBox3D,
     expand_bbox_resolution: bool,
     expand_bbox_backend: bool,
@@ -1288,6 +1332,14 @@ def _build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg
     """
     flow_id = id_generation.generate_invocation_id(kwargs=locals(), prefix="subchunkable")
 
+    """
+    Only the top level tasks are checked for missing inputs; the region read for each of
+    them is padded by the crops of all levels and the blends of the levels below the top
+    """
+    input_pad = sum(processing_crop_pads, Vec3D[int](0, 0, 0)) + sum(
+        processing_blend_pads[1:], Vec3D[int](0, 0, 0)
+    )
+
     """
     Basic building blocks where the work gets done, at the very bottom
     """
@@ -1301,6 +1353,7 @@ def _build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg
         processing_blend_mode=processing_blend_modes[-1],
         processing_gap=None,
         intermediaries_dir=_path_join_if_not_none(level_intermediaries_dirs[-1], "chunks_level_0"),
+        allow_memory_intermediaries=memory_intermediaries and num_levels > 1,
         allow_cache=(allow_cache_up_to_level >= 1),
         clear_cache_on_return=(allow_cache_up_to_level == 1),
         force_intermediaries=not (skip_intermediaries),
@@ -1308,6 +1361,8 @@ def _build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg
         l0_chunks_per_task=num_chunks_below[-1],
         op_worker_type=op_worker_type,
         reduction_worker_type=reduction_worker_type,
+        skip_empty_inputs=skip_empty_inputs and num_levels == 1,
+        input_pad=input_pad,
     )
     """
     Iteratively build the hierarchy of schemas
@@ -1318,6 +1373,9 @@ def _build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg
                 flow_schema,
                 op_name,
                 level,
+                # Nested levels run within the threads of the level above, so only the top
+                # one gets a thread pool
+                subchunk_num_threads if level == num_levels - 1 else 1,
             ),
             processing_chunk_size=processing_chunk_sizes[-level - 1],
             max_reduction_chunk_size=max_reduction_chunk_size,
@@ -1329,6 +1387,7 @@ def _build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg
             intermediaries_dir=_path_join_if_not_none(
                 level_intermediaries_dirs[-level - 1], f"chunks_level_{level}"
             ),
+            allow_memory_intermediaries=memory_intermediaries and level < num_levels - 1,
             allow_cache=(allow_cache_up_to_level >= level + 1),
             clear_cache_on_return=(allow_cache_up_to_level == level + 1),
             force_intermediaries=not (skip_intermediaries),
@@ -1336,5 +1395,7 @@ def _build_subchunkable_apply_flow(  # pylint: disable=keyword-arg-before-vararg
             l0_chunks_per_task=num_chunks_below[-level - 1],
             op_worker_type=op_worker_type,
             reduction_worker_type=reduction_worker_type,
+            skip_empty_inputs=skip_empty_inputs and level == num_levels - 1,
+            input_pad=input_pad,
         )
     return flow_schema(idx, dst, op_args, op_kwargs)
@@ -1,11 +1,26 @@
+# pylint: disable=too-many-lines
 from __future__ import annotations
 
 import itertools
 import multiprocessing
 from abc import ABC
+from collections import defaultdict, deque
+from concurrent.futures import Future, ThreadPoolExecutor
 from copy import deepcopy
 from os import path
-from typing import Any, Generic, List, Literal, Optional, Tuple, TypeVar
+from typing import (
+    Any,
+    Deque,
+    Generator,
+    Generic,
+    Iterable,
+    Iterator,
+    List,
+    Literal,
+    Optional,
+    Tuple,
+    TypeVar,
+)
 
 import attrs
 import cachetools
@@ -17,38 +32,145 @@ from typing_extensions import ParamSpec
 
 from zetta_utils import log, mazepa
 from zetta_utils.geometry import Vec3D
+from zetta_utils.layer import JointIndexDataProcessor
 from zetta_utils.layer.volumetric import (
+    ChunkExistence,
+    ChunkGrid,
+    MemoryVolumetricBackend,
     VolumetricBasedLayerProtocol,
     VolumetricIndex,
     VolumetricIndexChunker,
+    VolumetricLayer,
+    get_memory_buffer_pool,
 )
 from zetta_utils.mazepa import semaphore
 from zetta_utils.tensor_ops import convert
 
 from ..operation_protocols import VolumetricOpProtocol
 
-_weights_cache: cachetools.LRUCache = cachetools.LRUCache(maxsize=16)
+# Large enough for the templates of every alignment of a few subchunk shapes
+_weights_cache: cachetools.LRUCache = cachetools.LRUCache(maxsize=256)
+
+# Number of intermediaries read concurrently by a reduction; the ``read`` semaphore
+# still bounds the number of reads in flight
+REDUCTION_READ_NUM_THREADS = 8
 
 logger = log.get_logger("zetta_utils")
 
 IndexT = TypeVar("IndexT")
 P = ParamSpec("P")
 R_co = TypeVar("R_co", covariant=True)
+T = TypeVar("T")
+
+# Number of tasks generated and yielded at once by the flows, so that tasks stream
+# out to the execution state without materializing every chunk of the ROI
+TASK_BATCH_SIZE = 10000
+
+
+def _batched(iterable: Iterable[T], batch_size: int) -> Iterator[List[T]]:
+    iterator = iter(iterable)
+    while batch := list(itertools.islice(iterator, batch_size)):
+        yield batch
+
+
+@attrs.frozen
+class _CheckerboardPhase:
+    """
+    Processing chunks written to one of the temporary destinations of checkerboarding,
+    along with the ranges of ``task_grid`` chunks along each dimension that overlap each
+    reduction chunk position, as given by ``ChunkGrid.get_overlap_ranges``.
+    """
+
+    task_grid: ChunkGrid
+    dst_temp: VolumetricBasedLayerProtocol
+    red_overlap_ranges: Tuple[Tuple[Any, Any], Tuple[Any, Any], Tuple[Any, Any]]
+
+
+def _get_red_chunk_sources(
+    phases: List[_CheckerboardPhase], red_grid: ChunkGrid, red_ind: int
+) -> Tuple[List[VolumetricIndex], List[VolumetricBasedLayerProtocol]]:
+    red_steps = np.unravel_index(red_ind, red_grid.shape, order="F")
+    task_idxs: List[VolumetricIndex] = []
+    temps: List[VolumetricBasedLayerProtocol] = []
+    for phase in phases:
+        ranges = [
+            (int(lo[e]), int(hi[e])) for (lo, hi), e in zip(phase.red_overlap_ranges, red_steps)
+        ]
+        with suppress_type_checks():
+            phase_task_idxs = [
+                phase.task_grid[i] for i in phase.task_grid.get_block_indices(ranges)
+            ]
+        task_idxs += phase_task_idxs
+        temps += [phase.dst_temp] * len(phase_task_idxs)
+    return task_idxs, temps
+
+
+def _get_operation_name(op: Any) -> str:
+    # Same as the operation name given to tasks by `mazepa.taskable_operation_cls`
+    if hasattr(op, "get_operation_name"):
+        return op.get_operation_name()
+    return type(op).__name__
+
+
+def _check_overlaps_reduction_chunks(task_grid: ChunkGrid, red_grid: ChunkGrid) -> None:
+    # This catches the case where a chunk is entirely outside any reduction chunk; this
+    # can happen if, for instance, roi_crop_pad is set to [0, 0, 1] and the
+    # processing_chunk_size is [X, X, 1].
+    for dim, (lo, hi) in enumerate(task_grid.get_overlap_ranges(red_grid)):
+        no_overlap = np.nonzero(hi <= lo)[0]
+        if len(no_overlap) > 0:
+            steps = [0, 0, 0]
+            steps[dim] = int(no_overlap[0])
+            task_idx = task_grid[int(np.ravel_multi_index(steps, task_grid.shape, order="F"))]
+            raise ValueError(
+                f"The processing chunk `{task_idx.pformat()}` does not "
+                " correspond to any reduction chunk; please check the "
+                "`roi_crop_pad` and the `processing_chunk_size`."
+            )
 
 
 @mazepa.taskable_operation_cls
 @attrs.mutable
 class Copy:
+    __mazepa_hash_memoize__ = True
+
     def __call__(
         self,
         src: VolumetricBasedLayerProtocol,
         dst: VolumetricBasedLayerProtocol,
         idx: VolumetricIndex,
     ) -> None:
+        self.write_outputs(self.read_inputs(src, dst, idx), src, dst, idx)
+
+    def read_inputs(  # pylint: disable=unused-argument
+        self,
+        src: VolumetricBasedLayerProtocol,
+        dst: VolumetricBasedLayerProtocol,
+        idx: VolumetricIndex,
+    ) -> Any:
         with semaphore("read"):
-            data = src[idx]
+            return src[idx]
+
+    def compute_outputs(self, inputs: Any) -> Any:
+        return inputs
+
+    def write_outputs(  # pylint: disable=unused-argument
+        self,
+        outputs: Any,
+        src: VolumetricBasedLayerProtocol,
+        dst: VolumetricBasedLayerProtocol,
+        idx: VolumetricIndex,
+    ) -> None:
         with semaphore("write"):
-            dst[idx] = data
+            dst[idx] = outputs
+
+    def prefetch(  # pylint: disable=unused-argument
+        self,
+        src: VolumetricBasedLayerProtocol,
+        dst: VolumetricBasedLayerProtocol,
+        idx: VolumetricIndex,
+    ) -> None:
+        src.prefetch(idx)
 
 
 @mazepa.taskable_operation_cls
@@ -56,6 +178,8 @@ class ReduceOperation(ABC):
     """Base class for Reduce operations, which combine values from different
     chunks where they overlap."""
 
+    __mazepa_hash_memoize__ = True
+
     def __call__(
         self,
         src_idxs: List[VolumetricIndex],
@@ -67,6 +191,18 @@ class ReduceOperation(ABC):
     ) -> None:
         pass
 
+    def prefetch(  # pylint: disable=unused-argument
+        self,
+        src_idxs: List[VolumetricIndex],
+        src_layers: List[VolumetricBasedLayerProtocol],
+        red_idx: VolumetricIndex,
+        roi_idx: VolumetricIndex,
+        dst: VolumetricBasedLayerProtocol,
+        processing_blend_pad: Vec3D[int],
+    ) -> None:
+        for src_idx, layer in zip(src_idxs, src_layers):
+            layer.prefetch(src_idx.intersection(red_idx))
+
 
 @mazepa.taskable_operation_cls
 @attrs.frozen
@@ -135,20 +271,26 @@ class ReduceByWeightedSum(ReduceOperation):
         with suppress_type_checks():
             if len(src_layers) == 0:
                 return
-            if not is_floating_point_dtype(dst.backend.dtype) and processing_blend_pad != Vec3D[
-                int
-            ](0, 0, 0):
+            is_blended = processing_blend_pad != Vec3D[int](0, 0, 0)
+            if not is_floating_point_dtype(dst.backend.dtype) and is_blended:
                 # backend is integer, but blending is requested - need to use float to avoid
                 # rounding errors
-                res = torch.zeros((dst.backend.num_channels, *red_idx.shape), dtype=torch.float)
+                dtype = np.dtype(np.float32)
             else:
-                res = torch.zeros(
-                    (dst.backend.num_channels, *red_idx.shape),
-                    dtype=convert.to_torch_dtype(dst.backend.dtype),
-                )
-            assert len(src_layers) > 0
-            if processing_blend_pad != Vec3D[int](0, 0, 0):
-                for src_idx, layer in zip(src_idxs, src_layers):
+                dtype = dst.backend.dtype
+            # Volumetric layers read and write in Fortran order, so accumulating in the same
+            # order keeps the updates and the final write contiguous
+            res = np.zeros((dst.backend.num_channels, *red_idx.shape), dtype=dtype, order="F")
+            # Weighted subchunks are written here before being added to ``res``, so that
+            # no temporary is allocated per subchunk
+            weighted = np.empty_like(res) if is_blended else None
+            # The reads run ahead concurrently, but the results are accumulated in order
+            # so that the sums do not depend on the timing of the reads
+            for src_idx, (subidx, data) in zip(
+                src_idxs, _read_intersections(src_idxs, src_layers, red_idx)
+            ):
+                subidx_channels = (slice(0, res.shape[0]), *subidx)
+                if weighted is not None:
                     weight = get_blending_weights(
                         idx_subchunk=src_idx,
                         idx_roi=roi_idx,
@@ -156,29 +298,55 @@ class ReduceByWeightedSum(ReduceOperation):
                         processing_blend_pad=processing_blend_pad,
                         processing_blend_mode=self.processing_blend_mode,
                     )
-                    intscn, subidx = src_idx.get_intersection_and_subindex(red_idx)
-                    subidx_channels = [slice(0, res.shape[0])] + list(subidx)
-                    with semaphore("read"):
-                        if not is_floating_point_dtype(dst.backend.dtype):
-                            # Temporarily convert integer cutout to float for rounding
-                            res[subidx_channels] = (
-                                res[subidx_channels] + layer[intscn].astype(float) * weight.numpy()
-                            )
-                        else:
-                            res[subidx_channels] = (
-                                res[subidx_channels] + layer[intscn] * weight.numpy()
-                            )
-
-                if not is_floating_point_dtype(dst.backend.dtype):
-                    res = res.round().to(dtype=convert.to_torch_dtype(dst.backend.dtype))
-            else:
-                for src_idx, layer in zip(src_idxs, src_layers):
-                    intscn, subidx = src_idx.get_intersection_and_subindex(red_idx)
-                    subidx_channels = [slice(0, res.shape[0])] + list(subidx)
-                    with semaphore("read"):
-                        res.numpy()[tuple(subidx_channels)] = layer[intscn]
+                    weighted_subchunk = weighted[subidx_channels]
+                    np.multiply(data, weight.numpy(), out=weighted_subchunk)
+                    res[subidx_channels] += weighted_subchunk
+                else:
+                    res[subidx_channels] = data
+            if is_blended and not is_floating_point_dtype(dst.backend.dtype):
+                res = res.round().astype(dst.backend.dtype)
             with semaphore("write"):
-                dst[red_idx] = res
+                dst[red_idx] = torch.from_numpy(res)
+
+
+def _read_intersections(
+    src_idxs: List[VolumetricIndex],
+    src_layers: List[VolumetricBasedLayerProtocol],
+    red_idx: VolumetricIndex,
+) -> Iterator[Tuple[Tuple[slice, ...], Any]]:
+    """
+    Yields the subindex in ``red_idx`` and the data of the intersection of each of
+    ``src_idxs`` in order, reading up to ``REDUCTION_READ_NUM_THREADS`` of them ahead,
+    so that at most as many subchunks are held at a time.
+    """
+    with ThreadPoolExecutor(max_workers=REDUCTION_READ_NUM_THREADS) as pool:
+        reads: Deque[Future] = deque()
+        for src_idx, layer in zip(src_idxs, src_layers):
+            if len(reads) == REDUCTION_READ_NUM_THREADS:
+                yield reads.popleft().result()
+            reads.append(pool.submit(_read_intersection, src_idx, layer, red_idx))
+        while reads:
+            yield reads.popleft().result()
+
+
+def _read_intersection(
+    src_idx: VolumetricIndex, layer: VolumetricBasedLayerProtocol, red_idx: VolumetricIndex
+) -> Tuple[Tuple[slice, ...], Any]:
+    intscn, subidx = src_idx.get_intersection_and_subindex(red_idx)
+    with semaphore("read"):
+        return subidx, layer[intscn]
+
+
+def _get_weight_ramp(
+    processing_blend_mode: Literal["linear", "quadratic"], pad: int
+) -> torch.Tensor:
+    steps = torch.arange(1, 2 * pad + 1, dtype=torch.float64)
+    if processing_blend_mode == "linear":
+        ramp = steps / (2 * pad + 1)
+    else:
+        dists = steps / (pad + 0.5)
+        ramp = torch.where(steps <= pad, dists**2 / 2, 1 - (2 - dists) ** 2 / 2)
+    return ramp.float()
 
 
 @cachetools.cached(_weights_cache)
@@ -195,53 +363,24 @@ def get_weight_template(
     z_start_aligned: bool,
     z_stop_aligned: bool,
 ) -> torch.Tensor:
-    weight = torch.ones(subchunk_shape, dtype=torch.float)
-    if processing_blend_mode == "linear":
-        weights_x = [x / (2 * x_pad + 1) for x in range(1, 2 * x_pad + 1)]
-        weights_y = [y / (2 * y_pad + 1) for y in range(1, 2 * y_pad + 1)]
-        weights_z = [z / (2 * z_pad + 1) for z in range(1, 2 * z_pad + 1)]
-    elif processing_blend_mode == "quadratic":
-        weights_x = [
-            (
-                ((x / (x_pad + 0.5)) ** 2) / 2
-                if x <= x_pad
-                else 1 - ((2 - (x / (x_pad + 0.5))) ** 2) / 2
-            )
-            for x in range(1, 2 * x_pad + 1)
-        ]
-        weights_y = [
-            (
-                ((y / (y_pad + 0.5)) ** 2) / 2
-                if y <= y_pad
-                else 1 - ((2 - (y / (y_pad + 0.5))) ** 2) / 2
-            )
-            for y in range(1, 2 * y_pad + 1)
-        ]
-        weights_z = [
-            (
-                ((z / (z_pad + 0.5)) ** 2) / 2
-                if z <= z_pad
-                else 1 - ((2 - (z / (z_pad + 0.5))) ** 2) / 2
-            )
-            for z in range(1, 2 * z_pad + 1)
-        ]
-
-    weights_x_t = torch.Tensor(weights_x).unsqueeze(-1).unsqueeze(-1)
-    weights_y_t = torch.Tensor(weights_y).unsqueeze(0).unsqueeze(-1)
-    weights_z_t = torch.Tensor(weights_z).unsqueeze(0).unsqueeze(0)
-
-    if not x_start_aligned and x_pad != 0:
-        weight[0 : 2 * x_pad, :, :] *= weights_x_t
-    if not x_stop_aligned and x_pad != 0:
-        weight[(-2 * x_pad) :, :, :] *= weights_x_t.flip(0)
-    if not y_start_aligned and y_pad != 0:
-        weight[:, 0 : 2 * y_pad, :] *= weights_y_t
-    if not y_stop_aligned and y_pad != 0:
-        weight[:, (-2 * y_pad) :, :] *= weights_y_t.flip(1)
-    if not z_start_aligned and z_pad != 0:
-        weight[:, :, 0 : 2 * z_pad] *= weights_z_t
-    if not z_stop_aligned and z_pad != 0:
-        weight[:, :, (-2 * z_pad) :] *= weights_z_t.flip(2)
+    # In Fortran order, like the data that the weights are applied to
+    weight = torch.ones(subchunk_shape[::-1], dtype=torch.float).permute(2, 1, 0)
+    for dim, (pad, start_aligned, stop_aligned) in enumerate(
+        zip(
+            (x_pad, y_pad, z_pad),
+            (x_start_aligned, y_start_aligned, z_start_aligned),
+            (x_stop_aligned, y_stop_aligned, z_stop_aligned),
+        )
+    ):
+        if pad == 0:
+            continue
+        ramp = _get_weight_ramp(processing_blend_mode, pad).reshape(
+            [-1 if i == dim else 1 for i in range(3)]
+        )
+        if not start_aligned:
+            weight.narrow(dim, 0, 2 * pad).mul_(ramp)
+        if not stop_aligned:
+            weight.narrow(dim, subchunk_shape[dim] - 2 * pad, 2 * pad).mul_(ramp.flip(dim))
     return weight
 
 
@@ -323,11 +462,15 @@ def delete_if_local(*args, **kwargs):
     filesystem = fsspec.filesystem("file")
     for arg in args:
         if isinstance(arg, VolumetricBasedLayerProtocol):
-            if arg.backend.is_local:
+            if isinstance(arg.backend, MemoryVolumetricBackend):
+                arg.backend.delete()
+            elif arg.backend.is_local:
                 filesystem.delete(arg.backend.name, recursive=True)
     for kwarg in kwargs.values():
         if isinstance(kwarg, VolumetricBasedLayerProtocol):
-            if kwarg.backend.is_local:
+            if isinstance(kwarg.backend, MemoryVolumetricBackend):
+                kwarg.backend.delete()
+            elif kwarg.backend.is_local:
                 filesystem.delete(kwarg.backend.name, recursive=True)
 
 
@@ -344,6 +487,7 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
     processing_blend_mode: Literal["linear", "quadratic", "max", "defer"] = "quadratic"
     processing_gap: Optional[Vec3D[int]] = None
     intermediaries_dir: Optional[str] = None
+    allow_memory_intermediaries: bool = False
     allow_cache: bool = False
     clear_cache_on_return: bool = False
     force_intermediaries: bool = False
@@ -353,6 +497,8 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
     l0_chunks_per_task: int = 0
     op_worker_type: str | None = None
     reduction_worker_type: str | None = None
+    skip_empty_inputs: bool = False
+    input_pad: Vec3D[int] = Vec3D[int](0, 0, 0)
 
     @property
     def _intermediaries_are_local(self) -> bool:
@@ -448,13 +594,19 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
         suffix: Optional[Any] = None,
     ) -> VolumetricBasedLayerProtocol:
         assert self.intermediaries_dir is not None
-        temp_name = f"{prefix}_{self.op.__class__.__name__}_temp_{idx.pformat()}_{suffix}"
+        temp_name = self._get_temp_name(idx, prefix, suffix)
         allow_cache = self.allow_cache and not self._intermediaries_are_local
         if self.use_checkerboarding:
             backend_chunk_size_to_use = self._get_backend_chunk_size_to_use(dst)
         else:
             backend_chunk_size_to_use = self.processing_chunk_size
         backend_temp_base = dst.backend
+        if self._use_memory_intermediaries(dst, idx):
+            backend_temp_base = MemoryVolumetricBackend(
+                name=path.join(self.intermediaries_dir, temp_name),
+                dtype=dst.backend.dtype,
+                num_channels=dst.backend.num_channels,
+            )
         backend_temp = backend_temp_base.with_changes(
             name=path.join(self.intermediaries_dir, temp_name),
             voxel_offset_res=(idx.start - backend_chunk_size_to_use, self.dst_resolution),
@@ -469,6 +621,49 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
         )
         return dst.with_procs(read_procs=()).with_changes(backend=backend_temp)
 
+    def _get_temp_name(
+        self, idx: VolumetricIndex, prefix: Optional[Any] = None, suffix: Optional[Any] = None
+    ) -> str:
+        return f"{prefix}_{self.op.__class__.__name__}_temp_{idx.pformat()}_{suffix}"
+
+    def delete_memory_intermediaries(self, idx: VolumetricIndex) -> None:
+        """
+        Drop the intermediaries that ``flow`` keeps in the memory buffer pool of this
+        process for ``idx``. ``flow`` drops them itself once they are reduced, so this is
+        only needed when it does not run to completion.
+        """
+        if not self.allow_memory_intermediaries or self.intermediaries_dir is None:
+            return
+        assert self.roi_crop_pad is not None
+        pool = get_memory_buffer_pool()
+        # Checkerboarded intermediaries are made for the crop padded index
+        for temp_idx in (idx, idx.padded(self.roi_crop_pad)):
+            pool.delete_with_prefix(
+                path.join(self.intermediaries_dir, self._get_temp_name(temp_idx, self.flow_id, ""))
+            )
+
+    def _use_memory_intermediaries(
+        self, dst: VolumetricBasedLayerProtocol, idx: VolumetricIndex
+    ) -> bool:
+        """
+        Whether the intermediaries for ``idx`` go to the memory buffer pool of this
+        process, which requires that every task of the flow runs in this process and
+        that all of the intermediaries fit in the byte budget of the pool. Deferred
+        intermediaries outlive the flow, and so always go to ``intermediaries_dir``.
+        """
+        assert self.processing_blend_pad is not None
+        if not self.allow_memory_intermediaries or self.processing_blend_mode == "defer":
+            return False
+        if self.use_checkerboarding:
+            # Each task writes its processing chunk padded for blending
+            num_chunks = np.ceil(np.array(idx.shape) / np.array(self.processing_chunk_size))
+            padded_chunk_size = self.processing_chunk_size + 2 * self.processing_blend_pad
+            num_voxels = int(np.prod(num_chunks * np.array(padded_chunk_size)))
+        else:
+            num_voxels = int(np.prod(idx.shape))
+        num_bytes = num_voxels * dst.backend.num_channels * dst.backend.dtype.itemsize
+        return num_bytes <= get_memory_buffer_pool().max_bytes
+
     def _make_task(
         self,
         arg: Tuple[
@@ -479,12 +674,52 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
             self.op_worker_type
         )
 
+    def _get_input_chunk_existences(
+        self, idx: VolumetricIndex, op_kwargs: P.kwargs
+    ) -> Optional[List[ChunkExistence]]:
+        """
+        Finds which storage chunks of the input layers in ``op_kwargs`` are present in the
+        region read by the tasks for ``idx``. Returns None if there are no input layers, or
+        if this cannot be told for any of them.
+        """
+        assert self.roi_crop_pad is not None
+        assert self.processing_blend_pad is not None
+        input_resolution = self.op.get_input_resolution(self.dst_resolution)
+        input_idx = VolumetricIndex(
+            resolution=input_resolution,
+            bbox=idx.padded(
+                self.roi_crop_pad + self.processing_blend_pad + self.input_pad
+            ).bbox.snapped(grid_offset=(0, 0, 0), grid_size=input_resolution, mode="expand"),
+        )
+        result = []
+        for layer in op_kwargs.values():
+            if not isinstance(layer, VolumetricBasedLayerProtocol):
+                continue
+            # Index processors and joint processors may read outside of the region
+            if not isinstance(layer, VolumetricLayer) or len(layer.index_procs) > 0:
+                return None
+            if any(isinstance(e, JointIndexDataProcessor) for e in layer.read_procs):
+                return None
+            existence = layer.backend.get_chunk_existence(input_idx)
+            if existence is None:
+                return None
+            result.append(existence)
+        if len(result) == 0:
+            return None
+        return result
+
     def make_tasks_without_checkerboarding(
         self,
         idx_chunks: List[VolumetricIndex],
         dst: VolumetricBasedLayerProtocol | None,
         op_kwargs: P.kwargs,
+        input_existences: Optional[List[ChunkExistence]] = None,
     ) -> List[mazepa.tasks.Task[R_co]]:
+        """
+        Makes the tasks for ``idx_chunks``. When ``input_existences`` is given, the chunks
+        whose inputs are entirely missing are dropped.
+        """
+        idx_chunks = self._filter_by_input_existence(idx_chunks, input_existences)
         if len(idx_chunks) > multiprocessing.cpu_count():
             with multiprocessing.Pool() as pool_obj:
                 tasks = pool_obj.map(
@@ -500,6 +735,51 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
             )
         return tasks
 
+    def _make_task_batch(
+        self,
+        idx_chunks: List[VolumetricIndex],
+        dst: VolumetricBasedLayerProtocol | None,
+        op_kwargs: P.kwargs,
+        input_existences: Optional[List[ChunkExistence]] = None,
+    ) -> List[mazepa.tasks.Task[R_co]]:
+        """
+        Makes the tasks for one ``TASK_BATCH_SIZE`` batch of ``idx_chunks`` in this
+        process: forking a pool for every batch would cost more than making the tasks.
+        """
+        idx_chunks = self._filter_by_input_existence(idx_chunks, input_existences)
+        return [self._make_task((e, dst, op_kwargs)) for e in idx_chunks]
+
+    def _filter_by_input_existence(
+        self,
+        idx_chunks: List[VolumetricIndex],
+        input_existences: Optional[List[ChunkExistence]],
+    ) -> List[VolumetricIndex]:
+        if input_existences is None:
+            return idx_chunks
+        return [
+            e
+            for e in idx_chunks
+            if any(existence.any_in(e.padded(self.input_pad)) for existence in input_existences)
+        ]
+
+    def iter_tasks_without_checkerboarding(
+        self,
+        idx_chunks: Iterable[VolumetricIndex],
+        dst: VolumetricBasedLayerProtocol | None,
+        op_kwargs: P.kwargs,
+        input_existences: Optional[List[ChunkExistence]] = None,
+    ) -> Generator[List[mazepa.tasks.Task[R_co]], None, int]:
+        """
+        Lazily makes the tasks for ``idx_chunks``, yielding them in batches of
+        ``TASK_BATCH_SIZE``. Returns the total number of tasks made.
+        """
+        num_tasks = 0
+        for idx_chunks_batch in _batched(idx_chunks, TASK_BATCH_SIZE):
+            tasks = self._make_task_batch(idx_chunks_batch, dst, op_kwargs, input_existences)
+            num_tasks += len(tasks)
+            yield tasks
+        return num_tasks
+
     def make_tasks_with_intermediaries(  # pylint: disable=too-many-locals
         self,
         idx: VolumetricIndex,
@@ -507,23 +787,73 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
         op_kwargs: P.kwargs,
     ) -> Tuple[List[mazepa.tasks.Task[R_co]], VolumetricBasedLayerProtocol | None]:
         dst_temp = self._get_temp_dst(dst, idx, self.flow_id)
+        idx_chunks = self._iter_intermediary_idx_chunks(idx)
+        tasks = self.make_tasks_without_checkerboarding(list(idx_chunks), dst_temp, op_kwargs)
+        return tasks, dst_temp
+
+    def _get_intermediary_chunking_mode(self) -> Literal["expand", "exact"]:
         have_processing_gap = self.processing_gap is not None and self.processing_gap != Vec3D[
             int
         ](0, 0, 0)
         # TODO: remove "expand"; see https://github.com/ZettaAI/zetta_utils/issues/648
-        idx_chunks = self.processing_chunker(
+        return "expand" if have_processing_gap else "exact"
+
+    def _iter_intermediary_idx_chunks(self, idx: VolumetricIndex) -> Iterator[VolumetricIndex]:
+        return self.processing_chunker.iter_chunks(
             idx,
-            mode="expand" if have_processing_gap else "exact",
+            mode=self._get_intermediary_chunking_mode(),
             chunk_id_increment=self.l0_chunks_per_task,
         )
-        tasks = self.make_tasks_without_checkerboarding(idx_chunks, dst_temp, op_kwargs)
-        return tasks, dst_temp
 
-    def make_tasks_with_checkerboarding(  # pylint: disable=too-many-locals, too-many-branches, too-many-statements
+    def _get_copy_chunker(self, dst: VolumetricBasedLayerProtocol) -> VolumetricIndexChunker:
+        assert self.processing_gap is not None
+        if self.processing_gap != Vec3D[int](0, 0, 0):
+            copy_chunk_size = (
+                dst.backend.get_chunk_size(self.dst_resolution) - self.processing_gap // 2
+            )
+        elif not self.max_reduction_chunk_size_final >= dst.backend.get_chunk_size(
+            self.dst_resolution
+        ):
+            copy_chunk_size = dst.backend.get_chunk_size(self.dst_resolution)
+        else:
+            copy_chunk_size = self.max_reduction_chunk_size_final
+
+        return VolumetricIndexChunker(
+            chunk_size=dst.backend.get_chunk_size(self.dst_resolution) - self.processing_gap // 2,
+            resolution=self.dst_resolution,
+            max_superchunk_size=copy_chunk_size,
+            offset=-self.processing_gap // 2,
+        )
+
+    def _get_reduction_chunker(self, dst: VolumetricBasedLayerProtocol) -> VolumetricIndexChunker:
+        return VolumetricIndexChunker(
+            chunk_size=dst.backend.get_chunk_size(self.dst_resolution),
+            resolution=self.dst_resolution,
+            max_superchunk_size=self.max_reduction_chunk_size_final,
+        )
+
+    def _get_reducer(self) -> ReduceOperation:
+        assert self.processing_blend_mode != "defer"
+        if self.processing_blend_mode == "max":
+            return ReduceNaive()
+        return ReduceByWeightedSum(self.processing_blend_mode)
+
+    def _get_num_checkerboarding_tasks(self, idx: VolumetricIndex) -> int:
+        assert self.processing_blend_pad is not None
+        idx_expanded = idx.padded(self.processing_blend_pad)
+        return sum(
+            chunker.get_num_chunks(
+                idx_expanded, stride_start_offset=idx_expanded.start, mode="shrink"
+            )
+            for chunker, _ in self.processing_chunker.split_into_nonoverlapping_chunkers(
+                self.processing_blend_pad
+            )
+        )
+
+    def make_tasks_with_checkerboarding(
         self,
         idx: VolumetricIndex,
-        red_chunks: List[VolumetricIndex],
-        red_shape: Vec3D[int],
+        red_grid: ChunkGrid,
         dst: VolumetricBasedLayerProtocol,
         op_kwargs: P.kwargs,
     ) -> Tuple[
@@ -532,18 +862,48 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
         List[List[VolumetricBasedLayerProtocol]],
         List[VolumetricBasedLayerProtocol],
     ]:
-        assert self.intermediaries_dir is not None
-        assert self.processing_blend_pad is not None
         """
         Makes tasks that can be reduced to the final output, and for each reduction chunk,
         the list of VolumetricIndices and the VolumetricBasedLayerProtocols that can be
         reduced to the final output, as well as the temporary destination layers.
         """
-        red_chunks = list(red_chunks)
         tasks: List[mazepa.tasks.Task[R_co]] = []
-        red_chunks_task_idxs: List[List[VolumetricIndex]] = [[] for _ in red_chunks]
-        red_chunks_temps: List[List[VolumetricBasedLayerProtocol]] = [[] for _ in red_chunks]
-        dst_temps: List[VolumetricBasedLayerProtocol] = []
+        task_batches = self.iter_tasks_with_checkerboarding(idx, red_grid, dst, op_kwargs)
+        while True:
+            try:
+                tasks += next(task_batches)
+            except StopIteration as e:
+                _, phases = e.value
+                break
+        red_chunks_sources = [
+            _get_red_chunk_sources(phases, red_grid, red_ind) for red_ind in range(len(red_grid))
+        ]
+        return (
+            tasks,
+            [task_idxs for task_idxs, _ in red_chunks_sources],
+            [temps for _, temps in red_chunks_sources],
+            [phase.dst_temp for phase in phases],
+        )
+
+    def iter_tasks_with_checkerboarding(
+        self,
+        idx: VolumetricIndex,
+        red_grid: ChunkGrid,
+        dst: VolumetricBasedLayerProtocol,
+        op_kwargs: P.kwargs,
+        input_existences: Optional[List[ChunkExistence]] = None,
+    ) -> Generator[List[mazepa.tasks.Task[R_co]], None, Tuple[int, List[_CheckerboardPhase]]]:
+        """
+        Lazy version of ``make_tasks_with_checkerboarding``: yields the tasks in batches of
+        ``TASK_BATCH_SIZE`` and, once exhausted, returns the total number of tasks along with
+        the processing chunk grid and temporary destination of each checkerboarding phase.
+        Reduction chunk bookkeeping is done on the chunk grids, so processing chunks are
+        only materialized as VolumetricIndices when their tasks are made.
+        """
+        assert self.intermediaries_dir is not None
+        assert self.processing_blend_pad is not None
+        num_tasks = 0
+        phases: List[_CheckerboardPhase] = []
 
         next_chunk_id = idx.chunk_id
         for chunker, chunker_idx in self.processing_chunker.split_into_nonoverlapping_chunkers(
@@ -558,7 +918,6 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
             dst_temp = self._get_temp_dst(
                 dst, idx, self.flow_id, "_".join(str(i) for i in chunker_idx)
             )
-            dst_temps.append(dst_temp)
             with suppress_type_checks():
                 # assert that the idx passed in is in fact exactly divisible by the chunk size
                 red_chunk_aligned = idx.snapped(
@@ -573,89 +932,73 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
                 idx_expanded = idx.padded(self.processing_blend_pad)
                 idx_expanded.chunk_id = next_chunk_id
 
-                task_idxs = chunker(
+                task_grid = chunker.get_chunk_grid(
                     idx_expanded,
                     stride_start_offset=idx_expanded.start,
                     mode="shrink",
                     chunk_id_increment=self.l0_chunks_per_task,
                 )
+                next_chunk_id += len(task_grid) * self.l0_chunks_per_task
+                _check_overlaps_reduction_chunks(task_grid, red_grid)
+            phases.append(
+                _CheckerboardPhase(
+                    task_grid=task_grid,
+                    dst_temp=dst_temp,
+                    red_overlap_ranges=red_grid.get_overlap_ranges(task_grid),
+                )
+            )
 
-                if len(task_idxs) == 0:
-                    continue
-
-                next_chunk_id = task_idxs[-1].chunk_id + self.l0_chunks_per_task
+            for batch_start in range(0, len(task_grid), TASK_BATCH_SIZE):
+                # yield outside of `suppress_type_checks`: the suppression is process-wide
+                # and would otherwise stay on while the flow is suspended
+                with suppress_type_checks():
+                    batch_stop = min(batch_start + TASK_BATCH_SIZE, len(task_grid))
+                    task_idxs = [task_grid[i] for i in range(batch_start, batch_stop)]
+                    tasks = self._make_task_batch(task_idxs, dst_temp, op_kwargs, input_existences)
+                num_tasks += len(tasks)
+                yield tasks
+        return (num_tasks, phases)
+
+    def estimate_task_counts(
+        self,
+        idx: VolumetricIndex,
+        dst: VolumetricBasedLayerProtocol | None,
+        op_args: P.args,
+        op_kwargs: P.kwargs,
+    ) -> dict[str, int]:
+        """
+        Number of tasks per operation that ``flow`` makes for the same arguments,
+        computed from the shapes of the chunkings without making the tasks.
+        """
+        assert len(op_args) == 0
+        assert self.roi_crop_pad is not None
+        result: dict[str, int] = defaultdict(int)
+        op_name = self.op.make_task(idx=idx, dst=dst, **op_kwargs).operation_name
 
-                # get offsets in terms of index inds
-                red_chunk_offsets = tuple(itertools.product((0, 1, 2), (0, 1, 2), (0, 1, 2)))
-                # `set` to handle cases where the shape is 1 in some dimensions
-                red_ind_offsets = set(
-                    offset[2] * red_shape[0] * red_shape[1] + offset[1] * red_shape[0] + offset[0]
-                    for offset in red_chunk_offsets
+        if not self.use_checkerboarding and not self.force_intermediaries:
+            result[op_name] += self.processing_chunker.get_num_chunks(idx, mode="exact")
+        elif not self.use_checkerboarding:
+            assert dst is not None
+            result[op_name] += self.processing_chunker.get_num_chunks(
+                idx, mode=self._get_intermediary_chunking_mode()
+            )
+            result[_get_operation_name(Copy())] += self._get_copy_chunker(dst).get_num_chunks(
+                idx,
+                mode="exact",
+                stride_start_offset=dst.backend.get_voxel_offset(self.dst_resolution),
+            )
+        else:
+            assert dst is not None
+            result[op_name] += self._get_num_checkerboarding_tasks(idx.padded(self.roi_crop_pad))
+            if self.processing_blend_mode != "defer":
+                result[_get_operation_name(self._get_reducer())] += self._get_reduction_chunker(
+                    dst
+                ).get_num_chunks(
+                    idx,
+                    mode="exact",
+                    stride_start_offset=dst.backend.get_voxel_offset(self.dst_resolution),
                 )
-                if len(task_idxs) > multiprocessing.cpu_count():
-                    with multiprocessing.Pool() as pool_obj:
-                        tasks_split = pool_obj.map(
-                            self._make_task,
-                            zip(
-                                task_idxs,
-                                itertools.repeat(dst_temp),
-                                itertools.repeat(op_kwargs),
-                            ),
-                        )
-                else:
-                    tasks_split = list(
-                        map(
-                            self._make_task,
-                            zip(
-                                task_idxs,
-                                itertools.repeat(dst_temp),
-                                itertools.repeat(op_kwargs),
-                            ),
-                        )
-                    )
-                tasks += tasks_split
-
-                red_ind = 0
-                last_x_rollover = 0
-                last_xy_rollover = 0
-                for i, task_idx in enumerate(task_idxs):
-                    # test rollover in X, and then XY - note that this
-                    # also catches situations where the task_idx intersects
-                    # the current reduction chunk but is hanging off the
-                    # `left` edge
-                    if task_idx.intersects(red_chunks[last_xy_rollover]):
-                        red_ind = last_xy_rollover
-                    elif task_idx.intersects(red_chunks[last_x_rollover]):
-                        red_ind = last_x_rollover
-                    # all other cases
-                    else:
-                        try:
-                            while not task_idx.intersects(red_chunks[red_ind]):
-                                red_ind += 1
-                            if red_ind % (red_shape[0] * red_shape[1]) == 0:
-                                last_xy_rollover = red_ind
-                            if red_ind % red_shape[0] == 0:
-                                last_x_rollover = red_ind
-                        # This case catches the case where the chunk is entirely outside
-                        # any reduction chunk; this can happen if, for instance,
-                        # roi_crop_pad is set to [0, 0, 1] and the processing_chunk_size
-                        # is [X, X, 1].
-                        except IndexError as e:
-                            raise ValueError(
-                                f"The processing chunk `{task_idx.pformat()}` does not "
-                                " correspond to any reduction chunk; please check the "
-                                "`roi_crop_pad` and the `processing_chunk_size`."
-                            ) from e
-                    if task_idx.contained_in(red_chunks[red_ind]):
-                        red_chunks_task_idxs[red_ind].append(task_idx)
-                        red_chunks_temps[red_ind].append(dst_temp)
-                    else:
-                        inds = [red_ind + red_ind_offset for red_ind_offset in red_ind_offsets]
-                        for i in inds:
-                            if i < len(red_chunks) and task_idx.intersects(red_chunks[i]):
-                                red_chunks_task_idxs[i].append(task_idx)
-                                red_chunks_temps[i].append(dst_temp)
-        return (tasks, red_chunks_task_idxs, red_chunks_temps, dst_temps)
+        return dict(result)
 
     def flow(  # pylint:disable=too-many-branches, too-many-statements
         self,
@@ -671,63 +1014,60 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
         if self.allow_cache:
             op_args, op_kwargs = set_allow_cache(*op_args, **op_kwargs)
 
+        input_existences = None
+        if self.skip_empty_inputs:
+            input_existences = self._get_input_chunk_existences(idx, op_kwargs)
+            if input_existences is None:
+                logger.info("Cannot tell which input chunks are present; processing all chunks.")
+
         logger.debug(f"Breaking {idx} into chunks with {self.processing_chunker}.")
 
         # cases without checkerboarding
         if not self.use_checkerboarding and not self.force_intermediaries:
-            idx_chunks = self.processing_chunker(
+            idx_chunks = self.processing_chunker.iter_chunks(
                 idx, mode="exact", chunk_id_increment=self.l0_chunks_per_task
             )
-            tasks = self.make_tasks_without_checkerboarding(idx_chunks, dst, op_kwargs)
-            logger.info(f"Submitting {len(tasks)} processing tasks from operation {self.op}.")
-            yield tasks
+            num_tasks = yield from self.iter_tasks_without_checkerboarding(
+                idx_chunks, dst, op_kwargs, input_existences
+            )
+            logger.info(f"Submitted {num_tasks} processing tasks from operation {self.op}.")
         elif not self.use_checkerboarding and self.force_intermediaries:
             assert dst is not None
-            tasks, dst_temp = self.make_tasks_with_intermediaries(idx, dst, op_kwargs)
-            logger.info(f"Submitting {len(tasks)} processing tasks from operation {self.op}.")
-            yield tasks
+            dst_temp = self._get_temp_dst(dst, idx, self.flow_id)
+            num_tasks = yield from self.iter_tasks_without_checkerboarding(
+                self._iter_intermediary_idx_chunks(idx), dst_temp, op_kwargs, input_existences
+            )
+            logger.info(f"Submitted {num_tasks} processing tasks from operation {self.op}.")
             yield mazepa.Dependency()
             if self.processing_gap is None:
                 self.processing_gap = Vec3D[int](0, 0, 0)
-            if self.processing_gap != Vec3D[int](0, 0, 0):
-                copy_chunk_size = (
-                    dst.backend.get_chunk_size(self.dst_resolution) - self.processing_gap // 2
-                )
-            elif not self.max_reduction_chunk_size_final >= dst.backend.get_chunk_size(
-                self.dst_resolution
-            ):
-                copy_chunk_size = dst.backend.get_chunk_size(self.dst_resolution)
-            else:
-                copy_chunk_size = self.max_reduction_chunk_size_final
-
-            reduction_chunker = VolumetricIndexChunker(
-                chunk_size=dst.backend.get_chunk_size(self.dst_resolution)
-                - self.processing_gap // 2,
-                resolution=self.dst_resolution,
-                max_superchunk_size=copy_chunk_size,
-                offset=-self.processing_gap // 2,
-            )
+            reduction_chunker = self._get_copy_chunker(dst)
             logger.debug(
                 f"Breaking {idx} into chunks to be copied from the intermediary layer"
                 f" with {reduction_chunker}."
             )
             stride_start_offset = dst.backend.get_voxel_offset(self.dst_resolution)
-            red_chunks = reduction_chunker(
+            copy_chunks = reduction_chunker.iter_chunks(
                 idx, mode="exact", stride_start_offset=stride_start_offset
             )
-            tasks_reduce = [
-                Copy()
-                .make_task(
-                    src=dst_temp, dst=dst.with_procs(read_procs=(), write_procs=()), idx=red_chunk
-                )
-                .with_worker_type(self.reduction_worker_type)
-                for red_chunk in red_chunks
-            ]
+            num_tasks_reduce = 0
+            for copy_chunks_batch in _batched(copy_chunks, TASK_BATCH_SIZE):
+                tasks_reduce = [
+                    Copy()
+                    .make_task(
+                        src=dst_temp,
+                        dst=dst.with_procs(read_procs=(), write_procs=()),
+                        idx=copy_chunk,
+                    )
+                    .with_worker_type(self.reduction_worker_type)
+                    for copy_chunk in copy_chunks_batch
+                ]
+                num_tasks_reduce += len(tasks_reduce)
+                yield tasks_reduce
             logger.info(
                 "Copying temporary destination backend into the final destination:"
-                f" Submitting {len(tasks_reduce)} tasks."
+                f" Submitted {num_tasks_reduce} tasks."
             )
-            yield tasks_reduce
             yield mazepa.Dependency()
             clear_cache(dst_temp)
             delete_if_local(dst_temp)
@@ -735,16 +1075,19 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
         elif self.processing_blend_mode == "defer":
             assert dst is not None
             stride_start_offset = dst.backend.get_voxel_offset(self.dst_resolution)
-            (tasks, _, _, dst_temps,) = self.make_tasks_with_checkerboarding(
-                idx.padded(self.roi_crop_pad), [idx], Vec3D(1, 1, 1), dst, op_kwargs
+            num_tasks, _ = yield from self.iter_tasks_with_checkerboarding(
+                idx.padded(self.roi_crop_pad),
+                ChunkGrid.from_index(idx),
+                dst,
+                op_kwargs,
+                input_existences,
             )
             logger.info(
                 "Writing to intermediate destinations:\n"
-                f" Submitting {len(tasks)} processing tasks from operation {self.op}.\n"
+                f" Submitted {num_tasks} processing tasks from operation {self.op}.\n"
                 f"Note that because blending is deferred, {dst.pformat()} will NOT "
                 f"contain the final output."
             )
-            yield tasks
             yield mazepa.Dependency()
         else:
             assert dst is not None
@@ -768,63 +1111,48 @@ class VolumetricApplyFlowSchema(Generic[P, R_co]):
                     f" chunk size; received {self.max_reduction_chunk_size_final}, which is"
                     f" smaller than {dst.backend.get_chunk_size(self.dst_resolution)}"
                 )
-            reduction_chunker = VolumetricIndexChunker(
-                chunk_size=dst.backend.get_chunk_size(self.dst_resolution),
-                resolution=self.dst_resolution,
-                max_superchunk_size=self.max_reduction_chunk_size_final,
-            )
+            reduction_chunker = self._get_reduction_chunker(dst)
             logger.debug(
                 f"Breaking {idx} into reduction chunks with checkerboarding"
                 f" with {reduction_chunker}. Processing chunks will use the padded index"
                 f" {idx.padded(self.roi_crop_pad)} and be chunked with {self.processing_chunker}."
             )
             stride_start_offset = dst.backend.get_voxel_offset(self.dst_resolution)
-            red_chunks = reduction_chunker(
-                idx, mode="exact", stride_start_offset=stride_start_offset
-            )
-            red_shape = reduction_chunker.get_shape(
+            red_grid = reduction_chunker.get_chunk_grid(
                 idx, mode="exact", stride_start_offset=stride_start_offset
             )
-            (
-                tasks,
-                red_chunks_task_idxs,
-                red_chunks_temps,
-                dst_temps,
-            ) = self.make_tasks_with_checkerboarding(
-                idx.padded(self.roi_crop_pad), red_chunks, red_shape, dst, op_kwargs
+            num_tasks, phases = yield from self.iter_tasks_with_checkerboarding(
+                idx.padded(self.roi_crop_pad), red_grid, dst, op_kwargs, input_existences
             )
             logger.info(
                 "Writing to temporary destinations:\n"
-                f" Submitting {len(tasks)} processing tasks from operation {self.op}."
+                f" Submitted {num_tasks} processing tasks from operation {self.op}."
             )
-            yield tasks
             yield mazepa.Dependency()
-            reducer: ReduceOperation
-            if self.processing_blend_mode == "max":
-                reducer = ReduceNaive()
-            else:
-                reducer = ReduceByWeightedSum(self.processing_blend_mode)
-            tasks_reduce = [
-                reducer.make_task(
-                    src_idxs=red_chunk_task_idxs,
-                    src_layers=red_chunk_temps,
-                    red_idx=red_chunk,
-                    roi_idx=idx.padded(self.roi_crop_pad + self.processing_blend_pad),
-                    dst=dst.with_procs(read_procs=(), write_procs=()),
-                    processing_blend_pad=self.processing_blend_pad,
-                ).with_worker_type(self.reduction_worker_type)
-                for (
-                    red_chunk_task_idxs,
-                    red_chunk_temps,
-                    red_chunk,
-                ) in zip(red_chunks_task_idxs, red_chunks_temps, red_chunks)
-            ]
+            reducer = self._get_reducer()
             logger.info(
                 "Collating temporary destination backends into the final destination:"
-                f" Submitting {len(tasks_reduce)} tasks."
+                f" Submitting {len(red_grid)} tasks."
             )
-            yield tasks_reduce
+            for red_inds in _batched(range(len(red_grid)), TASK_BATCH_SIZE):
+                tasks_reduce = []
+                for red_ind in red_inds:
+                    red_chunk_task_idxs, red_chunk_temps = _get_red_chunk_sources(
+                        phases, red_grid, red_ind
+                    )
+                    tasks_reduce.append(
+                        reducer.make_task(
+                            src_idxs=red_chunk_task_idxs,
+                            src_layers=red_chunk_temps,
+                            red_idx=red_grid[red_ind],
+                            roi_idx=idx.padded(self.roi_crop_pad + self.processing_blend_pad),
+                            dst=dst.with_procs(read_procs=(), write_procs=()),
+                            processing_blend_pad=self.processing_blend_pad,
+                        ).with_worker_type(self.reduction_worker_type)
+                    )
+                yield tasks_reduce
             yield mazepa.Dependency()
+            dst_temps = [phase.dst_temp for phase in phases]
             clear_cache(*dst_temps)
             delete_if_local(*dst_temps)
         if self.clear_cache_on_return:
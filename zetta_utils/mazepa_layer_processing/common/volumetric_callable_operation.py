@@ -1,7 +1,7 @@
 from __future__ import annotations
 
 import copy
-from contextlib import ExitStack
+from contextlib import ExitStack, contextmanager
 from functools import partial
 from typing import Callable, Generic, Sequence, TypeVar
 
@@ -17,7 +17,7 @@ from zetta_utils.layer.volumetric import VolumetricIndex, VolumetricLayer
 from zetta_utils.mazepa import SemaphoreType, semaphore
 
 from . import ChunkedApplyFlowSchema
-from .callable_operation import _process_callable_kwargs
+from .callable_operation import _prefetch_callable_kwargs, _process_callable_kwargs
 
 P = ParamSpec("P")
 IndexT = TypeVar("IndexT", bound=VolumetricIndex)
@@ -45,6 +45,8 @@ class VolumetricCallableOperation(Generic[P]):
     input_crop_pad: Sequence[int] = attrs.field(init=False)
     operation_name: str | None = None
 
+    __mazepa_hash_memoize__ = True
+
     def get_operation_name(self):
         if self.operation_name is not None:
             result = self.operation_name
@@ -75,6 +77,21 @@ class VolumetricCallableOperation(Generic[P]):
                 )
         self.input_crop_pad = input_crop_pad_raw.int()
 
+    def _get_input_idx(self, idx: VolumetricIndex) -> VolumetricIndex:
+        idx_input = copy.deepcopy(idx)
+        idx_input.resolution = self.get_input_resolution(idx.resolution)
+        return idx_input.padded(Vec3D[int](*self.input_crop_pad))
+
+    def prefetch(  # pylint: disable=keyword-arg-before-vararg, unused-argument
+        self,
+        idx: VolumetricIndex,
+        dst: VolumetricLayer | None,
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> None:
+        """Starts fetching the inputs of the call with the same arguments."""
+        _prefetch_callable_kwargs(self._get_input_idx(idx), kwargs)
+
     def __call__(  # pylint: disable=keyword-arg-before-vararg
         self,
         idx: VolumetricIndex,
@@ -82,19 +99,56 @@ class VolumetricCallableOperation(Generic[P]):
         *args: P.args,
         **kwargs: P.kwargs,
     ) -> None:
+        task_kwargs = self.read_inputs(idx, dst, *args, **kwargs)
+        result_raw = self.compute_outputs(task_kwargs)
+        self.write_outputs(result_raw, idx, dst)
+
+    def read_inputs(  # pylint: disable=keyword-arg-before-vararg, unused-argument
+        self,
+        idx: VolumetricIndex,
+        dst: VolumetricLayer | None,
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> dict:
         assert len(args) == 0
-        idx_input = copy.deepcopy(idx)
-        idx_input.resolution = self.get_input_resolution(idx.resolution)
-        idx_input_padded = idx_input.padded(Vec3D[int](*self.input_crop_pad))
+        idx_input_padded = self._get_input_idx(idx)
         with semaphore("read"):
-            task_kwargs = _process_callable_kwargs(idx_input_padded, kwargs)
+            return _process_callable_kwargs(idx_input_padded, kwargs)
+
+    @contextmanager
+    def _fn_semaphores_ctx(self):
         with ExitStack() as semaphore_stack:
             if self.fn_semaphores is not None:
                 for semaphore_type in self.fn_semaphores:
                     semaphore_stack.enter_context(semaphore(semaphore_type))
-            result_raw = self.fn(**task_kwargs)
+            yield
+
+    def compute_outputs(self, inputs: dict) -> npt.NDArray | torch.Tensor:
+        with self._fn_semaphores_ctx():
+            result = self.fn(**inputs)
             torch.cuda.empty_cache()
+        return result
 
+    def compute_outputs_batch(self, inputs: Sequence[dict]) -> list[npt.NDArray | torch.Tensor]:
+        """
+        Processes the inputs of several calls. If ``fn`` has a ``call_batch`` method,
+        it is called once with the list of keyword arguments of all the calls.
+        """
+        if not hasattr(self.fn, "call_batch"):
+            return [self.compute_outputs(e) for e in inputs]
+        with self._fn_semaphores_ctx():
+            result = self.fn.call_batch(inputs)
+            torch.cuda.empty_cache()
+        return result
+
+    def write_outputs(  # pylint: disable=keyword-arg-before-vararg, unused-argument
+        self,
+        outputs: npt.NDArray | torch.Tensor,
+        idx: VolumetricIndex,
+        dst: VolumetricLayer | None,
+        *args: P.args,
+        **kwargs: P.kwargs,
+    ) -> None:
         # If no destination layer, we can bail out now.  Possibly we
         # could bail out a bit sooner.  ToDo: study this more.
         if dst is not None:
@@ -106,7 +160,7 @@ class VolumetricCallableOperation(Generic[P]):
                 write_procs=dst.write_procs + (partial(tensor_ops.crop, crop=self.crop_pad),)
             )
             with semaphore("write"):
-                dst_with_crop[idx] = result_raw
+                dst_with_crop[idx] = outputs
 
 
 # TODO: remove as soon as `interpolate_flow` is cut and ComputeField is configured
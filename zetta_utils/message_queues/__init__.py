@@ -1,4 +1,6 @@
 from .base import ReceivedMessage, MessageQueue, TQTask
 from . import serialization
+from .payload_store import PayloadStore
 from .file import FileQueue
 from .sqs import SQSQueue
+from .process import ProcessQueue
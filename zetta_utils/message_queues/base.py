@@ -55,12 +55,18 @@ class PushMessageQueue(ABC, Generic[T]):
 class PullMessageQueue(ABC, Generic[T]):
     name: str
 
-    # TODO: add an 'acknowledge all' element to the return value
-    #       to handle acks efficiently
     @abstractmethod
     def pull(self, max_num: int = 1) -> list[ReceivedMessage[T]]:
         ...
 
+    def acknowledge(self, msgs: Sequence[ReceivedMessage[T]]) -> None:
+        """
+        Acknowledge that the given messages pulled from this queue have been processed.
+        Queues that can acknowledge several messages in one request override this.
+        """
+        for msg in msgs:
+            msg.acknowledge_fn()
+
 
 class MessageQueue(PushMessageQueue[T], PullMessageQueue[T]):
     ...
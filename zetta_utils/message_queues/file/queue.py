@@ -15,6 +15,7 @@ from zetta_utils.log import get_logger
 from zetta_utils.message_queues.base import MessageQueue
 
 from .. import ReceivedMessage, TQTask, serialization
+from ..payload_store import PayloadStore
 
 logger = get_logger("zetta_utils")
 T = TypeVar("T")
@@ -28,6 +29,7 @@ class FileQueue(MessageQueue[T]):
     _queue: Any = attrs.field(init=False, default=None)
     pull_wait_sec: float = 0.5
     pull_lease_sec: int = 10  # TODO: get a better value
+    payload_store: PayloadStore | None = None
 
     def _check_name_no_prefix(self) -> None:
         if self.name != strip_prefix(self.name):
@@ -52,6 +54,8 @@ class FileQueue(MessageQueue[T]):
         queue_path = abspath(f"fq://{self.name}")
         queue_folder_path = strip_prefix(queue_path)
         shutil.rmtree(queue_folder_path)
+        if self.payload_store is not None:
+            self.payload_store.delete_uploaded()
         logger.info(f"Cleaned up FileQueue at `{queue_folder_path}`.")
 
     def _get_tq_queue(self) -> Any:
@@ -64,7 +68,7 @@ class FileQueue(MessageQueue[T]):
         if len(payloads) > 0:
             tq_tasks = []
             for e in payloads:
-                tq_task = TQTask(serialization.serialize(e))
+                tq_task = TQTask(serialization.serialize(e, payload_store=self.payload_store))
                 tq_tasks.append(tq_task)
             self._get_tq_queue().insert(tq_tasks)
 
@@ -0,0 +1,131 @@
+from __future__ import annotations
+
+import pickle
+import threading
+import zlib
+from typing import Any
+
+import attrs
+import cachetools
+import dill
+import xxhash
+from cloudfiles import CloudFiles
+from typeguard import typechecked
+
+from zetta_utils import builder
+from zetta_utils.common.path import abspath
+
+SHARED_PART_CACHE_SIZE = 64
+IDENTITY_MEMO_SIZE = 1024
+
+PartRef = tuple[str, str]
+# Parts too small to be shared are kept in the message in their serialized form
+InlinePart = tuple[None, bytes]
+
+_shared_part_cache: cachetools.LRUCache = cachetools.LRUCache(maxsize=SHARED_PART_CACHE_SIZE)
+_shared_part_cache_lock = threading.Lock()
+
+
+def dumps_part(obj: Any) -> bytes:
+    try:
+        return pickle.dumps(obj, protocol=4)
+    except (pickle.PicklingError, TypeError):
+        return dill.dumps(obj, protocol=4)
+
+
+def loads_part(data: bytes) -> Any:
+    try:
+        return pickle.loads(data)
+    except (ModuleNotFoundError, KeyError):
+        return dill.loads(data)
+
+
+def load_part(ref: PartRef | InlinePart) -> Any:
+    """
+    Get the payload part referenced by ``ref``, keeping the most recently used shared
+    parts deserialized in a process-wide LRU cache.
+    """
+    if ref[0] is None:
+        return loads_part(ref[1])
+    with _shared_part_cache_lock:
+        if ref in _shared_part_cache:
+            return _shared_part_cache[ref]
+    path, key = ref
+    data = CloudFiles(path).get(key)
+    if data is None:
+        raise FileNotFoundError(f"Shared payload part `{key}` not found in `{path}`.")
+    result = loads_part(zlib.decompress(data))
+    with _shared_part_cache_lock:
+        _shared_part_cache[ref] = result
+    return result
+
+
+@builder.register("PayloadStore")
+@typechecked
+@attrs.mutable
+class PayloadStore:
+    """
+    Content-addressed side store for the parts shared between many queue payloads,
+    such as the operation and the layers of the tasks of a flow.
+
+    Payloads opt in by implementing ``get_shared_payload_parts``. Each of their
+    shared parts that serializes to at least ``min_shared_bytes`` is uploaded once,
+    keyed by the hash of its serialized contents, and messages only carry a
+    reference to it. References include the store path, so consumers resolve them
+    without any configuration and keep the parts they use in a process-wide LRU
+    cache. Deserialized parts are therefore shared between payloads, and must not
+    be mutated.
+
+    Stored parts are shared by many messages, so they cannot be dropped when a single
+    message is acknowledged. Instead, the queue deletes the parts uploaded through its
+    store once it is torn down, when no message can reference them anymore; see
+    ``delete_uploaded``.
+
+    :param path: Local directory or CloudFiles path (e.g. ``gs://...``) of the store.
+        Must be accessible to all consumers of the queue.
+    :param min_shared_bytes: Parts that serialize to fewer bytes are kept inline.
+    """
+
+    path: str = attrs.field(converter=abspath)
+    min_shared_bytes: int = 1024
+    _uploaded_keys: set[str] = attrs.field(init=False, factory=set)
+    _identity_memo: cachetools.LRUCache = attrs.field(
+        init=False, factory=lambda: cachetools.LRUCache(maxsize=IDENTITY_MEMO_SIZE)
+    )
+
+    def put(self, part: Any) -> PartRef | InlinePart:
+        """
+        Store ``part`` unless it is too small to be worth sharing. The part is serialized
+        once, and the same bytes are either uploaded or kept inline.
+
+        :param part: The part to store.
+        :return: Reference to the stored part, or the serialized part if it should be
+            kept inline.
+        """
+        # Payloads of a flow reference the same part objects, so each is serialized once
+        memoized = self._identity_memo.get(id(part))
+        if memoized is not None and memoized[0] is part:
+            return memoized[1]
+
+        data = dumps_part(part)
+        ref: PartRef | InlinePart = (None, data)
+        if len(data) >= self.min_shared_bytes:
+            key = xxhash.xxh128_hexdigest(data)
+            if key not in self._uploaded_keys:
+                cf = CloudFiles(self.path)
+                if not cf.exists(key):
+                    cf.put(key, zlib.compress(data))
+                self._uploaded_keys.add(key)
+            ref = (self.path, key)
+        self._identity_memo[id(part)] = (part, ref)
+        return ref
+
+    def delete_uploaded(self) -> None:
+        """
+        Delete the parts stored through this store. Must only be called once no
+        message referencing them will be consumed anymore.
+        """
+        if len(self._uploaded_keys) > 0:
+            CloudFiles(self.path).delete(list(self._uploaded_keys))
+        self._uploaded_keys.clear()
+        self._identity_memo.clear()
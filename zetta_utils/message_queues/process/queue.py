@@ -0,0 +1,285 @@
+from __future__ import annotations
+
+import multiprocessing
+import os
+import pickle
+import queue
+import threading
+import time
+import uuid
+from multiprocessing import resource_tracker, shared_memory
+from typing import Any, Sequence, TypeVar
+
+import attrs
+import dill
+
+from zetta_utils.common.partial import ComparablePartial
+from zetta_utils.log import get_logger
+from zetta_utils.message_queues.base import MessageQueue
+
+from .. import ReceivedMessage
+
+logger = get_logger("zetta_utils")
+T = TypeVar("T")
+
+DEFAULT_SHARED_MEMORY_MIN_BYTES = 1 << 20
+
+# How long ``pull`` keeps waiting for each further message of a batch: pushed messages
+# are flushed to the queue by a feeder thread, so they may not all be there at once
+PULL_DRAIN_WAIT_SEC = 0.01
+
+# Message ID, pickled payload, and the name and size of each of its out-of-band buffers
+ProcessMessage = tuple[str, bytes, list[tuple[str, int]]]
+
+
+def _dumps(obj: Any, shared_memory_min_bytes: int) -> ProcessMessage:
+    buffers: list[pickle.PickleBuffer] = []
+
+    def buffer_callback(buf: pickle.PickleBuffer) -> bool:
+        # Small buffers are kept in the pickle, large ones are passed out-of-band
+        if buf.raw().nbytes < shared_memory_min_bytes:
+            return True
+        buffers.append(buf)
+        return False
+
+    try:
+        data = pickle.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+    except (pickle.PicklingError, TypeError, AttributeError):
+        buffers.clear()
+        data = dill.dumps(obj, protocol=5, buffer_callback=buffer_callback)
+
+    shm_specs = []
+    for buf in buffers:
+        raw = buf.raw()
+        shm = shared_memory.SharedMemory(create=True, size=max(raw.nbytes, 1))
+        shm.buf[: raw.nbytes] = raw
+        shm_specs.append((shm.name, raw.nbytes))
+        shm.close()
+        # The process that created the queue unlinks the segment once the message
+        # is acknowledged or the queue is closed
+        resource_tracker.unregister(shm._name, "shared_memory")  # type: ignore # pylint: disable=protected-access
+    return uuid.uuid4().hex, data, shm_specs
+
+
+def _read_shared_memory(name: str, nbytes: int) -> bytearray:
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        return bytearray(shm.buf[:nbytes])
+    finally:
+        shm.close()
+
+
+def _release_shared_memory(shm_specs: list[tuple[str, int]]) -> None:
+    for name, _ in shm_specs:
+        try:
+            shm = shared_memory.SharedMemory(name=name)
+        except FileNotFoundError:
+            continue
+        shm.close()
+        shm.unlink()
+
+
+def _loads(msg: ProcessMessage) -> Any:
+    _, data, shm_specs = msg
+    buffers = [_read_shared_memory(name, nbytes) for name, nbytes in shm_specs]
+    try:
+        return pickle.loads(data, buffers=buffers)
+    except (ModuleNotFoundError, KeyError):
+        return dill.loads(data, buffers=buffers)
+
+
+@attrs.mutable
+class ProcessQueue(MessageQueue[T]):
+    """
+    Message queue between the processes of a single machine, backed by a
+    ``multiprocessing`` queue. Pulls block until a message arrives or for up to
+    ``pull_wait_sec``, so that consumers do not need to poll.
+
+    The queue has to be passed to the other processes when they are started.
+    Buffers of at least ``shared_memory_min_bytes`` in the payloads, such as the data of
+    large NumPy arrays, are passed through shared memory instead of the pipe.
+
+    Pulled messages are leased for ``pull_lease_sec``. Leases, their extensions and
+    acknowledgements are reported to the process that created the queue, which has to
+    call ``requeue_expired`` periodically: it pushes the messages whose lease expired
+    back to the queue, and releases the shared memory of the acknowledged ones. Only the
+    message ID and shared memory segments of a lease are reported, so the owner keeps
+    the messages it pushes until they are acknowledged; messages pushed by other
+    processes can only be redelivered if the owner pulled them itself.
+    """
+
+    name: str
+    pull_wait_sec: float = 0.5
+    pull_lease_sec: float = 10.0
+    shared_memory_min_bytes: int = DEFAULT_SHARED_MEMORY_MIN_BYTES
+    _queue: Any = attrs.field(
+        init=False, factory=lambda: multiprocessing.get_context("spawn").Queue()
+    )
+    _lease_events: Any = attrs.field(
+        init=False, factory=lambda: multiprocessing.get_context("spawn").Queue()
+    )
+    # Only kept by the process that created the queue: the messages that can be pushed
+    # back, and the shared memory segments and deadline of each leased message
+    _requeueable: dict[str, ProcessMessage] = attrs.field(init=False, factory=dict)
+    _leases: dict[str, tuple[list[tuple[str, int]], float]] = attrs.field(init=False, factory=dict)
+    _owner_pid: int = attrs.field(init=False, factory=os.getpid)
+    # Guards the above in the owner, where pulls, acknowledgements and `requeue_expired`
+    # may run on different threads
+    _lock: threading.Lock = attrs.field(init=False, factory=threading.Lock)
+
+    def __getstate__(self) -> dict[str, Any]:
+        # Locks cannot be pickled, and the other processes only get the queues anyway
+        return {k: getattr(self, k) for k in attrs.fields_dict(type(self)) if k != "_lock"}
+
+    def __setstate__(self, state: dict[str, Any]) -> None:
+        for k, v in state.items():
+            object.__setattr__(self, k, v)
+        object.__setattr__(self, "_lock", threading.Lock())
+
+    def __enter__(self) -> ProcessQueue:
+        return self
+
+    def __exit__(self, *args) -> None:
+        # Lease events may still be on their way through the pipe
+        self._process_lease_events(timeout=0.1)
+        with self._lock:
+            num_leased = len(self._leases)
+            for shm_specs, _ in self._leases.values():
+                _release_shared_memory(shm_specs)
+            self._leases.clear()
+        # Release the shared memory of the messages that were never pulled
+        num_discarded = 0
+        try:
+            while True:
+                _release_shared_memory(self._queue.get(timeout=0.1)[2])
+                num_discarded += 1
+        except queue.Empty:
+            pass
+        with self._lock:
+            for msg in self._requeueable.values():
+                _release_shared_memory(msg[2])
+            self._requeueable.clear()
+        self._queue.close()
+        self._lease_events.close()
+        logger.info(
+            f"Closed ProcessQueue `{self.name}`, discarding {num_discarded} messages "
+            f"and {num_leased} unacknowledged messages."
+        )
+
+    def push(self, payloads: Sequence[T]) -> None:
+        is_owner = self._is_owner()
+        for e in payloads:
+            msg = _dumps(e, self.shared_memory_min_bytes)
+            if is_owner:
+                with self._lock:
+                    self._requeueable[msg[0]] = msg
+            self._queue.put(msg)
+
+    def pull(self, max_num: int = 500) -> list[ReceivedMessage[T]]:
+        msgs: list[ProcessMessage] = []
+        try:
+            if self.pull_wait_sec > 0:
+                msgs.append(self._queue.get(timeout=self.pull_wait_sec))
+            while len(msgs) < max_num:
+                msgs.append(self._queue.get(timeout=PULL_DRAIN_WAIT_SEC))
+        except queue.Empty:
+            pass
+
+        results = []
+        is_owner = self._is_owner()
+        for msg in msgs:
+            deadline = time.time() + self.pull_lease_sec
+            if is_owner:
+                with self._lock:
+                    self._requeueable.setdefault(msg[0], msg)
+                    self._leases[msg[0]] = (msg[2], deadline)
+            else:
+                self._lease_events.put(("lease", (msg[0], msg[2]), deadline))
+            results.append(
+                ReceivedMessage[T](
+                    payload=_loads(msg),
+                    approx_receive_count=1,
+                    acknowledge_fn=ComparablePartial(self._acknowledge, msg_id=msg[0]),
+                    extend_lease_fn=ComparablePartial(self._extend_lease, msg_id=msg[0]),
+                )
+            )
+        return results
+
+    def _is_owner(self) -> bool:
+        return os.getpid() == self._owner_pid
+
+    def _acknowledge(self, msg_id: str) -> None:
+        if self._is_owner():
+            self._apply_lease_event("ack", msg_id, None)
+        else:
+            self._lease_events.put(("ack", msg_id, None))
+
+    def _extend_lease(self, duration_sec: float, msg_id: str) -> None:
+        deadline = time.time() + duration_sec
+        if self._is_owner():
+            self._apply_lease_event("extend", msg_id, deadline)
+        else:
+            self._lease_events.put(("extend", msg_id, deadline))
+
+    def _apply_lease_event(self, kind: str, value: Any, deadline: float | None) -> None:
+        with self._lock:
+            if kind == "lease":
+                msg_id, shm_specs = value
+                self._leases[msg_id] = (shm_specs, deadline)
+            elif value in self._leases:
+                # Acknowledgements and extensions of messages that have been pushed back
+                # are stale, and the message will be leased again
+                if kind == "ack":
+                    _release_shared_memory(self._leases.pop(value)[0])
+                    self._requeueable.pop(value, None)
+                else:
+                    self._leases[value] = (self._leases[value][0], deadline)
+
+    def _process_lease_events(self, timeout: float = 0) -> None:
+        if not self._is_owner():
+            raise RuntimeError(
+                f"Leases of ProcessQueue `{self.name}` can only be tracked by the process "
+                "that created it."
+            )
+        while True:
+            try:
+                if timeout > 0:
+                    event = self._lease_events.get(timeout=timeout)
+                else:
+                    event = self._lease_events.get_nowait()
+            except queue.Empty:
+                break
+            self._apply_lease_event(*event)
+
+    def requeue_expired(self) -> int:
+        """
+        Push the messages whose lease expired without being acknowledged back to the
+        queue, and release the shared memory of the acknowledged messages. Can only be
+        called by the process that created the queue.
+
+        :return: The number of messages pushed back.
+        """
+        self._process_lease_events()
+        now = time.time()
+        num_pushed_back = 0
+        with self._lock:
+            expired = [k for k, (_, deadline) in self._leases.items() if deadline < now]
+            for msg_id in expired:
+                shm_specs, _ = self._leases.pop(msg_id)
+                if msg_id in self._requeueable:
+                    self._queue.put(self._requeueable[msg_id])
+                    num_pushed_back += 1
+                else:
+                    # The payload was already read from shared memory when it was pulled
+                    _release_shared_memory(shm_specs)
+        if num_pushed_back < len(expired):
+            logger.warning(
+                f"Could not push back {len(expired) - num_pushed_back} messages with "
+                f"expired leases to `{self.name}`, as they were pushed and pulled by "
+                "other processes."
+            )
+        if num_pushed_back > 0:
+            logger.info(
+                f"Pushed back {num_pushed_back} messages with expired leases to `{self.name}`."
+            )
+        return num_pushed_back
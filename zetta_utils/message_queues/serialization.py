@@ -1,13 +1,24 @@
 from __future__ import annotations
 
 import codecs
+import io
 import pickle
 import zlib
+from typing import Any
 
 import dill
 
+from .payload_store import PayloadStore, load_part
 
-def serialize(obj):  # pragma: no cover
+# Marks messages that reference parts kept in a ``PayloadStore``; not a base64 character
+SHARED_PARTS_PREFIX = "@"
+
+
+def serialize(obj, payload_store: PayloadStore | None = None):  # pragma: no cover
+    if payload_store is not None:
+        get_shared_parts = getattr(obj, "get_shared_payload_parts", None)
+        if get_shared_parts is not None:
+            return _serialize_with_shared_parts(obj, payload_store, get_shared_parts())
     try:
         result = _serialize(obj, pickle)
     except (pickle.PicklingError, TypeError):
@@ -27,6 +38,8 @@ def _deserialize(s, module):  # pragma: no cover
 
 
 def deserialize(s):  # pragma: no cover
+    if s.startswith(SHARED_PARTS_PREFIX):
+        return _deserialize_with_shared_parts(s[len(SHARED_PARTS_PREFIX) :])
     try:
         result = _deserialize(s, pickle)
     except (ModuleNotFoundError, KeyError):
@@ -34,6 +47,55 @@ def deserialize(s):  # pragma: no cover
     return result
 
 
+def _make_sharing_pickler_cls(base: type) -> type:
+    class SharingPickler(base):
+        def __init__(self, file, store: PayloadStore, parts: list, **kwargs):
+            super().__init__(file, protocol=4, **kwargs)
+            self.store = store
+            self.part_ids = {id(e) for e in parts}
+
+        def persistent_id(self, obj):
+            # Small parts come back inline, reusing the pickle made to measure their size
+            if id(obj) in self.part_ids:
+                return self.store.put(obj)
+            return None
+
+    return SharingPickler
+
+
+def _make_sharing_unpickler_cls(base: type) -> type:
+    class SharingUnpickler(base):
+        def persistent_load(self, pid):
+            return load_part(tuple(pid))
+
+    return SharingUnpickler
+
+
+_SharingPickler = _make_sharing_pickler_cls(pickle.Pickler)
+_SharingDillPickler = _make_sharing_pickler_cls(dill.Pickler)
+_SharingUnpickler = _make_sharing_unpickler_cls(pickle.Unpickler)
+_SharingDillUnpickler = _make_sharing_unpickler_cls(dill.Unpickler)
+
+
+def _serialize_with_shared_parts(obj: Any, store: PayloadStore, parts: list) -> str:
+    file = io.BytesIO()
+    try:
+        _SharingPickler(file, store, parts).dump(obj)
+    except (pickle.PicklingError, TypeError):
+        file = io.BytesIO()
+        _SharingDillPickler(file, store, parts).dump(obj)
+    encoded = codecs.encode(zlib.compress(file.getvalue()), "base64").decode()
+    return SHARED_PARTS_PREFIX + encoded
+
+
+def _deserialize_with_shared_parts(s: str) -> Any:
+    data = zlib.decompress(codecs.decode(s.encode(), "base64"))
+    try:
+        return _SharingUnpickler(io.BytesIO(data)).load()
+    except (ModuleNotFoundError, KeyError):
+        return _SharingDillUnpickler(io.BytesIO(data)).load()
+
+
 def test(obj):  # pragma: no cover
     ser = serialize(obj)
     deser = deserialize(ser)
@@ -12,6 +12,7 @@ from zetta_utils.common.partial import ComparablePartial
 from zetta_utils.message_queues.base import MessageQueue
 
 from .. import ReceivedMessage, TQTask, serialization
+from ..payload_store import PayloadStore
 from . import utils
 
 
@@ -41,8 +42,9 @@ class SQSQueue(MessageQueue[T]):
     endpoint_url: str | None = None
     insertion_threads: int = 5
     _queue: Any = attrs.field(init=False, default=None)
-    pull_wait_sec: int = 0
+    pull_wait_sec: float = 0
     pull_lease_sec: int = 10  # TODO: get a better value
+    payload_store: PayloadStore | None = None
 
     def _get_tq_queue(self) -> Any:
         if self._queue is None:
@@ -59,7 +61,7 @@ class SQSQueue(MessageQueue[T]):
         if len(payloads) > 0:
             tq_tasks = []
             for e in payloads:
-                tq_task = TQTask(serialization.serialize(e))
+                tq_task = TQTask(serialization.serialize(e, payload_store=self.payload_store))
                 tq_tasks.append(tq_task)
             self._get_tq_queue().insert(tq_tasks, parallel=self.insertion_threads)
 
@@ -72,6 +74,19 @@ class SQSQueue(MessageQueue[T]):
             visibility_timeout=duration_sec,
         )
 
+    def acknowledge(self, msgs: Sequence[ReceivedMessage[T]]) -> None:
+        receipt_handles = []
+        for msg in msgs:
+            assert isinstance(msg.acknowledge_fn, ComparablePartial)
+            receipt_handles.append(msg.acknowledge_fn.kwargs["receipt_handle"])
+        for i in range(0, len(receipt_handles), utils.SQS_MAX_BATCH_LEN):
+            utils.delete_msg_batch(
+                receipt_handles[i : i + utils.SQS_MAX_BATCH_LEN],
+                queue_name=self.name,
+                region_name=self.region_name,
+                endpoint_url=self.endpoint_url,
+            )
+
     def pull(self, max_num: int = 500) -> list[ReceivedMessage[T]]:
         results = []
         msgs = utils.receive_msgs(
@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import math
 import time
 from typing import Any, Optional
 
@@ -14,6 +15,9 @@ from zetta_utils.log import get_logger
 
 logger = get_logger("zetta_utils")
 
+SQS_MAX_BATCH_LEN = 10
+SQS_MAX_WAIT_SEC = 20
+
 
 @attrs.frozen
 class SQSReceivedMsg:
@@ -51,13 +55,18 @@ def receive_msgs(
     result = []  # type: list[SQSReceivedMsg]
     start_ts = time.time()
     while True:
+        # Long poll until the first messages arrive, then only take what is available
+        if len(result) == 0:
+            wait_time_sec = min(math.ceil(max_time_sec), SQS_MAX_WAIT_SEC)
+        else:
+            wait_time_sec = 0
         sqs_client = get_sqs_client(region_name, endpoint_url=endpoint_url)
         resp = sqs_client.receive_message(
             QueueUrl=get_queue_url(queue_name, region_name, endpoint_url=endpoint_url),
             AttributeNames=["All"],
-            MaxNumberOfMessages=min(msg_batch_size, max_msg_num),
+            MaxNumberOfMessages=min(msg_batch_size, max_msg_num - len(result)),
             VisibilityTimeout=visibility_timeout,
-            WaitTimeSeconds=1,
+            WaitTimeSeconds=wait_time_sec,
         )
         if "Messages" not in resp:
             break
@@ -120,8 +129,6 @@ def change_message_visibility(
     )
 
 
-# To be revived if we need batch deletes:
-"""
 @retry(stop=stop_after_attempt(5), wait=wait_random(min=0.5, max=2))
 def delete_msg_batch(
     receipt_handles: list[str],
@@ -131,7 +138,7 @@ def delete_msg_batch(
     try_count: int = 5,
 ) -> None:
     assert try_count > 0
-    assert len(receipt_handles) <= 10, "SQS only supports batch size <= 10"
+    assert len(receipt_handles) <= SQS_MAX_BATCH_LEN, "SQS only supports batch size <= 10"
     entries_left = {str(k): v for k, v in enumerate(receipt_handles)}
 
     ack = None  # type: Any
@@ -149,6 +156,9 @@ def delete_msg_batch(
 
     raise RuntimeError(f"Failed to delete messages: {ack}")  # pragma: no cover
 
+
+# To be revived if we need batch deletes:
+"""
 def delete_received_msgs(msgs: list[SQSReceivedMsg]) -> None:
     receipts_by_queue = defaultdict(list)  # type: dict[tuple[str, str, Optional[str]], list[str]]
     for msg in msgs:
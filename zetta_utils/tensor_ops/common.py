@@ -388,23 +388,13 @@ def interpolate(  # pylint: disable=too-many-locals
         allow_slice_rounding=allow_slice_rounding,
     )
 
-    if mode in ("segmentation", "img", "bilinear", "linear", "trilinear") and (
-        scale_factor_tuple is not None
-        and (
-            tuple(scale_factor_tuple)
-            in (
-                [(0.5 ** i, 0.5 ** i) for i in range(1, 5)]  # 2D factors of 2
-                + [(0.5 ** i, 0.5 ** i, 1) for i in range(1, 5)]
-                + [(0.5 ** i, 0.5 ** i, 0.5 ** i) for i in range(1, 5)]  # #D factors of 2
-            )
-        )
-        and data.shape[0] == 1
-    ):  # use tinybrain
+    if _can_use_tinybrain(data, scale_factor_tuple, mode):
+        assert scale_factor_tuple is not None
         result_raw = _interpolate_with_tinybrain(
             data=data,
             scale_factor_tuple=scale_factor_tuple,
             is_segmentation=(mode == "segmentation"),
-        )
+        )[0]
     else:
         result_raw = _interpolate_with_torch(
             data=data,
@@ -419,6 +409,87 @@ def interpolate(  # pylint: disable=too-many-locals
     return result_final
 
 
+@builder.register("interpolate_pyramid")
+@typechecked
+def interpolate_pyramid(
+    data: TensorTypeVar,
+    scale_factor: Union[float, Sequence[float]],
+    num_mips: int,
+    mode: InterpolationMode = "img",
+    mask_value_thr: float = 0,
+    unsqueeze_input_to: Optional[int] = 5,
+) -> list[TensorTypeVar]:
+    """
+    Interpolate the given tensor by the given ``scale_factor`` ``num_mips`` times in a row,
+    returning the result of each step. When ``tinybrain`` can be used for the scale factor,
+    all of the steps are computed in a single call.
+
+    :param data: Input tensor.
+    :param scale_factor: Interpolation scale factor of each step.
+        When provided as ``float``, applied to all spatial dimensions of the data.
+    :param num_mips: Number of interpolation steps.
+    :param mode: Algorithm according to which the tensor should be interpolated.
+    :param mask_value_thr: When ``mode == 'mask'``, threshold above which the interpolated
+        value will be considered as ``True``.
+    :param unsqueeze_input_to: If provided, the tensor will be unsqueezed to the given number
+        of dimensions before interpolating, as in ``interpolate``.
+    :return: List of ``num_mips`` interpolated tensors, from the finest to the coarsest.
+    """
+    original_ndim = data.ndim
+    data_unsqueezed = unsqueeze_to(data, unsqueeze_input_to)
+    scale_factor_tuple = _standardize_scale_factor(
+        data_ndim=data_unsqueezed.ndim,
+        scale_factor=scale_factor,
+    )
+    assert scale_factor_tuple is not None
+    if _can_use_tinybrain(data_unsqueezed, scale_factor_tuple, mode):
+        _validate_interpolation_setting(
+            data=data_unsqueezed,
+            size=None,
+            scale_factor_tuple=[e ** num_mips for e in scale_factor_tuple],
+            allow_slice_rounding=False,
+        )
+        return [
+            squeeze_to(e, original_ndim)
+            for e in _interpolate_with_tinybrain(
+                data=data_unsqueezed,
+                scale_factor_tuple=scale_factor_tuple,
+                is_segmentation=(mode == "segmentation"),
+                num_mips=num_mips,
+            )
+        ]
+
+    result = []
+    for _ in range(num_mips):
+        data = interpolate(
+            data,
+            scale_factor=scale_factor,
+            mode=mode,
+            mask_value_thr=mask_value_thr,
+            unsqueeze_input_to=unsqueeze_input_to,
+        )
+        result.append(data)
+    return result
+
+
+def _can_use_tinybrain(
+    data: TensorTypeVar, scale_factor_tuple: Sequence[float] | None, mode: InterpolationMode
+) -> bool:
+    return (
+        mode in ("segmentation", "img", "bilinear", "linear", "trilinear")
+        and scale_factor_tuple is not None
+        and (
+            tuple(scale_factor_tuple)
+            in (
+                [(0.5 ** i, 0.5 ** i) for i in range(1, 5)]  # 2D factors of 2
+                + [(0.5 ** i, 0.5 ** i, 1) for i in range(1, 5)]
+                + [(0.5 ** i, 0.5 ** i, 0.5 ** i) for i in range(1, 5)]  # #D factors of 2
+            )
+        )
+        and data.shape[0] == 1
+    )
+
+
 def _interpolate_with_torch(
     data: TensorTypeVar,
     scale_factor_tuple: Sequence[float] | None,
@@ -484,14 +555,19 @@ def _interpolate_with_torch(
 
 
 def _interpolate_with_tinybrain(
-    data: TensorTypeVar, scale_factor_tuple: Sequence[float], is_segmentation: bool
-) -> TensorTypeVar:
+    data: TensorTypeVar,
+    scale_factor_tuple: Sequence[float],
+    is_segmentation: bool,
+    num_mips: int = 1,
+) -> list[TensorTypeVar]:
     """
     Interpolate the given segmentation tensor by the given ``scale_factor_tuple`` using
     the algorithm implemented ``tinybrain``.
 
     :param data: Input tensor with batch and channel dimensions (B C X Y Z?).
     :param scale_factor_tuple: Interpolation scale factors for each spatial dim.
+    :param num_mips: Number of times to apply the scale factors. The result of each
+        of them is returned.
     """
     assert all(e <= 1 for e in scale_factor_tuple)
     assert data.shape[0] == 1
@@ -499,18 +575,20 @@ def _interpolate_with_tinybrain(
     data_np = data_np.squeeze(0)  # cut the B dim
     data_np = np.moveaxis(data_np, 0, -1)  # put C dim to the end for tinybrain
     if is_segmentation:
-        result_raw = tinybrain.downsample_segmentation(
-            img=data_np, factor=[1.0 / e for e in scale_factor_tuple]
-        )[0]
+        results_raw = tinybrain.downsample_segmentation(
+            img=data_np, factor=[1.0 / e for e in scale_factor_tuple], num_mips=num_mips
+        )
     else:
-        result_raw = tinybrain.downsample_with_averaging(
-            img=data_np, factor=[1.0 / e for e in scale_factor_tuple]
-        )[0]
+        results_raw = tinybrain.downsample_with_averaging(
+            img=data_np, factor=[1.0 / e for e in scale_factor_tuple], num_mips=num_mips
+        )
 
-    result_raw = np.moveaxis(result_raw, -1, 0)  # put C dim to front again
-    result_raw = result_raw[np.newaxis, ...]  # add the B dim
-    result_final = tensor_ops.convert.astype(result_raw, data)
-    return result_final
+    results_final = []
+    for result_raw in results_raw:
+        result_raw = np.moveaxis(result_raw, -1, 0)  # put C dim to front again
+        result_raw = result_raw[np.newaxis, ...]  # add the B dim
+        results_final.append(tensor_ops.convert.astype(result_raw, data))
+    return results_final
 
 
 CompareMode = Literal[